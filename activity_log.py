@@ -0,0 +1,147 @@
+"""Buffered ActivityLog writer.
+
+The middleware hands records to ``activity_buffer``; a background thread writes
+them with ``bulk_create`` once ``ACTIVITY_LOG_BATCH_SIZE`` records are waiting or
+``ACTIVITY_LOG_FLUSH_INTERVAL`` seconds have passed. When the queue is full the
+record is dropped (``ACTIVITY_LOG_OVERFLOW = 'drop'``) or the request waits up to
+``ACTIVITY_LOG_BLOCK_TIMEOUT`` seconds for room (``'block'``). Each record keeps
+the time it was queued, not the time of the flush.
+"""
+import atexit
+import logging
+import queue
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+class ActivityLogBuffer:
+    def __init__(self):
+        self._queue = None
+        self._thread = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.queued = 0
+        self.flushed = 0
+        self.dropped = 0
+        self.failed = 0
+
+    @property
+    def async_enabled(self):
+        return getattr(settings, 'ACTIVITY_LOG_ASYNC', True)
+
+    @property
+    def batch_size(self):
+        return getattr(settings, 'ACTIVITY_LOG_BATCH_SIZE', 100)
+
+    @property
+    def flush_interval(self):
+        return getattr(settings, 'ACTIVITY_LOG_FLUSH_INTERVAL', 2.0)
+
+    def stats(self):
+        return {
+            'queued': self.queued,
+            'flushed': self.flushed,
+            'dropped': self.dropped,
+            'failed': self.failed,
+            'pending': self._queue.qsize() if self._queue else 0,
+        }
+
+    def put(self, user_id, action, details):
+        """Queue one log record. Returns False if it was dropped."""
+        record = {'user_id': user_id, 'action': action, 'details': details, 'timestamp': timezone.now()}
+        if not self.async_enabled:
+            self._count('queued')
+            self._write([record])
+            return True
+
+        self._ensure_started()
+        try:
+            if getattr(settings, 'ACTIVITY_LOG_OVERFLOW', 'drop') == 'block':
+                self._queue.put(record, timeout=getattr(settings, 'ACTIVITY_LOG_BLOCK_TIMEOUT', 0.5))
+            else:
+                self._queue.put_nowait(record)
+        except queue.Full:
+            self._count('dropped')
+            return False
+        self._count('queued')
+        return True
+
+    def flush(self):
+        """Write everything currently queued from the calling thread."""
+        if not self._queue:
+            return
+        batch = []
+        while True:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+            if len(batch) >= self.batch_size:
+                self._write(batch)
+                batch = []
+        if batch:
+            self._write(batch)
+
+    def close(self):
+        """Stop the flusher thread and write what is left."""
+        self._stop.set()
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout=self.flush_interval + 5)
+        self.flush()
+
+    def _ensure_started(self):
+        if self._thread and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            if self._queue is None:
+                self._queue = queue.Queue(maxsize=getattr(settings, 'ACTIVITY_LOG_QUEUE_SIZE', 10000))
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='activity-log-flusher', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stop.is_set():
+            batch = []
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            if batch:
+                close_old_connections()
+                self._write(batch)
+
+    def _count(self, name, amount=1):
+        with self._stats_lock:
+            setattr(self, name, getattr(self, name) + amount)
+
+    def _write(self, batch):
+        from .models import ActivityLog
+
+        with self._write_lock:
+            try:
+                ActivityLog.objects.bulk_create(
+                    [ActivityLog(**record) for record in batch], batch_size=self.batch_size
+                )
+                self._count('flushed', len(batch))
+            except Exception as e:
+                self._count('failed', len(batch))
+                logger.error(f'Activity log flush failed ({len(batch)} records): {str(e)}')
+
+
+activity_buffer = ActivityLogBuffer()
+atexit.register(activity_buffer.close)
@@ -6,4 +6,6 @@ class AccountsConfig(AppConfig):
 
     def ready(self):
         # Import and register signals
-        from . import signals
\ No newline at end of file
+        from . import signals
+        # Models defined outside models.py
+        from . import models_export, models_facts, models_stock
\ No newline at end of file
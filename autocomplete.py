@@ -0,0 +1,89 @@
+"""Remote-search options for the client, driver and oil type selectors.
+
+Forms render only the selected option (see ``widgets.AutocompleteSelect``)
+and the browser asks ``/api/autocomplete/<source>/?q=`` for the rest as the
+user types. Matches come from the search index first, every word of the
+query a prefix of a word of the row ("ahm ali"); when that leaves room under
+the limit, PostgreSQL adds rows by trigram word similarity (``pg_trgm``,
+which also catches misspellings) and other databases add rows whose name
+contains the query.
+
+Results are cached per query under a namespace that every save or delete of
+a client, driver or oil type invalidates; its version also makes the ETag of
+the response.
+"""
+import hashlib
+from collections import namedtuple
+
+from django.apps import apps
+from django.conf import settings
+from django.db import connection
+from django.db.models import F
+
+from . import caching, search
+
+Source = namedtuple('Source', 'model kind field ordering')
+
+SOURCES = {
+    'clients': Source('accounts.Client', 'client', 'name', ['name', 'pk']),
+    'drivers': Source('accounts.Driver', 'driver', 'name', ['name', 'pk']),
+    'oil_types': Source('accounts.OilType', 'oil_type', 'name', ['name', 'pk']),
+}
+
+# pg_trgm word similarity below which a row is not offered
+TRIGRAM_THRESHOLD = 0.3
+
+
+def result_limit():
+    return getattr(settings, 'AUTOCOMPLETE_LIMIT', 20)
+
+
+def prefix_matches(source, queryset, term, limit):
+    if search.backend() is None:
+        return list(queryset.filter(search.fallback_filter(source.kind, term)).order_by(*source.ordering)[:limit])
+    pk_field = queryset.model._meta.pk
+    ids = [pk_field.to_python(object_id) for object_id in search.search_ids(source.kind, term, limit)]
+    rows = queryset.in_bulk(ids)
+    return [rows[pk] for pk in ids if pk in rows]
+
+
+def similar_matches(source, queryset, term, limit):
+    if connection.vendor == 'postgresql':
+        # Imported here: django.contrib.postgres needs psycopg
+        from django.contrib.postgres.lookups import TrigramWordSimilar
+        from django.contrib.postgres.search import TrigramWordSimilarity
+
+        # "name %> term" can use the gin_trgm_ops index
+        queryset = queryset.filter(TrigramWordSimilar(F(source.field), term))
+        queryset = queryset.annotate(similarity=TrigramWordSimilarity(term, source.field))
+        return list(queryset.filter(similarity__gte=TRIGRAM_THRESHOLD).order_by('-similarity', *source.ordering)[:limit])
+    return list(queryset.filter(**{f'{source.field}__icontains': term}).order_by(*source.ordering)[:limit])
+
+
+def suggest(name, term, limit=None):
+    """Up to ``limit`` ``{'id', 'text'}`` options of ``SOURCES[name]`` for ``term``."""
+    source = SOURCES[name]
+    limit = limit or result_limit()
+    term = ' '.join(term.split())
+
+    def compute():
+        queryset = apps.get_model(source.model)._default_manager.all()
+        if not term:
+            return [option(row) for row in queryset.order_by(*source.ordering)[:limit]]
+        rows = prefix_matches(source, queryset, term, limit)
+        if len(rows) < limit:
+            rest = queryset.exclude(pk__in=[row.pk for row in rows])
+            rows += similar_matches(source, rest, term, limit - len(rows))
+        return [option(row) for row in rows]
+
+    return caching.get_or_compute(caching.AUTOCOMPLETE, (name, term, limit), compute)
+
+
+def option(row):
+    return {'id': row.pk, 'text': str(row)}
+
+
+def etag(name, term):
+    """Changes whenever a client, driver or oil type is saved or deleted."""
+    parts = (name, ' '.join(term.split()), result_limit(), caching.get_version(caching.AUTOCOMPLETE))
+    return hashlib.md5(repr(parts).encode('utf-8')).hexdigest()
@@ -0,0 +1,124 @@
+"""Client balance ledger.
+
+Balances are changed with ``F()`` expressions instead of read-modify-save, so
+concurrent treasury entries cannot overwrite each other's updates, and the
+overdraft check is part of the UPDATE's WHERE clause rather than a separate
+read. Every change writes its ``BalanceChangeLog`` row in the same transaction.
+"""
+from collections import namedtuple
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, DecimalField, F, Q, Value, When
+
+from . import caching
+from .models import BalanceChangeLog, Client
+
+ZERO = Decimal('0.00')
+
+BalanceChange = namedtuple('BalanceChange', 'client_id delta notes allow_overdraft', defaults=('', True))
+
+
+class InsufficientBalance(Exception):
+    """A change would take a client that does not allow overdrafts below zero."""
+
+    def __init__(self, client_ids):
+        self.client_ids = sorted(client_ids)
+        super().__init__(f'Insufficient balance for client(s) {", ".join(map(str, self.client_ids))}')
+
+
+def treasury_change(source, transaction_type, amount, client_id, username=''):
+    """The balance change a treasury movement makes, or None for driver movements.
+
+    Client accounts receive income and pay expenses and may not be overdrawn;
+    company accounts move the other way (the company's debt to the client).
+    """
+    if not client_id or not amount:
+        return None
+    income = transaction_type == 'income'
+    if source in ('client', 'client_account'):
+        notes = f"{'إيداع' if income else 'سحب'} خزينة بواسطة {username}"
+        return BalanceChange(int(client_id), amount if income else -amount, notes, allow_overdraft=False)
+    if source in ('company', 'company_account'):
+        notes = f"{'سحب' if income else 'إيداع'} خزينة بواسطة {username}"
+        return BalanceChange(int(client_id), -amount if income else amount, notes)
+    return None
+
+
+def reverse_change(change, notes):
+    """A change that undoes ``change``; reversing never checks for overdraft."""
+    return BalanceChange(change.client_id, -change.delta, notes)
+
+
+def _sign(value):
+    return (value > 0) - (value < 0)
+
+
+def apply_changes(changes, user=None):
+    """Apply a batch of balance changes atomically and return their logs.
+
+    All clients are updated by a single ``UPDATE ... CASE`` statement. The
+    overdraft check applies to each client's net change in the batch, so a
+    reversal and a new expense on the same client are checked together.
+    Raises ``InsufficientBalance`` (and changes nothing) if any guarded client
+    would go below zero.
+    """
+    changes = [change for change in changes if change is not None and change.delta]
+    if not changes:
+        return []
+
+    net, guarded = {}, set()
+    for change in changes:
+        net[change.client_id] = net.get(change.client_id, ZERO) + change.delta
+        if not change.allow_overdraft:
+            guarded.add(change.client_id)
+    overdrawn = {client_id for client_id in guarded if net[client_id] < 0}
+
+    condition = Q()
+    for client_id in net:
+        if client_id in overdrawn:
+            condition |= Q(pk=client_id, balance__gte=-net[client_id])
+        else:
+            condition |= Q(pk=client_id)
+    amount_field = DecimalField(max_digits=15, decimal_places=2)
+    delta = Case(
+        *(When(pk=client_id, then=Value(value, output_field=amount_field)) for client_id, value in net.items()),
+        default=Value(ZERO, output_field=amount_field),
+        output_field=amount_field,
+    )
+
+    with transaction.atomic():
+        updated = Client.objects.filter(condition).update(balance=F('balance') + delta)
+        if updated != len(net):
+            missing = set(net) - set(Client.objects.filter(pk__in=net).values_list('pk', flat=True))
+            if missing:
+                raise Client.DoesNotExist(f'Client(s) {sorted(missing)} do not exist')
+            raise InsufficientBalance(overdrawn)
+
+        # Our UPDATE holds the rows, so these are the balances it produced
+        balances = dict(Client.objects.filter(pk__in=net).values_list('pk', 'balance'))
+        running = {client_id: balance - net[client_id] for client_id, balance in balances.items()}
+        if any(_sign(balances[client_id]) != _sign(running[client_id]) for client_id in net):
+            # The balance filter of the client list counts by sign
+            transaction.on_commit(lambda: caching.bump(caching.CLIENT_BALANCE_COUNTS))
+        # The dashboard lists the top balances
+        transaction.on_commit(lambda: caching.bump(caching.DASHBOARD))
+        logs = []
+        for change in changes:
+            previous = running[change.client_id]
+            running[change.client_id] = previous + change.delta
+            logs.append(BalanceChangeLog(
+                client_id=change.client_id,
+                user=user,
+                previous_balance=previous,
+                new_balance=running[change.client_id],
+                change_amount=change.delta,
+                notes=change.notes,
+            ))
+        return BalanceChangeLog.objects.bulk_create(logs)
+
+
+def apply_change(client_id, delta, user=None, notes='', allow_overdraft=True):
+    """Apply one balance change and return its log entry."""
+    logs = apply_changes([BalanceChange(client_id, delta, notes, allow_overdraft)], user=user)
+    return logs[0] if logs else None
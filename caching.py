@@ -0,0 +1,68 @@
+"""Versioned cache entries.
+
+Cached values are stored under a key that includes a per-namespace version
+number. Invalidating a namespace only increments that number, so every entry
+computed before the change is skipped without having to know its key.
+
+The version lives in the Django cache, so a bump reaches other processes only
+when ``CACHES`` is a shared backend (Redis, see settings). With the per-process
+LocMemCache default the other processes keep their entries until these time
+out, which is why every entry is stored with a timeout.
+"""
+import hashlib
+import time
+
+from django.core.cache import cache
+
+MISSING = object()
+
+# Namespaces
+TREASURY_TOTALS = 'treasury-totals'
+CLIENT_COUNTS = 'client-counts'
+CLIENT_BALANCE_COUNTS = 'client-balance-counts'
+AUTOCOMPLETE = 'autocomplete'
+DRIVER_LOOKUPS = 'driver-lookups'
+CLIENT_LOOKUPS = 'client-lookups'
+OIL_TYPE_LOOKUPS = 'oil-type-lookups'
+DASHBOARD = 'dashboard'
+
+
+def _version_key(namespace):
+    return f'{namespace}:version'
+
+
+def get_version(namespace):
+    version = cache.get(_version_key(namespace))
+    if version is None:
+        # Start from the clock so a lost version key never brings back old entries
+        version = int(time.time() * 1000)
+        if not cache.add(_version_key(namespace), version, None):
+            version = cache.get(_version_key(namespace), version)
+    return version
+
+
+def bump(namespace):
+    """Invalidate every entry of ``namespace``."""
+    try:
+        cache.incr(_version_key(namespace))
+    except ValueError:
+        get_version(namespace)
+        cache.incr(_version_key(namespace))
+
+
+def make_key(namespace, *parts, version=None):
+    """Key of ``parts`` under the current version of ``namespace``, or under ``version`` when given."""
+    digest = hashlib.md5(repr(parts).encode('utf-8')).hexdigest()
+    if version is None:
+        version = get_version(namespace)
+    return f'{namespace}:{version}:{digest}'
+
+
+def get_or_compute(namespace, parts, compute, timeout=300):
+    """Return the cached value for ``parts``, computing and storing it on a miss."""
+    key = make_key(namespace, *parts)
+    value = cache.get(key, MISSING)
+    if value is MISSING:
+        value = compute()
+        cache.set(key, value, timeout)
+    return value
@@ -0,0 +1,182 @@
+"""Monthly statement checkpoints.
+
+Every sale, purchase and treasury movement of a client contributes to the
+``StatementCheckpoint`` of its month. Saves and deletes apply the difference
+between the old and the new contribution, so a statement only has to scan the
+rows of the open period and can start from the previous month's closing balance.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+from django.db.models.functions import TruncMonth
+
+from .models import Purchase, Sale, Treasury
+from .models_statement import StatementCheckpoint
+
+ZERO = Decimal('0.00')
+
+
+def month_start(date):
+    return date.replace(day=1)
+
+
+def entry_for(model, values):
+    """(client_id, period, sales, purchases, treasury, balance delta) of one row, or None."""
+    if not values:
+        return None
+    if model is Sale:
+        amount = values['amount'] or ZERO
+        return values['client_id'], month_start(values['date']), amount, ZERO, ZERO, amount
+    if model is Purchase:
+        if not values['supplier_id']:
+            return None
+        amount = values['amount'] or ZERO
+        return values['supplier_id'], month_start(values['date']), ZERO, amount, ZERO, -amount
+    if model is Treasury:
+        if not values['related_client_id']:
+            return None
+        amount = values['paid_amount'] or ZERO
+        signed = -amount if values['transaction_type'] == 'expense' else amount
+        return values['related_client_id'], month_start(values['date']), ZERO, ZERO, amount, signed
+    return None
+
+
+def apply_entry(client_id, period, sales, purchases, treasury, balance, create=True):
+    """Add one contribution to the month's checkpoint and carry the balance to later months."""
+    if not (sales or purchases or treasury or balance):
+        return
+    with transaction.atomic():
+        updated = StatementCheckpoint.objects.filter(client_id=client_id, period=period).update(
+            total_sales=F('total_sales') + sales,
+            total_purchases=F('total_purchases') + purchases,
+            total_treasury=F('total_treasury') + treasury,
+            closing_balance=F('closing_balance') + balance,
+        )
+        if not updated and create:
+            previous = StatementCheckpoint.objects.filter(
+                client_id=client_id, period__lt=period
+            ).order_by('-period').values_list('closing_balance', flat=True).first()
+            try:
+                with transaction.atomic():
+                    StatementCheckpoint.objects.create(
+                        client_id=client_id, period=period, total_sales=sales, total_purchases=purchases,
+                        total_treasury=treasury, closing_balance=(previous or ZERO) + balance,
+                    )
+            except IntegrityError:
+                # Another writer created the month first
+                return apply_entry(client_id, period, sales, purchases, treasury, balance, create)
+        if balance:
+            StatementCheckpoint.objects.filter(client_id=client_id, period__gt=period).update(
+                closing_balance=F('closing_balance') + balance
+            )
+
+
+def apply_change(model, old_values, new_values):
+    """Replace the contribution of ``old_values`` with the one of ``new_values``."""
+    old = entry_for(model, old_values)
+    new = entry_for(model, new_values)
+    if old == new:
+        return
+    if old and new and old[:2] == new[:2]:
+        apply_entry(old[0], old[1], *(n - o for n, o in zip(new[2:], old[2:])))
+        return
+    if old:
+        apply_entry(old[0], old[1], *(-value for value in old[2:]), create=False)
+    if new:
+        apply_entry(*new)
+
+
+def apply_new_rows(model, rows):
+    """Add rows saved without signals (``bulk_create``), one update per client and month."""
+    grouped = {}
+    for values in rows:
+        entry = entry_for(model, values)
+        if entry is None:
+            continue
+        key = entry[:2]
+        previous = grouped.get(key, (ZERO, ZERO, ZERO, ZERO))
+        grouped[key] = tuple(total + value for total, value in zip(previous, entry[2:]))
+    for (client_id, period), totals in sorted(grouped.items()):
+        apply_entry(client_id, period, *totals)
+
+
+def monthly_totals(client_ids=None):
+    """{client_id: {period: [sales, purchases, treasury, balance delta]}} from the raw rows."""
+    totals = defaultdict(lambda: defaultdict(lambda: [ZERO, ZERO, ZERO, ZERO]))
+
+    sales = Sale.objects.all()
+    purchases = Purchase.objects.exclude(supplier=None)
+    treasury = Treasury.objects.exclude(related_client=None)
+    if client_ids is not None:
+        sales = sales.filter(client_id__in=client_ids)
+        purchases = purchases.filter(supplier_id__in=client_ids)
+        treasury = treasury.filter(related_client_id__in=client_ids)
+
+    for row in sales.annotate(period=TruncMonth('date')).values('client_id', 'period').annotate(total=Sum('amount')):
+        entry = totals[row['client_id']][row['period']]
+        entry[0] += row['total'] or ZERO
+        entry[3] += row['total'] or ZERO
+    for row in purchases.annotate(period=TruncMonth('date')).values('supplier_id', 'period').annotate(total=Sum('amount')):
+        entry = totals[row['supplier_id']][row['period']]
+        entry[1] += row['total'] or ZERO
+        entry[3] -= row['total'] or ZERO
+    for row in treasury.annotate(period=TruncMonth('date')).values(
+        'related_client_id', 'period', 'transaction_type'
+    ).annotate(total=Sum('paid_amount')):
+        entry = totals[row['related_client_id']][row['period']]
+        amount = row['total'] or ZERO
+        entry[2] += amount
+        entry[3] += -amount if row['transaction_type'] == 'expense' else amount
+    return totals
+
+
+def expected_checkpoints(client_ids=None):
+    for client_id, months in monthly_totals(client_ids).items():
+        balance = ZERO
+        for period in sorted(months):
+            sales, purchases, treasury, delta = months[period]
+            balance += delta
+            yield StatementCheckpoint(
+                client_id=client_id, period=period, total_sales=sales, total_purchases=purchases,
+                total_treasury=treasury, closing_balance=balance,
+            )
+
+
+@transaction.atomic
+def rebuild_checkpoints(client_ids=None):
+    """Recompute checkpoints from the raw rows. Returns the number of checkpoints written."""
+    existing = StatementCheckpoint.objects.all()
+    if client_ids is not None:
+        existing = existing.filter(client_id__in=client_ids)
+    existing.delete()
+    checkpoints = list(expected_checkpoints(client_ids))
+    StatementCheckpoint.objects.bulk_create(checkpoints, batch_size=1000)
+    return len(checkpoints)
+
+
+def check_checkpoints(client_ids=None):
+    """Compare stored checkpoints with the raw rows. Returns a list of (client_id, period, problem)."""
+    stored = StatementCheckpoint.objects.all()
+    if client_ids is not None:
+        stored = stored.filter(client_id__in=client_ids)
+    stored = {
+        (row['client_id'], row['period']): row
+        for row in stored.values('client_id', 'period', 'total_sales', 'total_purchases', 'total_treasury', 'closing_balance')
+    }
+    problems = []
+    fields = ('total_sales', 'total_purchases', 'total_treasury', 'closing_balance')
+    for expected in expected_checkpoints(client_ids):
+        row = stored.pop((expected.client_id, expected.period), None)
+        if row is None:
+            problems.append((expected.client_id, expected.period, 'missing'))
+            continue
+        for field in fields:
+            if row[field] != getattr(expected, field):
+                problems.append((expected.client_id, expected.period,
+                                 f'{field}: stored {row[field]}, expected {getattr(expected, field)}'))
+    for (client_id, period), row in stored.items():
+        if any(row[field] for field in fields[:3]):
+            problems.append((client_id, period, 'no matching rows'))
+    return problems
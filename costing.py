@@ -0,0 +1,186 @@
+"""Weighted-average cost of the oil types and the margin of every sale.
+
+The ``StockSnapshot`` of an oil type's day holds the value of the day's
+purchases (``value_in``, kept up to date by ``stock``) and the weighted-average
+cost of the stock after them (``average_cost``):
+
+    average = (opening stock * previous average + value in) / (opening stock + quantity in)
+
+An empty or negative opening stock starts over at the price of the day's
+purchases. Every sale of the day is costed at the day's average and its
+``unit_cost``, ``cost_amount`` and ``margin`` are stamped on the row, so the
+margin reports only sum them.
+
+A purchase or sale changing on a day only moves the averages from that day on:
+``recompute`` walks the snapshots of that suffix, never the earlier history,
+and stamps again the sales of the days whose average changed.
+
+The stock signals must run first; ``signals`` registers the costing receivers
+after them.
+"""
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, F, Min, OuterRef, Subquery, Sum
+from django.db.models.functions import Round, Trunc
+
+from . import stock
+from .models import OilType, Sale
+from .models_stock import StockSnapshot
+
+ZERO = Decimal('0')
+UNIT_COST = Decimal('0.0001')
+PERIODS = ('day', 'week', 'month', 'year')
+
+
+def average_cost(opening, previous, quantity_in, value_in):
+    if quantity_in <= 0:
+        return previous
+    if opening <= 0:
+        return (value_in / quantity_in).quantize(UNIT_COST)
+    return ((opening * previous + value_in) / (opening + quantity_in)).quantize(UNIT_COST)
+
+
+def stamp_sales(queryset):
+    """Cost the sales of ``queryset`` at the average of their oil type's day (two updates)."""
+    average = StockSnapshot.objects.filter(
+        oil_type_id=OuterRef('oil_type_id'), date=OuterRef('date')
+    ).order_by().values('average_cost')[:1]
+    queryset.update(unit_cost=Subquery(average))
+    cost = Round(F('quantity') * F('unit_cost'), 2)
+    queryset.update(cost_amount=cost, margin=F('amount') - cost)
+
+
+@transaction.atomic
+def recompute(oil_type_id, date):
+    """Recompute the averages of an oil type from ``date`` on. Returns the number of days that changed."""
+    previous = StockSnapshot.objects.filter(
+        oil_type_id=oil_type_id, date__lt=date
+    ).order_by('-date').values_list('average_cost', flat=True).first() or ZERO
+    changed = []
+    for snapshot in StockSnapshot.objects.filter(oil_type_id=oil_type_id, date__gte=date).order_by('date'):
+        opening = snapshot.closing_quantity - snapshot.quantity_in + snapshot.quantity_out
+        average = average_cost(opening, previous, snapshot.quantity_in, snapshot.value_in)
+        if average != snapshot.average_cost:
+            snapshot.average_cost = average
+            changed.append(snapshot)
+        previous = average
+    if changed:
+        StockSnapshot.objects.bulk_update(changed, ['average_cost'], batch_size=500)
+
+    # The changed day itself always, for the sale that moved
+    last = max([date] + [snapshot.date for snapshot in changed])
+    stamp_sales(Sale.objects.filter(oil_type_id=oil_type_id, date__gte=date, date__lte=last))
+    return len(changed)
+
+
+def apply_change(model, old_values, new_values):
+    """Recompute the costs touched by replacing ``old_values`` with ``new_values``.
+
+    Returns whether anything was stamped.
+    """
+    old = stock.entry_for(model, old_values)
+    new = stock.entry_for(model, new_values)
+    if old == new:
+        if model is Sale and old and old_values['amount'] != new_values['amount']:
+            # A new price changes the margin only
+            stamp_sales(Sale.objects.filter(pk=new_values['id']))
+            return True
+        return False
+    starts = {}
+    for entry in (old, new):
+        if entry:
+            starts[entry[0]] = min(entry[1], starts.get(entry[0], entry[1]))
+    for oil_type_id, date in sorted(starts.items()):
+        recompute(oil_type_id, date)
+    if model is Sale and new_values and not new:
+        # No oil type, no cost
+        Sale.objects.filter(pk=new_values['id']).update(unit_cost=None, cost_amount=None, margin=None)
+    return True
+
+
+def apply_new_rows(model, rows):
+    """Recompute the costs after ``stock.apply_new_rows``, once per oil type from its earliest new day."""
+    starts = {}
+    for values in rows:
+        entry = stock.entry_for(model, values)
+        if entry:
+            starts[entry[0]] = min(entry[1], starts.get(entry[0], entry[1]))
+    for oil_type_id, date in sorted(starts.items()):
+        recompute(oil_type_id, date)
+
+
+def refresh(sale):
+    """Read back the stamped cost of a saved sale instance."""
+    sale.unit_cost, sale.cost_amount, sale.margin = Sale.objects.filter(pk=sale.pk).values_list(
+        'unit_cost', 'cost_amount', 'margin'
+    ).get()
+
+
+@transaction.atomic
+def rebuild_costs(oil_type_ids=None):
+    """Recompute every average and stamp every sale. Returns the number of days that changed."""
+    oil_types = OilType.objects.all()
+    if oil_type_ids is not None:
+        oil_types = oil_types.filter(pk__in=oil_type_ids)
+    changed = 0
+    for oil_type_id, first in oil_types.values_list('pk').annotate(first=Min('stock_snapshots__date')):
+        if first is not None:
+            changed += recompute(oil_type_id, first)
+    sales = Sale.objects.all()
+    if oil_type_ids is not None:
+        sales = sales.filter(oil_type_id__in=oil_type_ids)
+    stamp_sales(sales.exclude(oil_type=None))
+    sales.filter(oil_type=None).exclude(unit_cost=None).update(unit_cost=None, cost_amount=None, margin=None)
+    return changed
+
+
+def check_costs(oil_type_ids=None):
+    """Compare the stored averages and sale costs with a recomputation. Returns a list of (oil_type_id, date, problem)."""
+    problems = []
+    snapshots = StockSnapshot.objects.order_by('oil_type_id', 'date')
+    sales = Sale.objects.exclude(oil_type=None)
+    if oil_type_ids is not None:
+        snapshots = snapshots.filter(oil_type_id__in=oil_type_ids)
+        sales = sales.filter(oil_type_id__in=oil_type_ids)
+
+    oil_type_id = previous = None
+    for snapshot in snapshots.iterator():
+        if snapshot.oil_type_id != oil_type_id:
+            oil_type_id, previous = snapshot.oil_type_id, ZERO
+        opening = snapshot.closing_quantity - snapshot.quantity_in + snapshot.quantity_out
+        expected = average_cost(opening, previous, snapshot.quantity_in, snapshot.value_in)
+        if snapshot.average_cost != expected:
+            problems.append((oil_type_id, snapshot.date, f'average_cost: stored {snapshot.average_cost}, expected {expected}'))
+        previous = expected
+
+    average = StockSnapshot.objects.filter(
+        oil_type_id=OuterRef('oil_type_id'), date=OuterRef('date')
+    ).order_by().values('average_cost')[:1]
+    stale = sales.annotate(expected=Subquery(average)).exclude(unit_cost=F('expected')).exclude(
+        unit_cost=None, expected=None
+    )
+    for row in stale.values('oil_type_id', 'date').annotate(count=Count('id')).order_by('oil_type_id', 'date'):
+        problems.append((row['oil_type_id'], row['date'], f'{row["count"]} sales with a stale unit cost'))
+    return problems
+
+
+def margin_report(period='month', date_from=None, date_to=None, oil_type_ids=None):
+    """Quantity, sales, cost and margin per period and oil type, summed from the stamped sales."""
+    if period not in PERIODS:
+        raise ValueError(f'Unknown period: {period}')
+    sales = Sale.objects.exclude(oil_type=None)
+    if date_from:
+        sales = sales.filter(date__gte=date_from)
+    if date_to:
+        sales = sales.filter(date__lte=date_to)
+    if oil_type_ids:
+        sales = sales.filter(oil_type_id__in=oil_type_ids)
+    rows = sales.annotate(period=Trunc('date', period)).values('period', 'oil_type_id', 'oil_type__name').annotate(
+        quantity=Sum('quantity'), sales=Sum('amount'), cost=Sum('cost_amount'), margin=Sum('margin'),
+    ).order_by('period', 'oil_type__name')
+    for row in rows:
+        row['margin_rate'] = None
+        if row['sales'] and row['margin'] is not None:
+            row['margin_rate'] = (row['margin'] / row['sales'] * 100).quantize(Decimal('0.01'))
+        yield row
@@ -0,0 +1,91 @@
+"""Home page KPIs.
+
+Every figure comes from the daily facts or from the ``Client.balance`` column,
+never from the raw rows, and the whole set is cached as one entry of the
+``DASHBOARD`` namespace. Saves and deletes of the operations, treasury
+movements and clients bump the namespace, and a short timeout bounds what a
+change made without signals (or in another process, without a shared cache
+backend) can leave behind, so a page load is normally two cache reads.
+
+The treasury figures and the client balances are only computed (and cached)
+for the roles allowed into the treasury and client pages; see ``GROUP_ROLES``.
+"""
+from decimal import Decimal
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+
+from . import caching, facts
+from .mixins import ClientManagerRequiredMixin, TransactionManagerRequiredMixin
+from .models import Client
+
+ZERO = Decimal('0')
+TOP = 5
+
+# KPI groups shown only to the roles of the pages they summarize
+GROUP_ROLES = {
+    'treasury': TransactionManagerRequiredMixin.required_roles,
+    'top_clients': ClientManagerRequiredMixin.required_roles,
+}
+
+
+def hidden_groups(user):
+    """The KPI groups ``user`` may not see; none when no user is given."""
+    if user is None:
+        return ()
+    return tuple(group for group, roles in GROUP_ROLES.items() if user.role not in roles)
+
+
+def _totals(source, date_from, date_to):
+    row = facts.summary(source, date_from, date_to)
+    return {name[len('total_'):]: value or ZERO for name, value in row.items()}
+
+
+def compute(today, hidden=()):
+    month_start = today.replace(day=1)
+    operations = {}
+    for source in ('sale', 'purchase'):
+        operations[source] = {
+            'today': _totals(source, today, today),
+            'month': _totals(source, month_start, today),
+        }
+    trips = facts.summary('freight', month_start, today, by=['driver_id', 'driver__name'])
+    figures = {
+        'today': today,
+        'month_start': month_start,
+        'sales': operations['sale'],
+        'purchases': operations['purchase'],
+        'trips': [
+            {
+                'driver_id': row['driver_id'],
+                'driver_name': row['driver__name'],
+                'count': row['total_count'],
+                'quantity': row['total_quantity'],
+                'driver_freight': row['total_driver_freight'],
+            }
+            for row in trips.filter(driver__isnull=False).order_by(F('total_count').desc(), 'driver__name')[:TOP]
+        ],
+    }
+    if 'treasury' not in hidden:
+        treasury = _totals('treasury', month_start, today)
+        figures['treasury'] = {
+            'today': _totals('treasury', today, today),
+            'month': treasury,
+            'net': treasury['paid_in'] - treasury['paid_out'],
+        }
+    if 'top_clients' not in hidden:
+        figures['top_clients'] = list(Client.objects.order_by('-balance', 'pk').values('pk', 'name', 'balance')[:TOP])
+    return figures
+
+
+def kpis(today=None, user=None):
+    """The dashboard figures for ``today`` (the local date by default) that ``user`` may see."""
+    today = today or timezone.localdate()
+    hidden = hidden_groups(user)
+    return caching.get_or_compute(
+        caching.DASHBOARD,
+        (today, *hidden),
+        lambda: compute(today, hidden),
+        timeout=getattr(settings, 'DASHBOARD_CACHE_TIMEOUT', 60),
+    )
@@ -0,0 +1,161 @@
+"""Server-side processing for DataTables.
+
+Each entry of ``TABLES`` describes one JSON endpoint: the model, the columns
+the browser may ask for (a name and the ``values()`` path it reads), and who
+may read it. A request carries the DataTables parameters (``draw``, ``start``,
+``length``, ``order[i][column]``, ``order[i][dir]``, ``search[value]`` and
+``columns[i][data]``/``columns[i][search][value]``); the response holds only
+the requested page, projected to the requested columns.
+
+The global search box goes through the full-text index when the model has a
+search document, otherwise ``icontains`` on the searchable columns. A column
+search on a column with choices matches the stored value exactly, and its
+rows also carry ``<name>_display``.
+"""
+from collections import namedtuple
+from functools import reduce
+from operator import or_
+
+from django.apps import apps
+from django.conf import settings
+from django.db.models import F, Q
+
+from . import search
+
+Column = namedtuple('Column', 'name field searchable orderable choices', defaults=(None, True, True, False))
+
+
+class Table:
+    def __init__(self, model, columns, ordering, search_kind=None, roles=None):
+        self.model = model
+        self.columns = {column.name: column._replace(field=column.field or column.name) for column in columns}
+        self.ordering = list(ordering)
+        self.search_kind = search_kind
+        self.roles = roles
+
+    def allowed(self, user):
+        return user.is_authenticated and (self.roles is None or user.role in self.roles)
+
+    def get_queryset(self):
+        return apps.get_model(self.model)._default_manager.all()
+
+    def choices(self, column):
+        return dict(apps.get_model(self.model)._meta.get_field(column.field).flatchoices)
+
+    def requested_columns(self, params):
+        """Names of the requested columns, by their DataTables index; every column when none is sent."""
+        requested = {}
+        index = 0
+        while f'columns[{index}][data]' in params:
+            name = params[f'columns[{index}][data]']
+            if name in self.columns:
+                requested[index] = name
+            index += 1
+        return requested or dict(enumerate(self.columns))
+
+    def filter(self, queryset, params, requested):
+        query = params.get('search[value]', '').strip()
+        if query:
+            if self.search_kind:
+                queryset = search.filter_queryset(queryset, self.search_kind, query)
+            else:
+                fields = [column.field for column in self.columns.values() if column.searchable]
+                queryset = queryset.filter(reduce(
+                    lambda q, word: q & reduce(or_, (Q(**{f'{field}__icontains': word}) for field in fields)),
+                    query.split(), Q(),
+                ))
+        for index, name in requested.items():
+            column = self.columns[name]
+            value = params.get(f'columns[{index}][search][value]', '').strip()
+            if value and column.searchable:
+                lookup = column.field if column.choices else f'{column.field}__icontains'
+                queryset = queryset.filter(**{lookup: value})
+        return queryset
+
+    def order(self, queryset, params, requested):
+        ordering = []
+        index = 0
+        while f'order[{index}][column]' in params:
+            column_index = params[f'order[{index}][column]']
+            name = requested.get(int(column_index)) if column_index.isdigit() else None
+            if name and self.columns[name].orderable:
+                descending = params.get(f'order[{index}][dir]') == 'desc'
+                ordering.append(f'{"-" if descending else ""}{self.columns[name].field}')
+            index += 1
+        if not ordering:
+            # Keep the rank order of search results
+            return queryset if queryset.query.order_by else queryset.order_by(*self.ordering)
+        # The primary key keeps the order stable between pages
+        return queryset.order_by(*ordering, '-pk' if ordering[-1].startswith('-') else 'pk')
+
+    def project(self, queryset, names):
+        fields = [self.columns[name].field for name in names]
+        plain = [field for name, field in zip(names, fields) if name == field]
+        aliases = {name: F(field) for name, field in zip(names, fields) if name != field}
+        return queryset.values(*plain, **aliases)
+
+    def response(self, params):
+        try:
+            draw = int(params.get('draw', 0))
+            start = max(int(params.get('start', 0)), 0)
+            length = int(params.get('length', 25))
+        except ValueError:
+            draw, start, length = 0, 0, 25
+        max_length = getattr(settings, 'DATATABLES_MAX_LENGTH', 100)
+        length = max_length if length < 0 else min(length, max_length)
+
+        requested = self.requested_columns(params)
+        base = self.get_queryset()
+        filtered = self.filter(base, params, requested)
+        total = base.count()
+        # No extra COUNT when nothing is filtered
+        count = total if filtered is base else filtered.count()
+
+        names = list(dict.fromkeys(requested.values()))
+        rows = list(self.project(self.order(filtered, params, requested), names)[start:start + length])
+        for name in names:
+            if self.columns[name].choices:
+                display = self.choices(self.columns[name])
+                for row in rows:
+                    row[f'{name}_display'] = display.get(row[name], row[name])
+        return {'draw': draw, 'recordsTotal': total, 'recordsFiltered': count, 'data': rows}
+
+
+TABLES = {
+    'sales': Table('accounts.Sale', [
+        Column('id'), Column('sale_id'), Column('date'),
+        Column('client_name', 'client__name'), Column('oil_type_name', 'oil_type__name'),
+        Column('quantity', searchable=False), Column('price', searchable=False), Column('amount', searchable=False),
+        Column('driver_name', 'driver__name'), Column('loading_location'), Column('unloading_location'),
+    ], ordering=['-date', '-pk'], search_kind='sale'),
+    'purchases': Table('accounts.Purchase', [
+        Column('id'), Column('purchase_id', 'BU_ID'), Column('date'),
+        Column('supplier_name', 'supplier__name'), Column('oil_type_name', 'oil_type__name'),
+        Column('quantity', searchable=False), Column('price', searchable=False), Column('amount', searchable=False),
+        Column('driver_name', 'driver__name'), Column('loading_location'), Column('unloading_location'),
+    ], ordering=['-date', '-pk'], search_kind='purchase'),
+    'treasury': Table('accounts.Treasury', [
+        Column('movement_id'), Column('date'), Column('description'),
+        Column('transaction_type', choices=True),
+        Column('paid_amount', searchable=False), Column('payment_method', choices=True),
+    ], ordering=['-date', '-movement_id'], search_kind='treasury', roles=['admin', 'transaction_manager']),
+    'vehicle_movements': Table('accounts.VehicleMovement', [
+        Column('movement_id'), Column('date'),
+        Column('movement_type', choices=True),
+        Column('client_name', 'client__name'), Column('driver_name', 'driver__name'), Column('vehicle_number'),
+        Column('oil_type_name', 'oil_type__name'), Column('quantity', searchable=False),
+    ], ordering=['-date', '-created_at', '-movement_id'], search_kind='vehicle_movement'),
+    'clients': Table('accounts.Client', [
+        Column('id', searchable=False), Column('client_id'), Column('name'), Column('company_name'),
+        Column('phone_number'), Column('balance', searchable=False),
+    ], ordering=['name', 'pk']),
+    'drivers': Table('accounts.Driver', [
+        Column('id', searchable=False), Column('driver_id'), Column('name'), Column('id_number'),
+        Column('phone_number'), Column('license_number'),
+        Column('license_type', choices=True),
+        Column('license_expiry_date', searchable=False), Column('vehicle_number'), Column('vehicle_type'),
+    ], ordering=['name', 'pk'], roles=['admin', 'vehicle_manager']),
+    'oil_types': Table('accounts.OilType', [
+        Column('id'), Column('name'), Column('properties'), Column('current_quantity', searchable=False),
+    ], ordering=['id'], search_kind='oil_type', roles=['admin']),
+}
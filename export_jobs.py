@@ -0,0 +1,190 @@
+"""Background export jobs.
+
+Web requests only record an ``ExportJob``; the ``run_export_worker`` command
+claims pending jobs, writes the file under ``EXPORT_ROOT`` and reports
+progress on the job row. A request whose kind, format and filters match a
+finished job younger than ``EXPORT_ARTIFACT_TTL`` (or one still being built)
+gets that job back instead of a new one, as long as the requester may open it.
+A running job whose worker has not reported for ``EXPORT_JOB_TIMEOUT`` is
+taken to be lost: it is no longer reused and the worker marks it failed.
+"""
+import csv
+import hashlib
+import json
+import logging
+import os
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from .filters import parse_date_param
+from .models import Client
+from .models_export import ExportJob
+from .models_vehicle import VehicleMovement
+from .statements import ClientStatement
+from .vehicle_exports import HEADERS as VEHICLE_HEADERS, export_rows, filter_movements
+
+logger = logging.getLogger(__name__)
+
+PROGRESS_EVERY = 1000
+
+STATEMENT_HEADERS = ['التاريخ', 'رقم العملية', 'النوع', 'التفاصيل', 'المبلغ', 'الرصيد']
+STATEMENT_TYPES = {'sale': 'مبيعات', 'purchase': 'مشتريات', 'treasury': 'خزينة'}
+
+
+def export_root():
+    return getattr(settings, 'EXPORT_ROOT', os.path.join(settings.BASE_DIR, 'exports'))
+
+
+def artifact_ttl():
+    return timedelta(seconds=getattr(settings, 'EXPORT_ARTIFACT_TTL', 3600))
+
+
+def job_timeout():
+    return timedelta(seconds=getattr(settings, 'EXPORT_JOB_TIMEOUT', 600))
+
+
+def visible_jobs(user):
+    """The jobs ``user`` may open: every job for admins, their own for everyone else."""
+    jobs = ExportJob.objects.all()
+    if user is not None and user.role != 'admin':
+        jobs = jobs.filter(created_by=user)
+    return jobs
+
+
+def hash_params(kind, format, params):
+    payload = json.dumps([kind, format, params], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def vehicle_movement_source(params):
+    total = filter_movements(VehicleMovement.objects.all(), params).count()
+    return VEHICLE_HEADERS, total, export_rows(params)
+
+
+def client_statement_source(params):
+    client = Client.objects.get(pk=params['client_id'])
+    statement = ClientStatement(
+        client,
+        date_from=parse_date_param(params.get('date_from')),
+        date_to=parse_date_param(params.get('date_to')),
+    )
+
+    def rows():
+        if statement.date_from:
+            yield ['', '', '', 'رصيد منقول', '', statement.summary()['opening_balance']]
+        for row in statement.iter_rows():
+            yield [
+                row['date'].isoformat(), row['transaction_id'], STATEMENT_TYPES[row['type']],
+                row['details'], row['amount'], row['balance'],
+            ]
+
+    return STATEMENT_HEADERS, statement.count(), rows()
+
+
+SOURCES = {
+    'vehicle_movements': vehicle_movement_source,
+    'client_statement': client_statement_source,
+}
+
+
+def request_export(kind, format, params, user=None):
+    """Return a fresh or in-progress job for these filters, or queue a new one."""
+    params = {key: value for key, value in params.items() if value not in (None, '')}
+    params_hash = hash_params(kind, format, params)
+    matching = visible_jobs(user).filter(kind=kind, format=format, params_hash=params_hash)
+    alive = Q(status='pending') | Q(status='running', heartbeat_at__gte=timezone.now() - job_timeout())
+    job = matching.filter(alive).first()
+    if job:
+        return job
+    job = matching.filter(status='done', finished_at__gte=timezone.now() - artifact_ttl()).first()
+    if job and os.path.exists(job.file_path):
+        return job
+    return ExportJob.objects.create(kind=kind, format=format, params=params, params_hash=params_hash, created_by=user)
+
+
+def claim_next_job():
+    """Mark the oldest pending job as running and return it, or None."""
+    for job_id in ExportJob.objects.filter(status='pending').order_by('created_at').values_list('pk', flat=True)[:10]:
+        # Conditional update so two workers never take the same job
+        now = timezone.now()
+        if ExportJob.objects.filter(pk=job_id, status='pending').update(status='running', started_at=now, heartbeat_at=now):
+            return ExportJob.objects.get(pk=job_id)
+    return None
+
+
+def _progress(job_id, **fields):
+    ExportJob.objects.filter(pk=job_id).update(heartbeat_at=timezone.now(), **fields)
+
+
+def fail_lost_jobs(now=None):
+    """Mark running jobs without a heartbeat for ``EXPORT_JOB_TIMEOUT`` as failed. Returns their number."""
+    now = now or timezone.now()
+    return ExportJob.objects.filter(status='running', heartbeat_at__lt=now - job_timeout()).update(
+        status='failed', error='Export worker stopped before the job finished', finished_at=now,
+    )
+
+
+def _counting(job_id, rows):
+    written = 0
+    for row in rows:
+        yield row
+        written += 1
+        if written % PROGRESS_EVERY == 0:
+            _progress(job_id, rows_written=written)
+    _progress(job_id, rows_written=written)
+
+
+def write_csv(headers, rows, path):
+    with open(path, 'w', newline='', encoding='utf-8-sig') as file:
+        writer = csv.writer(file)
+        writer.writerow(headers)
+        writer.writerows(rows)
+
+
+def write_xlsx(headers, rows, path):
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(headers)
+    for row in rows:
+        sheet.append(row)
+    workbook.save(path)
+
+
+WRITERS = {'csv': write_csv, 'xlsx': write_xlsx}
+
+
+def run_job(job):
+    """Generate the job's file. Failures are recorded on the job."""
+    os.makedirs(export_root(), exist_ok=True)
+    path = os.path.join(export_root(), f'{job.kind}-{job.pk}.{job.format}')
+    try:
+        headers, total, rows = SOURCES[job.kind](job.params)
+        _progress(job.pk, total_rows=total)
+        WRITERS[job.format](headers, _counting(job.pk, rows), path)
+    except Exception as e:
+        logger.exception('Export job %s failed', job.pk)
+        if os.path.exists(path):
+            os.remove(path)
+        _progress(job.pk, status='failed', error=str(e), finished_at=timezone.now())
+    else:
+        _progress(job.pk, status='done', file_path=path, finished_at=timezone.now())
+    job.refresh_from_db()
+    return job
+
+
+def remove_expired(now=None):
+    """Delete files of finished jobs past their TTL. Returns the number of jobs removed."""
+    cutoff = (now or timezone.now()) - artifact_ttl()
+    expired = ExportJob.objects.filter(status__in=['done', 'failed'], finished_at__lt=cutoff)
+    count = 0
+    for job in expired:
+        if job.file_path and os.path.exists(job.file_path):
+            os.remove(job.file_path)
+        job.delete()
+        count += 1
+    return count
@@ -0,0 +1,224 @@
+"""Daily fact rollups of sales, purchases, vehicle movements and treasury.
+
+``DailyFact`` holds one row per source, day, client, oil type and driver with
+the counts and sums the reports need, so a month or a year is a few thousand
+fact rows instead of every raw row. Saves and deletes add the difference
+between the old and the new contribution of a row, the same way as the
+statement checkpoints.
+
+Code that writes these models without signals has to keep the facts itself:
+``update()`` goes through ``facts.update()`` and ``bulk_create()`` through
+``apply_new_rows()``. ``rebuild_facts()`` (the ``rebuild_daily_facts``
+command) recomputes any date range from the raw rows.
+"""
+from collections import namedtuple
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import Trunc
+
+from .models import Purchase, Sale, Treasury
+from .models_facts import DailyFact
+from .models_vehicle import VehicleMovement
+
+ZERO = Decimal('0')
+CENT = Decimal('0.01')
+MEASURES = ('count', 'quantity', 'amount', 'driver_freight', 'client_freight', 'paid_in', 'paid_out')
+
+# Column names of the client and driver dimensions on each source model
+Source = namedtuple('Source', 'name client driver fields')
+
+SOURCES = {
+    Sale: Source('sale', 'client_id', 'driver_id', ('quantity', 'amount', 'driver_freight', 'client_freight')),
+    Purchase: Source('purchase', 'supplier_id', 'driver_id', ('quantity', 'amount', 'driver_freight', 'client_freight')),
+    VehicleMovement: Source('freight', 'client_id', 'driver_id', ('quantity', 'driver_freight', 'client_freight')),
+    Treasury: Source('treasury', 'related_client_id', 'related_driver_id', ('quantity', 'paid_amount', 'transaction_type')),
+}
+MODELS = {source.name: model for model, source in SOURCES.items()}
+
+
+def cents(value):
+    # Rounded as the columns store it, so a later delete takes back exactly what was added
+    return Decimal(value or 0).quantize(CENT)
+
+
+def fields_of(model):
+    """The columns a row's facts depend on."""
+    source = SOURCES[model]
+    return ('date', source.client, 'oil_type_id', source.driver) + source.fields
+
+
+def entry_for(model, values):
+    """((source, date, client_id, oil_type_id, driver_id), measures) of one row, or None."""
+    if not values:
+        return None
+    source = SOURCES[model]
+    key = (source.name, values['date'], values[source.client], values['oil_type_id'], values[source.driver])
+    quantity = values['quantity'] or ZERO
+    if model is Treasury:
+        paid = cents(values['paid_amount'])
+        income = values['transaction_type'] == 'income'
+        return key, (1, quantity, ZERO, ZERO, ZERO, paid if income else ZERO, ZERO if income else paid)
+    amount = cents(values['amount']) if model is not VehicleMovement else ZERO
+    return key, (1, quantity, amount, cents(values['driver_freight']), cents(values['client_freight']), ZERO, ZERO)
+
+
+def fact_key(source, date, client_id, oil_type_id, driver_id):
+    return ':'.join(str(value) if value is not None else '' for value in (source, date, client_id, oil_type_id, driver_id))
+
+
+def apply_entry(key, measures):
+    """Add one contribution to the fact row of ``key``."""
+    if not any(measures):
+        return
+    with transaction.atomic():
+        updated = DailyFact.objects.filter(key=fact_key(*key)).update(
+            **{name: F(name) + value for name, value in zip(MEASURES, measures)}
+        )
+        if not updated:
+            source, date, client_id, oil_type_id, driver_id = key
+            try:
+                with transaction.atomic():
+                    DailyFact.objects.create(
+                        key=fact_key(*key), source=source, date=date, client_id=client_id,
+                        oil_type_id=oil_type_id, driver_id=driver_id, **dict(zip(MEASURES, measures)),
+                    )
+            except IntegrityError:
+                # Another writer created the row first
+                return apply_entry(key, measures)
+
+
+def apply_change(model, old_values, new_values):
+    """Replace the contribution of ``old_values`` with the one of ``new_values``."""
+    old = entry_for(model, old_values)
+    new = entry_for(model, new_values)
+    if old == new:
+        return
+    if old and new and old[0] == new[0]:
+        apply_entry(old[0], tuple(n - o for n, o in zip(new[1], old[1])))
+        return
+    if old:
+        apply_entry(old[0], tuple(-value for value in old[1]))
+    if new:
+        apply_entry(*new)
+
+
+def update(queryset, **changes):
+    """``queryset.update(**changes)`` keeping the facts of the updated rows. Returns the number of rows."""
+    model = queryset.model
+    fields = fields_of(model)
+    changed = [name for name in changes if name in fields]
+    if not changed:
+        return queryset.update(**changes)
+    with transaction.atomic():
+        # One read of the old values, only when a fact column changes
+        rows = list(queryset.values(*fields))
+        count = queryset.update(**changes)
+        for values in rows:
+            apply_change(model, values, {**values, **{name: changes[name] for name in changed}})
+    return count
+
+
+def apply_new_rows(model, rows):
+    """Add rows saved without signals (``bulk_create``), one update per fact row."""
+    grouped = {}
+    for values in rows:
+        entry = entry_for(model, values)
+        if entry is None:
+            continue
+        key, measures = entry
+        previous = grouped.get(key, (0,) + (ZERO,) * (len(MEASURES) - 1))
+        grouped[key] = tuple(total + value for total, value in zip(previous, measures))
+    for key in sorted(grouped, key=lambda key: fact_key(*key)):
+        apply_entry(key, grouped[key])
+
+
+def totals_of(model):
+    """SQL sums of a source model's rows, named after the fact columns."""
+    if model is Treasury:
+        return {
+            'fact_quantity': Sum('quantity'),
+            'fact_paid_in': Sum('paid_amount', filter=Q(transaction_type='income')),
+            'fact_paid_out': Sum('paid_amount', filter=Q(transaction_type='expense')),
+        }
+    totals = {
+        'fact_quantity': Sum('quantity'),
+        'fact_driver_freight': Sum('driver_freight'),
+        'fact_client_freight': Sum('client_freight'),
+    }
+    if model is not VehicleMovement:
+        totals['fact_amount'] = Sum('amount')
+    return totals
+
+
+def expected_facts(date_from=None, date_to=None, sources=None):
+    """Fact rows aggregated in SQL from the raw rows of a date range."""
+    for model, source in SOURCES.items():
+        if sources and source.name not in sources:
+            continue
+        queryset = model.objects.all()
+        if date_from:
+            queryset = queryset.filter(date__gte=date_from)
+        if date_to:
+            queryset = queryset.filter(date__lte=date_to)
+        dimensions = ('date', source.client, 'oil_type_id', source.driver)
+        rows = queryset.values(*dimensions).annotate(fact_count=Count('pk'), **totals_of(model)).order_by()
+        for row in rows.iterator():
+            key = (source.name, row['date'], row[source.client], row['oil_type_id'], row[source.driver])
+            yield DailyFact(
+                key=fact_key(*key), source=source.name, date=row['date'], client_id=key[2],
+                oil_type_id=key[3], driver_id=key[4],
+                **{name: row.get(f'fact_{name}') or 0 for name in MEASURES},
+            )
+
+
+def stored_facts(date_from=None, date_to=None, sources=None):
+    facts = DailyFact.objects.all()
+    if date_from:
+        facts = facts.filter(date__gte=date_from)
+    if date_to:
+        facts = facts.filter(date__lte=date_to)
+    if sources:
+        facts = facts.filter(source__in=sources)
+    return facts
+
+
+@transaction.atomic
+def rebuild_facts(date_from=None, date_to=None, sources=None):
+    """Recompute the facts of a date range from the raw rows. Returns the number of fact rows written."""
+    stored_facts(date_from, date_to, sources).delete()
+    facts = list(expected_facts(date_from, date_to, sources))
+    DailyFact.objects.bulk_create(facts, batch_size=1000)
+    return len(facts)
+
+
+def check_facts(date_from=None, date_to=None, sources=None):
+    """Compare the stored facts with the raw rows. Returns a list of (key, problem)."""
+    stored = {row['key']: row for row in stored_facts(date_from, date_to, sources).values('key', *MEASURES)}
+    problems = []
+    for expected in expected_facts(date_from, date_to, sources):
+        row = stored.pop(expected.key, None)
+        if row is None:
+            problems.append((expected.key, 'missing'))
+            continue
+        for name in MEASURES:
+            if row[name] != getattr(expected, name):
+                problems.append((expected.key, f'{name}: stored {row[name]}, expected {getattr(expected, name)}'))
+    for key, row in stored.items():
+        if any(row[name] for name in MEASURES):
+            problems.append((key, 'no matching rows'))
+    return problems
+
+
+def summary(source, date_from=None, date_to=None, by=(), period=None):
+    """Sums of the facts of ``source`` grouped by ``by`` (fact fields) and ``period`` (day, week, month, year)."""
+    facts = stored_facts(date_from, date_to, [source])
+    group = list(by)
+    if period:
+        facts = facts.annotate(period=Trunc('date', period))
+        group.insert(0, 'period')
+    if group:
+        facts = facts.values(*group).order_by(*group)
+    sums = {f'total_{name}': Sum(name) for name in MEASURES}
+    return facts.annotate(**sums) if group else facts.aggregate(**sums)
@@ -0,0 +1,12 @@
+"""Parsing of the filters that lists and reports take from the query string."""
+from django.utils.dateparse import parse_date
+
+
+def parse_date_param(value):
+    """The date in ``value``, or None when it is missing, malformed or impossible (2025-02-30)."""
+    if not value:
+        return None
+    try:
+        return parse_date(value)
+    except ValueError:
+        return None
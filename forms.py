@@ -2,8 +2,9 @@ from django import forms
 from django.core.exceptions import ValidationError
 from django.utils import timezone
 from .models_vehicle import VehicleMovement
-from .models import Sale, Purchase, Client, Driver, OilType
+from .models import Sale, Purchase, Client, Driver, OilType, Treasury
 from .forms_driver import DriverForm
+from .widgets import AutocompleteSelect
 
 class VehicleMovementForm(forms.ModelForm):
     class Meta:
@@ -16,12 +17,12 @@ class VehicleMovementForm(forms.ModelForm):
                 'class': 'form-control',
                 'type': 'date'
             }),
-            'client': forms.Select(attrs={
-                'class': 'form-control select2',
+            'client': AutocompleteSelect('clients', attrs={
+                'class': 'form-control',
                 'data-placeholder': 'اختر العميل'
             }),
-            'oil_type': forms.Select(attrs={
-                'class': 'form-control select2',
+            'oil_type': AutocompleteSelect('oil_types', attrs={
+                'class': 'form-control',
                 'data-placeholder': 'اختر نوع الزيت'
             }),
             'quantity': forms.NumberInput(attrs={
@@ -29,8 +30,8 @@ class VehicleMovementForm(forms.ModelForm):
                 'step': '0.001',
                 'min': '0'
             }),
-            'driver': forms.Select(attrs={
-                'class': 'form-control select2',
+            'driver': AutocompleteSelect('drivers', attrs={
+                'class': 'form-control',
                 'data-placeholder': 'اختر السائق'
             }),
             'vehicle_number': forms.TextInput(attrs={
@@ -115,13 +116,13 @@ class PurchaseForm(forms.ModelForm):
                 'class': 'form-control',
                 'type': 'date'
             }),
-            'supplier': forms.Select(attrs={
-                'class': 'form-control select2',
+            'supplier': AutocompleteSelect('clients', attrs={
+                'class': 'form-control',
                 'data-placeholder': 'اختر المورد',
                 'required': False
             }),
-            'oil_type': forms.Select(attrs={
-                'class': 'form-control select2',
+            'oil_type': AutocompleteSelect('oil_types', attrs={
+                'class': 'form-control',
                 'data-placeholder': 'اختر نوع الزيت'
             }),
             'quantity': forms.NumberInput(attrs={
@@ -140,8 +141,8 @@ class PurchaseForm(forms.ModelForm):
             'unloading_location': forms.TextInput(attrs={
                 'class': 'form-control'
             }),
-            'driver': forms.Select(attrs={
-                'class': 'form-control select2',
+            'driver': AutocompleteSelect('drivers', attrs={
+                'class': 'form-control',
                 'data-placeholder': 'اختر السائق'
             }),
             'vehicle_number': forms.TextInput(attrs={
@@ -181,4 +182,82 @@ class PurchaseForm(forms.ModelForm):
                     'client_freight': 'نولون العميل يجب أن يكون أكبر من أو يساوي نولون السائق'
                 })
         
-        return cleaned_data
\ No newline at end of file
+        return cleaned_data
+
+class SaleForm(forms.ModelForm):
+    class Meta:
+        model = Sale
+        fields = ['date', 'client', 'oil_type', 'quantity', 'price', 'loading_location', 'unloading_location',
+                  'driver', 'description']
+        widgets = {
+            'client': AutocompleteSelect('clients', attrs={
+                'class': 'form-control',
+                'data-placeholder': 'اختر العميل'
+            }),
+            'oil_type': AutocompleteSelect('oil_types', attrs={
+                'class': 'form-control',
+                'data-placeholder': 'اختر نوع الزيت'
+            }),
+            'driver': AutocompleteSelect('drivers', attrs={
+                'class': 'form-control',
+                'data-placeholder': 'اختر السائق'
+            }),
+        }
+
+class TreasuryMovementForm(forms.ModelForm):
+    TRANSACTION_TYPE_CHOICES = [
+        ('income', 'وارد'),
+        ('expense', 'منصرف')
+    ]
+    
+    SOURCE_CHOICES = [
+        ('client', 'العميل'),
+        ('company', 'الشركة'),
+        ('driver', 'السائق')
+    ]
+    
+    transaction_type = forms.ChoiceField(choices=TRANSACTION_TYPE_CHOICES)
+    source = forms.ChoiceField(choices=SOURCE_CHOICES, label='نوع الحساب')
+    description = forms.CharField(widget=forms.Textarea)
+    other_payment_method = forms.CharField(required=False)
+
+    def clean(self):
+        cleaned_data = super().clean()
+        payment_method = cleaned_data.get('payment_method')
+        other_payment = cleaned_data.get('other_payment_method')
+        source = cleaned_data.get('source')
+        record_id = self.data.get('record_id')
+
+        # Validate payment method
+        if payment_method == 'other' and not other_payment:
+            self.add_error('other_payment_method', 'يجب إدخال طريقة الدفع عند اختيار "أخرى"')
+
+        # Validate amount
+        paid_amount = cleaned_data.get('paid_amount')
+        if paid_amount and paid_amount <= 0:
+            self.add_error('paid_amount', 'يجب أن يكون المبلغ المدفوع أكبر من الصفر')
+
+        # Validate record selection
+        if not record_id:
+            self.add_error(None, 'يجب اختيار حساب مرتبط')
+
+        return cleaned_data
+    
+    class Meta:
+        model = Treasury
+        fields = ['movement_id', 'date', 'description', 'transaction_type', 'paid_amount', 'payment_method']
+        widgets = {
+            'description': forms.Textarea(attrs={'rows': 3}),
+            'date': forms.DateInput(attrs={'class': 'datepicker'}),
+        }
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['paid_amount'].label = 'المبلغ المدفوع'
+        self.fields['payment_method'].label = 'طريقة الدفع'
+        self.fields['description'].label = 'ملاحظات'
+        self.fields['date'].label = 'التاريخ'
+
+
+class TreasuryImportForm(forms.Form):
+    file = forms.FileField(label='ملف الحركات', help_text='CSV أو XLSX')
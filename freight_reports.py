@@ -0,0 +1,158 @@
+"""Freight profitability and driver settlement reports.
+
+Both reports are one grouped aggregation each; no movement is loaded as a
+model instance. Internal movements mirror the freight of their sale or
+purchase (see ``sync``), so the freight margin reads ``VehicleMovement``
+alone and nothing is counted twice.
+
+The margin report groups the filtered movements by driver, vehicle, route or
+client. The settlement sums the daily facts instead of the raw rows: freight
+owed to each driver from the ``freight`` facts and the treasury movements
+with ``related_driver`` from the ``treasury`` facts, so a year is the fact
+rows of that year whatever the number of movements.
+
+A route or vehicle grouping over a large table can still give many groups,
+so the views paginate the grouped queryset in the database and take the
+report totals from one separate aggregate over the same filters; no page
+holds more than its own groups.
+"""
+from decimal import Decimal
+
+from django.db.models import Count, DecimalField, F, Q, Sum, Value
+from django.db.models.functions import Coalesce
+
+from . import facts
+from .models_vehicle import VehicleMovement
+from .vehicle_exports import filter_movements
+
+ZERO = Decimal('0')
+CENT = Decimal('0.01')
+
+# The columns each margin report groups by; the _id columns are not shown
+GROUPS = {
+    'driver': ('driver_id', 'driver__name'),
+    'vehicle': ('vehicle_number',),
+    'route': ('loading_location', 'unloading_location'),
+    'client': ('client_id', 'client__name'),
+}
+
+MARGIN_HEADERS = {
+    'driver': ['السائق'],
+    'vehicle': ['رقم السيارة'],
+    'route': ['مكان التحميل', 'مكان التفريغ'],
+    'client': ['العميل'],
+}
+MARGIN_COLUMNS = ['عدد الرحلات', 'الكمية', 'نولون العميل', 'نولون السائق', 'هامش النولون', 'نسبة الهامش']
+
+SETTLEMENT_HEADERS = ['السائق', 'عدد الرحلات', 'النولون المستحق', 'المدفوع للسائق', 'المحصل من السائق', 'الرصيد المستحق']
+
+
+def _sum(field, **kwargs):
+    return Coalesce(Sum(field, **kwargs), Value(ZERO), output_field=DecimalField(max_digits=18, decimal_places=2))
+
+
+def margin_rate(margin, client_freight):
+    if not client_freight:
+        return None
+    return (margin / client_freight * 100).quantize(CENT)
+
+
+def _movements(params):
+    return filter_movements(VehicleMovement.objects.all(), params).order_by()
+
+
+def _freight_sums():
+    return {
+        'trips': Count('pk'),
+        'total_quantity': Sum('quantity'),
+        'total_client_freight': _sum('client_freight'),
+        'total_driver_freight': _sum('driver_freight'),
+    }
+
+
+def margin_rows(params, group='driver'):
+    """Grouped queryset of trips, quantity, freight and margin per ``group`` of the movements matching ``params``.
+
+    ``params`` takes the vehicle movement list filters (type, client, date_from,
+    date_to, search). Rows are ordered by margin, highest first.
+    """
+    if group not in GROUPS:
+        raise ValueError(f'Unknown group: {group}')
+    fields = GROUPS[group]
+    return _movements(params).values(*fields).annotate(**_freight_sums()).annotate(
+        freight_margin=F('total_client_freight') - F('total_driver_freight'),
+    ).order_by('-freight_margin', *fields)
+
+
+def with_margin_rates(rows):
+    for row in rows:
+        row['margin_rate'] = margin_rate(row['freight_margin'], row['total_client_freight'])
+        yield row
+
+
+def freight_margins(params, group='driver'):
+    """The rows of ``margin_rows`` with their ``margin_rate``."""
+    return with_margin_rates(margin_rows(params, group).iterator())
+
+
+def margin_totals(params):
+    """Report totals of the movements matching ``params``, in one aggregate."""
+    totals = _movements(params).aggregate(**_freight_sums())
+    totals['total_quantity'] = totals['total_quantity'] or ZERO
+    totals['freight_margin'] = totals['total_client_freight'] - totals['total_driver_freight']
+    totals['margin_rate'] = margin_rate(totals['freight_margin'], totals['total_client_freight'])
+    return totals
+
+
+def driver_settlements(date_from=None, date_to=None):
+    """Freight owed to each driver against the treasury movements with that driver, from the daily facts.
+
+    ``due`` is what the company still owes the driver for the period: the
+    freight of their trips, less what was paid to them, plus what they paid in.
+    """
+    rows = _driver_facts(date_from, date_to).values('driver_id', 'driver__name').annotate(**_settlement_sums()).annotate(
+        due=F('owed') - F('paid') + F('received'),
+    ).order_by('-due', 'driver__name')
+    return rows
+
+
+def settlement_totals(date_from=None, date_to=None):
+    """Totals of ``driver_settlements`` over all drivers, in one aggregate."""
+    totals = _driver_facts(date_from, date_to).aggregate(**_settlement_sums())
+    totals['due'] = totals['owed'] - totals['paid'] + totals['received']
+    return totals
+
+
+def _driver_facts(date_from, date_to):
+    return facts.stored_facts(date_from, date_to, ['freight', 'treasury']).filter(driver__isnull=False)
+
+
+def _settlement_sums():
+    freight = Q(source='freight')
+    treasury = Q(source='treasury')
+    return {
+        'trips': Coalesce(Sum('count', filter=freight), Value(0)),
+        'owed': _sum('driver_freight', filter=freight),
+        'paid': _sum('paid_out', filter=treasury),
+        'received': _sum('paid_in', filter=treasury),
+    }
+
+
+def money(value):
+    # SQLite returns sums without their scale
+    return Decimal(value or 0).quantize(CENT)
+
+
+def margin_csv_rows(rows, group):
+    for row in rows:
+        names = [row[field] for field in GROUPS[group] if not field.endswith('_id')]
+        yield names + [
+            row['trips'], Decimal(row['total_quantity'] or 0).quantize(Decimal('0.001')),
+            money(row['total_client_freight']), money(row['total_driver_freight']), money(row['freight_margin']),
+            row['margin_rate'] if row['margin_rate'] is not None else '',
+        ]
+
+
+def settlement_csv_rows(rows):
+    for row in rows:
+        yield [row['driver__name'], row['trips']] + [money(row[name]) for name in ('owed', 'paid', 'received', 'due')]
@@ -40,6 +40,35 @@ const utils = {
                 ...options
             });
         }
+    },
+
+    // Select2 whose options come from the element's data-autocomplete-url (see widgets.AutocompleteSelect)
+    initializeAutocomplete(element, options = {}) {
+        const select = $(element);
+        select.select2({
+            theme: 'bootstrap-5',
+            width: '100%',
+            dir: 'rtl',
+            placeholder: select.data('placeholder') || 'اختر...',
+            allowClear: !select.prop('required'),
+            ajax: {
+                url: select.data('autocomplete-url'),
+                dataType: 'json',
+                delay: 250,
+                cache: true,
+                data: params => ({ q: params.term || '' })
+            },
+            ...options
+        });
+    },
+
+    // Select a value that may not be among the loaded options yet
+    setAutocompleteValue(element, value, text) {
+        const select = $(element);
+        if (value && !select.find(`option[value='${value}']`).length) {
+            select.append(new Option(text || value, value, true, true));
+        }
+        select.val(value || null).trigger('change');
     }
 };
 
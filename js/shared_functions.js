@@ -109,6 +109,19 @@ function initializeDataTable(tableId, options = {}) {
     return $(tableId).DataTable({ ...defaultOptions, ...options });
 }
 
+// DataTable whose rows come one page at a time from an /api/tables/<name>/ endpoint
+function initializeServerDataTable(tableId, url, columns, options = {}) {
+    return initializeDataTable(tableId, {
+        serverSide: true,
+        processing: true,
+        searchDelay: 400,
+        ajax: { url: url },
+        columns: columns,
+        order: [],
+        ...options
+    });
+}
+
 // Export utilities
 function exportTableToExcel(tableId, fileName) {
     const table = document.getElementById(tableId);
@@ -224,25 +224,31 @@ class VehicleMovementHandler {
         });
     }
 
+    // One page of sales or purchases from the server-side table endpoint
+    async fetchOperations(type, query = '') {
+        const table = type === 'sale' ? 'sales' : 'purchases';
+        const params = new URLSearchParams({ length: 50, 'search[value]': query });
+        const response = await fetch(`/accounts/api/tables/${table}/?${params}`);
+        if (!response.ok) {
+            console.error(`[ERROR] HTTP error! status: ${response.status}`);
+            throw new Error(`HTTP error! status: ${response.status}`);
+        }
+        const data = await response.json();
+        return data.data.map(op => ({ ...op, client_name: op.client_name ?? op.supplier_name }));
+    }
+
     async loadOperations(type) {
         const loadingSwal = this.showLoading();
         const showOperationsBtn = document.getElementById('showOperationsBtn');
         
         try {
             console.log(`[DEBUG] Loading operations of type: ${type}`);
-            const response = await fetch(`/accounts/api/operations/${type}/list/`);
-            
-            if (!response.ok) {
-                console.error(`[ERROR] HTTP error! status: ${response.status}`);
-                throw new Error(`HTTP error! status: ${response.status}`);
-            }
-            
-            const data = await response.json();
-            console.log(`[DEBUG] Received ${data.operations?.length || 0} operations`);
+            const operations = await this.fetchOperations(type);
+            console.log(`[DEBUG] Received ${operations.length} operations`);
             
             loadingSwal.close();
             
-            if (!data.operations || data.operations.length === 0) {
+            if (operations.length === 0) {
                 Swal.fire({
                     title: 'تنبيه',
                     text: 'لا توجد عمليات متاحة',
@@ -251,7 +257,7 @@ class VehicleMovementHandler {
                 return;
             }
             
-            this.showOperationsModal(data.operations, type);
+            this.showOperationsModal(operations, type);
         } catch (error) {
             console.error('[ERROR] Failed to load operations:', error);
             loadingSwal.close();
@@ -291,12 +297,12 @@ class VehicleMovementHandler {
 
     fillFormFields(data) {
         const fields = {
-            'id_client': { value: data.client, trigger: true },
-            'id_oil_type': { value: data.oil_type, trigger: true },
+            'id_client': { value: data.client, text: data.client_name, trigger: true },
+            'id_oil_type': { value: data.oil_type, text: data.oil_type_name, trigger: true },
             'id_quantity': { value: data.quantity },
             'id_loading_location': { value: data.loading_location },
             'id_unloading_location': { value: data.unloading_location },
-            'id_driver': { value: data.driver, trigger: true },
+            'id_driver': { value: data.driver, text: data.driver_name, trigger: true },
             'id_vehicle_number': { value: data.vehicle_number || '' },
             'id_driver_freight': { value: data.driver_freight || 0 },
             'id_client_freight': { value: data.client_freight || 0 }
@@ -304,7 +310,9 @@ class VehicleMovementHandler {
 
         Object.entries(fields).forEach(([id, config]) => {
             const element = $(`#${id}`);
-            if (element.length) {
+            if (element.is('[data-autocomplete-url]')) {
+                utils.setAutocompleteValue(element, config.value, config.text);
+            } else if (element.length) {
                 element.val(config.value);
                 if (config.trigger) element.trigger('change');
             }
@@ -438,29 +446,30 @@ class VehicleMovementHandler {
             </div>
         `;
         
-        // Setup search functionality
+        // Search on the server; only the first page of matches is shown
         const searchInput = document.getElementById('operationsSearch');
         if (searchInput) {
             searchInput.value = ''; // Clear previous search
-            searchInput.addEventListener('input', function() {
-                const searchValue = this.value.toLowerCase();
-                const rows = document.querySelectorAll('#operationsTable tbody tr');
-                
-                rows.forEach(row => {
-                    const text = row.textContent.toLowerCase();
-                    row.style.display = text.includes(searchValue) ? '' : 'none';
-                });
-            });
+            searchInput.oninput = () => {
+                clearTimeout(this.loadingTimeout);
+                this.loadingTimeout = setTimeout(async () => {
+                    try {
+                        const operations = await this.fetchOperations(operationType, searchInput.value);
+                        modalBody.querySelector('tbody').innerHTML = this.createOperationsTableRows(operations);
+                    } catch (error) {
+                        this.handleError(error, 'خطأ', 'حدث خطأ أثناء تحميل العمليات');
+                    }
+                }, 400);
+            };
         }
         
         // Handle operation selection
-        modalBody.querySelectorAll('.select-operation').forEach(btn => {
-            btn.addEventListener('click', () => {
-                const operationId = btn.dataset.id;
-                this.selectOperation(operationId, operationType);
-                bootstrap.Modal.getInstance(modalElement).hide();
-            });
-        });
+        modalBody.onclick = event => {
+            const btn = event.target.closest('.select-operation');
+            if (!btn) return;
+            this.selectOperation(btn.dataset.id, operationType);
+            bootstrap.Modal.getInstance(modalElement).hide();
+        };
         
         // Show the modal
         const modal = new bootstrap.Modal(modalElement);
@@ -0,0 +1,132 @@
+"""Cached lookups of drivers, clients and oil types by primary key.
+
+The API endpoints that fill in the vehicle movement and sale forms read the
+same few master-data rows over and over. A ``Lookup`` answers from a dict in
+this process first, then from the Django cache, and only then from the
+database. Both levels are keyed by the version of the lookup's ``caching``
+namespace, which the save/delete signals bump. The process keeps that version
+for ``LOOKUP_VERSION_TTL`` seconds, so a hit in the dict reads nothing from
+the cache backend; a bump made here is seen at once. With a shared cache
+backend an edit in another process is seen within ``LOOKUP_VERSION_TTL``;
+with the per-process default, once ``LOOKUP_CACHE_TIMEOUT`` has passed, after
+which the dict is emptied and the cache entries expire.
+
+Only fields that change through ``save()`` are cached: a client's balance is
+updated with ``update()`` (see ``balances``) and is never part of a lookup.
+"""
+import threading
+import time
+from collections import Counter
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ObjectDoesNotExist
+
+from . import caching
+
+MISSING = object()
+
+
+class Lookup:
+    def __init__(self, model, namespace, fields):
+        self.model = model
+        self.namespace = namespace
+        self.fields = list(fields)
+        self._local = {}
+        self._local_version = None
+        self._local_expires = 0
+        self._version_expires = 0
+        self._lock = threading.Lock()
+        self.counts = Counter()
+
+    def local_size(self):
+        return getattr(settings, 'LOOKUP_LOCAL_SIZE', 1000)
+
+    def timeout(self):
+        return getattr(settings, 'LOOKUP_CACHE_TIMEOUT', 300)
+
+    def version_ttl(self):
+        return getattr(settings, 'LOOKUP_VERSION_TTL', 2)
+
+    def fetch(self, pk):
+        try:
+            return apps.get_model(self.model)._default_manager.values(*self.fields).get(pk=pk)
+        except (ObjectDoesNotExist, TypeError, ValueError):
+            return None
+
+    def get(self, pk):
+        """The cached ``fields`` of row ``pk`` as a dict, or None when there is no such row."""
+        if pk in (None, ''):
+            return None
+        version = self.version()
+        with self._lock:
+            row = self._local.get(str(pk), MISSING) if self._local_version == version else MISSING
+        if row is not MISSING:
+            self.count('local')
+            return row
+
+        key = caching.make_key(self.namespace, str(pk), version=version)
+        row = cache.get(key, MISSING)
+        if row is MISSING:
+            self.count('miss')
+            # Missing rows are cached as None too; creating one bumps the version
+            row = self.fetch(pk)
+            cache.set(key, row, self.timeout())
+        else:
+            self.count('shared')
+
+        with self._lock:
+            if self._local_version == version:
+                if len(self._local) >= self.local_size():
+                    self._local = {}
+                self._local[str(pk)] = row
+        return row
+
+    def version(self):
+        """The namespace version, read from the cache at most once every ``version_ttl`` seconds."""
+        now = time.monotonic()
+        with self._lock:
+            if now < self._version_expires and now < self._local_expires:
+                return self._local_version
+        version = caching.get_version(self.namespace)
+        with self._lock:
+            if self._local_version != version or now >= self._local_expires:
+                self._local = {}
+                self._local_version = version
+                self._local_expires = now + self.timeout()
+            self._version_expires = now + self.version_ttl()
+        return version
+
+    def count(self, level):
+        with self._lock:
+            self.counts[level] += 1
+
+    def invalidate(self):
+        caching.bump(self.namespace)
+        with self._lock:
+            self._version_expires = 0
+
+    def stats(self):
+        """Lookups answered by this process's dict, the shared cache and the database."""
+        with self._lock:
+            return {level: self.counts[level] for level in ('local', 'shared', 'miss')}
+
+    def reset(self):
+        with self._lock:
+            self._local = {}
+            self._local_version = None
+            self._local_expires = 0
+            self._version_expires = 0
+            self.counts.clear()
+
+
+DRIVERS = Lookup('accounts.Driver', caching.DRIVER_LOOKUPS, ['id', 'driver_id', 'name', 'vehicle_number', 'license_number'])
+CLIENTS = Lookup('accounts.Client', caching.CLIENT_LOOKUPS, ['id', 'client_id', 'name'])
+OIL_TYPES = Lookup('accounts.OilType', caching.OIL_TYPE_LOOKUPS, ['id', 'name', 'price_per_liter'])
+
+LOOKUPS = {'drivers': DRIVERS, 'clients': CLIENTS, 'oil_types': OIL_TYPES}
+
+
+def stats():
+    return {name: lookup.stats() for name, lookup in LOOKUPS.items()}
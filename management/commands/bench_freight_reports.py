@@ -0,0 +1,133 @@
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.http import QueryDict
+
+from accounts import caching, facts
+from accounts.freight_reports import GROUPS, driver_settlements, freight_margins, margin_csv_rows
+from accounts.models import Client, Driver, OilType, Treasury
+from accounts.models_vehicle import VehicleMovement
+from accounts.vehicle_exports import stream_csv
+
+BENCH_NAME = '__bench_freight_reports__'
+BENCH_PREFIX = 'BENCHF-'
+START = date(2020, 1, 1)
+DAYS = 1500
+DRIVERS = 40
+CLIENTS = 50
+LOCATIONS = 12
+
+
+def timed(function, repeat):
+    """Best wall time of ``repeat`` calls, in milliseconds."""
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        elapsed = (time.perf_counter() - started) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def raw_delete(queryset):
+    # Without signals: the facts of the range are rebuilt afterwards instead of row by row
+    return queryset._raw_delete(queryset.db)
+
+
+class Command(BaseCommand):
+    help = 'Times the freight margin reports and the driver settlement over a large set of vehicle movements'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000000)
+        parser.add_argument('--repeat', type=int, default=3)
+        parser.add_argument('--keep', action='store_true', help='Keep the generated movements for another run')
+
+    def handle(self, *args, **options):
+        try:
+            self.create_rows(options['rows'])
+            self.run(options['repeat'])
+        finally:
+            if not options['keep']:
+                self.clean_up()
+
+    def bench_objects(self):
+        drivers = list(Driver.objects.filter(name__startswith=BENCH_NAME).order_by('pk'))
+        if len(drivers) < DRIVERS:
+            for n in range(len(drivers), DRIVERS):
+                Driver.objects.create(name=f'{BENCH_NAME}{n}', license_number='-', vehicle_number=f'V-{n}')
+            drivers = list(Driver.objects.filter(name__startswith=BENCH_NAME).order_by('pk'))
+        clients = list(Client.objects.filter(name__startswith=BENCH_NAME).order_by('pk'))
+        if len(clients) < CLIENTS:
+            for n in range(len(clients), CLIENTS):
+                Client.objects.create(name=f'{BENCH_NAME}{n}', address='-', phone_number='-')
+            clients = list(Client.objects.filter(name__startswith=BENCH_NAME).order_by('pk'))
+        oil_type = OilType.objects.filter(name=BENCH_NAME).first() or OilType.objects.create(name=BENCH_NAME, properties='-')
+        return drivers, clients, oil_type
+
+    def create_rows(self, rows):
+        existing = VehicleMovement.objects.filter(movement_id__startswith=BENCH_PREFIX).count()
+        if existing >= rows:
+            return
+        drivers, clients, oil_type = self.bench_objects()
+        batch = []
+        for n in range(existing, rows):
+            driver = drivers[n % DRIVERS]
+            batch.append(VehicleMovement(
+                movement_id=f'{BENCH_PREFIX}{n:07d}', movement_type='external', date=START + timedelta(days=n % DAYS),
+                client=clients[n % CLIENTS], oil_type=oil_type, quantity=Decimal('12.500'), driver=driver,
+                vehicle_number=driver.vehicle_number, loading_location=f'L{n % LOCATIONS}',
+                unloading_location=f'U{(n // LOCATIONS) % LOCATIONS}',
+                driver_freight=Decimal(100 + n % 7), client_freight=Decimal(150 + n % 11),
+            ))
+            if len(batch) == 5000:
+                VehicleMovement.objects.bulk_create(batch)
+                batch = []
+        VehicleMovement.objects.bulk_create(batch)
+        # One payment to each driver every other day
+        raw_delete(Treasury.objects.filter(related_driver__in=drivers, description=BENCH_NAME))
+        Treasury.objects.bulk_create([
+            Treasury(date=START + timedelta(days=day), description=BENCH_NAME, transaction_type='expense',
+                     payment_method='cash', movement_source='driver_account', paid_amount=Decimal('500.00'),
+                     related_driver=driver)
+            for day in range(0, DAYS, 2) for driver in drivers
+        ], batch_size=5000)
+        # bulk_create sends no signals
+        started = time.perf_counter()
+        self.rebuild()
+        self.stdout.write(f'facts rebuilt in {(time.perf_counter() - started):.1f}s')
+
+    def rebuild(self):
+        facts.rebuild_facts(START, START + timedelta(days=DAYS), ['freight', 'treasury'])
+        caching.bump(caching.TREASURY_TOTALS)
+        caching.bump(caching.DASHBOARD)
+
+    def run(self, repeat):
+        total = VehicleMovement.objects.filter(movement_id__startswith=BENCH_PREFIX).count()
+        year = QueryDict(mutable=True)
+        year.update({'date_from': '2021-01-01', 'date_to': '2021-12-31'})
+        self.stdout.write(f'movements={total}')
+        for group in GROUPS:
+            for label, params in (('all', QueryDict()), ('year', year)):
+                rows = []
+                elapsed = timed(lambda: rows.extend(freight_margins(params, group)), repeat)
+                self.stdout.write(f'margins {group:<8} {label:<5} groups={len(rows) // repeat:<5} time={elapsed:.0f}ms')
+
+        def export():
+            for line in stream_csv(margin_csv_rows(freight_margins(QueryDict(), 'route'), 'route')):
+                pass
+
+        self.stdout.write(f'csv     route    all   time={timed(export, repeat):.0f}ms')
+        for label, dates in (('all', (None, None)), ('year', (date(2021, 1, 1), date(2021, 12, 31)))):
+            rows = []
+            elapsed = timed(lambda: rows.extend(driver_settlements(*dates)), repeat)
+            self.stdout.write(f'settle  driver   {label:<5} groups={len(rows) // repeat:<5} time={elapsed:.0f}ms')
+
+    def clean_up(self):
+        raw_delete(VehicleMovement.objects.filter(movement_id__startswith=BENCH_PREFIX))
+        raw_delete(Treasury.objects.filter(description=BENCH_NAME, related_driver__name__startswith=BENCH_NAME))
+        self.rebuild()
+        Client.objects.filter(name__startswith=BENCH_NAME).delete()
+        Driver.objects.filter(name__startswith=BENCH_NAME).delete()
+        OilType.objects.filter(name=BENCH_NAME).delete()
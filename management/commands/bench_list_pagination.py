@@ -0,0 +1,91 @@
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+
+from accounts.models import Client, Driver, OilType
+from accounts.models_vehicle import VehicleMovement
+from accounts.pagination import CountedPaginator, KeysetPaginator, approximate_count
+from accounts.views_vehicle import VehicleMovementListView
+
+BENCH_NAME = '__bench_list_pagination__'
+BENCH_PREFIX = 'BENCHL-'
+
+
+def timed(function, repeat):
+    """Best wall time of ``repeat`` calls, in milliseconds."""
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        elapsed = (time.perf_counter() - started) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+class Command(BaseCommand):
+    help = 'Times the vehicle movement list at page 1 and a deep page with OFFSET and with cursor pagination'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=150000)
+        parser.add_argument('--page', type=int, default=5000, help='Deep page number to compare with page 1')
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--keep', action='store_true', help='Keep the generated movements for another run')
+
+    def handle(self, *args, **options):
+        try:
+            self.create_movements(options['rows'])
+            self.run(options['page'], options['repeat'])
+        finally:
+            if not options['keep']:
+                VehicleMovement.objects.filter(movement_id__startswith=BENCH_PREFIX).delete()
+                Client.objects.filter(name=BENCH_NAME).delete()
+                Driver.objects.filter(name=BENCH_NAME).delete()
+                OilType.objects.filter(name=BENCH_NAME).delete()
+
+    def create_movements(self, rows):
+        existing = VehicleMovement.objects.filter(movement_id__startswith=BENCH_PREFIX).count()
+        if existing >= rows:
+            return
+        client = Client.objects.filter(name=BENCH_NAME).first() or Client.objects.create(name=BENCH_NAME, address='-', phone_number='-')
+        driver = Driver.objects.filter(name=BENCH_NAME).first() or Driver.objects.create(name=BENCH_NAME, license_number='-', vehicle_number='-')
+        oil_type = OilType.objects.filter(name=BENCH_NAME).first() or OilType.objects.create(name=BENCH_NAME, properties='-')
+        start = date(2020, 1, 1)
+        batch = []
+        for n in range(existing, rows):
+            batch.append(VehicleMovement(
+                movement_id=f'{BENCH_PREFIX}{n:07d}', movement_type='external', date=start + timedelta(days=n % 1500),
+                client=client, oil_type=oil_type, quantity=Decimal('12.500'), driver=driver, vehicle_number='V-1',
+                loading_location='A', unloading_location='B',
+            ))
+            if len(batch) == 5000:
+                VehicleMovement.objects.bulk_create(batch)
+                batch = []
+        VehicleMovement.objects.bulk_create(batch)
+
+    def run(self, deep_page, repeat):
+        view = VehicleMovementListView
+        queryset = VehicleMovement.objects.select_related('client', 'driver', 'oil_type').order_by(*view.keyset_ordering)
+        per_page = view.paginate_by
+        total = queryset.count()
+        deep_page = min(deep_page, max(1, total // per_page))
+
+        offset = CountedPaginator(queryset, per_page, count=total)
+        keyset = KeysetPaginator(queryset, view.keyset_ordering, per_page)
+        # The cursor a user would hold after reaching the page before the deep one
+        deep_cursor = keyset.encode('next', queryset[(deep_page - 1) * per_page - 1]) if deep_page > 1 else None
+
+        results = [
+            ('offset', 1, timed(lambda: list(offset.page(1).object_list), repeat)),
+            ('offset', deep_page, timed(lambda: list(offset.page(deep_page).object_list), repeat)),
+            ('cursor', 1, timed(lambda: list(keyset.page().object_list), repeat)),
+            ('cursor', deep_page, timed(lambda: list(keyset.page(deep_cursor).object_list), repeat)),
+        ]
+        self.stdout.write(f'rows={total} per_page={per_page}')
+        for mode, page, elapsed in results:
+            self.stdout.write(f'{mode:<7} page={page:<6} time={elapsed:.1f}ms')
+
+        exact = timed(lambda: queryset.count(), repeat)
+        approximate = timed(lambda: approximate_count(queryset, view.approximate_count_limit), repeat)
+        self.stdout.write(f'count   exact={exact:.1f}ms approximate(limit={view.approximate_count_limit})={approximate:.1f}ms')
@@ -0,0 +1,84 @@
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import IntegrityError, OperationalError, connection, transaction
+
+from accounts.models import Client
+from accounts.sequences import allocator
+
+BENCH_NAME = '__bench_sequences__'
+MAX_ATTEMPTS = 50
+
+
+def legacy_client_id():
+    """The pre-sequence allocator: lock and sort the whole table by its string ID."""
+    last_client = Client.objects.select_for_update().order_by('-client_id').first()
+    if last_client:
+        try:
+            new_number = int(last_client.client_id.split('-')[1]) + 1
+        except (IndexError, ValueError):
+            new_number = 1
+    else:
+        new_number = 1
+    return f'CL-{new_number:03d}'
+
+
+class Command(BaseCommand):
+    help = 'Measures client inserts per second with concurrent writers, legacy ID scan vs. sequence allocator'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=8)
+        parser.add_argument('--inserts', type=int, default=200, help='Inserts per writer')
+
+    def handle(self, *args, **options):
+        writers = options['writers']
+        inserts = options['inserts']
+        try:
+            for label, make_id in (('legacy', legacy_client_id), ('sequence', None)):
+                elapsed, total, conflicts = self.run(writers, inserts, make_id)
+                self.stdout.write(
+                    f'{label:<9} writers={writers} inserts={total} '
+                    f'time={elapsed:.2f}s rate={total / elapsed:.0f}/s conflicts={conflicts}'
+                )
+        finally:
+            Client.objects.filter(name=BENCH_NAME).delete()
+
+    def run(self, writers, inserts, make_id):
+        conflicts = [0] * writers
+        barrier = threading.Barrier(writers)
+
+        def insert():
+            client = Client(name=BENCH_NAME, address='-', phone_number='-')
+            if make_id:
+                with transaction.atomic():
+                    client.client_id = make_id()
+                    client.save()
+            else:
+                client.save()
+
+        def writer(index):
+            allocator.reset()
+            barrier.wait()
+            try:
+                for _ in range(inserts):
+                    for _ in range(MAX_ATTEMPTS):
+                        try:
+                            insert()
+                            break
+                        except (IntegrityError, OperationalError):
+                            # Duplicate ID or "database is locked": retry like a user would.
+                            conflicts[index] += 1
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=writer, args=(i,)) for i in range(writers)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        total = Client.objects.filter(name=BENCH_NAME).count()
+        Client.objects.filter(name=BENCH_NAME).delete()
+        return elapsed, total, sum(conflicts)
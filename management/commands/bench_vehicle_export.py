@@ -0,0 +1,132 @@
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.http import QueryDict
+
+from accounts.models import Client, Driver, OilType
+from accounts.models_vehicle import VehicleMovement
+from accounts.vehicle_exports import HEADERS, export_rows, stream_csv, write_xlsx
+
+BENCH_NAME = '__bench_vehicle_export__'
+BENCH_PREFIX = 'BENCH-'
+XLS_MAX_ROWS = 65535
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def legacy_xls(file):
+    """The pre-streaming export: every row as a model instance, the whole workbook in memory."""
+    import xlwt
+
+    workbook = xlwt.Workbook(encoding='utf-8')
+    sheet = workbook.add_sheet('حركات السيارات')
+    for col_num, title in enumerate(HEADERS):
+        sheet.write(0, col_num, title)
+    movements = VehicleMovement.objects.select_related('client', 'driver', 'oil_type').order_by('-date', '-created_at')
+    rows = 0
+    for row_num, movement in enumerate(movements[:XLS_MAX_ROWS], 1):
+        row = [
+            movement.movement_id, movement.date.strftime('%Y-%m-%d'), movement.movement_type,
+            movement.operation_id or '-', movement.client.name, movement.driver.name, movement.vehicle_number,
+            movement.oil_type.name, movement.quantity, movement.loading_location, movement.unloading_location,
+            movement.driver_freight, movement.client_freight,
+        ]
+        for col_num, value in enumerate(row):
+            sheet.write(row_num, col_num, value)
+        rows = row_num
+    workbook.save(file)
+    return rows
+
+
+class Command(BaseCommand):
+    help = 'Exports a large set of vehicle movements as streamed CSV, write-only XLSX and legacy XLS, reporting time and peak RSS'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=500000)
+        parser.add_argument('--skip-legacy', action='store_true', help='Do not run the in-memory xlwt export')
+        parser.add_argument('--keep', action='store_true', help='Keep the generated movements for another run')
+        parser.add_argument('--mode', choices=['csv', 'xlsx', 'legacy'], help='Run one export in this process (used internally)')
+
+    def handle(self, *args, **options):
+        if options['mode']:
+            self.run_export(options['mode'])
+            return
+
+        try:
+            self.create_movements(options['rows'])
+            modes = ['csv', 'xlsx'] + ([] if options['skip_legacy'] else ['legacy'])
+            for mode in modes:
+                # A fresh process per export so each peak RSS is its own
+                result = subprocess.run(
+                    [sys.executable, '-m', 'django', 'bench_vehicle_export', '--mode', mode],
+                    env={**os.environ, 'PYTHONPATH': os.pathsep.join(sys.path)},
+                    capture_output=True, text=True,
+                )
+                if result.returncode:
+                    self.stderr.write(result.stderr)
+                else:
+                    self.stdout.write(result.stdout.strip())
+        finally:
+            if not options['keep']:
+                VehicleMovement.objects.filter(movement_id__startswith=BENCH_PREFIX).delete()
+                Client.objects.filter(name=BENCH_NAME).delete()
+                Driver.objects.filter(name=BENCH_NAME).delete()
+                OilType.objects.filter(name=BENCH_NAME).delete()
+
+    def create_movements(self, rows):
+        existing = VehicleMovement.objects.filter(movement_id__startswith=BENCH_PREFIX).count()
+        if existing >= rows:
+            return
+        client = Client.objects.filter(name=BENCH_NAME).first() or Client.objects.create(name=BENCH_NAME, address='-', phone_number='-')
+        driver = Driver.objects.filter(name=BENCH_NAME).first() or Driver.objects.create(name=BENCH_NAME, license_number='-', vehicle_number='-')
+        oil_type = OilType.objects.filter(name=BENCH_NAME).first() or OilType.objects.create(name=BENCH_NAME, properties='-')
+        start = date(2020, 1, 1)
+        batch = []
+        for n in range(existing, rows):
+            batch.append(VehicleMovement(
+                movement_id=f'{BENCH_PREFIX}{n:07d}', movement_type='external', date=start + timedelta(days=n % 1500),
+                client=client, oil_type=oil_type, quantity=Decimal('12.500'), driver=driver, vehicle_number='V-1',
+                loading_location='A', unloading_location='B', driver_freight=Decimal('100.00'), client_freight=Decimal('150.00'),
+            ))
+            if len(batch) == 5000:
+                VehicleMovement.objects.bulk_create(batch)
+                batch = []
+        VehicleMovement.objects.bulk_create(batch)
+
+    def run_export(self, mode):
+        started = time.perf_counter()
+        with tempfile.TemporaryFile() as file:
+            if mode == 'csv':
+                rows = -1  # header line
+                for line in stream_csv(export_rows(QueryDict())):
+                    file.write(line.encode('utf-8'))
+                    rows += 1
+            elif mode == 'xlsx':
+                counted = [0]
+
+                def counting(rows):
+                    for row in rows:
+                        counted[0] += 1
+                        yield row
+
+                write_xlsx(counting(export_rows(QueryDict())), file)
+                rows = counted[0]
+            else:
+                rows = legacy_xls(file)
+            size = file.tell()
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f'{mode:<7} rows={rows} size={size / (1024 * 1024):.1f}MB '
+            f'time={elapsed:.2f}s peak_rss={peak_rss_mb():.1f}MB'
+        )
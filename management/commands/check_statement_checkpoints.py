@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.checkpoints import check_checkpoints, rebuild_checkpoints
+
+
+class Command(BaseCommand):
+    help = 'Compares the monthly client statement checkpoints with the raw rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--client', type=int, action='append', dest='clients', help='Client pk (repeatable)')
+        parser.add_argument('--fix', action='store_true', help='Rebuild the checkpoints of inconsistent clients')
+
+    def handle(self, *args, **options):
+        problems = check_checkpoints(options['clients'])
+        for client_id, period, problem in problems:
+            self.stdout.write(f'client {client_id} {period:%Y-%m}: {problem}')
+
+        if not problems:
+            self.stdout.write(self.style.SUCCESS('Checkpoints are consistent'))
+            return
+        if options['fix']:
+            clients = sorted({client_id for client_id, _, _ in problems})
+            rebuild_checkpoints(clients)
+            self.stdout.write(self.style.SUCCESS(f'Rebuilt checkpoints of {len(clients)} clients'))
+            return
+        raise CommandError(f'{len(problems)} inconsistent checkpoints')
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.costing import check_costs, rebuild_costs
+from accounts.stock import check_stock, rebuild_stock
+
+
+class Command(BaseCommand):
+    help = 'Compares the oil type stock snapshots, ledger, current quantities and sale costs with purchases and sales'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--oil-type', action='append', dest='oil_types', help='Oil type id (repeatable)')
+        parser.add_argument('--fix', action='store_true', help='Rebuild the stock of inconsistent oil types')
+
+    def handle(self, *args, **options):
+        problems = check_stock(options['oil_types']) + check_costs(options['oil_types'])
+        for oil_type_id, date, problem in problems:
+            self.stdout.write(f'oil type {oil_type_id} {date or "current"}: {problem}')
+
+        if not problems:
+            self.stdout.write(self.style.SUCCESS('Stock is consistent'))
+            return
+        if options['fix']:
+            oil_types = sorted({oil_type_id for oil_type_id, _, _ in problems})
+            rebuild_stock(oil_types)
+            rebuild_costs(oil_types)
+            self.stdout.write(self.style.SUCCESS(f'Rebuilt stock of {len(oil_types)} oil types'))
+            return
+        raise CommandError(f'{len(problems)} stock inconsistencies')
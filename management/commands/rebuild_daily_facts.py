@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from accounts.facts import MODELS, check_facts, rebuild_facts
+
+
+def date_argument(value):
+    date = parse_date(value)
+    if date is None:
+        raise ValueError(value)
+    return date
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the daily sale, purchase, freight and treasury facts of a date range from the raw rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', type=date_argument, dest='date_from', help='First day (YYYY-MM-DD)')
+        parser.add_argument('--to', type=date_argument, dest='date_to', help='Last day (YYYY-MM-DD)')
+        parser.add_argument('--source', action='append', dest='sources', choices=sorted(MODELS),
+                            help='Fact source (repeatable)')
+        parser.add_argument('--check', action='store_true', help='Only report the facts that differ from the raw rows')
+
+    def handle(self, *args, **options):
+        date_from, date_to, sources = options['date_from'], options['date_to'], options['sources']
+        if date_from and date_to and date_from > date_to:
+            raise CommandError('--from is after --to')
+
+        if options['check']:
+            problems = check_facts(date_from, date_to, sources)
+            for key, problem in problems:
+                self.stdout.write(f'{key}: {problem}')
+            if problems:
+                raise CommandError(f'{len(problems)} inconsistent facts')
+            self.stdout.write(self.style.SUCCESS('Facts are consistent'))
+            return
+
+        count = rebuild_facts(date_from, date_to, sources)
+        self.stdout.write(self.style.SUCCESS(f'{count} daily facts rebuilt'))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from accounts import search
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the full-text search index of the list views'
+
+    def handle(self, *args, **options):
+        impl = search.backend(connection)
+        if impl is None:
+            raise CommandError(f'No full-text backend for {connection.vendor}; searches use icontains')
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                impl.create(cursor)
+            counts = search.rebuild()
+        for kind, count in counts.items():
+            self.stdout.write(f'{kind}: {count}')
+        self.stdout.write(self.style.SUCCESS(f'{sum(counts.values())} documents indexed'))
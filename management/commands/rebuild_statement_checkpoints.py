@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from accounts.checkpoints import rebuild_checkpoints
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the monthly client statement checkpoints from sales, purchases and treasury movements'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--client', type=int, action='append', dest='clients', help='Client pk (repeatable)')
+
+    def handle(self, *args, **options):
+        count = rebuild_checkpoints(options['clients'])
+        self.stdout.write(self.style.SUCCESS(f'{count} checkpoints rebuilt'))
@@ -0,0 +1,41 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from accounts.export_jobs import claim_next_job, fail_lost_jobs, remove_expired, run_job
+
+
+class Command(BaseCommand):
+    help = 'Runs queued export jobs and removes expired export files'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Run the pending jobs, then exit')
+        parser.add_argument('--poll-interval', type=float, default=2.0, help='Seconds to wait when the queue is empty')
+
+    def handle(self, *args, **options):
+        while True:
+            # Between jobs a long-running worker drops stale connections; a --once run keeps
+            # the caller's connection and any transaction it has open
+            if not options['once']:
+                close_old_connections()
+            job = claim_next_job()
+            if job is None:
+                lost = fail_lost_jobs()
+                if lost:
+                    self.stderr.write(f'Marked {lost} export(s) without a worker as failed')
+                removed = remove_expired()
+                if removed:
+                    self.stdout.write(f'Removed {removed} expired export(s)')
+                if options['once']:
+                    return
+                time.sleep(options['poll_interval'])
+                continue
+
+            started = time.perf_counter()
+            job = run_job(job)
+            elapsed = time.perf_counter() - started
+            if job.status == 'done':
+                self.stdout.write(f'Export {job.pk} ({job.kind}, {job.format}): {job.rows_written} rows in {elapsed:.1f}s')
+            else:
+                self.stderr.write(f'Export {job.pk} ({job.kind}, {job.format}) failed: {job.error}')
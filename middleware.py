@@ -1,10 +1,7 @@
-from django.utils import timezone
-from django.urls import resolve
 from django.core.cache import cache
 from django.conf import settings
-from django.urls.exceptions import Resolver404
-from django.db import transaction
 from .models_vehicle import VehicleMovement
+from .activity_log import activity_buffer
 
 class ActivityMiddleware:
     def __init__(self, get_response):
@@ -19,23 +16,19 @@ class ActivityMiddleware:
                 # Use caching to reduce database queries
                 cache_key = f'activity_log_{request.user.id}_{request.path}'
                 if not cache.get(cache_key):
-                    from .models import ActivityLog
-                    
-                    try:
-                        url_name = resolve(request.path).url_name or request.path
-                    except Resolver404:
-                        url_name = request.path
+                    # URL resolution already happened for this request
+                    resolver_match = getattr(request, 'resolver_match', None)
+                    url_name = (resolver_match and resolver_match.url_name) or request.path
 
                     # Filter sensitive headers
                     safe_headers = {k: v for k, v in request.headers.items() 
                                   if k.lower() not in ['cookie', 'authorization', 'session']}
                     
-                    # Batch create activity logs
-                    ActivityLog.objects.create(
-                        user=request.user,
+                    # Hand the record to the background writer
+                    activity_buffer.put(
+                        user_id=request.user.id,
                         action=f"Accessed {url_name} via {request.method}",
                         details=str(safe_headers),
-                        timestamp=timezone.now()
                     )
                     
                     # Set cache to prevent duplicate logs
@@ -60,24 +53,9 @@ class VehicleMovementMiddleware:
         """Process view is called just before Django calls the view"""
         # Only process vehicle movement creation views
         if hasattr(view_func, 'view_class') and view_func.view_class.__name__ == 'VehicleMovementCreateView':
-            movement_type = view_kwargs.get('movement_type', 'external')
-            
-            # Get next available ID
-            with transaction.atomic():
-                prefix = 'VEi-' if movement_type == 'internal' else 'VEe-'
-                last_movement = VehicleMovement.objects.select_for_update().filter(
-                    movement_id__startswith=prefix
-                ).order_by('-movement_id').first()
-                
-                if last_movement:
-                    try:
-                        last_number = int(last_movement.movement_id.split('-')[1])
-                        next_number = last_number + 1
-                    except (IndexError, ValueError):
-                        next_number = 1
-                else:
-                    next_number = 1
-                
-                request.next_movement_id = f'{prefix}{next_number:03d}'
+            # Display-only ID for the empty form; the real one is reserved when the movement is saved
+            if request.method == 'GET':
+                movement_type = view_kwargs.get('movement_type', 'external')
+                request.next_movement_id = VehicleMovement.preview_movement_id(movement_type)
         
         return None
\ No newline at end of file
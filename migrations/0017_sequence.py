@@ -0,0 +1,45 @@
+# Generated by Django 5.1.7 on 2025-03-22 10:14
+
+from django.db import migrations, models
+
+
+SEQUENCE_SOURCES = {
+    'DR-': ('Driver', 'driver_id'),
+    'CL-': ('Client', 'client_id'),
+    'OT-': ('OilType', 'id'),
+    'BU-': ('Purchase', 'BU_ID'),
+    'SL-': ('Sale', 'sale_id'),
+    'VEi-': ('VehicleMovement', 'movement_id'),
+    'VEe-': ('VehicleMovement', 'movement_id'),
+}
+
+
+def seed_sequences(apps, schema_editor):
+    Sequence = apps.get_model('accounts', 'Sequence')
+    for prefix, (model_name, field) in SEQUENCE_SOURCES.items():
+        model = apps.get_model('accounts', model_name)
+        last_value = 0
+        for value in model.objects.filter(**{f'{field}__startswith': prefix}).values_list(field, flat=True):
+            try:
+                last_value = max(last_value, int(value[len(prefix):]))
+            except ValueError:
+                continue
+        Sequence.objects.update_or_create(prefix=prefix, defaults={'last_value': last_value})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0016_treasury_related_client'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Sequence',
+            fields=[
+                ('prefix', models.CharField(max_length=10, primary_key=True, serialize=False)),
+                ('last_value', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(seed_sequences, migrations.RunPython.noop),
+    ]
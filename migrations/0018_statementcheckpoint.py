@@ -0,0 +1,73 @@
+# Generated by Django 5.1.7 on 2025-03-24 09:41
+
+from collections import defaultdict
+from decimal import Decimal
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Sum
+from django.db.models.functions import TruncMonth
+
+
+def build_checkpoints(apps, schema_editor):
+    Sale = apps.get_model('accounts', 'Sale')
+    Purchase = apps.get_model('accounts', 'Purchase')
+    Treasury = apps.get_model('accounts', 'Treasury')
+    StatementCheckpoint = apps.get_model('accounts', 'StatementCheckpoint')
+
+    zero = Decimal('0.00')
+    totals = defaultdict(lambda: defaultdict(lambda: [zero, zero, zero, zero]))
+    for row in Sale.objects.annotate(period=TruncMonth('date')).values('client_id', 'period').annotate(total=Sum('amount')):
+        entry = totals[row['client_id']][row['period']]
+        entry[0] += row['total'] or zero
+        entry[3] += row['total'] or zero
+    for row in Purchase.objects.exclude(supplier=None).annotate(period=TruncMonth('date')).values('supplier_id', 'period').annotate(total=Sum('amount')):
+        entry = totals[row['supplier_id']][row['period']]
+        entry[1] += row['total'] or zero
+        entry[3] -= row['total'] or zero
+    for row in Treasury.objects.exclude(related_client=None).annotate(period=TruncMonth('date')).values('related_client_id', 'period', 'transaction_type').annotate(total=Sum('paid_amount')):
+        entry = totals[row['related_client_id']][row['period']]
+        amount = row['total'] or zero
+        entry[2] += amount
+        entry[3] += -amount if row['transaction_type'] == 'expense' else amount
+
+    checkpoints = []
+    for client_id, months in totals.items():
+        balance = zero
+        for period in sorted(months):
+            sales, purchases, treasury, delta = months[period]
+            balance += delta
+            checkpoints.append(StatementCheckpoint(
+                client_id=client_id, period=period, total_sales=sales, total_purchases=purchases,
+                total_treasury=treasury, closing_balance=balance,
+            ))
+    StatementCheckpoint.objects.bulk_create(checkpoints, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0017_sequence'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StatementCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.DateField(verbose_name='الشهر')),
+                ('total_sales', models.DecimalField(decimal_places=2, default=0, max_digits=15, verbose_name='إجمالي المبيعات')),
+                ('total_purchases', models.DecimalField(decimal_places=2, default=0, max_digits=15, verbose_name='إجمالي المشتريات')),
+                ('total_treasury', models.DecimalField(decimal_places=2, default=0, max_digits=15, verbose_name='إجمالي حركات الخزينة')),
+                ('closing_balance', models.DecimalField(decimal_places=2, default=0, max_digits=15, verbose_name='الرصيد الختامي')),
+                ('client', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='statement_checkpoints', to='accounts.client', verbose_name='العميل')),
+            ],
+            options={
+                'verbose_name': 'رصيد شهري للعميل',
+                'verbose_name_plural': 'الأرصدة الشهرية للعملاء',
+                'ordering': ['client', 'period'],
+                'unique_together': {('client', 'period')},
+            },
+        ),
+        migrations.RunPython(build_checkpoints, migrations.RunPython.noop),
+    ]
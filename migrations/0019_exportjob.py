@@ -0,0 +1,39 @@
+# Generated by Django 5.1.7 on 2025-03-24 10:15
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0018_statementcheckpoint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExportJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('vehicle_movements', 'حركات السيارات'), ('client_statement', 'كشف حساب عميل')], max_length=30, verbose_name='نوع التصدير')),
+                ('format', models.CharField(choices=[('csv', 'CSV'), ('xlsx', 'Excel')], max_length=10, verbose_name='الصيغة')),
+                ('params', models.JSONField(blank=True, default=dict, verbose_name='الفلاتر')),
+                ('params_hash', models.CharField(db_index=True, editable=False, max_length=64)),
+                ('status', models.CharField(choices=[('pending', 'في الانتظار'), ('running', 'جاري التنفيذ'), ('done', 'مكتمل'), ('failed', 'فشل')], default='pending', max_length=10, verbose_name='الحالة')),
+                ('total_rows', models.PositiveIntegerField(blank=True, null=True, verbose_name='إجمالي الصفوف')),
+                ('rows_written', models.PositiveIntegerField(default=0, verbose_name='الصفوف المكتوبة')),
+                ('file_path', models.CharField(blank=True, max_length=500)),
+                ('error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='تاريخ الطلب')),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='export_jobs', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'مهمة تصدير',
+                'verbose_name_plural': 'مهام التصدير',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.1.7 on 2025-03-25 09:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def link_operations(apps, schema_editor):
+    """Fill the new foreign keys from the existing operation_type/operation_id pairs."""
+    VehicleMovement = apps.get_model('accounts', 'VehicleMovement')
+    for operation_type, model_name, field in [('sale', 'Sale', 'sale_id'), ('purchase', 'Purchase', 'purchase_id')]:
+        existing = set(apps.get_model('accounts', model_name).objects.values_list('pk', flat=True))
+        movements = VehicleMovement.objects.filter(movement_type='internal', operation_type=operation_type)
+        links = {}
+        for movement_id, operation_id in movements.values_list('movement_id', 'operation_id'):
+            operation_pk = int(operation_id) if operation_id and operation_id.strip().isdigit() else None
+            if operation_pk in existing:
+                links.setdefault(operation_pk, []).append(movement_id)
+        for operation_pk, movement_ids in links.items():
+            VehicleMovement.objects.filter(movement_id__in=movement_ids).update(**{field: operation_pk})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0019_exportjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='vehiclemovement',
+            name='purchase',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='vehicle_movements', to='accounts.purchase', verbose_name='عملية الشراء'),
+        ),
+        migrations.AddField(
+            model_name='vehiclemovement',
+            name='sale',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='vehicle_movements', to='accounts.sale', verbose_name='عملية البيع'),
+        ),
+        migrations.RunPython(link_operations, migrations.RunPython.noop),
+    ]
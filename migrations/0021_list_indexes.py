@@ -0,0 +1,53 @@
+# Generated by Django 5.1.7 on 2025-03-25 15:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0020_vehiclemovement_sale_purchase'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='purchase',
+            index=models.Index(fields=['date'], name='purchase_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='purchase',
+            index=models.Index(fields=['supplier', 'date'], name='purchase_supplier_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sale',
+            index=models.Index(fields=['date'], name='sale_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sale',
+            index=models.Index(fields=['client', 'date'], name='sale_client_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='treasury',
+            index=models.Index(fields=['date'], name='treasury_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='treasury',
+            index=models.Index(fields=['transaction_type', 'date'], name='treasury_type_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='treasury',
+            index=models.Index(fields=['related_client', 'date'], name='treasury_client_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='vehiclemovement',
+            index=models.Index(fields=['date', 'created_at'], name='vm_date_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='vehiclemovement',
+            index=models.Index(fields=['movement_type', 'date', 'created_at'], name='vm_type_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='vehiclemovement',
+            index=models.Index(fields=['client', 'date', 'created_at'], name='vm_client_date_idx'),
+        ),
+    ]
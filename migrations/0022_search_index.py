@@ -0,0 +1,94 @@
+# Generated by Django 5.1.7 on 2025-03-26 11:05
+
+import re
+
+from django.db import migrations
+
+# A copy of accounts.search as of this migration, so later changes to the
+# module cannot change what this migration creates
+TABLE = 'accounts_searchindex'
+KEYS = TABLE + '_keys'
+
+DOCUMENTS = {
+    'sale': ('Sale', ['sale_id', 'client__name', 'oil_type__name', 'driver__name', 'vehicle_number', 'description']),
+    'purchase': ('Purchase', ['BU_ID', 'supplier__name', 'oil_type__name', 'driver__name', 'vehicle_number', 'description']),
+    'treasury': ('Treasury', ['movement_id', 'description', 'related_sale__sale_id', 'related_purchase__BU_ID', 'related_driver__name', 'related_client__name']),
+    'vehicle_movement': ('VehicleMovement', ['movement_id', 'client__name', 'driver__name', 'vehicle_number', 'oil_type__name']),
+    'oil_type': ('OilType', ['id', 'name', 'properties']),
+}
+
+ARABIC_DIACRITICS = re.compile('[\u0610-\u061a\u064b-\u065f\u0670\u06d6-\u06ed\u0640]')
+ARABIC_LETTERS = str.maketrans({
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا',
+    'ى': 'ي', 'ئ': 'ي', 'ؤ': 'و', 'ة': 'ه',
+})
+
+
+def normalize(text):
+    text = ARABIC_DIACRITICS.sub('', str(text))
+    return text.translate(ARABIC_LETTERS).lower()
+
+
+def fts5_available(cursor):
+    cursor.execute('PRAGMA compile_options')
+    return 'ENABLE_FTS5' in {row[0] for row in cursor.fetchall()}
+
+
+def create_index(apps, schema_editor):
+    conn = schema_editor.connection
+    with conn.cursor() as cursor:
+        if conn.vendor == 'sqlite':
+            if not fts5_available(cursor):
+                return
+            cursor.execute(
+                f'CREATE TABLE IF NOT EXISTS {KEYS} ('
+                f'id integer PRIMARY KEY, kind varchar(30) NOT NULL, object_id varchar(50) NOT NULL, UNIQUE (kind, object_id))'
+            )
+            cursor.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE} USING fts5(body, tokenize='unicode61 remove_diacritics 2')")
+        elif conn.vendor == 'postgresql':
+            cursor.execute(
+                f"CREATE TABLE IF NOT EXISTS {TABLE} ("
+                f"kind varchar(30) NOT NULL, object_id varchar(50) NOT NULL, body text NOT NULL, "
+                f"document tsvector GENERATED ALWAYS AS (to_tsvector('simple', body)) STORED, "
+                f"PRIMARY KEY (kind, object_id))"
+            )
+            cursor.execute(f'CREATE INDEX IF NOT EXISTS {TABLE}_document ON {TABLE} USING gin (document)')
+        else:
+            return
+
+        for kind, (model_name, fields) in DOCUMENTS.items():
+            rows = apps.get_model('accounts', model_name)._base_manager.using(conn.alias).values_list('pk', *fields)
+            docs = [
+                (str(row[0]), normalize(' '.join(str(value) for value in row[1:] if value not in (None, ''))))
+                for row in rows.iterator()
+            ]
+            if conn.vendor == 'sqlite':
+                cursor.executemany(f'INSERT INTO {KEYS} (kind, object_id) VALUES (%s, %s)',
+                                   [(kind, object_id) for object_id, _ in docs])
+                cursor.executemany(
+                    f'INSERT INTO {TABLE} (rowid, body) SELECT id, %s FROM {KEYS} WHERE kind = %s AND object_id = %s',
+                    [(body, kind, object_id) for object_id, body in docs],
+                )
+            else:
+                cursor.executemany(f'INSERT INTO {TABLE} (kind, object_id, body) VALUES (%s, %s, %s)',
+                                   [(kind, object_id, body) for object_id, body in docs])
+
+
+def drop_index(apps, schema_editor):
+    conn = schema_editor.connection
+    with conn.cursor() as cursor:
+        if conn.vendor in ('sqlite', 'postgresql'):
+            cursor.execute(f'DROP TABLE IF EXISTS {TABLE}')
+        if conn.vendor == 'sqlite':
+            cursor.execute(f'DROP TABLE IF EXISTS {KEYS}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0021_list_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.1.7 on 2025-03-28 11:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0023_client_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='vehiclemovement',
+            name='vm_date_created_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='vehiclemovement',
+            name='vm_type_date_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='vehiclemovement',
+            name='vm_client_date_idx',
+        ),
+        migrations.AddIndex(
+            model_name='vehiclemovement',
+            index=models.Index(fields=['date', 'created_at', 'movement_id'], name='vm_date_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='vehiclemovement',
+            index=models.Index(fields=['movement_type', 'date', 'created_at', 'movement_id'], name='vm_type_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='vehiclemovement',
+            index=models.Index(fields=['client', 'date', 'created_at', 'movement_id'], name='vm_client_date_idx'),
+        ),
+    ]
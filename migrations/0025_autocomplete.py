@@ -0,0 +1,119 @@
+# Generated by Django 5.1.7 on 2025-03-29 10:20
+
+import re
+
+from django.db import migrations, models
+
+# The search index layout and normalization of accounts.search as of this
+# migration, copied so later changes to the module cannot change it
+TABLE = 'accounts_searchindex'
+KEYS = TABLE + '_keys'
+
+DOCUMENTS = {
+    'client': ('Client', ['client_id', 'name', 'company_name', 'phone_number']),
+    'driver': ('Driver', ['driver_id', 'name', 'vehicle_number', 'phone_number']),
+}
+
+ARABIC_DIACRITICS = re.compile('[\u0610-\u061a\u064b-\u065f\u0670\u06d6-\u06ed\u0640]')
+ARABIC_LETTERS = str.maketrans({
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا',
+    'ى': 'ي', 'ئ': 'ي', 'ؤ': 'و', 'ة': 'ه',
+})
+
+
+def normalize(text):
+    text = ARABIC_DIACRITICS.sub('', str(text))
+    return text.translate(ARABIC_LETTERS).lower()
+
+
+# Autocomplete trigram matching on PostgreSQL
+TRIGRAM_INDEXES = [
+    ('accounts_client_name_trgm', 'Client'),
+    ('accounts_driver_name_trgm', 'Driver'),
+    ('accounts_oiltype_name_trgm', 'OilType'),
+]
+
+
+def index_exists(cursor, conn):
+    return TABLE in conn.introspection.table_names(cursor)
+
+
+def documents(apps, conn, kind):
+    model_name, fields = DOCUMENTS[kind]
+    rows = apps.get_model('accounts', model_name)._base_manager.using(conn.alias).values_list('pk', *fields)
+    for row in rows.iterator():
+        yield str(row[0]), normalize(' '.join(str(value) for value in row[1:] if value not in (None, '')))
+
+
+def delete_documents(cursor, conn, kind, ids):
+    for start in range(0, len(ids), 500):
+        chunk = ids[start:start + 500]
+        if conn.vendor == 'sqlite':
+            keys = f'SELECT id FROM {KEYS} WHERE kind = %s AND object_id IN ({", ".join(["%s"] * len(chunk))})'
+            cursor.execute(f'DELETE FROM {TABLE} WHERE rowid IN ({keys})', [kind, *chunk])
+            cursor.execute(f'DELETE FROM {KEYS} WHERE id IN ({keys})', [kind, *chunk])
+        else:
+            cursor.execute(f'DELETE FROM {TABLE} WHERE kind = %s AND object_id = ANY(%s)', [kind, chunk])
+
+
+def index_documents(apps, schema_editor):
+    conn = schema_editor.connection
+    with conn.cursor() as cursor:
+        if conn.vendor not in ('sqlite', 'postgresql') or not index_exists(cursor, conn):
+            return
+        for kind in DOCUMENTS:
+            docs = list(documents(apps, conn, kind))
+            delete_documents(cursor, conn, kind, [object_id for object_id, _ in docs])
+            if conn.vendor == 'sqlite':
+                cursor.executemany(f'INSERT INTO {KEYS} (kind, object_id) VALUES (%s, %s)',
+                                   [(kind, object_id) for object_id, _ in docs])
+                cursor.executemany(
+                    f'INSERT INTO {TABLE} (rowid, body) SELECT id, %s FROM {KEYS} WHERE kind = %s AND object_id = %s',
+                    [(body, kind, object_id) for object_id, body in docs],
+                )
+            else:
+                cursor.executemany(f'INSERT INTO {TABLE} (kind, object_id, body) VALUES (%s, %s, %s)',
+                                   [(kind, object_id, body) for object_id, body in docs])
+
+
+def remove_documents(apps, schema_editor):
+    conn = schema_editor.connection
+    with conn.cursor() as cursor:
+        if conn.vendor not in ('sqlite', 'postgresql') or not index_exists(cursor, conn):
+            return
+        for kind, (model_name, _) in DOCUMENTS.items():
+            model = apps.get_model('accounts', model_name)
+            ids = [str(pk) for pk in model._base_manager.using(conn.alias).values_list('pk', flat=True)]
+            delete_documents(cursor, conn, kind, ids)
+
+
+def create_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for name, model_name in TRIGRAM_INDEXES:
+        table = apps.get_model('accounts', model_name)._meta.db_table
+        schema_editor.execute(f'CREATE INDEX IF NOT EXISTS {name} ON {table} USING gin (name gin_trgm_ops)')
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, _ in TRIGRAM_INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0024_vehicle_movement_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='driver',
+            index=models.Index(fields=['name'], name='driver_name_idx'),
+        ),
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+        migrations.RunPython(index_documents, remove_documents),
+    ]
@@ -0,0 +1,95 @@
+# Generated by Django 5.1.7 on 2025-03-30 11:15
+
+from collections import defaultdict
+from decimal import Decimal
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def build_stock(apps, schema_editor):
+    OilType = apps.get_model('accounts', 'OilType')
+    Sale = apps.get_model('accounts', 'Sale')
+    Purchase = apps.get_model('accounts', 'Purchase')
+    StockMovement = apps.get_model('accounts', 'StockMovement')
+    StockSnapshot = apps.get_model('accounts', 'StockSnapshot')
+
+    zero = Decimal('0.000')
+    totals = defaultdict(lambda: defaultdict(lambda: [zero, zero]))
+    movements = []
+    for row in Purchase.objects.values('id', 'BU_ID', 'oil_type_id', 'date', 'quantity').iterator():
+        if row['quantity']:
+            totals[row['oil_type_id']][row['date']][0] += row['quantity']
+            movements.append(StockMovement(oil_type_id=row['oil_type_id'], date=row['date'], quantity=row['quantity'],
+                                           source='purchase', purchase_id=row['id'], reference=row['BU_ID'] or ''))
+    for row in Sale.objects.exclude(oil_type=None).values('id', 'sale_id', 'oil_type_id', 'date', 'quantity').iterator():
+        if row['quantity']:
+            totals[row['oil_type_id']][row['date']][1] += row['quantity']
+            movements.append(StockMovement(oil_type_id=row['oil_type_id'], date=row['date'], quantity=-row['quantity'],
+                                           source='sale', sale_id=row['id'], reference=row['sale_id'] or ''))
+    StockMovement.objects.bulk_create(movements, batch_size=1000)
+
+    snapshots = []
+    OilType.objects.update(current_quantity=zero)
+    for oil_type_id, days in totals.items():
+        closing = zero
+        for date in sorted(days):
+            quantity_in, quantity_out = days[date]
+            closing += quantity_in - quantity_out
+            snapshots.append(StockSnapshot(oil_type_id=oil_type_id, date=date, quantity_in=quantity_in,
+                                           quantity_out=quantity_out, closing_quantity=closing))
+        OilType.objects.filter(pk=oil_type_id).update(current_quantity=closing)
+    StockSnapshot.objects.bulk_create(snapshots, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0025_autocomplete'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='oiltype',
+            name='current_quantity',
+            field=models.DecimalField(decimal_places=3, default=0, max_digits=15),
+        ),
+        migrations.CreateModel(
+            name='StockMovement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='التاريخ')),
+                ('quantity', models.DecimalField(decimal_places=3, max_digits=15, verbose_name='الكمية')),
+                ('source', models.CharField(choices=[('purchase', 'شراء'), ('sale', 'بيع'), ('adjustment', 'تسوية')], max_length=10, verbose_name='المصدر')),
+                ('reference', models.CharField(blank=True, default='', max_length=20, verbose_name='المرجع')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='وقت التسجيل')),
+                ('oil_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_movements', to='accounts.oiltype', verbose_name='نوع الزيت')),
+                ('purchase', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='stock_movements', to='accounts.purchase', verbose_name='عملية الشراء')),
+                ('sale', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='stock_movements', to='accounts.sale', verbose_name='عملية البيع')),
+            ],
+            options={
+                'verbose_name': 'حركة مخزون',
+                'verbose_name_plural': 'حركات المخزون',
+                'ordering': ['date', 'id'],
+                'indexes': [models.Index(fields=['oil_type', 'date'], name='stock_movement_oil_date_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='StockSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='اليوم')),
+                ('quantity_in', models.DecimalField(decimal_places=3, default=0, max_digits=15, verbose_name='الوارد')),
+                ('quantity_out', models.DecimalField(decimal_places=3, default=0, max_digits=15, verbose_name='المنصرف')),
+                ('closing_quantity', models.DecimalField(decimal_places=3, default=0, max_digits=15, verbose_name='رصيد آخر اليوم')),
+                ('oil_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_snapshots', to='accounts.oiltype', verbose_name='نوع الزيت')),
+            ],
+            options={
+                'verbose_name': 'رصيد يومي للمخزون',
+                'verbose_name_plural': 'الأرصدة اليومية للمخزون',
+                'ordering': ['oil_type', 'date'],
+                'unique_together': {('oil_type', 'date')},
+            },
+        ),
+        migrations.RunPython(build_stock, migrations.RunPython.noop),
+    ]
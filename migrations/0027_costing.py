@@ -0,0 +1,82 @@
+# Generated by Django 5.1.7 on 2025-03-31 14:05
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import F, OuterRef, Subquery, Sum
+from django.db.models.functions import Round
+
+
+def build_costs(apps, schema_editor):
+    Purchase = apps.get_model('accounts', 'Purchase')
+    Sale = apps.get_model('accounts', 'Sale')
+    StockSnapshot = apps.get_model('accounts', 'StockSnapshot')
+
+    zero = Decimal('0')
+    unit = Decimal('0.0001')
+    values = {
+        (row['oil_type_id'], row['date']): row['value'] or zero
+        for row in Purchase.objects.values('oil_type_id', 'date').annotate(value=Sum('amount'))
+    }
+    snapshots = []
+    oil_type_id = previous = None
+    for snapshot in StockSnapshot.objects.order_by('oil_type_id', 'date').iterator():
+        if snapshot.oil_type_id != oil_type_id:
+            oil_type_id, previous = snapshot.oil_type_id, zero
+        snapshot.value_in = values.get((snapshot.oil_type_id, snapshot.date), zero)
+        opening = snapshot.closing_quantity - snapshot.quantity_in + snapshot.quantity_out
+        if snapshot.quantity_in > 0:
+            if opening <= 0:
+                previous = (snapshot.value_in / snapshot.quantity_in).quantize(unit)
+            else:
+                previous = ((opening * previous + snapshot.value_in) / (opening + snapshot.quantity_in)).quantize(unit)
+        snapshot.average_cost = previous
+        snapshots.append(snapshot)
+    StockSnapshot.objects.bulk_update(snapshots, ['value_in', 'average_cost'], batch_size=1000)
+
+    sales = Sale.objects.exclude(oil_type=None)
+    sales.update(unit_cost=Subquery(StockSnapshot.objects.filter(
+        oil_type_id=OuterRef('oil_type_id'), date=OuterRef('date')
+    ).values('average_cost')[:1]))
+    cost = Round(F('quantity') * F('unit_cost'), 2)
+    sales.update(cost_amount=cost, margin=F('amount') - cost)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0026_stock_ledger'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sale',
+            name='cost_amount',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=15, null=True),
+        ),
+        migrations.AddField(
+            model_name='sale',
+            name='margin',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=15, null=True),
+        ),
+        migrations.AddField(
+            model_name='sale',
+            name='unit_cost',
+            field=models.DecimalField(blank=True, decimal_places=4, editable=False, max_digits=12, null=True),
+        ),
+        migrations.AddField(
+            model_name='stocksnapshot',
+            name='average_cost',
+            field=models.DecimalField(decimal_places=4, default=0, max_digits=12, verbose_name='متوسط التكلفة'),
+        ),
+        migrations.AddField(
+            model_name='stocksnapshot',
+            name='value_in',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=15, verbose_name='قيمة الوارد'),
+        ),
+        migrations.AddIndex(
+            model_name='sale',
+            index=models.Index(fields=['oil_type', 'date'], name='sale_oil_type_date_idx'),
+        ),
+        migrations.RunPython(build_costs, migrations.RunPython.noop),
+    ]
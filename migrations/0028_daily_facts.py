@@ -0,0 +1,79 @@
+# Generated by Django 5.1.7 on 2025-04-01 10:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+
+
+def build_facts(apps, schema_editor):
+    DailyFact = apps.get_model('accounts', 'DailyFact')
+    sources = [
+        ('sale', apps.get_model('accounts', 'Sale'), 'client_id', 'driver_id'),
+        ('purchase', apps.get_model('accounts', 'Purchase'), 'supplier_id', 'driver_id'),
+        ('freight', apps.get_model('accounts', 'VehicleMovement'), 'client_id', 'driver_id'),
+        ('treasury', apps.get_model('accounts', 'Treasury'), 'related_client_id', 'related_driver_id'),
+    ]
+    facts = []
+    for name, model, client, driver in sources:
+        if name == 'treasury':
+            totals = {
+                'fact_quantity': Sum('quantity'),
+                'fact_paid_in': Sum('paid_amount', filter=Q(transaction_type='income')),
+                'fact_paid_out': Sum('paid_amount', filter=Q(transaction_type='expense')),
+            }
+        else:
+            totals = {
+                'fact_quantity': Sum('quantity'),
+                'fact_driver_freight': Sum('driver_freight'),
+                'fact_client_freight': Sum('client_freight'),
+            }
+            if name != 'freight':
+                totals['fact_amount'] = Sum('amount')
+        rows = model.objects.values('date', client, 'oil_type_id', driver).annotate(fact_count=Count('pk'), **totals).order_by()
+        for row in rows.iterator():
+            key = (name, row['date'], row[client], row['oil_type_id'], row[driver])
+            facts.append(DailyFact(
+                key=':'.join(str(value) if value is not None else '' for value in key),
+                source=name, date=row['date'], client_id=row[client], oil_type_id=row['oil_type_id'],
+                driver_id=row[driver], count=row['fact_count'], quantity=row['fact_quantity'] or 0,
+                amount=row.get('fact_amount') or 0, driver_freight=row.get('fact_driver_freight') or 0,
+                client_freight=row.get('fact_client_freight') or 0, paid_in=row.get('fact_paid_in') or 0,
+                paid_out=row.get('fact_paid_out') or 0,
+            ))
+    DailyFact.objects.bulk_create(facts, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0027_costing'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyFact',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=100, unique=True, verbose_name='المفتاح')),
+                ('source', models.CharField(choices=[('sale', 'مبيعات'), ('purchase', 'مشتريات'), ('freight', 'حركات السيارات'), ('treasury', 'الخزينة')], max_length=10, verbose_name='المصدر')),
+                ('date', models.DateField(verbose_name='اليوم')),
+                ('count', models.IntegerField(default=0, verbose_name='عدد العمليات')),
+                ('quantity', models.DecimalField(decimal_places=3, default=0, max_digits=18, verbose_name='الكمية')),
+                ('amount', models.DecimalField(decimal_places=2, default=0, max_digits=18, verbose_name='المبلغ')),
+                ('driver_freight', models.DecimalField(decimal_places=2, default=0, max_digits=18, verbose_name='نولون السائق')),
+                ('client_freight', models.DecimalField(decimal_places=2, default=0, max_digits=18, verbose_name='نولون العميل')),
+                ('paid_in', models.DecimalField(decimal_places=2, default=0, max_digits=18, verbose_name='الوارد')),
+                ('paid_out', models.DecimalField(decimal_places=2, default=0, max_digits=18, verbose_name='المنصرف')),
+                ('client', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='accounts.client', verbose_name='العميل')),
+                ('driver', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='accounts.driver', verbose_name='السائق')),
+                ('oil_type', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='accounts.oiltype', verbose_name='نوع الزيت')),
+            ],
+            options={
+                'verbose_name': 'إجمالي يومي',
+                'verbose_name_plural': 'الإجماليات اليومية',
+                'ordering': ['source', 'date'],
+                'indexes': [models.Index(fields=['source', 'date'], name='daily_fact_source_date_idx')],
+            },
+        ),
+        migrations.RunPython(build_facts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.1.7 on 2025-04-02 09:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0028_daily_facts'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='purchase',
+            name='supplier',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='accounts.client'),
+        ),
+    ]
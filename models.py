@@ -8,6 +8,40 @@ from django.core.exceptions import ValidationError
 from django.core.validators import RegexValidator
 from django.utils import timezone
 
+class LoadedValuesMixin:
+    """Remembers the column values a row was loaded with.
+
+    Signal handlers compare ``_loaded_values`` (None for a new row) with the
+    instance to apply deltas. Before a save or delete the old row is read again
+    under ``select_for_update()``: the values an instance was loaded with are
+    stale once another save of the same row commits, and two concurrent edits
+    would otherwise both be applied against the original values.
+    """
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def current_values(self):
+        return {field.attname: getattr(self, field.attname) for field in self._meta.concrete_fields}
+
+    def remember_loaded_values(self):
+        """Read the stored row into ``_loaded_values``, locked until the transaction ends."""
+        if self._state.adding:
+            self._loaded_values = None
+            return
+        attnames = [field.attname for field in self._meta.concrete_fields]
+        rows = type(self)._base_manager.select_for_update().filter(pk=self.pk)
+        self._loaded_values = rows.values(*attnames).first()
+
+    def save(self, *args, **kwargs):
+        # pre_save locks the old row and post_save applies the deltas in the same transaction
+        with transaction.atomic(savepoint=False):
+            super().save(*args, **kwargs)
+        self._loaded_values = self.current_values()
+
 class CustomUser(AbstractUser):
     ROLE_CHOICES = [
         ('admin', 'Administrator'),
@@ -20,11 +54,20 @@ class CustomUser(AbstractUser):
     def __str__(self):
         return f"{self.username} ({self.get_role_display()})"
 
+class Sequence(models.Model):
+    """Per-prefix counter backing the business IDs (DR-, CL-, OT-, BU-, SL-, VEi-/VEe-)."""
+    prefix = models.CharField(max_length=10, primary_key=True)
+    last_value = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.prefix}{self.last_value}"
+
 class ActivityLog(models.Model):
     user = models.ForeignKey(CustomUser, on_delete=models.CASCADE)
     action = models.CharField(max_length=100)
     details = models.TextField()
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # Set when the record is queued; the buffered writer may save it later
+    timestamp = models.DateTimeField(default=timezone.now)
 
     def __str__(self):
         return f"{self.user.username} - {self.action} at {self.timestamp}"
@@ -42,23 +85,17 @@ class Driver(models.Model):
     vehicle_type = models.CharField(default='', max_length=50, verbose_name='نوع السيارة')
     hire_date = models.DateField(auto_now_add=True, verbose_name='تاريخ التعيين')
     balance = models.DecimalField(max_digits=15, decimal_places=2, default=0, verbose_name='الرصيد')
+
+    class Meta:
+        indexes = [
+            # Autocomplete options are listed by name
+            models.Index(fields=['name'], name='driver_name_idx'),
+        ]
     
-    @transaction.atomic
     def save(self, *args, **kwargs):
         if not self.driver_id:
-            # Get the highest driver_id number with a lock
-            last_driver = Driver.objects.select_for_update().order_by('-driver_id').first()
-            if last_driver:
-                # Extract the number from the last driver_id and increment it
-                try:
-                    last_number = int(last_driver.driver_id.split('-')[1])
-                    new_number = last_number + 1
-                except (IndexError, ValueError):
-                    new_number = 1
-            else:
-                new_number = 1
-            # Format the new driver_id with leading zeros
-            self.driver_id = f'DR-{new_number:03d}'
+            from .sequences import next_id
+            self.driver_id = next_id('DR-')
         super().save(*args, **kwargs)
     
     def __str__(self):
@@ -72,21 +109,12 @@ class OilType(models.Model):
     properties = models.TextField()
     notes = models.TextField(blank=True)
     price_per_liter = models.DecimalField(max_digits=10, decimal_places=2, default=0)
-    current_quantity = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    current_quantity = models.DecimalField(max_digits=15, decimal_places=3, default=0)
 
-    @transaction.atomic
     def save(self, *args, **kwargs):
         if not self.id:
-            last_oil = OilType.objects.select_for_update().order_by('-id').first()
-            if last_oil:
-                try:
-                    last_number = int(last_oil.id.split('-')[1])
-                    new_number = last_number + 1
-                except (IndexError, ValueError):
-                    new_number = 1
-            else:
-                new_number = 1
-            self.id = f'OT-{new_number:03d}'
+            from .sequences import next_id
+            self.id = next_id('OT-')
         super().save(*args, **kwargs)
 
     def __str__(self):
@@ -107,22 +135,17 @@ class Client(models.Model):
     balance = models.DecimalField(decimal_places=2, default=0, max_digits=10)
     created_at = models.DateTimeField(default=timezone.now)
 
-    @transaction.atomic
+    class Meta:
+        indexes = [
+            # Keyset pagination of the client list on (name, id)
+            models.Index(fields=['name'], name='client_name_idx'),
+            models.Index(fields=['created_at'], name='client_created_idx'),
+        ]
+
     def save(self, *args, **kwargs):
         if not self.client_id:
-            # Get the highest client_id number with a lock
-            last_client = Client.objects.select_for_update().order_by('-client_id').first()
-            if last_client:
-                # Extract the number from the last client_id and increment it
-                try:
-                    last_number = int(last_client.client_id.split('-')[1])
-                    new_number = last_number + 1
-                except (IndexError, ValueError):
-                    new_number = 1
-            else:
-                new_number = 1
-            # Format the new client_id with leading zeros
-            self.client_id = f'CL-{new_number:03d}'
+            from .sequences import next_id
+            self.client_id = next_id('CL-')
         super().save(*args, **kwargs)
 
     def __str__(self):
@@ -130,7 +153,9 @@ class Client(models.Model):
 
 
 
-class Sale(models.Model):
+COST_FIELDS = ('unit_cost', 'cost_amount', 'margin')
+
+class Sale(LoadedValuesMixin, models.Model):
     sale_id = models.CharField(max_length=20, unique=True, null=True, blank=True)
     date = models.DateField()
     client = models.ForeignKey(Client, on_delete=models.CASCADE)
@@ -145,6 +170,10 @@ class Sale(models.Model):
     driver_freight = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     client_freight = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     description = models.TextField(blank=True)
+    # Stamped by costing from the weighted-average cost of the oil type on the sale's day
+    unit_cost = models.DecimalField(max_digits=12, decimal_places=4, null=True, blank=True, editable=False)
+    cost_amount = models.DecimalField(max_digits=15, decimal_places=2, null=True, blank=True, editable=False)
+    margin = models.DecimalField(max_digits=15, decimal_places=2, null=True, blank=True, editable=False)
     
     def clean(self):
         if self.driver_freight and self.client_freight:
@@ -157,7 +186,15 @@ class Sale(models.Model):
     def save(self, *args, **kwargs):
         self.clean()
         self.amount = self.quantity * self.price
-        super().save(*args, **kwargs)
+        if not self._state.adding and not args and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            # The cost columns are stamped with update(); an instance loaded before must not write them back
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in COST_FIELDS
+            ]
+        # The internal vehicle movement is updated from post_save in the same transaction
+        with transaction.atomic():
+            super().save(*args, **kwargs)
 
     def __str__(self):
         return f"{self.sale_id} - {self.client.name}"
@@ -166,8 +203,13 @@ class Sale(models.Model):
         ordering = ['-date']
         verbose_name = 'عملية بيع'
         verbose_name_plural = 'عمليات البيع'
+        indexes = [
+            models.Index(fields=['date'], name='sale_date_idx'),
+            models.Index(fields=['client', 'date'], name='sale_client_date_idx'),
+            models.Index(fields=['oil_type', 'date'], name='sale_oil_type_date_idx'),
+        ]
 
-class Treasury(models.Model):
+class Treasury(LoadedValuesMixin, models.Model):
     TRANSACTION_TYPES = [
         ('income', 'وارد'),
         ('expense', 'منصرف')
@@ -201,6 +243,14 @@ class Treasury(models.Model):
     quantity = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     total = models.DecimalField(max_digits=15, decimal_places=2, editable=False, null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # The list is ordered by (-date, -movement_id); the primary key is part of every index
+            models.Index(fields=['date'], name='treasury_date_idx'),
+            models.Index(fields=['transaction_type', 'date'], name='treasury_type_date_idx'),
+            models.Index(fields=['related_client', 'date'], name='treasury_client_date_idx'),
+        ]
     
     def __str__(self):
         if self.related_client:
@@ -210,7 +260,7 @@ class Treasury(models.Model):
         else:
             return f"{self.movement_id}"
 
-class Purchase(models.Model):
+class Purchase(LoadedValuesMixin, models.Model):
     BU_ID = models.CharField(max_length=20, unique=True, editable=False)
     date = models.DateField()
     supplier = models.ForeignKey('Client', on_delete=models.CASCADE, null=True, blank=True)
@@ -234,25 +284,19 @@ class Purchase(models.Model):
                     'client_freight': 'نولون العميل يجب أن يكون أكبر من أو يساوي نولون السائق'
                 })
 
-    @transaction.atomic
     def save(self, *args, **kwargs):
         self.clean()
         creating = not self.pk
         self.amount = self.quantity * self.price
         
         if not self.BU_ID:
-            last_purchase = Purchase.objects.select_for_update().order_by('-BU_ID').first()
-            if last_purchase:
-                try:
-                    last_number = int(last_purchase.BU_ID.split('-')[1])
-                    new_number = last_number + 1
-                except (IndexError, ValueError):
-                    new_number = 1
-            else:
-                new_number = 1
-            self.BU_ID = f'BU-{new_number:03d}'
+            # Reserve the ID before opening the transaction so the allocator
+            # can hand it out from its pre-allocated block.
+            from .sequences import next_id
+            self.BU_ID = next_id('BU-')
             
-        super().save(*args, **kwargs)
+        with transaction.atomic():
+            super().save(*args, **kwargs)
 
     def __str__(self):
         supplier_name = self.supplier.name if self.supplier else 'بدون مورد'
@@ -262,6 +306,10 @@ class Purchase(models.Model):
         ordering = ['-date']
         verbose_name = 'عملية شراء'
         verbose_name_plural = 'عمليات الشراء'
+        indexes = [
+            models.Index(fields=['date'], name='purchase_date_idx'),
+            models.Index(fields=['supplier', 'date'], name='purchase_supplier_date_idx'),
+        ]
 
 class CompanyAccount(models.Model):
     balance = models.DecimalField(max_digits=15, decimal_places=2, default=0)
@@ -0,0 +1,58 @@
+import os
+
+from django.db import models
+
+
+class ExportJob(models.Model):
+    """An export generated by the background worker and kept on disk for download."""
+    KINDS = [
+        ('vehicle_movements', 'حركات السيارات'),
+        ('client_statement', 'كشف حساب عميل'),
+    ]
+    FORMATS = [
+        ('csv', 'CSV'),
+        ('xlsx', 'Excel'),
+    ]
+    STATUSES = [
+        ('pending', 'في الانتظار'),
+        ('running', 'جاري التنفيذ'),
+        ('done', 'مكتمل'),
+        ('failed', 'فشل'),
+    ]
+
+    kind = models.CharField('نوع التصدير', max_length=30, choices=KINDS)
+    format = models.CharField('الصيغة', max_length=10, choices=FORMATS)
+    params = models.JSONField('الفلاتر', default=dict, blank=True)
+    params_hash = models.CharField(max_length=64, db_index=True, editable=False)
+    status = models.CharField('الحالة', max_length=10, choices=STATUSES, default='pending')
+    total_rows = models.PositiveIntegerField('إجمالي الصفوف', null=True, blank=True)
+    rows_written = models.PositiveIntegerField('الصفوف المكتوبة', default=0)
+    file_path = models.CharField(max_length=500, blank=True)
+    error = models.TextField(blank=True)
+    created_by = models.ForeignKey('CustomUser', on_delete=models.SET_NULL, null=True, blank=True, related_name='export_jobs')
+    created_at = models.DateTimeField('تاريخ الطلب', auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    # Set by the worker with every progress update; a running job without one for a while lost its worker
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = 'مهمة تصدير'
+        verbose_name_plural = 'مهام التصدير'
+
+    def __str__(self):
+        return f"{self.get_kind_display()} ({self.format}) - {self.get_status_display()}"
+
+    @property
+    def progress(self):
+        """Percentage of rows written, when the total is known."""
+        if self.status == 'done':
+            return 100
+        if not self.total_rows:
+            return 0
+        return min(100, self.rows_written * 100 // self.total_rows)
+
+    @property
+    def filename(self):
+        return os.path.basename(self.file_path) if self.file_path else ''
@@ -0,0 +1,41 @@
+from django.db import models
+
+
+class DailyFact(models.Model):
+    """Counts and sums of one source's rows per day, client, oil type and driver."""
+    SOURCES = [
+        ('sale', 'مبيعات'),
+        ('purchase', 'مشتريات'),
+        ('freight', 'حركات السيارات'),
+        ('treasury', 'الخزينة'),
+    ]
+
+    # source:date:client:oil_type:driver, unique even when a dimension is empty
+    key = models.CharField('المفتاح', max_length=100, unique=True)
+    source = models.CharField('المصدر', max_length=10, choices=SOURCES)
+    date = models.DateField('اليوم')
+    # No constraints: a fact keeps the ids of deleted rows until the next rebuild
+    client = models.ForeignKey('Client', on_delete=models.DO_NOTHING, db_constraint=False, null=True, blank=True,
+                               related_name='+', verbose_name='العميل')
+    oil_type = models.ForeignKey('OilType', on_delete=models.DO_NOTHING, db_constraint=False, null=True, blank=True,
+                                 related_name='+', verbose_name='نوع الزيت')
+    driver = models.ForeignKey('Driver', on_delete=models.DO_NOTHING, db_constraint=False, null=True, blank=True,
+                               related_name='+', verbose_name='السائق')
+    count = models.IntegerField('عدد العمليات', default=0)
+    quantity = models.DecimalField('الكمية', max_digits=18, decimal_places=3, default=0)
+    amount = models.DecimalField('المبلغ', max_digits=18, decimal_places=2, default=0)
+    driver_freight = models.DecimalField('نولون السائق', max_digits=18, decimal_places=2, default=0)
+    client_freight = models.DecimalField('نولون العميل', max_digits=18, decimal_places=2, default=0)
+    paid_in = models.DecimalField('الوارد', max_digits=18, decimal_places=2, default=0)
+    paid_out = models.DecimalField('المنصرف', max_digits=18, decimal_places=2, default=0)
+
+    class Meta:
+        ordering = ['source', 'date']
+        verbose_name = 'إجمالي يومي'
+        verbose_name_plural = 'الإجماليات اليومية'
+        indexes = [
+            models.Index(fields=['source', 'date'], name='daily_fact_source_date_idx'),
+        ]
+
+    def __str__(self):
+        return self.key
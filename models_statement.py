@@ -0,0 +1,20 @@
+from django.db import models
+
+
+class StatementCheckpoint(models.Model):
+    """Per-client monthly totals and the cumulative balance at the end of the month."""
+    client = models.ForeignKey('Client', on_delete=models.CASCADE, related_name='statement_checkpoints', verbose_name='العميل')
+    period = models.DateField('الشهر')  # first day of the month
+    total_sales = models.DecimalField('إجمالي المبيعات', max_digits=15, decimal_places=2, default=0)
+    total_purchases = models.DecimalField('إجمالي المشتريات', max_digits=15, decimal_places=2, default=0)
+    total_treasury = models.DecimalField('إجمالي حركات الخزينة', max_digits=15, decimal_places=2, default=0)
+    closing_balance = models.DecimalField('الرصيد الختامي', max_digits=15, decimal_places=2, default=0)
+
+    class Meta:
+        ordering = ['client', 'period']
+        unique_together = [('client', 'period')]
+        verbose_name = 'رصيد شهري للعميل'
+        verbose_name_plural = 'الأرصدة الشهرية للعملاء'
+
+    def __str__(self):
+        return f"{self.client_id} - {self.period:%Y-%m}: {self.closing_balance}"
@@ -0,0 +1,52 @@
+from django.db import models
+
+
+class StockMovement(models.Model):
+    """One signed change of an oil type's stock: positive for purchases, negative for sales."""
+    SOURCES = [
+        ('purchase', 'شراء'),
+        ('sale', 'بيع'),
+        ('adjustment', 'تسوية'),
+    ]
+
+    oil_type = models.ForeignKey('OilType', on_delete=models.CASCADE, related_name='stock_movements', verbose_name='نوع الزيت')
+    date = models.DateField('التاريخ')
+    quantity = models.DecimalField('الكمية', max_digits=15, decimal_places=3)
+    source = models.CharField('المصدر', max_length=10, choices=SOURCES)
+    # Kept when the operation is deleted: its reversal has no operation but the same reference
+    sale = models.ForeignKey('Sale', on_delete=models.SET_NULL, null=True, blank=True, related_name='stock_movements', verbose_name='عملية البيع')
+    purchase = models.ForeignKey('Purchase', on_delete=models.SET_NULL, null=True, blank=True, related_name='stock_movements', verbose_name='عملية الشراء')
+    reference = models.CharField('المرجع', max_length=20, blank=True, default='')
+    created_at = models.DateTimeField('وقت التسجيل', auto_now_add=True)
+
+    class Meta:
+        ordering = ['date', 'id']
+        verbose_name = 'حركة مخزون'
+        verbose_name_plural = 'حركات المخزون'
+        indexes = [
+            models.Index(fields=['oil_type', 'date'], name='stock_movement_oil_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.oil_type_id} {self.date}: {self.quantity:+}"
+
+
+class StockSnapshot(models.Model):
+    """Per-oil-type daily quantities in and out and the stock at the end of the day."""
+    oil_type = models.ForeignKey('OilType', on_delete=models.CASCADE, related_name='stock_snapshots', verbose_name='نوع الزيت')
+    date = models.DateField('اليوم')
+    quantity_in = models.DecimalField('الوارد', max_digits=15, decimal_places=3, default=0)
+    quantity_out = models.DecimalField('المنصرف', max_digits=15, decimal_places=3, default=0)
+    closing_quantity = models.DecimalField('رصيد آخر اليوم', max_digits=15, decimal_places=3, default=0)
+    value_in = models.DecimalField('قيمة الوارد', max_digits=15, decimal_places=2, default=0)
+    # Weighted-average cost after the day's purchases, maintained by costing
+    average_cost = models.DecimalField('متوسط التكلفة', max_digits=12, decimal_places=4, default=0)
+
+    class Meta:
+        ordering = ['oil_type', 'date']
+        unique_together = [('oil_type', 'date')]
+        verbose_name = 'رصيد يومي للمخزون'
+        verbose_name_plural = 'الأرصدة اليومية للمخزون'
+
+    def __str__(self):
+        return f"{self.oil_type_id} {self.date}: {self.closing_quantity}"
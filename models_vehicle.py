@@ -2,7 +2,9 @@ from django.db import models
 from django.utils import timezone
 from django.db import transaction
 
-class VehicleMovement(models.Model):
+from .models import LoadedValuesMixin, Purchase, Sale
+
+class VehicleMovement(LoadedValuesMixin, models.Model):
     MOVEMENT_TYPES = [
         ('internal', 'داخلية'),
         ('external', 'خارجية'),
@@ -17,6 +19,8 @@ class VehicleMovement(models.Model):
     movement_type = models.CharField('نوع الحركة', max_length=10, choices=MOVEMENT_TYPES, default='external')
     operation_type = models.CharField('نوع العملية', max_length=10, choices=OPERATION_TYPES, null=True, blank=True)
     operation_id = models.CharField('رقم العملية', max_length=20, null=True, blank=True)
+    sale = models.ForeignKey('Sale', on_delete=models.SET_NULL, null=True, blank=True, related_name='vehicle_movements', verbose_name='عملية البيع')
+    purchase = models.ForeignKey('Purchase', on_delete=models.SET_NULL, null=True, blank=True, related_name='vehicle_movements', verbose_name='عملية الشراء')
     date = models.DateField()
     client = models.ForeignKey('Client', on_delete=models.CASCADE, verbose_name='العميل')
     oil_type = models.ForeignKey('OilType', on_delete=models.CASCADE, verbose_name='نوع الزيت')
@@ -35,14 +39,66 @@ class VehicleMovement(models.Model):
         ordering = ['-date', '-created_at']
         verbose_name = 'حركة سيارة'
         verbose_name_plural = 'حركات السيارات'
+        indexes = [
+            models.Index(fields=['date', 'created_at', 'movement_id'], name='vm_date_created_idx'),
+            models.Index(fields=['movement_type', 'date', 'created_at', 'movement_id'], name='vm_type_date_idx'),
+            models.Index(fields=['client', 'date', 'created_at', 'movement_id'], name='vm_client_date_idx'),
+        ]
         
     def __str__(self):
         return f"{self.movement_id} - {self.client.name}"
 
+    @staticmethod
+    def id_prefix(movement_type):
+        return 'VEi-' if movement_type == 'internal' else 'VEe-'
+
+    @classmethod
+    def preview_movement_id(cls, movement_type):
+        """رقم الحركة المتوقع للعرض فقط، بدون حجز وبدون أي قفل"""
+        from .sequences import peek_id
+        return peek_id(cls.id_prefix(movement_type))
+
+    def reserve_movement_id(self):
+        """حجز رقم الحركة الفعلي، يتم مرة واحدة عند الحفظ"""
+        if not self.movement_id:
+            from .sequences import next_id
+            self.movement_id = next_id(self.id_prefix(self.movement_type))
+        return self.movement_id
+
+    @property
+    def operation(self):
+        """عملية البيع/الشراء المرتبطة بالحركة الداخلية"""
+        if self.movement_type != 'internal':
+            return None
+        return self.sale if self.operation_type == 'sale' else self.purchase if self.operation_type == 'purchase' else None
+
+    def link_operation(self):
+        """ربط الحركة بعملية البيع/الشراء من نوع ورقم العملية"""
+        operation_pk = None
+        if self.movement_type == 'internal' and self.operation_id:
+            try:
+                operation_pk = int(self.operation_id)
+            except (TypeError, ValueError):
+                pass
+        sale_id = operation_pk if self.operation_type == 'sale' else None
+        purchase_id = operation_pk if self.operation_type == 'purchase' else None
+        if (sale_id, purchase_id) == (self.sale_id, self.purchase_id):
+            return
+        # العملية قد تكون محذوفة، ولا يتم الاستعلام إلا عند تغيير الربط
+        if sale_id is not None and not Sale.objects.filter(pk=sale_id).exists():
+            sale_id = None
+        if purchase_id is not None and not Purchase.objects.filter(pk=purchase_id).exists():
+            purchase_id = None
+        self.sale_id, self.purchase_id = sale_id, purchase_id
+
     def save(self, *args, **kwargs):
         # التأكد من صحة النولون
         if self.driver_freight and self.client_freight:
             if self.driver_freight > self.client_freight:
                 raise ValueError("نولون السائق لا يمكن أن يتجاوز نولون العميل")
         
-        super().save(*args, **kwargs)
\ No newline at end of file
+        self.reserve_movement_id()
+        self.link_operation()
+        # The linked sale/purchase is updated from post_save in the same transaction
+        with transaction.atomic():
+            super().save(*args, **kwargs)
\ No newline at end of file
@@ -0,0 +1,210 @@
+import base64
+import json
+from types import SimpleNamespace
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db import connection
+from django.db.models import Q
+from django.http import Http404
+
+
+class CountedPaginator(Paginator):
+    """Paginator that takes an already known row count instead of running COUNT(*)."""
+
+    def __init__(self, object_list, per_page, count=None, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        if count is not None:
+            self.count = count
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+class KeysetPage:
+    """One page of a ``KeysetPaginator``, with the cursors of its neighbours."""
+
+    def __init__(self, object_list, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class KeysetPaginator:
+    """Pages through a queryset by the values of its last row instead of OFFSET.
+
+    ``ordering`` is a list like ``['-date', '-pk']`` whose last field must be
+    unique. A cursor is an opaque token holding the ordering values of the row
+    the page starts after (or before, going back), so every page is one
+    indexed range query however deep it is.
+    """
+
+    def __init__(self, queryset, ordering, per_page):
+        self.queryset = queryset
+        self.ordering = list(ordering)
+        self.per_page = per_page
+        self.fields = [(name.lstrip('-'), name.startswith('-')) for name in self.ordering]
+
+    def _model_field(self, name):
+        meta = self.queryset.model._meta
+        return meta.pk if name == 'pk' else meta.get_field(name)
+
+    def _value(self, name, row):
+        field = self._model_field(name)
+        if isinstance(row, dict):
+            # A values() row keyed by the ordering names
+            row = SimpleNamespace(**{field.attname: row[name]})
+        return field.value_to_string(row)
+
+    def encode(self, direction, row):
+        values = [self._value(name, row) for name, _ in self.fields]
+        payload = json.dumps([direction, values], separators=(',', ':')).encode('utf-8')
+        return base64.urlsafe_b64encode(payload).decode('ascii').rstrip('=')
+
+    def decode(self, cursor):
+        try:
+            direction, values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+            if direction not in ('next', 'prev') or len(values) != len(self.fields):
+                raise ValueError(cursor)
+            return direction, [self._model_field(name).to_python(value) for (name, _), value in zip(self.fields, values)]
+        except (TypeError, ValueError, ValidationError) as e:
+            raise InvalidCursor(cursor) from e
+
+    def _after(self, values, backwards):
+        """Rows past ``values`` in the ordering (before them when ``backwards``)."""
+        condition = Q()
+        equal = Q()
+        for (name, descending), value in zip(self.fields, values):
+            lookup = 'lt' if descending != backwards else 'gt'
+            condition |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+        # Redundant bound on the leading column so the database can seek the index
+        (name, descending), value = self.fields[0], values[0]
+        return Q(**{f'{name}__{"lte" if descending != backwards else "gte"}': value}) & condition
+
+    def following(self, cursor=None):
+        """The ordered rows after a 'next' cursor, for callers that read the page themselves."""
+        direction, values = self.decode(cursor) if cursor else ('next', None)
+        if direction != 'next':
+            raise InvalidCursor(cursor)
+        queryset = self.queryset if values is None else self.queryset.filter(self._after(values, False))
+        return queryset.order_by(*self.ordering)
+
+    def page(self, cursor=None):
+        direction, values = self.decode(cursor) if cursor else ('next', None)
+        backwards = direction == 'prev'
+        queryset = self.queryset
+        if values is not None:
+            queryset = queryset.filter(self._after(values, backwards))
+        ordering = self.ordering
+        if backwards:
+            ordering = [name[1:] if name.startswith('-') else f'-{name}' for name in ordering]
+        rows = list(queryset.order_by(*ordering)[:self.per_page + 1])
+        more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if backwards:
+            rows.reverse()
+        if not rows:
+            return KeysetPage(rows, None, None)
+        # Coming from a cursor means there is a page on that side
+        has_next = more if not backwards else True
+        has_previous = (values is not None) if not backwards else more
+        return KeysetPage(
+            rows,
+            self.encode('next', rows[-1]) if has_next else None,
+            self.encode('prev', rows[0]) if has_previous else None,
+        )
+
+
+def approximate_count(queryset, limit):
+    """``(count, is_estimate)`` without counting more than ``limit`` rows.
+
+    PostgreSQL answers for a whole table from the planner statistics; otherwise
+    the count stops at ``limit`` and is reported as "at least".
+    """
+    if connection.vendor == 'postgresql' and not queryset.query.where:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT reltuples FROM pg_class WHERE relname = %s', [queryset.model._meta.db_table])
+            row = cursor.fetchone()
+        if row and row[0] > limit:
+            return int(row[0]), True
+    count = queryset.order_by()[:limit + 1].count()
+    return min(count, limit), count > limit
+
+
+class KeysetPaginationMixin:
+    """``ListView`` pagination by cursor instead of page number.
+
+    ``keyset_ordering`` is the view's ordering ending with a unique field.
+    ``count_mode`` is ``'exact'``, ``'approximate'`` (stops counting at
+    ``approximate_count_limit`` rows) or None for no count. When
+    ``use_keyset()`` is false (e.g. search results ordered by rank) the view
+    falls back to numbered pages.
+    """
+    keyset_ordering = ['-pk']
+    count_mode = 'approximate'
+    approximate_count_limit = 10000
+    cursor_param = 'cursor'
+    search_param = 'search'
+    paginator_class = CountedPaginator
+
+    def use_keyset(self):
+        return not self.request.GET.get(self.search_param, '').strip()
+
+    def get_ordering(self):
+        return self.keyset_ordering
+
+    def get_total_count(self, queryset):
+        """``(count, is_estimate)``; count is None when not counted."""
+        if self.count_mode == 'exact':
+            return queryset.count(), False
+        if self.count_mode == 'approximate':
+            return approximate_count(queryset, self.approximate_count_limit)
+        return None, False
+
+    def get_paginator(self, queryset, per_page, orphans=0, allow_empty_first_page=True, **kwargs):
+        count = self.total_count if self.total_count is not None and not self.count_is_estimate else None
+        return self.paginator_class(
+            queryset, per_page, count=count, orphans=orphans, allow_empty_first_page=allow_empty_first_page, **kwargs
+        )
+
+    def paginate_queryset(self, queryset, page_size):
+        self.total_count, self.count_is_estimate = self.get_total_count(queryset)
+        if not self.use_keyset():
+            paginator, page, object_list, is_paginated = super().paginate_queryset(queryset, page_size)
+            if self.count_is_estimate:
+                self.total_count, self.count_is_estimate = paginator.count, False
+            return paginator, page, object_list, is_paginated
+        paginator = KeysetPaginator(queryset, self.keyset_ordering, page_size)
+        try:
+            page = paginator.page(self.request.GET.get(self.cursor_param))
+        except InvalidCursor:
+            raise Http404('Invalid cursor')
+        return paginator, page, page.object_list, page.has_other_pages()
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['cursor_pagination'] = self.use_keyset()
+        context['total_count'] = self.total_count
+        context['count_is_estimate'] = self.count_is_estimate
+        query = self.request.GET.copy()
+        query.pop(self.cursor_param, None)
+        query.pop('page', None)
+        context['page_query'] = query.urlencode()
+        return context
@@ -0,0 +1,116 @@
+"""JSON projections for the list APIs.
+
+A ``Projection`` maps the keys of a JSON row to ``values()`` paths, so a list
+endpoint reads only the columns it returns, related names included, in one
+query whatever the number of rows. ``?fields=a,b`` asks for a subset of the
+keys; ``?limit=`` and the ``next`` cursor of the previous page (passed back
+as ``?cursor=``) page through the rows in the projection's ordering (see
+``pagination.KeysetPaginator``).
+
+The response is streamed row by row as ``{"<key>": [...], "next": cursor}``,
+with ``next`` null on the last page.
+"""
+from decimal import Decimal
+
+from django.apps import apps
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import JsonResponse, StreamingHttpResponse
+
+from .pagination import InvalidCursor, KeysetPaginator
+
+
+class ProjectionError(ValueError):
+    pass
+
+
+class JSONEncoder(DjangoJSONEncoder):
+    """Amounts as JSON numbers, as these endpoints have always returned them."""
+
+    def default(self, o):
+        if isinstance(o, Decimal):
+            return float(o)
+        return super().default(o)
+
+
+def page_size(params):
+    default = getattr(settings, 'API_PAGE_SIZE', 100)
+    maximum = getattr(settings, 'API_MAX_PAGE_SIZE', 500)
+    try:
+        limit = int(params.get('limit') or default)
+    except ValueError:
+        raise ProjectionError('limit must be a number')
+    return min(max(limit, 1), maximum)
+
+
+class Projection:
+    def __init__(self, model, fields, ordering):
+        self.model = model
+        self.fields = dict(fields)
+        # Model fields, the last one unique
+        self.ordering = list(ordering)
+
+    def get_queryset(self):
+        return apps.get_model(self.model)._default_manager.all()
+
+    def requested(self, params):
+        """The keys named by ``?fields=``; every key when none is given."""
+        names = [name.strip() for name in params.get('fields', '').split(',') if name.strip()]
+        unknown = [name for name in names if name not in self.fields]
+        if unknown:
+            raise ProjectionError(f'Unknown fields: {", ".join(unknown)}')
+        return names or list(self.fields)
+
+    def values(self, queryset, names):
+        # The ordering fields are read too, for the next cursor
+        paths = [self.fields[name] for name in names] + [name.lstrip('-') for name in self.ordering]
+        return queryset.values(*dict.fromkeys(paths))
+
+    def project(self, row, names):
+        return {name: row[self.fields[name]] for name in names}
+
+    def response(self, params, key):
+        try:
+            names = self.requested(params)
+            paginator = KeysetPaginator(self.get_queryset(), self.ordering, page_size(params))
+            queryset = paginator.following(params.get('cursor') or None)
+        except InvalidCursor:
+            return JsonResponse({'error': 'Invalid cursor'}, status=400)
+        except ProjectionError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        return StreamingHttpResponse(self.stream(paginator, queryset, names, key), content_type='application/json')
+
+    def stream(self, paginator, queryset, names, key):
+        encoder = JSONEncoder()
+        yield f'{{{encoder.encode(key)}: ['
+        last = None
+        more = False
+        # One row past the page tells whether there is a next one
+        for index, row in enumerate(self.values(queryset, names)[:paginator.per_page + 1].iterator()):
+            if index == paginator.per_page:
+                more = True
+                break
+            yield (', ' if index else '') + encoder.encode(self.project(row, names))
+            last = row
+        yield f'], "next": {encoder.encode(paginator.encode("next", last) if more else None)}}}'
+
+
+SALES = Projection('accounts.Sale', {
+    'id': 'id', 'sale_id': 'sale_id', 'date': 'date',
+    'client_id': 'client_id', 'client_name': 'client__name', 'oil_type': 'oil_type__name',
+    'quantity': 'quantity', 'price': 'price', 'total': 'amount', 'driver_name': 'driver__name',
+}, ordering=['-date', '-id'])
+
+PURCHASES = Projection('accounts.Purchase', {
+    'id': 'id', 'purchase_id': 'BU_ID', 'date': 'date',
+    'supplier_id': 'supplier_id', 'supplier_name': 'supplier__name', 'oil_type': 'oil_type__name',
+    'quantity': 'quantity', 'price': 'price', 'total': 'amount', 'driver_name': 'driver__name',
+}, ordering=['-date', '-id'])
+
+CLIENTS = Projection('accounts.Client', {
+    'id': 'id', 'client_id': 'client_id', 'name': 'name', 'balance': 'balance',
+}, ordering=['name', 'id'])
+
+DRIVERS = Projection('accounts.Driver', {
+    'id': 'id', 'driver_id': 'driver_id', 'name': 'name', 'vehicle_number': 'vehicle_number',
+}, ordering=['name', 'id'])
@@ -0,0 +1,332 @@
+"""Full-text search for the list-view search boxes.
+
+Every searchable row has one document in ``accounts_searchindex``: the text of
+its own and its related rows' searchable fields, normalized so that Arabic
+spelling variants match (alef forms, alef maqsura/ya, ta marbuta/ha,
+diacritics and tatweel). SQLite stores the documents in an FTS5 table and
+PostgreSQL in a ``tsvector`` column with a GIN index; on other databases, or
+an SQLite built without FTS5, searches fall back to ``icontains`` on the same
+fields.
+
+Saves and deletes only mark documents as dirty; they are rebuilt in a few
+queries per kind when the transaction commits, or before the same thread
+searches. Code that writes with
+``update()`` or ``bulk_create()`` must call ``mark()`` itself.
+"""
+import re
+import threading
+from collections import namedtuple
+from functools import reduce
+from operator import or_
+
+from django.apps import apps as global_apps
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Case, IntegerField, Q, Value, When
+from django.db.models.expressions import RawSQL
+
+TABLE = 'accounts_searchindex'
+
+Document = namedtuple('Document', 'model fields')
+
+# Searchable fields per kind; "fk__field" paths are reindexed when the related row changes
+DOCUMENTS = {
+    'sale': Document('accounts.Sale', ['sale_id', 'client__name', 'oil_type__name', 'driver__name', 'vehicle_number', 'description']),
+    'purchase': Document('accounts.Purchase', ['BU_ID', 'supplier__name', 'oil_type__name', 'driver__name', 'vehicle_number', 'description']),
+    'treasury': Document('accounts.Treasury', ['movement_id', 'description', 'related_sale__sale_id', 'related_purchase__BU_ID', 'related_driver__name', 'related_client__name']),
+    'vehicle_movement': Document('accounts.VehicleMovement', ['movement_id', 'client__name', 'driver__name', 'vehicle_number', 'oil_type__name']),
+    'oil_type': Document('accounts.OilType', ['id', 'name', 'properties']),
+    'client': Document('accounts.Client', ['client_id', 'name', 'company_name', 'phone_number']),
+    'driver': Document('accounts.Driver', ['driver_id', 'name', 'vehicle_number', 'phone_number']),
+}
+
+# Harakat, Quranic annotation marks and tatweel
+ARABIC_DIACRITICS = re.compile('[\u0610-\u061a\u064b-\u065f\u0670\u06d6-\u06ed\u0640]')
+ARABIC_LETTERS = str.maketrans({
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا',
+    'ى': 'ي', 'ئ': 'ي', 'ؤ': 'و', 'ة': 'ه',
+})
+TOKEN = re.compile(r'\w+')
+
+
+def normalize(text):
+    """Fold the Arabic spelling variants and case so index and query compare equal."""
+    text = ARABIC_DIACRITICS.sub('', str(text))
+    return text.translate(ARABIC_LETTERS).lower()
+
+
+def tokens(text):
+    return TOKEN.findall(normalize(text))
+
+
+def result_limit():
+    return getattr(settings, 'SEARCH_RESULTS_LIMIT', 1000)
+
+
+# Backends
+
+class SQLiteBackend:
+    """FTS5 table keyed by the rowid of a plain (kind, object_id) table."""
+    keys = TABLE + '_keys'
+
+    def available(self, conn):
+        with conn.cursor() as cursor:
+            cursor.execute('PRAGMA compile_options')
+            return 'ENABLE_FTS5' in {row[0] for row in cursor.fetchall()}
+
+    def create(self, cursor):
+        cursor.execute(
+            f'CREATE TABLE IF NOT EXISTS {self.keys} ('
+            f'id integer PRIMARY KEY, kind varchar(30) NOT NULL, object_id varchar(50) NOT NULL, UNIQUE (kind, object_id))'
+        )
+        cursor.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE} USING fts5(body, tokenize='unicode61 remove_diacritics 2')")
+
+    def drop(self, cursor):
+        cursor.execute(f'DROP TABLE IF EXISTS {TABLE}')
+        cursor.execute(f'DROP TABLE IF EXISTS {self.keys}')
+
+    def clear(self, cursor):
+        cursor.execute(f'DELETE FROM {TABLE}')
+        cursor.execute(f'DELETE FROM {self.keys}')
+
+    def delete(self, cursor, kind, ids):
+        for chunk in chunks(ids):
+            keys = f'SELECT id FROM {self.keys} WHERE kind = %s AND object_id IN ({", ".join(["%s"] * len(chunk))})'
+            cursor.execute(f'DELETE FROM {TABLE} WHERE rowid IN ({keys})', [kind, *chunk])
+            cursor.execute(f'DELETE FROM {self.keys} WHERE id IN ({keys})', [kind, *chunk])
+
+    def insert(self, cursor, kind, docs):
+        if not docs:
+            return
+        cursor.executemany(f'INSERT INTO {self.keys} (kind, object_id) VALUES (%s, %s)',
+                           [(kind, object_id) for object_id, _ in docs])
+        cursor.executemany(
+            f'INSERT INTO {TABLE} (rowid, body) SELECT id, %s FROM {self.keys} WHERE kind = %s AND object_id = %s',
+            [(body, kind, object_id) for object_id, body in docs],
+        )
+
+    def search(self, cursor, kind, words, limit):
+        cursor.execute(
+            f'SELECT k.object_id FROM {TABLE} f JOIN {self.keys} k ON k.id = f.rowid '
+            f'WHERE {TABLE} MATCH %s AND k.kind = %s ORDER BY f.rank LIMIT %s',
+            [self.query(words), kind, limit],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+    def matches(self, kind, words, integer_ids):
+        # SQLite compares the text ids with an integer key by the key's affinity
+        return (
+            f'SELECT k.object_id FROM {TABLE} f JOIN {self.keys} k ON k.id = f.rowid '
+            f'WHERE {TABLE} MATCH %s AND k.kind = %s',
+            [self.query(words), kind],
+        )
+
+    def query(self, words):
+        return ' '.join(f'"{word}"*' for word in words)
+
+
+class PostgresBackend:
+    """Plain table with a generated ``tsvector`` column and a GIN index."""
+
+    def available(self, conn):
+        return True
+
+    def create(self, cursor):
+        cursor.execute(
+            f"CREATE TABLE IF NOT EXISTS {TABLE} ("
+            f"kind varchar(30) NOT NULL, object_id varchar(50) NOT NULL, body text NOT NULL, "
+            f"document tsvector GENERATED ALWAYS AS (to_tsvector('simple', body)) STORED, "
+            f"PRIMARY KEY (kind, object_id))"
+        )
+        cursor.execute(f'CREATE INDEX IF NOT EXISTS {TABLE}_document ON {TABLE} USING gin (document)')
+
+    def drop(self, cursor):
+        cursor.execute(f'DROP TABLE IF EXISTS {TABLE}')
+
+    def clear(self, cursor):
+        cursor.execute(f'DELETE FROM {TABLE}')
+
+    def delete(self, cursor, kind, ids):
+        for chunk in chunks(ids):
+            cursor.execute(f'DELETE FROM {TABLE} WHERE kind = %s AND object_id = ANY(%s)', [kind, chunk])
+
+    def insert(self, cursor, kind, docs):
+        cursor.executemany(f'INSERT INTO {TABLE} (kind, object_id, body) VALUES (%s, %s, %s)',
+                           [(kind, object_id, body) for object_id, body in docs])
+
+    def search(self, cursor, kind, words, limit):
+        cursor.execute(
+            f"SELECT object_id FROM {TABLE}, to_tsquery('simple', %s) query "
+            f"WHERE kind = %s AND document @@ query ORDER BY ts_rank(document, query) DESC LIMIT %s",
+            [self.query(words), kind, limit],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+    def matches(self, kind, words, integer_ids):
+        column = 'object_id::bigint' if integer_ids else 'object_id'
+        return (
+            f"SELECT {column} FROM {TABLE} WHERE kind = %s AND document @@ to_tsquery('simple', %s)",
+            [kind, self.query(words)],
+        )
+
+    def query(self, words):
+        return ' & '.join(f'{word}:*' for word in words)
+
+
+BACKENDS = {'sqlite': SQLiteBackend(), 'postgresql': PostgresBackend()}
+_available = {}
+
+
+def backend(conn=connection):
+    """The index backend of this database, or None to fall back to ``icontains``."""
+    impl = BACKENDS.get(conn.vendor)
+    if impl is None:
+        return None
+    if conn.alias not in _available:
+        _available[conn.alias] = impl.available(conn)
+    return impl if _available[conn.alias] else None
+
+
+def chunks(items, size=500):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+# Indexing
+
+def documents(kind, queryset):
+    """``(object_id, body)`` for every row of ``queryset``, in one query."""
+    fields = DOCUMENTS[kind].fields
+    for row in queryset.values_list('pk', *fields).iterator():
+        yield str(row[0]), normalize(' '.join(str(value) for value in row[1:] if value not in (None, '')))
+
+
+def reindex(kind, queryset=None, ids=None, apps=global_apps, conn=connection):
+    """Rewrite the documents of ``ids`` (or of every row of ``queryset``)."""
+    impl = backend(conn)
+    if impl is None:
+        return
+    model = apps.get_model(DOCUMENTS[kind].model)
+    if queryset is None:
+        queryset = model._base_manager.filter(pk__in=ids)
+    docs = list(documents(kind, queryset.using(conn.alias)))
+    stale = {str(pk) for pk in ids} if ids is not None else set()
+    stale.update(object_id for object_id, _ in docs)
+    with conn.cursor() as cursor:
+        impl.delete(cursor, kind, stale)
+        impl.insert(cursor, kind, docs)
+
+
+def rebuild(apps=global_apps, conn=connection):
+    """Recreate the whole index. Returns the number of documents per kind."""
+    impl = backend(conn)
+    if impl is None:
+        return {}
+    with conn.cursor() as cursor:
+        impl.clear(cursor)
+    counts = {}
+    for kind, document in DOCUMENTS.items():
+        docs = list(documents(kind, apps.get_model(document.model)._base_manager.using(conn.alias)))
+        with conn.cursor() as cursor:
+            impl.insert(cursor, kind, docs)
+        counts[kind] = len(docs)
+    return counts
+
+
+_pending = threading.local()
+
+
+def mark(kind, ids=(), **lookup):
+    """Queue documents for reindexing when the current transaction commits.
+
+    ``ids`` names rows directly (deleted rows lose their document); a
+    ``lookup`` such as ``client_id=5`` names every row that matches it.
+    """
+    pending = getattr(_pending, 'entries', None)
+    if pending is None:
+        pending = _pending.entries = {}
+    entry = pending.setdefault(kind, [set(), set()])
+    entry[0].update(ids)
+    if lookup:
+        entry[1].add(tuple(sorted(lookup.items())))
+    # Runs at once outside a transaction; a rolled-back entry is flushed with the next commit
+    transaction.on_commit(flush)
+
+
+def flush():
+    pending = getattr(_pending, 'entries', None)
+    if not pending:
+        return
+    _pending.entries = {}
+    for kind, (ids, lookups) in pending.items():
+        if ids:
+            reindex(kind, ids=ids)
+        for lookup in lookups:
+            model = global_apps.get_model(DOCUMENTS[kind].model)
+            reindex(kind, queryset=model._base_manager.filter(**dict(lookup)))
+
+
+def kind_of(model):
+    label = model._meta.label
+    for kind, document in DOCUMENTS.items():
+        if document.model == label:
+            return kind
+    return None
+
+
+def dependents(model):
+    """``(kind, fk attname)`` of the documents that include fields of ``model``."""
+    for kind, document in DOCUMENTS.items():
+        related = global_apps.get_model(document.model)
+        for fk in {path.split('__')[0] for path in document.fields if '__' in path}:
+            field = related._meta.get_field(fk)
+            if field.related_model is model:
+                yield kind, field.attname
+
+
+# Querying
+
+def search_ids(kind, query, limit=None):
+    """The ``limit`` (``result_limit()``) best primary keys matching every word of ``query``, best first."""
+    words = tokens(query)
+    impl = backend()
+    if not words or impl is None:
+        return []
+    # Rows this thread changed in the open transaction are searchable too
+    flush()
+    with connection.cursor() as cursor:
+        return impl.search(cursor, kind, words, limit or result_limit())
+
+
+def fallback_filter(kind, query):
+    """``icontains`` on the document fields, every word in at least one of them."""
+    words = query.split()
+    fields = DOCUMENTS[kind].fields
+    return reduce(
+        lambda q, word: q & reduce(or_, (Q(**{f'{path}__icontains': word}) for path in fields)),
+        words, Q(),
+    )
+
+
+def filter_queryset(queryset, kind, query):
+    """Limit ``queryset`` to every search result, the best ``result_limit()`` first in rank order.
+
+    The filter is a subquery on the index, so counts and totals cover all the
+    matches; only the rank order stops at the limit, the rest follow by key.
+    """
+    impl = backend()
+    if impl is None:
+        return queryset.filter(fallback_filter(kind, query))
+    words = tokens(query)
+    if not words:
+        return queryset.none()
+    pk_field = queryset.model._meta.pk
+    ranked = [pk_field.to_python(object_id) for object_id in search_ids(kind, query)]
+    if not ranked:
+        return queryset.none()
+    integer_ids = pk_field.get_internal_type() in ('AutoField', 'BigAutoField', 'IntegerField', 'BigIntegerField')
+    sql, params = impl.matches(kind, words, integer_ids)
+    rank = Case(*[When(pk=pk, then=Value(position)) for position, pk in enumerate(ranked)],
+                default=Value(len(ranked)), output_field=IntegerField())
+    return queryset.filter(pk__in=RawSQL(sql, params)).order_by(rank, '-pk')
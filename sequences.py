@@ -0,0 +1,126 @@
+"""Business ID allocation (DR-001, CL-001, OT-001, BU-001, SL-001, VEi-001/VEe-001).
+
+Each prefix owns one row in the ``Sequence`` table. A worker process reserves a
+block of numbers with a single ``UPDATE ... SET last_value = last_value + n``
+and then hands them out from memory, so creating a record no longer scans or
+locks the target table.
+"""
+import threading
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+
+from .models import Sequence
+
+# prefix -> (model label, id field) used to seed a missing counter row from
+# the rows that already exist in the table.
+SEQUENCE_SOURCES = {
+    'DR-': ('accounts.Driver', 'driver_id'),
+    'CL-': ('accounts.Client', 'client_id'),
+    'OT-': ('accounts.OilType', 'id'),
+    'BU-': ('accounts.Purchase', 'BU_ID'),
+    'SL-': ('accounts.Sale', 'sale_id'),
+    'VEi-': ('accounts.VehicleMovement', 'movement_id'),
+    'VEe-': ('accounts.VehicleMovement', 'movement_id'),
+}
+
+
+def format_id(prefix, number):
+    return f'{prefix}{number:03d}'
+
+
+def parse_number(value, prefix):
+    """Return the numeric part of ``value`` or None if it does not belong to ``prefix``."""
+    if not value or not value.startswith(prefix):
+        return None
+    try:
+        return int(value[len(prefix):])
+    except ValueError:
+        return None
+
+
+def current_max(prefix):
+    """Highest number already used for ``prefix``, compared numerically (CL-1000 > CL-999)."""
+    from django.apps import apps
+
+    model_label, field = SEQUENCE_SOURCES[prefix]
+    model = apps.get_model(model_label)
+    values = model.objects.filter(**{f'{field}__startswith': prefix}).values_list(field, flat=True)
+    numbers = [parse_number(value, prefix) for value in values.iterator()]
+    return max((n for n in numbers if n is not None), default=0)
+
+
+class SequenceAllocator:
+    """Hands out sequence numbers from per-thread blocks reserved in the database.
+
+    Blocks are only cached when the reservation is committed immediately. Inside
+    an outer ``transaction.atomic()`` a rollback would undo the counter update,
+    so in that case exactly one number is reserved and nothing is kept in memory.
+    """
+
+    def __init__(self, block_size=None):
+        self.block_size = block_size
+        self._local = threading.local()
+
+    def _get_block_size(self):
+        if self.block_size is not None:
+            return self.block_size
+        return getattr(settings, 'SEQUENCE_BLOCK_SIZE', 10)
+
+    def _blocks(self):
+        if not hasattr(self._local, 'blocks'):
+            self._local.blocks = {}
+        return self._local.blocks
+
+    def reset(self):
+        """Drop the numbers cached by the current thread."""
+        self._local.blocks = {}
+
+    def next_value(self, prefix):
+        blocks = self._blocks()
+        block = blocks.get(prefix)
+        if block and block[0] <= block[1]:
+            value = block[0]
+            block[0] += 1
+            return value
+
+        if connection.in_atomic_block:
+            first, last = self._reserve(prefix, 1)
+            return first
+
+        first, last = self._reserve(prefix, self._get_block_size())
+        blocks[prefix] = [first + 1, last]
+        return first
+
+    def peek(self, prefix):
+        """Best-effort next number without reserving it and without taking any lock."""
+        block = self._blocks().get(prefix)
+        if block and block[0] <= block[1]:
+            return block[0]
+        last_value = Sequence.objects.filter(prefix=prefix).values_list('last_value', flat=True).first()
+        if last_value is None:
+            last_value = current_max(prefix)
+        return last_value + 1
+
+    def _reserve(self, prefix, count):
+        with transaction.atomic():
+            updated = Sequence.objects.filter(prefix=prefix).update(last_value=F('last_value') + count)
+            if not updated:
+                Sequence.objects.get_or_create(prefix=prefix, defaults={'last_value': current_max(prefix)})
+                Sequence.objects.filter(prefix=prefix).update(last_value=F('last_value') + count)
+            last = Sequence.objects.values_list('last_value', flat=True).get(prefix=prefix)
+        return last - count + 1, last
+
+
+allocator = SequenceAllocator()
+
+
+def next_id(prefix):
+    """Reserve and return the next formatted ID for ``prefix`` (e.g. ``CL-042``)."""
+    return format_id(prefix, allocator.next_value(prefix))
+
+
+def peek_id(prefix):
+    """Formatted ID the next ``next_id(prefix)`` call will most likely return."""
+    return format_id(prefix, allocator.peek(prefix))
@@ -75,6 +75,8 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # A file, not the in-memory default: the concurrency tests need writers that wait for each other
+        'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
     }
 }
 
@@ -111,6 +113,27 @@ SESSION_ENGINE = 'django.contrib.sessions.backends.db'
 SESSION_COOKIE_AGE = 3600  # 1 hour
 SESSION_EXPIRE_AT_BROWSER_CLOSE = True
 
+# Activity log: written in batches by a background thread
+ACTIVITY_LOG_ASYNC = True
+
+# Cache: the versioned entries of accounts.caching are invalidated in every
+# process only with a shared backend, so set REDIS_URL wherever more than one
+# worker process runs. Without it each process has its own LocMemCache and
+# sees another process's changes once the entries time out.
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
 INTERNAL_IPS = [
     '127.0.0.1',
 ]
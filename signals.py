@@ -1,8 +1,10 @@
-from django.db.models.signals import post_save, pre_save
+from django.db.models.signals import post_save, pre_save, post_delete, pre_delete
 from django.dispatch import receiver
 from django.core.exceptions import ValidationError
+from django.db import transaction
 from .models_vehicle import VehicleMovement
-from .models import Sale, Purchase
+from .models import Client, Driver, OilType, Sale, Purchase, Treasury
+from . import caching, checkpoints, costing, facts, lookups, search, stock, sync
 import logging
 
 logger = logging.getLogger(__name__)
@@ -18,111 +20,171 @@ def validate_vehicle_movement(sender, instance, **kwargs):
             })
 
 @receiver(post_save, sender=VehicleMovement)
-def handle_vehicle_movement_save(sender, instance, created, **kwargs):
-    """Update related sale/purchase when vehicle movement is saved"""
-    if instance.movement_type == 'internal' and instance.operation_type and instance.operation_id:
-        # Update related sale/purchase with movement details
-        if instance.operation_type == 'sale':
-            try:
-                sale = Sale.objects.get(id=instance.operation_id)
-                sale.driver = instance.driver
-                sale.vehicle_number = instance.vehicle_number
-                sale.loading_location = instance.loading_location
-                sale.unloading_location = instance.unloading_location
-                sale.driver_freight = instance.driver_freight
-                sale.client_freight = instance.client_freight
-                sale.save()
-            except Sale.DoesNotExist:
-                pass
-        elif instance.operation_type == 'purchase':
-            try:
-                purchase = Purchase.objects.get(id=instance.operation_id)
-                purchase.driver = instance.driver
-                purchase.vehicle_number = instance.vehicle_number
-                purchase.loading_location = instance.loading_location
-                purchase.unloading_location = instance.unloading_location
-                purchase.driver_freight = instance.driver_freight
-                purchase.client_freight = instance.client_freight
-                purchase.save()
-            except Purchase.DoesNotExist:
-                pass
-
-@receiver([post_save], sender=Sale)
-def handle_sale_save(sender, instance, created, **kwargs):
-    """تحديث حركات السيارات المرتبطة بعملية البيع"""
-    if instance.driver and instance.vehicle_number:
-        try:
-            movement = VehicleMovement.objects.get(
-                movement_type='internal',
-                operation_type='sale',
-                operation_id=instance.id
-            )
-            # تحديث بيانات الحركة
-            movement.driver = instance.driver
-            movement.vehicle_number = instance.vehicle_number
-            movement.loading_location = instance.loading_location
-            movement.unloading_location = instance.unloading_location
-            movement.driver_freight = instance.driver_freight
-            movement.client_freight = instance.client_freight
-            movement.save()
-            logger.info(f"Updated vehicle movement for sale {instance.id}")
-        except VehicleMovement.DoesNotExist:
-            # إنشاء حركة جديدة
-            VehicleMovement.objects.create(
-                movement_type='internal',
-                operation_type='sale',
-                operation_id=instance.id,
-                date=instance.date,
-                client=instance.client,
-                oil_type=instance.oil_type,
-                quantity=instance.quantity,
-                driver=instance.driver,
-                vehicle_number=instance.vehicle_number,
-                loading_location=instance.loading_location,
-                unloading_location=instance.unloading_location,
-                driver_freight=instance.driver_freight,
-                client_freight=instance.client_freight
-            )
-            logger.info(f"Created new vehicle movement for sale {instance.id}")
-        except Exception as e:
-            logger.error(f"Error handling sale {instance.id}: {str(e)}")
-
-@receiver([post_save], sender=Purchase)
-def handle_purchase_save(sender, instance, created, **kwargs):
-    """تحديث حركات السيارات المرتبطة بعملية الشراء"""
-    if instance.driver and instance.vehicle_number:
-        try:
-            movement = VehicleMovement.objects.get(
-                movement_type='internal',
-                operation_type='purchase',
-                operation_id=instance.id
-            )
-            # تحديث بيانات الحركة
-            movement.driver = instance.driver
-            movement.vehicle_number = instance.vehicle_number
-            movement.loading_location = instance.loading_location
-            movement.unloading_location = instance.unloading_location
-            movement.driver_freight = instance.driver_freight
-            movement.client_freight = instance.client_freight
-            movement.save()
-            logger.info(f"Updated vehicle movement for purchase {instance.id}")
-        except VehicleMovement.DoesNotExist:
-            # إنشاء حركة جديدة
-            VehicleMovement.objects.create(
-                movement_type='internal',
-                operation_type='purchase',
-                operation_id=instance.id,
-                date=instance.date,
-                client=instance.supplier,
-                oil_type=instance.oil_type,
-                quantity=instance.quantity,
-                driver=instance.driver,
-                vehicle_number=instance.vehicle_number,
-                loading_location=instance.loading_location,
-                unloading_location=instance.unloading_location,
-                driver_freight=instance.driver_freight,
-                client_freight=instance.client_freight
-            )
-            logger.info(f"Created new vehicle movement for purchase {instance.id}")
-        except Exception as e:
-            logger.error(f"Error handling purchase {instance.id}: {str(e)}")
\ No newline at end of file
+def handle_vehicle_movement_save(sender, instance, created, raw=False, **kwargs):
+    """تحديث بيانات النقل في عملية البيع/الشراء المرتبطة بالأعمدة المتغيرة فقط"""
+    if not raw:
+        sync.operation_from_movement(instance)
+
+@receiver(post_save, sender=Sale)
+@receiver(post_save, sender=Purchase)
+def handle_operation_save(sender, instance, created, raw=False, **kwargs):
+    """تحديث أو إنشاء حركة السيارة الداخلية المرتبطة بعملية البيع/الشراء"""
+    if not raw:
+        sync.movement_from_operation(instance)
+
+@receiver(pre_save, sender=Sale)
+@receiver(pre_save, sender=Purchase)
+@receiver(pre_save, sender=Treasury)
+@receiver(pre_save, sender=VehicleMovement)
+def remember_loaded_values(sender, instance, raw=False, **kwargs):
+    """حفظ القيم القديمة قبل التعديل لحساب الفروق بعد الحفظ"""
+    if not raw:
+        instance.remember_loaded_values()
+
+@receiver(pre_delete, sender=Sale)
+@receiver(pre_delete, sender=Purchase)
+@receiver(pre_delete, sender=Treasury)
+@receiver(pre_delete, sender=VehicleMovement)
+def remember_deleted_values(sender, instance, **kwargs):
+    """قراءة القيم المحفوظة قبل الحذف حتى يُخصم الصف الفعلي وليس نسخة قديمة منه"""
+    instance.remember_loaded_values()
+
+@receiver(post_save, sender=Sale)
+@receiver(post_save, sender=Purchase)
+@receiver(post_save, sender=Treasury)
+def update_statement_checkpoints(sender, instance, raw=False, **kwargs):
+    """تحديث الرصيد الشهري للعميل بفرق العملية"""
+    if not raw:
+        checkpoints.apply_change(sender, getattr(instance, '_loaded_values', None), instance.current_values())
+
+@receiver(post_delete, sender=Sale)
+@receiver(post_delete, sender=Purchase)
+@receiver(post_delete, sender=Treasury)
+def remove_from_statement_checkpoints(sender, instance, **kwargs):
+    """خصم العملية المحذوفة من الرصيد الشهري للعميل"""
+    checkpoints.apply_change(sender, instance._loaded_values, None)
+
+@receiver(post_save, sender=Sale)
+@receiver(post_save, sender=Purchase)
+def update_stock(sender, instance, raw=False, **kwargs):
+    """تسجيل فرق الكمية في دفتر المخزون وتحديث الكمية الحالية لنوع الزيت"""
+    if not raw:
+        stock.apply_change(sender, getattr(instance, '_loaded_values', None), instance.current_values())
+
+@receiver(post_delete, sender=Sale)
+@receiver(post_delete, sender=Purchase)
+def remove_from_stock(sender, instance, **kwargs):
+    """عكس حركة المخزون للعملية المحذوفة"""
+    stock.apply_change(sender, instance._loaded_values, None)
+
+# بعد تحديث المخزون: متوسط التكلفة يُحسب من الأرصدة اليومية
+@receiver(post_save, sender=Sale)
+@receiver(post_save, sender=Purchase)
+def update_costs(sender, instance, raw=False, **kwargs):
+    """إعادة حساب متوسط التكلفة من يوم العملية وتحديث تكلفة وهامش المبيعات المتأثرة"""
+    if not raw:
+        stamped = costing.apply_change(sender, getattr(instance, '_loaded_values', None), instance.current_values())
+        if stamped and sender is Sale:
+            costing.refresh(instance)
+
+@receiver(post_delete, sender=Sale)
+@receiver(post_delete, sender=Purchase)
+def remove_from_costs(sender, instance, **kwargs):
+    """إعادة حساب متوسط التكلفة بعد حذف العملية"""
+    costing.apply_change(sender, instance._loaded_values, None)
+
+@receiver(post_save, sender=Sale)
+@receiver(post_save, sender=Purchase)
+@receiver(post_save, sender=Treasury)
+@receiver(post_save, sender=VehicleMovement)
+def update_daily_facts(sender, instance, raw=False, **kwargs):
+    """تحديث الإجماليات اليومية بفرق العملية"""
+    if not raw:
+        facts.apply_change(sender, getattr(instance, '_loaded_values', None), instance.current_values())
+
+@receiver(post_delete, sender=Sale)
+@receiver(post_delete, sender=Purchase)
+@receiver(post_delete, sender=Treasury)
+@receiver(post_delete, sender=VehicleMovement)
+def remove_from_daily_facts(sender, instance, **kwargs):
+    """خصم العملية المحذوفة من الإجماليات اليومية"""
+    facts.apply_change(sender, instance._loaded_values, None)
+
+@receiver(post_save, sender=Treasury)
+@receiver(post_delete, sender=Treasury)
+def invalidate_treasury_totals(sender, **kwargs):
+    """إلغاء إجماليات الخزينة المخزنة بعد تأكيد الحفظ"""
+    transaction.on_commit(lambda: caching.bump(caching.TREASURY_TOTALS))
+
+@receiver(post_save, sender=Sale)
+@receiver(post_save, sender=Purchase)
+@receiver(post_save, sender=Treasury)
+@receiver(post_save, sender=VehicleMovement)
+@receiver(post_save, sender=Client)
+@receiver(post_delete, sender=Sale)
+@receiver(post_delete, sender=Purchase)
+@receiver(post_delete, sender=Treasury)
+@receiver(post_delete, sender=VehicleMovement)
+@receiver(post_delete, sender=Client)
+def invalidate_dashboard(sender, raw=False, **kwargs):
+    """إلغاء مؤشرات الصفحة الرئيسية المخزنة بعد تأكيد الحفظ أو الحذف"""
+    if raw:
+        return
+    transaction.on_commit(lambda: caching.bump(caching.DASHBOARD))
+
+@receiver(post_save, sender=Sale)
+@receiver(post_save, sender=Purchase)
+@receiver(post_save, sender=Treasury)
+@receiver(post_save, sender=VehicleMovement)
+@receiver(post_save, sender=OilType)
+@receiver(post_save, sender=Client)
+@receiver(post_save, sender=Driver)
+@receiver(post_delete, sender=Sale)
+@receiver(post_delete, sender=Purchase)
+@receiver(post_delete, sender=Treasury)
+@receiver(post_delete, sender=VehicleMovement)
+@receiver(post_delete, sender=OilType)
+@receiver(post_delete, sender=Client)
+@receiver(post_delete, sender=Driver)
+def update_search_index(sender, instance, **kwargs):
+    """إعادة فهرسة العملية أو العميل/السائق للبحث بعد تأكيد الحفظ أو الحذف"""
+    search.mark(search.kind_of(sender), [instance.pk])
+
+@receiver(post_save, sender=Client)
+@receiver(post_save, sender=Driver)
+@receiver(post_save, sender=OilType)
+def update_dependent_search_index(sender, instance, created, **kwargs):
+    """إعادة فهرسة العمليات التي تحتوي على اسم العميل/السائق/نوع الزيت بعد تعديله"""
+    if created:
+        return
+    for kind, attname in search.dependents(sender):
+        search.mark(kind, **{attname: instance.pk})
+
+@receiver(post_save, sender=Client)
+@receiver(post_delete, sender=Client)
+def invalidate_client_counts(sender, created=False, **kwargs):
+    """إلغاء أعداد العملاء المخزنة بعد إضافة أو حذف عميل أو تعديل رصيده"""
+    if created or kwargs['signal'] is post_delete:
+        transaction.on_commit(lambda: caching.bump(caching.CLIENT_COUNTS))
+    transaction.on_commit(lambda: caching.bump(caching.CLIENT_BALANCE_COUNTS))
+
+@receiver(post_save, sender=Client)
+@receiver(post_save, sender=Driver)
+@receiver(post_save, sender=OilType)
+@receiver(post_delete, sender=Client)
+@receiver(post_delete, sender=Driver)
+@receiver(post_delete, sender=OilType)
+def invalidate_autocomplete(sender, **kwargs):
+    """إلغاء نتائج الإكمال التلقائي المخزنة بعد تعديل العملاء أو السائقين أو أنواع الزيت"""
+    transaction.on_commit(lambda: caching.bump(caching.AUTOCOMPLETE))
+
+@receiver(post_save, sender=Client)
+@receiver(post_save, sender=Driver)
+@receiver(post_save, sender=OilType)
+@receiver(post_delete, sender=Client)
+@receiver(post_delete, sender=Driver)
+@receiver(post_delete, sender=OilType)
+def invalidate_lookups(sender, **kwargs):
+    """إلغاء بيانات العميل/السائق/نوع الزيت المخزنة في كل العمليات بعد تأكيد الحفظ أو الحذف"""
+    lookup = {Client: lookups.CLIENTS, Driver: lookups.DRIVERS, OilType: lookups.OIL_TYPES}[sender]
+    transaction.on_commit(lookup.invalidate)
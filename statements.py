@@ -0,0 +1,229 @@
+"""Client statement engine.
+
+Sales, purchases and treasury movements of one client are read as a single
+date-ordered ``UNION ALL`` stream and the running balance is computed by the
+database with a window function, so a page of the statement costs one query no
+matter how long the client's history is. With ``date_from`` set, the balance
+brought forward comes from the previous month's ``StatementCheckpoint`` and
+only rows from the start of ``date_from``'s month onwards are scanned.
+"""
+import datetime
+from decimal import Decimal
+
+from django.db import connection
+
+from .models import OilType, Purchase, Sale, Treasury
+from .models_statement import StatementCheckpoint
+
+SALE, PURCHASE, TREASURY = 0, 1, 2
+KIND_NAMES = {SALE: 'sale', PURCHASE: 'purchase', TREASURY: 'treasury'}
+CENT = Decimal('0.01')
+MILLI = Decimal('0.001')
+
+
+def to_decimal(value, exp=CENT):
+    if value is None:
+        return Decimal(0).quantize(exp)
+    if not isinstance(value, Decimal):
+        value = Decimal(str(value))
+    return value.quantize(exp)
+
+
+def to_date(value):
+    if isinstance(value, datetime.date):
+        return value
+    return datetime.date.fromisoformat(str(value)[:10])
+
+
+def _column(model, field):
+    return connection.ops.quote_name(model._meta.get_field(field).column)
+
+
+def _table(model):
+    return connection.ops.quote_name(model._meta.db_table)
+
+
+def entries_sql(since=False):
+    """SQL for every statement entry of one client.
+
+    Params per branch: the client id, followed by the first date to include
+    when ``since`` is true.
+    """
+    sale, purchase, treasury, oil = _table(Sale), _table(Purchase), _table(Treasury), _table(OilType)
+    oil_pk = _column(OilType, 'id')
+
+    def since_sql(alias, model):
+        return f' AND {alias}.{_column(model, "date")} >= %s' if since else ''
+
+    return f"""
+        SELECT s.{_column(Sale, 'date')} AS entry_date, {SALE} AS kind, s.{_column(Sale, 'id')} AS row_id,
+               s.{_column(Sale, 'sale_id')} AS reference, s.{_column(Sale, 'quantity')} AS quantity,
+               o.{_column(OilType, 'name')} AS oil_name, NULL AS description,
+               s.{_column(Sale, 'amount')} AS amount
+        FROM {sale} s LEFT JOIN {oil} o ON o.{oil_pk} = s.{_column(Sale, 'oil_type')}
+        WHERE s.{_column(Sale, 'client')} = %s{since_sql('s', Sale)}
+        UNION ALL
+        SELECT p.{_column(Purchase, 'date')}, {PURCHASE}, p.{_column(Purchase, 'id')},
+               p.{_column(Purchase, 'BU_ID')}, p.{_column(Purchase, 'quantity')},
+               o.{_column(OilType, 'name')}, NULL, -p.{_column(Purchase, 'amount')}
+        FROM {purchase} p LEFT JOIN {oil} o ON o.{oil_pk} = p.{_column(Purchase, 'oil_type')}
+        WHERE p.{_column(Purchase, 'supplier')} = %s{since_sql('p', Purchase)}
+        UNION ALL
+        SELECT t.{_column(Treasury, 'date')}, {TREASURY}, t.{_column(Treasury, 'movement_id')},
+               NULL, NULL, NULL, t.{_column(Treasury, 'description')},
+               CASE WHEN t.{_column(Treasury, 'transaction_type')} = 'expense'
+                    THEN -t.{_column(Treasury, 'paid_amount')} ELSE t.{_column(Treasury, 'paid_amount')} END
+        FROM {treasury} t
+        WHERE t.{_column(Treasury, 'related_client')} = %s{since_sql('t', Treasury)}
+    """
+
+
+def checkpoint_sql():
+    """Closing balance of the last checkpoint before a month (params: client id, month)."""
+    return f"""
+        SELECT {_column(StatementCheckpoint, 'closing_balance')} FROM {_table(StatementCheckpoint)}
+        WHERE {_column(StatementCheckpoint, 'client')} = %s AND {_column(StatementCheckpoint, 'period')} < %s
+        ORDER BY {_column(StatementCheckpoint, 'period')} DESC LIMIT 1
+    """
+
+
+class ClientStatement:
+    """Statement of one client, optionally limited to ``date_from``..``date_to``.
+
+    Behaves like a sliceable sequence with ``count()`` so it can be handed to
+    Django's ``Paginator``; each slice is one windowed query and the running
+    balance of the first row carries forward everything before it.
+    """
+
+    def __init__(self, client, date_from=None, date_to=None):
+        self.client = client
+        self.date_from = date_from
+        self.date_to = date_to
+        self._summary = None
+
+    def _range_condition(self):
+        conditions, params = [], []
+        if self.date_from:
+            conditions.append('entry_date >= %s')
+            params.append(connection.ops.adapt_datefield_value(self.date_from))
+        if self.date_to:
+            conditions.append('entry_date <= %s')
+            params.append(connection.ops.adapt_datefield_value(self.date_to))
+        return ' AND '.join(conditions) or '1 = 1', params
+
+    def _scan_from(self):
+        """First day of ``date_from``'s month: earlier rows are covered by the checkpoints."""
+        if self.date_from:
+            return self.date_from.replace(day=1)
+        return None
+
+    def _entries(self):
+        scan_from = self._scan_from()
+        if scan_from is None:
+            return entries_sql(), [self.client.pk] * 3
+        return entries_sql(since=True), [self.client.pk, connection.ops.adapt_datefield_value(scan_from)] * 3
+
+    def summary(self):
+        """Opening balance, totals and row count of the range in one query."""
+        if self._summary is not None:
+            return self._summary
+        condition, condition_params = self._range_condition()
+        entries, entry_params = self._entries()
+        if self.date_from:
+            # Checkpoint of the previous month plus the rows of the month before date_from
+            opening_sql = f'COALESCE(({checkpoint_sql()}), 0) + SUM(CASE WHEN entry_date < %s THEN amount ELSE 0 END)'
+            opening_params = [
+                self.client.pk,
+                connection.ops.adapt_datefield_value(self._scan_from()),
+                connection.ops.adapt_datefield_value(self.date_from),
+            ]
+        else:
+            opening_sql, opening_params = '0', []
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                SELECT {opening_sql},
+                       SUM(CASE WHEN {condition} THEN 1 ELSE 0 END),
+                       SUM(CASE WHEN kind = {SALE} AND {condition} THEN amount ELSE 0 END),
+                       SUM(CASE WHEN kind = {PURCHASE} AND {condition} THEN -amount ELSE 0 END),
+                       SUM(CASE WHEN kind = {TREASURY} AND {condition} THEN ABS(amount) ELSE 0 END)
+                FROM ({entries}) entries
+                """,
+                opening_params + condition_params * 4 + entry_params,
+            )
+            opening, count, sales, purchases, treasury = cursor.fetchone()
+        self._summary = {
+            'count': count or 0,
+            'opening_balance': to_decimal(opening),
+            'total_sales': to_decimal(sales),
+            'total_purchases': to_decimal(purchases),
+            'total_treasury': to_decimal(treasury),
+        }
+        return self._summary
+
+    def count(self):
+        return self.summary()['count']
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start = index.start or 0
+            limit = None if index.stop is None else max(index.stop - start, 0)
+            return list(self.iter_rows(offset=start, limit=limit))
+        rows = list(self.iter_rows(offset=index, limit=1))
+        if not rows:
+            raise IndexError(index)
+        return rows[0]
+
+    def rows_sql(self, offset=0, limit=None):
+        """SQL and params of the date-ordered rows with their running balance."""
+        condition, condition_params = self._range_condition()
+        entries, entry_params = self._entries()
+        sql = f"""
+            SELECT entry_date, kind, row_id, reference, quantity, oil_name, description, amount,
+                   SUM(amount) OVER (ORDER BY entry_date, kind, row_id ROWS UNBOUNDED PRECEDING) AS running
+            FROM ({entries}) entries
+            WHERE {condition}
+            ORDER BY entry_date, kind, row_id
+        """
+        params = entry_params + condition_params
+        if limit is not None:
+            sql += ' LIMIT %s OFFSET %s'
+            params += [limit, offset]
+        elif offset:
+            sql += ' LIMIT -1 OFFSET %s' if connection.vendor == 'sqlite' else ' OFFSET %s'
+            params.append(offset)
+        return sql, params
+
+    def iter_rows(self, offset=0, limit=None, chunk_size=500):
+        """Yield statement rows in date order, fetching ``chunk_size`` rows at a time."""
+        sql, params = self.rows_sql(offset, limit)
+        opening = self.summary()['opening_balance']
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                for row in rows:
+                    yield self._make_row(row, opening)
+
+    def _make_row(self, row, opening):
+        entry_date, kind, row_id, reference, quantity, oil_name, description, amount, running = row
+        if kind == SALE:
+            details = f'بيع {to_decimal(quantity, MILLI)} {oil_name or ""}'
+        elif kind == PURCHASE:
+            details = f'شراء {to_decimal(quantity, MILLI)} {oil_name or ""}'
+        else:
+            reference = f'TR-{row_id}'
+            details = description
+        return {
+            'date': to_date(entry_date),
+            'transaction_id': reference,
+            'type': KIND_NAMES[kind],
+            'details': details,
+            'amount': to_decimal(amount),
+            'balance': opening + to_decimal(running),
+        }
@@ -193,13 +193,13 @@ function selectOperation(operationId) {
         success: function(response) {
             // Fill form fields with operation details
             $('#id_operation_id').val(response.id);
-            $('#id_client').val(response.client).trigger('change');
-            $('#id_oil_type').val(response.oil_type).trigger('change');
+            utils.setAutocompleteValue('#id_client', response.client, response.client_name);
+            utils.setAutocompleteValue('#id_oil_type', response.oil_type, response.oil_type_name);
             $('#id_quantity').val(response.quantity);
             $('#id_loading_location').val(response.loading_location);
             $('#id_unloading_location').val(response.unloading_location);
             if (response.driver) {
-                $('#id_driver').val(response.driver).trigger('change');
+                utils.setAutocompleteValue('#id_driver', response.driver, response.driver_name);
             }
             
             // Close modal
@@ -0,0 +1,263 @@
+"""Oil type stock ledger.
+
+Every purchase and sale with an oil type moves its stock: a purchase adds its
+quantity, a sale takes it away. Saves and deletes write the signed difference
+between the old and the new quantity as a ``StockMovement``, apply it to
+``OilType.current_quantity`` with an ``F()`` update and add it to the
+``StockSnapshot`` of its day, whose closing quantity is carried to every later
+snapshot. The stock of an oil type on any date is then the closing quantity of
+the last snapshot on or before it, one indexed row whatever the history.
+
+Rows saved without signals (``bulk_create``) have to go through
+``apply_new_rows``.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import DecimalField, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import OilType, Purchase, Sale
+from .models_stock import StockMovement, StockSnapshot
+
+ZERO = Decimal('0.000')
+CENT = Decimal('0.01')
+
+
+def entry_for(model, values):
+    """(oil_type_id, date, quantity in, quantity out, value in) of one row, or None.
+
+    The value of a purchase feeds the weighted-average cost (see ``costing``).
+    """
+    if not values or not values.get('oil_type_id'):
+        return None
+    quantity = values['quantity'] or ZERO
+    if model is Purchase:
+        # Rounded as the column stores it, so a later delete takes back exactly what was added
+        value = Decimal(values['amount'] or 0).quantize(CENT)
+        return values['oil_type_id'], values['date'], quantity, ZERO, value
+    if model is Sale:
+        return values['oil_type_id'], values['date'], ZERO, quantity, ZERO
+    return None
+
+
+def apply_entry(oil_type_id, date, quantity_in, quantity_out, value_in=ZERO, create=True):
+    """Add quantities to the day's snapshot, the later closing quantities and the current stock."""
+    delta = quantity_in - quantity_out
+    if not (quantity_in or quantity_out or value_in):
+        return
+    with transaction.atomic():
+        updated = StockSnapshot.objects.filter(oil_type_id=oil_type_id, date=date).update(
+            quantity_in=F('quantity_in') + quantity_in,
+            quantity_out=F('quantity_out') + quantity_out,
+            value_in=F('value_in') + value_in,
+            closing_quantity=F('closing_quantity') + delta,
+        )
+        if not updated and create:
+            previous = StockSnapshot.objects.filter(
+                oil_type_id=oil_type_id, date__lt=date
+            ).order_by('-date').values_list('closing_quantity', flat=True).first()
+            try:
+                with transaction.atomic():
+                    StockSnapshot.objects.create(
+                        oil_type_id=oil_type_id, date=date, quantity_in=quantity_in, quantity_out=quantity_out,
+                        value_in=value_in, closing_quantity=(previous or ZERO) + delta,
+                    )
+            except IntegrityError:
+                # Another writer created the day first
+                return apply_entry(oil_type_id, date, quantity_in, quantity_out, value_in, create)
+        if delta:
+            StockSnapshot.objects.filter(oil_type_id=oil_type_id, date__gt=date).update(
+                closing_quantity=F('closing_quantity') + delta
+            )
+            OilType.objects.filter(pk=oil_type_id).update(current_quantity=F('current_quantity') + delta)
+
+
+def movement(model, values, entry, deleted=False):
+    """The ledger row of one contribution; a deleted operation is only named by its reference."""
+    oil_type_id, date, quantity_in, quantity_out = entry[:4]
+    if model is Sale:
+        source, reference = 'sale', values['sale_id']
+    else:
+        source, reference = 'purchase', values['BU_ID']
+    return StockMovement(
+        oil_type_id=oil_type_id, date=date, quantity=quantity_in - quantity_out, source=source,
+        sale_id=None if deleted or model is not Sale else values['id'],
+        purchase_id=None if deleted or model is not Purchase else values['id'],
+        reference=reference or '',
+    )
+
+
+def record(model, values, entry, deleted=False, create=True):
+    with transaction.atomic():
+        # A new price alone changes the value of the day, not the stock
+        if entry[2] or entry[3]:
+            movement(model, values, entry, deleted).save()
+        apply_entry(*entry, create=create)
+
+
+def apply_change(model, old_values, new_values):
+    """Replace the stock movement of ``old_values`` with the one of ``new_values``."""
+    old = entry_for(model, old_values)
+    new = entry_for(model, new_values)
+    if old == new:
+        return
+    deleted = new_values is None
+    if old and new and old[:2] == new[:2]:
+        record(model, new_values, (*old[:2], *(n - o for n, o in zip(new[2:], old[2:]))))
+        return
+    if old:
+        record(model, old_values, (*old[:2], *(-value for value in old[2:])), deleted=deleted, create=False)
+    if new:
+        record(model, new_values, new)
+
+
+def apply_new_rows(model, rows):
+    """Add rows saved without signals (``bulk_create``), one snapshot update per oil type and day."""
+    rows = list(rows)
+    grouped = {}
+    movements = []
+    for values in rows:
+        entry = entry_for(model, values)
+        if entry is None or not (entry[2] or entry[3]):
+            continue
+        movements.append(movement(model, values, entry))
+        key = entry[:2]
+        previous = grouped.get(key, (ZERO, ZERO, ZERO))
+        grouped[key] = tuple(total + value for total, value in zip(previous, entry[2:]))
+    with transaction.atomic():
+        StockMovement.objects.bulk_create(movements, batch_size=1000)
+        for (oil_type_id, date), totals in sorted(grouped.items()):
+            apply_entry(oil_type_id, date, *totals)
+
+
+def stock_as_of(oil_type_id, date):
+    """Stock of an oil type at the end of ``date``."""
+    closing = StockSnapshot.objects.filter(
+        oil_type_id=oil_type_id, date__lte=date
+    ).order_by('-date').values_list('closing_quantity', flat=True).first()
+    return closing or ZERO
+
+
+def with_stock_as_of(queryset, date):
+    """Oil types annotated with ``stock`` at the end of ``date``, in the same query."""
+    closing = StockSnapshot.objects.filter(
+        oil_type=OuterRef('pk'), date__lte=date
+    ).order_by('-date').values('closing_quantity')[:1]
+    return queryset.annotate(stock=Coalesce(
+        Subquery(closing), Value(ZERO), output_field=DecimalField(max_digits=15, decimal_places=3)
+    ))
+
+
+def daily_totals(oil_type_ids=None):
+    """{oil_type_id: {date: [quantity in, quantity out, value in]}} from the raw rows."""
+    totals = defaultdict(lambda: defaultdict(lambda: [ZERO, ZERO, ZERO]))
+
+    purchases = Purchase.objects.all()
+    sales = Sale.objects.exclude(oil_type=None)
+    if oil_type_ids is not None:
+        purchases = purchases.filter(oil_type_id__in=oil_type_ids)
+        sales = sales.filter(oil_type_id__in=oil_type_ids)
+
+    for row in purchases.values('oil_type_id', 'date').annotate(total=Sum('quantity'), value=Sum('amount')):
+        totals[row['oil_type_id']][row['date']][0] += row['total'] or ZERO
+        totals[row['oil_type_id']][row['date']][2] += row['value'] or ZERO
+    for row in sales.values('oil_type_id', 'date').annotate(total=Sum('quantity')):
+        totals[row['oil_type_id']][row['date']][1] += row['total'] or ZERO
+    return totals
+
+
+def expected_snapshots(oil_type_ids=None):
+    for oil_type_id, days in daily_totals(oil_type_ids).items():
+        closing = ZERO
+        for date in sorted(days):
+            quantity_in, quantity_out, value_in = days[date]
+            if not (quantity_in or quantity_out):
+                continue
+            closing += quantity_in - quantity_out
+            yield StockSnapshot(
+                oil_type_id=oil_type_id, date=date, quantity_in=quantity_in, quantity_out=quantity_out,
+                value_in=value_in, closing_quantity=closing,
+            )
+
+
+def expected_stock(oil_type_ids=None):
+    """{oil_type_id: current stock} from the raw rows, for every oil type."""
+    oil_types = OilType.objects.all()
+    if oil_type_ids is not None:
+        oil_types = oil_types.filter(pk__in=oil_type_ids)
+    stock = {pk: ZERO for pk in oil_types.values_list('pk', flat=True)}
+    for oil_type_id, days in daily_totals(oil_type_ids).items():
+        stock[oil_type_id] = sum((i - o for i, o, _ in days.values()), ZERO)
+    return stock
+
+
+@transaction.atomic
+def rebuild_stock(oil_type_ids=None):
+    """Recompute snapshots and current quantities from the raw rows. Returns the number of snapshots written.
+
+    The ledger is history and is never rewritten: a difference is booked as an adjustment movement.
+    """
+    existing = StockSnapshot.objects.all()
+    movements = StockMovement.objects.all()
+    if oil_type_ids is not None:
+        existing = existing.filter(oil_type_id__in=oil_type_ids)
+        movements = movements.filter(oil_type_id__in=oil_type_ids)
+    existing.delete()
+    snapshots = list(expected_snapshots(oil_type_ids))
+    StockSnapshot.objects.bulk_create(snapshots, batch_size=1000)
+
+    ledger = dict(movements.values('oil_type_id').annotate(total=Sum('quantity')).values_list('oil_type_id', 'total'))
+    adjustments = []
+    for oil_type_id, quantity in expected_stock(oil_type_ids).items():
+        OilType.objects.filter(pk=oil_type_id).update(current_quantity=quantity)
+        difference = quantity - (ledger.get(oil_type_id) or ZERO)
+        if difference:
+            adjustments.append(StockMovement(oil_type_id=oil_type_id, date=timezone.localdate(),
+                                             quantity=difference, source='adjustment'))
+    StockMovement.objects.bulk_create(adjustments)
+    return len(snapshots)
+
+
+def check_stock(oil_type_ids=None):
+    """Compare snapshots, ledger and current quantities with the raw rows.
+
+    Returns a list of (oil_type_id, date or None, problem).
+    """
+    problems = []
+    stored = StockSnapshot.objects.all()
+    movements = StockMovement.objects.all()
+    oil_types = OilType.objects.all()
+    if oil_type_ids is not None:
+        stored = stored.filter(oil_type_id__in=oil_type_ids)
+        movements = movements.filter(oil_type_id__in=oil_type_ids)
+        oil_types = oil_types.filter(pk__in=oil_type_ids)
+    stored = {
+        (row['oil_type_id'], row['date']): row
+        for row in stored.values('oil_type_id', 'date', 'quantity_in', 'quantity_out', 'value_in', 'closing_quantity')
+    }
+    fields = ('quantity_in', 'quantity_out', 'value_in', 'closing_quantity')
+    for expected in expected_snapshots(oil_type_ids):
+        row = stored.pop((expected.oil_type_id, expected.date), None)
+        if row is None:
+            problems.append((expected.oil_type_id, expected.date, 'missing'))
+            continue
+        for field in fields:
+            if row[field] != getattr(expected, field):
+                problems.append((expected.oil_type_id, expected.date,
+                                 f'{field}: stored {row[field]}, expected {getattr(expected, field)}'))
+    for (oil_type_id, date), row in stored.items():
+        if row['quantity_in'] or row['quantity_out']:
+            problems.append((oil_type_id, date, 'no matching rows'))
+
+    expected = expected_stock(oil_type_ids)
+    ledger = dict(movements.values('oil_type_id').annotate(total=Sum('quantity')).values_list('oil_type_id', 'total'))
+    for oil_type_id, current in oil_types.values_list('pk', 'current_quantity'):
+        if current != expected[oil_type_id]:
+            problems.append((oil_type_id, None, f'current_quantity: stored {current}, expected {expected[oil_type_id]}'))
+        total = ledger.get(oil_type_id) or ZERO
+        if total != expected[oil_type_id]:
+            problems.append((oil_type_id, None, f'ledger: total {total}, expected {expected[oil_type_id]}'))
+    return problems
@@ -0,0 +1,108 @@
+"""Two-way sync between sales/purchases and their internal vehicle movement.
+
+Only the transport fields are shared. After a save, the fields that differ
+from the values the row was loaded with are written to the other side with a
+queryset ``update()``. ``update()`` sends no signals, so a save never bounces
+back, and an unchanged save costs no extra queries. The two sides are matched
+through the movement's ``sale``/``purchase`` foreign keys. ``Sale``,
+``Purchase`` and ``VehicleMovement`` save inside a transaction, so both sides
+change together. The updates go through ``facts.update()``, which keeps the
+daily facts of the driver and freight columns.
+"""
+import threading
+from contextlib import contextmanager
+
+from django.utils import timezone
+
+from . import facts, search
+from .models import Purchase, Sale
+from .models_vehicle import VehicleMovement
+
+SYNC_FIELDS = (
+    'driver_id', 'vehicle_number', 'loading_location', 'unloading_location',
+    'driver_freight', 'client_freight',
+)
+LINK_FIELDS = ('sale_id', 'purchase_id')
+
+_state = threading.local()
+
+
+@contextmanager
+def syncing():
+    """Ignore the signals of rows saved by the sync itself."""
+    previous = getattr(_state, 'active', False)
+    _state.active = True
+    try:
+        yield
+    finally:
+        _state.active = previous
+
+
+def is_syncing():
+    return getattr(_state, 'active', False)
+
+
+def changed_fields(old, new, fields):
+    if old is None:
+        return {field: new[field] for field in fields}
+    return {field: new[field] for field in fields if old.get(field) != new[field]}
+
+
+def operation_type_of(instance):
+    return 'sale' if isinstance(instance, Sale) else 'purchase'
+
+
+def movement_from_operation(instance):
+    """Push the transport fields of a saved sale/purchase to its internal movement."""
+    if is_syncing() or not (instance.driver_id and instance.vehicle_number):
+        return
+    operation_type = operation_type_of(instance)
+    values = instance.current_values()
+    changes = changed_fields(getattr(instance, '_loaded_values', None), values, SYNC_FIELDS)
+    if not changes:
+        return
+
+    updated = facts.update(VehicleMovement.objects.filter(
+        movement_type='internal', **{f'{operation_type}_id': instance.pk},
+    ), updated_at=timezone.now(), **changes)
+    if updated:
+        # update() sends no signals
+        search.mark('vehicle_movement', **{f'{operation_type}_id': instance.pk})
+        return
+
+    client_id = instance.client_id if operation_type == 'sale' else instance.supplier_id
+    if client_id is None or instance.oil_type_id is None:
+        # A movement needs a client and an oil type
+        return
+    with syncing():
+        VehicleMovement.objects.create(
+            movement_type='internal',
+            operation_type=operation_type,
+            operation_id=str(instance.pk),
+            **{f'{operation_type}_id': instance.pk},
+            date=instance.date,
+            client_id=client_id,
+            oil_type_id=instance.oil_type_id,
+            quantity=instance.quantity,
+            **{field: values[field] for field in SYNC_FIELDS},
+        )
+
+
+def operation_from_movement(instance):
+    """Push the transport fields of a saved internal movement to its sale/purchase."""
+    if is_syncing():
+        return
+    operation_pk = instance.sale_id or instance.purchase_id
+    if instance.movement_type != 'internal' or operation_pk is None:
+        return
+
+    old = getattr(instance, '_loaded_values', None)
+    values = instance.current_values()
+    if old is not None and any(old.get(field) != values[field] for field in LINK_FIELDS):
+        # Linked to another operation: it gets every field
+        old = None
+    changes = changed_fields(old, values, SYNC_FIELDS)
+    if changes:
+        model = Sale if instance.sale_id else Purchase
+        if facts.update(model.objects.filter(pk=operation_pk), **changes):
+            search.mark(search.kind_of(model), [operation_pk])
@@ -0,0 +1,34 @@
+"""Base test cases for the app's tests.
+
+The sequence allocator keeps blocks of business IDs (SL-, BU-, VEi-...) in
+memory, while the ``Sequence`` rows that reserved them are rolled back with
+each test; the base classes drop the cached blocks before the class data and
+before every test so IDs are numbered from the database again.
+
+Activity log records are written in the request rather than by the
+background flusher, so a test never races the flusher thread.
+"""
+from django.test import TestCase, TransactionTestCase, override_settings
+
+from .sequences import allocator
+
+
+class SequenceResetMixin:
+    @classmethod
+    def setUpClass(cls):
+        allocator.reset()
+        super().setUpClass()
+
+    def setUp(self):
+        allocator.reset()
+        super().setUp()
+
+
+@override_settings(ACTIVITY_LOG_ASYNC=False)
+class AccountsTestCase(SequenceResetMixin, TestCase):
+    pass
+
+
+@override_settings(ACTIVITY_LOG_ASYNC=False)
+class AccountsTransactionTestCase(SequenceResetMixin, TransactionTestCase):
+    pass
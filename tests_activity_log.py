@@ -0,0 +1,108 @@
+import datetime
+import time
+
+from django.test import override_settings
+from django.utils import timezone
+
+from accounts.activity_log import ActivityLogBuffer
+from accounts.models import ActivityLog, CustomUser
+from accounts.testcases import AccountsTransactionTestCase
+
+
+class RecordingBuffer(ActivityLogBuffer):
+    """Buffer that remembers the size of every batch it writes."""
+
+    def __init__(self):
+        super().__init__()
+        self.batches = []
+
+    def _write(self, batch):
+        self.batches.append(len(batch))
+        super()._write(batch)
+
+
+# The flusher thread writes with its own connection, so the test rows must be committed
+@override_settings(ACTIVITY_LOG_ASYNC=True, ACTIVITY_LOG_FLUSH_INTERVAL=1.0)
+class ActivityLogBufferTests(AccountsTransactionTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = CustomUser.objects.create_user(username='logger', password='testpass123')
+        self.buffer = RecordingBuffer()
+        self.addCleanup(self.buffer.close)
+
+    def put(self, count):
+        return [self.buffer.put(self.user.pk, 'GET', f'/page/{n}/') for n in range(count)]
+
+    def wait_for_flushed(self, count, timeout=5):
+        deadline = time.monotonic() + timeout
+        while self.buffer.flushed + self.buffer.failed < count:
+            if time.monotonic() > deadline:
+                self.fail(f'Only {self.buffer.flushed} of {count} records were written: {self.buffer.stats()}')
+            time.sleep(0.01)
+
+    @override_settings(ACTIVITY_LOG_BATCH_SIZE=3)
+    def test_full_batches_are_written_without_waiting(self):
+        started = time.monotonic()
+        self.put(6)
+        self.wait_for_flushed(6)
+        self.assertLess(time.monotonic() - started, 1.0)
+        self.assertEqual(self.buffer.batches, [3, 3])
+
+        self.put(1)
+        self.buffer.close()
+        self.assertEqual(self.buffer.batches, [3, 3, 1])
+        self.assertEqual(ActivityLog.objects.count(), 7)
+        self.assertEqual(self.buffer.stats(), {'queued': 7, 'flushed': 7, 'dropped': 0, 'failed': 0, 'pending': 0})
+
+    @override_settings(ACTIVITY_LOG_BATCH_SIZE=100, ACTIVITY_LOG_FLUSH_INTERVAL=0.2)
+    def test_partial_batch_is_written_after_the_interval(self):
+        started = time.monotonic()
+        self.put(2)
+        self.wait_for_flushed(2)
+        self.assertGreaterEqual(time.monotonic() - started, 0.2)
+        self.assertEqual(self.buffer.batches, [2])
+        self.assertEqual(ActivityLog.objects.filter(user=self.user).count(), 2)
+
+    @override_settings(ACTIVITY_LOG_BATCH_SIZE=100, ACTIVITY_LOG_FLUSH_INTERVAL=0.3)
+    def test_records_keep_the_time_they_were_queued(self):
+        before = timezone.now()
+        self.put(1)
+        after = timezone.now()
+        self.wait_for_flushed(1)
+        flushed_at = timezone.now()
+        timestamp = ActivityLog.objects.get().timestamp
+        self.assertTrue(before <= timestamp <= after)
+        self.assertGreaterEqual(flushed_at - timestamp, datetime.timedelta(seconds=0.3))
+
+    @override_settings(ACTIVITY_LOG_BATCH_SIZE=1, ACTIVITY_LOG_QUEUE_SIZE=2)
+    def test_full_queue_drops_records(self):
+        # Hold the writer: the thread takes one record and waits, two more fill the queue
+        with self.buffer._write_lock:
+            results = self.put(10)
+        self.assertIn(False, results)
+        self.assertLessEqual(results.count(True), 3)
+        self.buffer.close()
+        stats = self.buffer.stats()
+        self.assertEqual((stats['queued'], stats['dropped']), (results.count(True), results.count(False)))
+        self.assertEqual(stats['flushed'], stats['queued'])
+        self.assertEqual(ActivityLog.objects.count(), stats['flushed'])
+
+    @override_settings(ACTIVITY_LOG_BATCH_SIZE=1, ACTIVITY_LOG_QUEUE_SIZE=1,
+                       ACTIVITY_LOG_OVERFLOW='block', ACTIVITY_LOG_BLOCK_TIMEOUT=0.05)
+    def test_block_policy_waits_then_drops(self):
+        with self.buffer._write_lock:
+            self.put(3)
+            started = time.monotonic()
+            self.assertFalse(self.buffer.put(self.user.pk, 'GET', '/late/'))
+            self.assertGreaterEqual(time.monotonic() - started, 0.05)
+        self.buffer.close()
+        self.assertGreaterEqual(self.buffer.dropped, 1)
+        self.assertEqual(self.buffer.flushed + self.buffer.dropped, 4)
+
+    @override_settings(ACTIVITY_LOG_ASYNC=False)
+    def test_synchronous_writes_and_failures_are_counted(self):
+        self.assertTrue(self.buffer.put(self.user.pk, 'GET', '/now/'))
+        self.assertEqual(ActivityLog.objects.get().details, '/now/')
+        with self.assertLogs('accounts.activity_log', 'ERROR'):
+            self.buffer.put(self.user.pk + 1000, 'GET', '/nobody/')
+        self.assertEqual(self.buffer.stats(), {'queued': 2, 'flushed': 1, 'dropped': 0, 'failed': 1, 'pending': 0})
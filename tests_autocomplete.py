@@ -0,0 +1,107 @@
+import datetime
+
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from accounts import search
+from accounts.forms import SaleForm
+from accounts.models import Client, CustomUser, Driver, OilType, Sale
+from accounts.testcases import AccountsTestCase
+
+
+class AutocompleteTests(AccountsTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = CustomUser.objects.create_user(username='lookup', password='testpass123', role='admin')
+        for name in ['Ahmed Ali', 'Mohamed Ahmed', 'Sara Hassan']:
+            Client.objects.create(name=name, address='-', phone_number='-')
+        cls.oil_type = OilType.objects.create(name='Diesel', properties='-')
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        # Documents written by an earlier test's commit callbacks were rolled back with it
+        search.rebuild()
+        self.client.force_login(self.admin)
+
+    def get(self, source, q='', **headers):
+        return self.client.get(reverse('api_autocomplete', args=[source]), {'q': q}, **headers)
+
+    def texts(self, source, q):
+        return sorted(option['text'].split(' (')[0] for option in self.get(source, q).json()['results'])
+
+    def test_every_word_matches_a_word_prefix(self):
+        self.assertEqual(self.texts('clients', 'ahm'), ['Ahmed Ali', 'Mohamed Ahmed'])
+        self.assertEqual(self.texts('clients', 'ali ahm'), ['Ahmed Ali'])
+
+    def test_mid_word_matches_fill_the_remaining_places(self):
+        self.assertEqual(self.texts('clients', 'assan'), ['Sara Hassan'])
+
+    def test_options_are_limited(self):
+        Client.objects.bulk_create(Client(client_id=f'T-{i:02}', name=f'Bulk {i:02}', address='-', phone_number='-')
+                                   for i in range(30))
+        results = self.get('clients').json()['results']
+        self.assertEqual(len(results), 20)
+        with self.settings(AUTOCOMPLETE_LIMIT=5):
+            cache.clear()
+            self.assertEqual(len(self.get('clients', 'bulk').json()['results']), 5)
+
+    def test_etag_and_cache_control(self):
+        response = self.get('oil_types', 'die')
+        self.assertEqual(response.json()['results'], [{'id': self.oil_type.pk, 'text': 'Diesel'}])
+        self.assertIn('private', response['Cache-Control'])
+        self.assertIn('max-age=60', response['Cache-Control'])
+
+        self.assertEqual(self.get('oil_types', 'die', HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            OilType.objects.create(name='Diesel Plus', properties='-')
+        response = self.get('oil_types', 'die', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['results']), 2)
+
+    def test_unknown_source(self):
+        self.assertEqual(self.get('users').status_code, 404)
+
+
+class AutocompleteWidgetTests(AccountsTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = CustomUser.objects.create_user(username='forms', password='testpass123', role='admin')
+        cls.client_obj = Client.objects.create(name='Nile', address='-', phone_number='-')
+        cls.oil_type = OilType.objects.create(name='Diesel', properties='-')
+
+    def test_only_the_selected_option_is_rendered(self):
+        Client.objects.create(name='Delta', address='-', phone_number='-')
+        html = str(SaleForm(initial={'client': self.client_obj.pk})['client'])
+        self.assertIn(f'data-autocomplete-url="{reverse("api_autocomplete", args=["clients"])}"', html)
+        self.assertIn(f'<option value="{self.client_obj.pk}" selected>', html)
+        self.assertNotIn('Delta', html)
+        self.assertNotIn('Diesel', str(SaleForm()['oil_type']))
+
+    def test_form_pages_render_in_constant_queries(self):
+        self.client.force_login(self.admin)
+        sale = Sale.objects.create(date=datetime.date(2025, 1, 1), client=self.client_obj, oil_type=self.oil_type,
+                                   quantity=1, price=1, amount=1)
+        urls = [reverse('sale_create'), reverse('sale_update', args=[sale.pk]),
+                reverse('purchase_create'), reverse('vehicle_movement_create_external')]
+
+        def counts():
+            result = []
+            for url in urls:
+                with CaptureQueriesContext(connection) as queries:
+                    self.assertEqual(self.client.get(url).status_code, 200)
+                result.append(len(queries))
+            return result
+
+        # The first requests also write the activity log entries
+        counts()
+        before = counts()
+        Client.objects.bulk_create(Client(client_id=f'T-{i:03}', name=f'Client {i}', address='-', phone_number='-')
+                                   for i in range(100))
+        Driver.objects.bulk_create(Driver(driver_id=f'T-{i:03}', name=f'Driver {i}', license_number=f'L{i}')
+                                   for i in range(100))
+        self.assertEqual(counts(), before)
+        self.assertNotContains(self.client.get(reverse('purchase_create')), 'Client 1')
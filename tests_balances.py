@@ -0,0 +1,131 @@
+import datetime
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from accounts.balances import BalanceChange, InsufficientBalance, apply_change, apply_changes
+from accounts.models import BalanceChangeLog, Client, CustomUser, Treasury
+from accounts.testcases import AccountsTestCase, AccountsTransactionTestCase
+
+
+class BalanceLedgerTests(AccountsTestCase):
+    def setUp(self):
+        super().setUp()
+        self.first = Client.objects.create(name='First', address='-', phone_number='-', balance=Decimal('100.00'))
+        self.second = Client.objects.create(name='Second', address='-', phone_number='-', balance=Decimal('10.00'))
+
+    def test_change_is_logged_with_previous_and_new_balance(self):
+        log = apply_change(self.first.pk, Decimal('-40.00'), notes='withdrawal', allow_overdraft=False)
+        self.first.refresh_from_db()
+        self.assertEqual(self.first.balance, Decimal('60.00'))
+        self.assertEqual((log.previous_balance, log.new_balance, log.change_amount),
+                         (Decimal('100.00'), Decimal('60.00'), Decimal('-40.00')))
+
+    def test_overdraft_is_refused_without_changes(self):
+        with self.assertRaises(InsufficientBalance):
+            apply_change(self.second.pk, Decimal('-10.01'), allow_overdraft=False)
+        self.second.refresh_from_db()
+        self.assertEqual(self.second.balance, Decimal('10.00'))
+        self.assertFalse(BalanceChangeLog.objects.exists())
+
+    def test_batch_updates_every_client_in_one_statement(self):
+        changes = [
+            BalanceChange(self.first.pk, Decimal('5.00')),
+            BalanceChange(self.second.pk, Decimal('-10.00'), allow_overdraft=False),
+            BalanceChange(self.first.pk, Decimal('-25.00'), allow_overdraft=False),
+        ]
+        with CaptureQueriesContext(connection) as queries:
+            logs = apply_changes(changes)
+        updates = [query for query in queries.captured_queries if query['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual([(log.previous_balance, log.new_balance) for log in logs], [
+            (Decimal('100.00'), Decimal('105.00')),
+            (Decimal('10.00'), Decimal('0.00')),
+            (Decimal('105.00'), Decimal('80.00')),
+        ])
+
+    def test_batch_is_all_or_nothing(self):
+        with self.assertRaises(InsufficientBalance) as raised:
+            apply_changes([
+                BalanceChange(self.first.pk, Decimal('5.00')),
+                BalanceChange(self.second.pk, Decimal('-11.00'), allow_overdraft=False),
+            ])
+        self.assertEqual(raised.exception.client_ids, [self.second.pk])
+        self.assertEqual(Client.objects.get(pk=self.first.pk).balance, Decimal('100.00'))
+
+
+class TreasuryBalanceViewTests(AccountsTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = CustomUser.objects.create_user(username='cashier', password='testpass123', role='admin')
+        self.client.force_login(self.user)
+        self.client_obj = Client.objects.create(name='Client', address='-', phone_number='-', balance=Decimal('50.00'))
+
+    def form_data(self, **overrides):
+        data = {
+            'date': datetime.date.today().isoformat(),
+            'description': '-',
+            'transaction_type': 'expense',
+            'paid_amount': '30.00',
+            'payment_method': 'cash',
+            'source': 'client',
+            'record_id': self.client_obj.pk,
+        }
+        data.update(overrides)
+        return data
+
+    def test_movement_and_balance_change_are_saved_together(self):
+        response = self.client.post(reverse('treasury_create'), self.form_data())
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Treasury.objects.get().related_client, self.client_obj)
+        self.assertEqual(Client.objects.get(pk=self.client_obj.pk).balance, Decimal('20.00'))
+        self.assertEqual(BalanceChangeLog.objects.get().user, self.user)
+
+    def test_editing_a_movement_replaces_its_balance_change(self):
+        self.client.post(reverse('treasury_create'), self.form_data())
+        movement = Treasury.objects.get()
+        self.assertEqual(Client.objects.get(pk=self.client_obj.pk).balance, Decimal('20.00'))
+
+        # 30 is given back before the new 45 is taken, so the edit is within the balance
+        response = self.client.post(reverse('treasury_update', args=[movement.pk]), self.form_data(paid_amount='45.00'))
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Client.objects.get(pk=self.client_obj.pk).balance, Decimal('5.00'))
+        self.assertEqual(BalanceChangeLog.objects.count(), 3)
+
+
+class BalanceConcurrencyTests(AccountsTransactionTestCase):
+    workers = 20
+    rounds = 10
+
+    def test_concurrent_changes_lose_no_updates(self):
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest('Shared-cache in-memory SQLite fails concurrent writers instead of waiting; keep DATABASES["default"]["TEST"]["NAME"] a file')
+        client = Client.objects.create(name='Busy', address='-', phone_number='-', balance=Decimal('0.00'))
+
+        def work(worker):
+            refused = 0
+            try:
+                for _ in range(self.rounds):
+                    if worker % 2:
+                        apply_change(client.pk, Decimal('3.00'))
+                    else:
+                        try:
+                            apply_change(client.pk, Decimal('-2.00'), allow_overdraft=False)
+                        except InsufficientBalance:
+                            refused += 1
+                return refused
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            refused = sum(pool.map(work, range(self.workers)))
+
+        deposits = self.workers // 2 * self.rounds
+        withdrawals = self.workers // 2 * self.rounds - refused
+        client.refresh_from_db()
+        self.assertEqual(client.balance, Decimal('3.00') * deposits - Decimal('2.00') * withdrawals)
+        self.assertEqual(BalanceChangeLog.objects.filter(client=client).count(), deposits + withdrawals)
+        self.assertFalse(BalanceChangeLog.objects.filter(new_balance__lt=0).exists())
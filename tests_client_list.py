@@ -0,0 +1,90 @@
+import datetime
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db import connection
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.balances import apply_change
+from accounts.models import Client, CustomUser
+from accounts.pagination import KeysetPaginator
+from accounts.testcases import AccountsTestCase
+
+
+class ClientListTests(AccountsTestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        user = CustomUser.objects.create_user(username='clients', password='testpass123', role='admin')
+        self.client.force_login(user)
+        created = timezone.make_aware(datetime.datetime(2025, 1, 1, 12))
+        Client.objects.bulk_create(
+            Client(client_id=f'T-{i:03}', name=f'Client {i % 40:02}', address='-', phone_number='-',
+                   balance=Decimal(i % 3 - 1), created_at=created + datetime.timedelta(days=i))
+            for i in range(120)
+        )
+        self.url = reverse('client_list')
+
+    def walk(self, params=None):
+        names, cursor = [], None
+        while True:
+            response = self.client.get(self.url, dict(params or {}, **({'cursor': cursor} if cursor else {})))
+            page = response.context['page_obj']
+            names.extend((client.name, client.pk) for client in page)
+            if not page.has_next():
+                return names, response
+            cursor = page.next_cursor
+
+    def test_pages_follow_name_then_id(self):
+        rows, _ = self.walk()
+        self.assertEqual(rows, list(Client.objects.order_by('name', 'pk').values_list('name', 'pk')))
+
+    def test_previous_cursor_returns_the_same_page(self):
+        first = self.client.get(self.url).context['page_obj']
+        second = self.client.get(self.url, {'cursor': first.next_cursor}).context['page_obj']
+        back = self.client.get(self.url, {'cursor': second.previous_cursor}).context['page_obj']
+        self.assertEqual(list(back), list(first))
+        self.assertFalse(first.has_previous())
+        self.assertTrue(back.has_next())
+
+    def test_count_is_cached_until_a_client_is_added(self):
+        # session, user, count, page, activity log
+        with self.assertNumQueries(5):
+            response = self.client.get(self.url)
+        self.assertEqual(response.context['total_count'], 120)
+        self.assertEqual(len(response.context['clients']), 50)
+        # The count comes from the cache (and the activity log entry is only written once)
+        with self.assertNumQueries(3):
+            self.client.get(self.url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Client.objects.create(name='New', address='-', phone_number='-')
+        self.assertEqual(self.client.get(self.url).context['total_count'], 121)
+
+    def test_filters(self):
+        response = self.client.get(self.url, {'balance': 'positive'})
+        self.assertEqual(response.context['total_count'], 40)
+        response = self.client.get(self.url, {'created_from': '2025-01-11', 'created_to': '2025-01-20'})
+        self.assertEqual(response.context['total_count'], 10)
+
+    def test_balance_changes_refresh_the_balance_counts(self):
+        self.assertEqual(self.client.get(self.url, {'balance': 'zero'}).context['total_count'], 40)
+        client = Client.objects.filter(balance=0).first()
+        with self.captureOnCommitCallbacks(execute=True):
+            apply_change(client.pk, Decimal('5'))
+        self.assertEqual(self.client.get(self.url, {'balance': 'zero'}).context['total_count'], 39)
+
+    def test_invalid_cursor(self):
+        self.assertEqual(self.client.get(self.url, {'cursor': 'nonsense'}).status_code, 404)
+
+    def test_deep_page_uses_the_index(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('Plans are checked with SQLite EXPLAIN QUERY PLAN')
+        paginator = KeysetPaginator(Client.objects.all(), ['name', 'pk'], 50)
+        cursor = paginator.page().next_cursor
+        direction, values = paginator.decode(cursor)
+        queryset = Client.objects.filter(paginator._after(values, False)).order_by('name', 'pk')[:51]
+        plan = queryset.explain()
+        self.assertIn('client_name_idx', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
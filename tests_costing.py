@@ -0,0 +1,135 @@
+import datetime
+from decimal import Decimal
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from accounts.costing import check_costs, margin_report, rebuild_costs
+from accounts.models import Client, CustomUser, OilType, Purchase, Sale
+from accounts.models_stock import StockSnapshot
+from accounts.testcases import AccountsTestCase
+
+
+class CostingTests(AccountsTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client_obj = Client.objects.create(name='Client', address='-', phone_number='-')
+        self.oil_type = OilType.objects.create(name='Oil', properties='-')
+        self.first = self.purchase(datetime.date(2025, 1, 1), '10', '5.00')
+        self.early_sale = self.sale(datetime.date(2025, 1, 2), '4', '9.00')
+        self.purchase(datetime.date(2025, 1, 3), '10', '7.00')
+        self.late_sale = self.sale(datetime.date(2025, 1, 4), '2', '9.00')
+
+    def purchase(self, date, quantity, price, oil_type=None):
+        return Purchase.objects.create(date=date, supplier=self.client_obj, oil_type=oil_type or self.oil_type,
+                                       quantity=Decimal(quantity), price=Decimal(price))
+
+    def sale(self, date, quantity, price):
+        return Sale.objects.create(date=date, client=self.client_obj, oil_type=self.oil_type,
+                                   quantity=Decimal(quantity), price=Decimal(price))
+
+    def costs(self, sale):
+        return Sale.objects.values_list('unit_cost', 'cost_amount', 'margin').get(pk=sale.pk)
+
+    def test_sales_are_costed_at_the_weighted_average(self):
+        self.assertEqual(self.costs(self.early_sale), (Decimal('5.0000'), Decimal('20.00'), Decimal('16.00')))
+        # (6 left at 5 + 10 at 7) / 16
+        self.assertEqual(self.costs(self.late_sale), (Decimal('6.2500'), Decimal('12.50'), Decimal('5.50')))
+        self.assertEqual(self.late_sale.margin, Decimal('5.50'))
+        self.assertEqual(check_costs(), [])
+
+    def test_back_dated_edits_recompute_the_suffix(self):
+        self.first.price = Decimal('6.00')
+        self.first.save()
+        self.assertEqual(self.costs(self.early_sale)[1], Decimal('24.00'))
+        # (6 at 6 + 10 at 7) / 16
+        self.assertEqual(self.costs(self.late_sale)[0], Decimal('6.6250'))
+
+        self.early_sale.quantity = Decimal('8')
+        self.early_sale.save()
+        # (2 at 6 + 10 at 7) / 12
+        self.assertEqual(self.costs(self.late_sale)[0], Decimal('6.8333'))
+
+        self.first.delete()
+        self.assertEqual(self.costs(self.early_sale)[0], Decimal('0.0000'))
+        self.assertEqual(self.costs(self.late_sale)[0], Decimal('7.0000'))
+        self.assertEqual(check_costs(), [])
+
+    def test_a_new_price_only_moves_the_margin(self):
+        self.late_sale.price = Decimal('10.00')
+        with CaptureQueriesContext(connection) as queries:
+            self.late_sale.save()
+        self.assertFalse([q for q in queries if q['sql'].startswith('UPDATE "accounts_stocksnapshot"')])
+        self.assertEqual(self.costs(self.late_sale), (Decimal('6.2500'), Decimal('12.50'), Decimal('7.50')))
+
+    def test_saving_a_stale_instance_keeps_the_stamped_cost(self):
+        stale = Sale.objects.get(pk=self.late_sale.pk)
+        self.first.price = Decimal('6.00')
+        self.first.save()
+        stale.description = 'edited'
+        stale.save()
+        self.assertEqual(self.costs(self.late_sale)[0], Decimal('6.6250'))
+
+    def test_recent_rows_do_not_read_the_history(self):
+        def latest_purchase_queries(date):
+            with CaptureQueriesContext(connection) as queries:
+                self.purchase(date, '1', '8.00')
+            return len(queries)
+
+        before = latest_purchase_queries(datetime.date(2026, 1, 1))
+        start = datetime.date(2025, 2, 1)
+        for day in range(30):
+            self.purchase(start + datetime.timedelta(days=day), '5', '6.00')
+        self.assertEqual(latest_purchase_queries(datetime.date(2026, 2, 1)), before)
+
+    def test_rebuild_and_check(self):
+        StockSnapshot.objects.update(average_cost=0)
+        Sale.objects.update(unit_cost=None)
+        self.assertTrue(check_costs())
+        rebuild_costs()
+        self.assertEqual(check_costs(), [])
+        self.assertEqual(self.costs(self.late_sale)[0], Decimal('6.2500'))
+
+    def test_margin_report_sums_the_stamped_sales(self):
+        other = OilType.objects.create(name='Another', properties='-')
+        self.purchase(datetime.date(2025, 2, 1), '10', '3.00', oil_type=other)
+        Sale.objects.create(date=datetime.date(2025, 2, 2), client=self.client_obj, oil_type=other,
+                            quantity=Decimal('5'), price=Decimal('4.00'))
+        rows = list(margin_report('month'))
+        self.assertEqual([(row['period'], row['oil_type__name'], row['sales'], row['cost'], row['margin'], row['margin_rate'])
+                          for row in rows], [
+            (datetime.date(2025, 1, 1), 'Oil', Decimal('54.00'), Decimal('32.50'), Decimal('21.50'), Decimal('39.81')),
+            (datetime.date(2025, 2, 1), 'Another', Decimal('20.00'), Decimal('15.00'), Decimal('5.00'), Decimal('25.00')),
+        ])
+        self.assertEqual(len(list(margin_report('day', date_from=datetime.date(2025, 1, 3)))), 2)
+
+
+class MarginReportViewTests(AccountsTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = CustomUser.objects.create_user(username='margins', password='testpass123', role='admin')
+        cls.client_obj = Client.objects.create(name='Client', address='-', phone_number='-')
+        cls.oil_type = OilType.objects.create(name='Oil', properties='-')
+
+    def test_report_reads_one_aggregate(self):
+        self.client.force_login(self.admin)
+        url = reverse('margin_report')
+        params = {'period': 'day', 'date_from': '2025-01-01', 'date_to': ''}
+        # The first request also writes the activity log entry
+        self.client.get(url, params)
+        for day in range(1, 11):
+            date = datetime.date(2025, 1, day)
+            Purchase.objects.create(date=date, supplier=self.client_obj, oil_type=self.oil_type,
+                                    quantity=Decimal('10'), price=Decimal('5.00'))
+            Sale.objects.create(date=date, client=self.client_obj, oil_type=self.oil_type,
+                                quantity=Decimal('5'), price=Decimal('8.00'))
+        # session, user, report
+        with self.assertNumQueries(3):
+            response = self.client.get(url, params)
+        self.assertEqual(len(response.context['rows']), 10)
+        self.assertEqual(response.context['total_margin'], Decimal('150.00'))
+
+    def test_admin_only(self):
+        self.client.force_login(CustomUser.objects.create_user(username='viewer', password='testpass123', role='user'))
+        self.assertEqual(self.client.get(reverse('margin_report')).status_code, 403)
@@ -0,0 +1,91 @@
+import datetime
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.dashboard import kpis
+from accounts.models import Client, CustomUser, Driver, OilType, Purchase, Sale, Treasury
+from accounts.testcases import AccountsTestCase
+
+
+class DashboardTests(AccountsTestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.today = timezone.localdate()
+        self.user = CustomUser.objects.create_user(username='dashboard', password='testpass123', role='user')
+        self.client_obj = Client.objects.create(name='Client', address='-', phone_number='-', balance=Decimal('500'))
+        self.poor = Client.objects.create(name='Poor', address='-', phone_number='-', balance=Decimal('10'))
+        self.driver = Driver.objects.create(name='Driver', license_number='L1', vehicle_number='V1')
+        self.oil_type = OilType.objects.create(name='Oil', properties='-')
+        self.sale(self.today, '2', '10.00')
+        Purchase.objects.create(date=self.today, supplier=self.client_obj, oil_type=self.oil_type,
+                                quantity=Decimal('10'), price=Decimal('5.00'))
+        Treasury.objects.create(date=self.today, description='in', transaction_type='income', payment_method='cash',
+                                movement_source='other', paid_amount=Decimal('70.00'))
+        Treasury.objects.create(date=self.today, description='out', transaction_type='expense', payment_method='cash',
+                                movement_source='other', paid_amount=Decimal('30.00'))
+
+    def sale(self, date, quantity, price):
+        return Sale.objects.create(date=date, client=self.client_obj, oil_type=self.oil_type, quantity=Decimal(quantity),
+                                   price=Decimal(price), driver=self.driver, vehicle_number='V1',
+                                   driver_freight=Decimal('40'), client_freight=Decimal('60'))
+
+    def test_figures_come_from_the_facts(self):
+        figures = kpis()
+        self.assertEqual(figures['sales']['today']['amount'], Decimal('20.00'))
+        self.assertEqual(figures['purchases']['month']['quantity'], Decimal('10.000'))
+        self.assertEqual(figures['treasury']['month']['paid_in'], Decimal('70.00'))
+        self.assertEqual(figures['treasury']['net'], Decimal('40.00'))
+        self.assertEqual([row['name'] for row in figures['top_clients']], ['Client', 'Poor'])
+        self.assertEqual([(row['driver_name'], row['count']) for row in figures['trips']], [('Driver', 1)])
+        # Last month is not part of this month's figures
+        last_month = self.today.replace(day=1) - datetime.timedelta(days=1)
+        self.sale(last_month, '5', '10.00')
+        self.assertEqual(kpis(last_month)['sales']['today']['amount'], Decimal('50.00'))
+        self.assertEqual(kpis(self.today)['sales']['month']['count'], 1)
+
+    def test_saves_invalidate_the_cached_figures(self):
+        self.assertEqual(kpis()['sales']['today']['count'], 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.sale(self.today, '3', '10.00')
+        self.assertEqual(kpis()['sales']['today']['count'], 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.poor.balance = Decimal('900')
+            self.poor.save()
+        self.assertEqual(kpis()['top_clients'][0]['name'], 'Poor')
+
+    def test_a_cached_page_load_reads_no_tables(self):
+        self.client.force_login(self.user)
+        # The first request also writes the activity log entry and fills the cache
+        self.client.get(reverse('home'))
+        # session, user
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('home'))
+        self.assertEqual(response.context['kpis']['sales']['today']['amount'], Decimal('20.00'))
+        self.assertContains(response, 'رحلات السائقين هذا الشهر')
+
+    def test_treasury_and_client_figures_follow_the_page_roles(self):
+        figures = kpis(user=self.user)
+        self.assertNotIn('treasury', figures)
+        self.assertNotIn('top_clients', figures)
+        self.assertEqual(figures['sales']['today']['amount'], Decimal('20.00'))
+        figures = kpis(user=CustomUser(role='transaction_manager'))
+        self.assertEqual(figures['treasury']['net'], Decimal('40.00'))
+        self.assertNotIn('top_clients', figures)
+        figures = kpis(user=CustomUser(role='client_manager'))
+        self.assertNotIn('treasury', figures)
+        self.assertEqual(figures['top_clients'][0]['name'], 'Client')
+        self.assertIn('treasury', kpis(user=CustomUser(role='admin')))
+
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('home'))
+        self.assertNotContains(response, 'صافي الخزينة للشهر')
+        self.assertNotContains(response, 'أعلى أرصدة العملاء')
+        self.client.force_login(CustomUser.objects.create_user(username='boss', password='testpass123', role='admin'))
+        response = self.client.get(reverse('home'))
+        self.assertContains(response, 'صافي الخزينة للشهر')
+        self.assertContains(response, 'أعلى أرصدة العملاء')
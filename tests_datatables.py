@@ -0,0 +1,92 @@
+import datetime
+from decimal import Decimal
+
+from django.urls import reverse
+
+from accounts.models import Client, CustomUser, Driver, OilType, Sale
+from accounts.testcases import AccountsTestCase
+
+
+def datatables_params(columns, **extra):
+    params = {'draw': '3', 'start': '0', 'length': '10'}
+    for index, name in enumerate(columns):
+        params[f'columns[{index}][data]'] = name
+    params.update(extra)
+    return params
+
+
+class DataTableEndpointTests(AccountsTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = CustomUser.objects.create_user(username='tables', password='testpass123', role='admin')
+        cls.client_obj = Client.objects.create(name='Nile', address='-', phone_number='-')
+        cls.oil_type = OilType.objects.create(name='Diesel', properties='-')
+        Sale.objects.bulk_create(
+            Sale(date=datetime.date(2025, 1, 1) + datetime.timedelta(days=i), client=cls.client_obj,
+                 oil_type=cls.oil_type, quantity=Decimal(i), price=Decimal('2'), amount=Decimal(i * 2))
+            for i in range(30)
+        )
+        Driver.objects.bulk_create(
+            Driver(driver_id=f'T-{i:02}', name=f'Driver {i:02}', license_number=f'L{i}', vehicle_number=f'V{i}',
+                   license_type='second' if i % 3 else 'first')
+            for i in range(12)
+        )
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.admin)
+
+    def get(self, name, params):
+        return self.client.get(reverse('api_datatable', args=[name]), params)
+
+    def test_page_holds_only_the_requested_rows_and_columns(self):
+        response = self.get('sales', datatables_params(['sale_id', 'date', 'client_name', 'amount'], start='10'))
+        data = response.json()
+        self.assertEqual((data['draw'], data['recordsTotal'], data['recordsFiltered']), (3, 30, 30))
+        self.assertEqual(len(data['data']), 10)
+        self.assertEqual(set(data['data'][0]), {'sale_id', 'date', 'client_name', 'amount'})
+        # Newest first by default
+        self.assertEqual(data['data'][0]['date'], '2025-01-20')
+        self.assertEqual(data['data'][0]['client_name'], 'Nile')
+
+    def test_ordering_by_a_requested_column(self):
+        params = datatables_params(['sale_id', 'quantity'], **{'order[0][column]': '1', 'order[0][dir]': 'asc'})
+        rows = self.get('sales', params).json()['data']
+        self.assertEqual([row['quantity'] for row in rows[:3]], ['0.000', '1.000', '2.000'])
+
+    def test_search_and_column_filters(self):
+        data = self.get('drivers', datatables_params(['name', 'license_type'], **{'search[value]': 'driver v1'})).json()
+        self.assertEqual(data['recordsTotal'], 12)
+        self.assertEqual(sorted(row['name'] for row in data['data']), ['Driver 01', 'Driver 10', 'Driver 11'])
+
+        params = datatables_params(['name', 'license_type'], **{'columns[1][search][value]': 'first'})
+        data = self.get('drivers', params).json()
+        self.assertEqual(data['recordsFiltered'], 4)
+        self.assertEqual(data['data'][0]['license_type_display'], 'أولى')
+
+    def test_one_count_without_filters(self):
+        # session, user, count, page, activity log
+        with self.assertNumQueries(5):
+            self.get('clients', datatables_params(['name', 'balance']))
+
+    def test_page_size_is_capped(self):
+        with self.settings(DATATABLES_MAX_LENGTH=5):
+            self.assertEqual(len(self.get('sales', datatables_params(['sale_id'], length='-1')).json()['data']), 5)
+
+    def test_permissions(self):
+        user = CustomUser.objects.create_user(username='viewer', password='testpass123', role='user')
+        self.client.force_login(user)
+        self.assertEqual(self.get('treasury', {}).status_code, 403)
+        self.assertEqual(self.get('sales', {}).status_code, 200)
+        self.assertEqual(self.get('missing', {}).status_code, 404)
+
+    def test_driver_rows_follow_the_driver_list_roles(self):
+        for role, status in (('transaction_manager', 403), ('vehicle_manager', 200)):
+            self.client.force_login(CustomUser.objects.create_user(username=role, password='testpass123', role=role))
+            self.assertEqual(self.client.get(reverse('driver_list')).status_code, status)
+            self.assertEqual(self.get('drivers', {}).status_code, status)
+
+    def test_driver_list_page_renders_no_rows(self):
+        response = self.client.get(reverse('driver_list'))
+        self.assertEqual(response.context['total_count'], 12)
+        self.assertNotContains(response, 'Driver 01')
@@ -0,0 +1,124 @@
+import csv
+import datetime
+import shutil
+import tempfile
+from decimal import Decimal
+
+from django.core.management import call_command
+from django.test import override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.export_jobs import claim_next_job, fail_lost_jobs, remove_expired, request_export, run_job
+from accounts.models import Client, CustomUser, Driver, OilType, Sale
+from accounts.models_export import ExportJob
+from accounts.models_vehicle import VehicleMovement
+from accounts.testcases import AccountsTestCase
+
+
+class ExportJobTests(AccountsTestCase):
+    def setUp(self):
+        super().setUp()
+        self.export_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.export_root, ignore_errors=True)
+        settings_override = override_settings(EXPORT_ROOT=self.export_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.user = CustomUser.objects.create_user(username='exporter', password='testpass123', role='admin')
+        self.client_obj = Client.objects.create(name='Client', address='-', phone_number='-')
+        driver = Driver.objects.create(name='Driver', license_number='L1', vehicle_number='V1')
+        self.oil_type = OilType.objects.create(name='Oil', properties='-')
+        for day in range(5):
+            date = datetime.date(2025, 1, 1) + datetime.timedelta(days=day)
+            VehicleMovement.objects.create(
+                date=date, client=self.client_obj, oil_type=self.oil_type, quantity=Decimal('5.000'),
+                driver=driver, vehicle_number='V1', loading_location='A', unloading_location='B',
+            )
+            Sale.objects.create(date=date, client=self.client_obj, oil_type=self.oil_type,
+                                quantity=Decimal('1.000'), price=Decimal('10.00'), sale_id=f'SL-{day:03d}')
+
+    def read_csv(self, job):
+        with open(job.file_path, encoding='utf-8-sig', newline='') as file:
+            return list(csv.reader(file))
+
+    def test_worker_writes_the_file_and_reports_progress(self):
+        job = request_export('vehicle_movements', 'csv', {'date_from': '2025-01-02', 'search': ''}, self.user)
+        self.assertEqual(job.params, {'date_from': '2025-01-02'})
+        call_command('run_export_worker', '--once', stdout=open('/dev/null', 'w'))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.total_rows, job.rows_written, job.progress), ('done', 4, 4, 100))
+        self.assertEqual(len(self.read_csv(job)), 1 + 4)
+
+    def test_identical_requests_reuse_the_artifact(self):
+        first = request_export('client_statement', 'csv', {'client_id': str(self.client_obj.pk)}, self.user)
+        self.assertEqual(request_export('client_statement', 'csv', {'client_id': str(self.client_obj.pk)}).pk, first.pk)
+        run_job(claim_next_job())
+        self.assertEqual(request_export('client_statement', 'csv', {'client_id': str(self.client_obj.pk)}).pk, first.pk)
+        self.assertNotEqual(request_export('client_statement', 'xlsx', {'client_id': str(self.client_obj.pk)}).pk, first.pk)
+
+        # Past the TTL a new job is queued and the old file is removed
+        ExportJob.objects.filter(pk=first.pk).update(finished_at=timezone.now() - datetime.timedelta(days=1))
+        self.assertNotEqual(request_export('client_statement', 'csv', {'client_id': str(self.client_obj.pk)}).pk, first.pk)
+        self.assertEqual(remove_expired(), 1)
+
+    def test_statement_export_rows(self):
+        job = run_job(request_export('client_statement', 'csv', {'client_id': self.client_obj.pk, 'date_from': '2025-01-03'}))
+        rows = self.read_csv(job)
+        self.assertEqual(rows[1][3], 'رصيد منقول')
+        self.assertEqual(rows[1][5], '20.00')
+        self.assertEqual(rows[-1][5], '50.00')
+
+    def test_failed_job_keeps_the_error(self):
+        job = run_job(request_export('client_statement', 'csv', {'client_id': 9999}))
+        self.assertEqual(job.status, 'failed')
+        self.assertTrue(job.error)
+
+    def test_request_status_and_download_views(self):
+        self.client.force_login(self.user)
+        response = self.client.post(reverse('export_job_create', args=['vehicle_movements']), {'export_format': 'xlsx'})
+        job = ExportJob.objects.get()
+        self.assertRedirects(response, reverse('export_job_detail', args=[job.pk]))
+        self.assertEqual(self.client.get(reverse('export_job_download', args=[job.pk])).status_code, 404)
+
+        run_job(claim_next_job())
+        status = self.client.get(reverse('export_job_detail', args=[job.pk]), HTTP_X_REQUESTED_WITH='XMLHttpRequest').json()
+        self.assertEqual(status['status'], 'done')
+        response = self.client.get(status['download_url'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Disposition'], f'attachment; filename="vehicle_movements-{job.pk}.xlsx"')
+        # Reading the stream closes the file; response.close() would also close the test's connection
+        self.assertTrue(b''.join(response.streaming_content).startswith(b'PK'))
+
+    def test_reuse_is_limited_to_the_requester_own_jobs(self):
+        params = {'client_id': str(self.client_obj.pk)}
+        first_user = CustomUser.objects.create_user(username='user1', password='testpass123', role='user')
+        second_user = CustomUser.objects.create_user(username='user2', password='testpass123', role='user')
+        first = request_export('client_statement', 'csv', params, first_user)
+        second = request_export('client_statement', 'csv', params, second_user)
+        self.assertNotEqual(second.pk, first.pk)
+        self.assertEqual(request_export('client_statement', 'csv', params, second_user).pk, second.pk)
+        # Admins see every job, so they may be handed any of them
+        self.assertIn(request_export('client_statement', 'csv', params, self.user).pk, [first.pk, second.pk])
+
+        self.client.force_login(second_user)
+        response = self.client.post(reverse('export_job_create', args=['client_statement']),
+                                    {'export_format': 'csv', **params})
+        self.assertRedirects(response, reverse('export_job_detail', args=[second.pk]))
+
+    def test_running_job_without_a_worker_is_failed_and_not_reused(self):
+        params = {'client_id': str(self.client_obj.pk)}
+        job = request_export('client_statement', 'csv', params, self.user)
+        self.assertEqual(claim_next_job().pk, job.pk)
+        self.assertEqual(request_export('client_statement', 'csv', params, self.user).pk, job.pk)
+        self.assertEqual(fail_lost_jobs(), 0)
+
+        ExportJob.objects.filter(pk=job.pk).update(heartbeat_at=timezone.now() - datetime.timedelta(hours=1))
+        replacement = request_export('client_statement', 'csv', params, self.user)
+        self.assertNotEqual(replacement.pk, job.pk)
+        call_command('run_export_worker', '--once', stdout=open('/dev/null', 'w'), stderr=open('/dev/null', 'w'))
+        job.refresh_from_db()
+        replacement.refresh_from_db()
+        self.assertEqual(job.status, 'failed')
+        self.assertTrue(job.error)
+        self.assertEqual(replacement.status, 'done')
@@ -0,0 +1,106 @@
+import datetime
+from decimal import Decimal
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+
+from accounts.facts import apply_new_rows, check_facts, rebuild_facts, summary
+from accounts.models import Client, Driver, OilType, Purchase, Sale, Treasury
+from accounts.models_facts import DailyFact
+from accounts.models_vehicle import VehicleMovement
+from accounts.testcases import AccountsTestCase
+
+
+class DailyFactTests(AccountsTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client_obj = Client.objects.create(name='Client', address='-', phone_number='-')
+        self.driver = Driver.objects.create(name='Driver', license_number='L1', vehicle_number='V1')
+        self.other_driver = Driver.objects.create(name='Other', license_number='L2', vehicle_number='V2')
+        self.oil_type = OilType.objects.create(name='Oil', properties='-')
+        start = datetime.date(2025, 1, 1)
+        for day in range(40):
+            date = start + datetime.timedelta(days=day)
+            Sale.objects.create(date=date, client=self.client_obj, oil_type=self.oil_type, quantity=Decimal('2.500'),
+                                price=Decimal('10.00'), driver=self.driver, vehicle_number='V1',
+                                driver_freight=Decimal('50'), client_freight=Decimal('80'))
+            if day % 5 == 0:
+                Purchase.objects.create(date=date, supplier=self.client_obj, oil_type=self.oil_type,
+                                        quantity=Decimal('10'), price=Decimal('7.00'),
+                                        loading_location='A', unloading_location='B')
+                Treasury.objects.create(date=date, description='payment', transaction_type='income',
+                                        payment_method='cash', movement_source='client_account',
+                                        paid_amount=Decimal('20.00'), related_client=self.client_obj)
+
+    def test_saves_and_deletes_keep_the_facts(self):
+        self.assertEqual(check_facts(), [])
+        # Every sale with a driver also has its internal movement
+        self.assertEqual(summary('freight')['total_count'], 40)
+
+        sale = Sale.objects.order_by('date').first()
+        sale.quantity = Decimal('4')
+        sale.date = datetime.date(2025, 3, 1)
+        sale.save()
+        movement = Treasury.objects.first()
+        movement.transaction_type = 'expense'
+        movement.save()
+        Purchase.objects.first().delete()
+        VehicleMovement.objects.create(movement_type='external', date=datetime.date(2025, 1, 5), client=self.client_obj,
+                                       oil_type=self.oil_type, quantity=Decimal('3'), driver=self.other_driver,
+                                       vehicle_number='V2', loading_location='A', unloading_location='B',
+                                       driver_freight=Decimal('30'), client_freight=Decimal('45'))
+        self.assertEqual(check_facts(), [])
+
+    def test_synced_updates_move_the_facts(self):
+        sale = Sale.objects.order_by('date').first()
+        sale.driver = self.other_driver
+        sale.driver_freight = Decimal('60')
+        sale.save()
+        # The internal movement was changed with update()
+        self.assertEqual(VehicleMovement.objects.get(sale=sale).driver, self.other_driver)
+        self.assertEqual(check_facts(), [])
+
+        movement = VehicleMovement.objects.get(sale=sale)
+        movement.client_freight = Decimal('90')
+        movement.save()
+        # ...and the sale here
+        self.assertEqual(Sale.objects.get(pk=sale.pk).client_freight, Decimal('90'))
+        self.assertEqual(check_facts(), [])
+
+    def test_bulk_created_rows_are_applied(self):
+        rows = Treasury.objects.bulk_create([
+            Treasury(date=datetime.date(2025, 1, 2), description='bulk', transaction_type='expense',
+                     payment_method='cash', movement_source='driver_account', paid_amount=Decimal('15.00'),
+                     related_driver=self.driver),
+        ])
+        self.assertTrue(check_facts())
+        apply_new_rows(Treasury, [row.current_values() for row in rows])
+        self.assertEqual(check_facts(), [])
+
+    def test_summary_reads_the_facts(self):
+        months = list(summary('sale', by=['client__name'], period='month'))
+        self.assertEqual([(row['period'], row['client__name'], row['total_count'], row['total_amount']) for row in months], [
+            (datetime.date(2025, 1, 1), 'Client', 31, Decimal('775.00')),
+            (datetime.date(2025, 2, 1), 'Client', 9, Decimal('225.00')),
+        ])
+        treasury = summary('treasury', date_from=datetime.date(2025, 2, 1))
+        self.assertEqual(treasury['total_paid_in'], Decimal('20.00'))
+
+    def test_rebuild_a_date_range(self):
+        DailyFact.objects.filter(date__month=1).update(amount=0)
+        DailyFact.objects.filter(date__month=2).delete()
+        february = (datetime.date(2025, 2, 1), datetime.date(2025, 2, 28))
+        self.assertTrue(check_facts(*february))
+        rebuild_facts(*february)
+        self.assertEqual(check_facts(*february), [])
+        # January was left alone
+        self.assertTrue(check_facts(datetime.date(2025, 1, 1), datetime.date(2025, 1, 31)))
+
+        with self.assertRaises(CommandError):
+            call_command('rebuild_daily_facts', '--check', stdout=StringIO())
+        call_command('rebuild_daily_facts', '--from', '2025-01-01', '--to', '2025-01-31', '--source', 'sale', stdout=StringIO())
+        self.assertEqual(check_facts(sources=['sale']), [])
+        self.assertTrue(check_facts(sources=['purchase']))
+        call_command('rebuild_daily_facts', '--from', '2025-01-01', '--to', '2025-01-31', stdout=StringIO())
+        self.assertEqual(check_facts(), [])
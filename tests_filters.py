@@ -0,0 +1,29 @@
+import datetime
+
+from django.urls import reverse
+
+from accounts.filters import parse_date_param
+from accounts.models import CustomUser
+from accounts.testcases import AccountsTestCase
+
+
+class DateFilterTests(AccountsTestCase):
+    def test_parse_date_param(self):
+        self.assertEqual(parse_date_param('2025-02-28'), datetime.date(2025, 2, 28))
+        for value in (None, '', 'yesterday', '2025-02-30', '2025-13-01'):
+            self.assertIsNone(parse_date_param(value))
+
+    def test_impossible_dates_are_ignored_by_the_lists_and_reports(self):
+        self.client.force_login(CustomUser.objects.create_user(username='dates', password='testpass123', role='admin'))
+        dates = {'date_from': '2025-02-30', 'date_to': '2025-02-31'}
+        for name, params in (
+            ('client_list', {'created_from': '2025-02-30', 'created_to': '2025-02-31'}),
+            ('margin_report', dates),
+            ('treasury_list', dates),
+            ('vehicle_movement_list', dates),
+            ('vehicle_movement_export', {**dates, 'format': 'csv'}),
+            ('freight_report', dates),
+            ('driver_settlement', dates),
+        ):
+            with self.subTest(name):
+                self.assertEqual(self.client.get(reverse(name), params).status_code, 200)
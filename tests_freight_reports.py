@@ -0,0 +1,127 @@
+import datetime
+from decimal import Decimal
+from unittest import mock
+
+from django.http import QueryDict
+from django.urls import reverse
+
+from accounts.freight_reports import driver_settlements, freight_margins
+from accounts.models import Client, CustomUser, Driver, OilType, Sale, Treasury
+from accounts.models_vehicle import VehicleMovement
+from accounts.testcases import AccountsTestCase
+from accounts.views_vehicle import DriverSettlementView, FreightReportView
+
+
+class FreightReportTests(AccountsTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = CustomUser.objects.create_user(username='freight', password='testpass123', role='admin')
+        cls.client_obj = Client.objects.create(name='Client', address='-', phone_number='-')
+        cls.other_client = Client.objects.create(name='Other client', address='-', phone_number='-')
+        cls.driver = Driver.objects.create(name='Driver', license_number='L1', vehicle_number='V1')
+        cls.other_driver = Driver.objects.create(name='Other driver', license_number='L2', vehicle_number='V2')
+        cls.oil_type = OilType.objects.create(name='Oil', properties='-')
+        # The sale's internal movement carries its freight
+        Sale.objects.create(date=datetime.date(2025, 1, 5), client=cls.client_obj, oil_type=cls.oil_type,
+                            quantity=Decimal('2'), price=Decimal('10.00'), driver=cls.driver, vehicle_number='V1',
+                            loading_location='A', unloading_location='B',
+                            driver_freight=Decimal('50'), client_freight=Decimal('80'))
+        for day, client, driver, driver_freight, client_freight in (
+            (6, cls.client_obj, cls.driver, '40', '50'),
+            (7, cls.other_client, cls.other_driver, '100', '200'),
+            (20, cls.other_client, cls.other_driver, '30', '30'),
+        ):
+            VehicleMovement.objects.create(movement_type='external', date=datetime.date(2025, 1, day), client=client,
+                                           oil_type=cls.oil_type, quantity=Decimal('3'), driver=driver,
+                                           vehicle_number=driver.vehicle_number, loading_location='A',
+                                           unloading_location='C', driver_freight=Decimal(driver_freight),
+                                           client_freight=Decimal(client_freight))
+        for amount, transaction_type in (('60.00', 'expense'), ('5.00', 'income')):
+            Treasury.objects.create(date=datetime.date(2025, 1, 10), description='driver', transaction_type=transaction_type,
+                                    payment_method='cash', movement_source='driver_account',
+                                    paid_amount=Decimal(amount), related_driver=cls.driver)
+
+    def margins(self, group, **params):
+        query = QueryDict(mutable=True)
+        query.update(params)
+        return list(freight_margins(query, group))
+
+    def test_margins_per_group(self):
+        drivers = self.margins('driver')
+        self.assertEqual([(row['driver__name'], row['trips'], row['total_client_freight'], row['total_driver_freight'],
+                           row['freight_margin'], row['margin_rate']) for row in drivers], [
+            ('Other driver', 2, Decimal('230.00'), Decimal('130.00'), Decimal('100.00'), Decimal('43.48')),
+            ('Driver', 2, Decimal('130.00'), Decimal('90.00'), Decimal('40.00'), Decimal('30.77')),
+        ])
+        routes = self.margins('route')
+        self.assertEqual([(row['loading_location'], row['unloading_location'], row['freight_margin']) for row in routes], [
+            ('A', 'C', Decimal('110.00')),
+            ('A', 'B', Decimal('30.00')),
+        ])
+        self.assertEqual([row['vehicle_number'] for row in self.margins('vehicle')], ['V2', 'V1'])
+        clients = self.margins('client', date_to='2025-01-10')
+        self.assertEqual([(row['client__name'], row['freight_margin']) for row in clients], [
+            ('Other client', Decimal('100.00')), ('Client', Decimal('40.00')),
+        ])
+        external = {row['driver__name']: row['freight_margin'] for row in self.margins('driver', type='external')}
+        self.assertEqual(external, {'Other driver': Decimal('100.00'), 'Driver': Decimal('10.00')})
+        with self.assertRaises(ValueError):
+            self.margins('oil_type')
+
+    def test_settlement_of_freight_owed_against_payments(self):
+        rows = list(driver_settlements())
+        self.assertEqual([(row['driver__name'], row['trips'], row['owed'], row['paid'], row['received'], row['due'])
+                          for row in rows], [
+            ('Other driver', 2, Decimal('130.00'), Decimal('0.00'), Decimal('0.00'), Decimal('130.00')),
+            ('Driver', 2, Decimal('90.00'), Decimal('60.00'), Decimal('5.00'), Decimal('35.00')),
+        ])
+        early = {row['driver__name']: row['due'] for row in driver_settlements(date_to=datetime.date(2025, 1, 6))}
+        self.assertEqual(early, {'Driver': Decimal('90.00')})
+
+    def test_report_views(self):
+        self.client.force_login(self.admin)
+        url = reverse('freight_report')
+        params = {'group': 'route', 'date_from': '2025-01-01', 'date_to': ''}
+        # The first request also writes the activity log entry
+        self.client.get(url, params)
+        # session, user, group count, page, totals
+        with self.assertNumQueries(5) as queries:
+            response = self.client.get(url, params)
+        self.assertIn('LIMIT', queries.captured_queries[3]['sql'])
+        self.assertEqual(len(response.context['rows']), 2)
+        self.assertEqual(response.context['freight_margin'], Decimal('140.00'))
+        self.assertEqual(response.context['margin_rate'], Decimal('38.89'))
+
+        response = self.client.get(url, {**params, 'format': 'csv'})
+        lines = b''.join(response.streaming_content).decode('utf-8').splitlines()
+        self.assertEqual(lines[1], 'A,C,3,9.000,280.00,170.00,110.00,39.29')
+
+        url = reverse('driver_settlement')
+        self.client.get(url, {'date_from': '2025-01-01'})
+        with self.assertNumQueries(5):
+            response = self.client.get(url, {'date_from': '2025-01-01'})
+        self.assertEqual(response.context['due'], Decimal('165.00'))
+        # The current year by default
+        self.assertEqual(list(self.client.get(url).context['rows']), [])
+        response = self.client.get(url, {'date_from': '2025-01-01', 'format': 'csv'})
+        self.assertEqual(len(b''.join(response.streaming_content).decode('utf-8').splitlines()), 3)
+
+    def test_pages_are_read_from_the_database_and_totals_cover_every_page(self):
+        self.client.force_login(self.admin)
+        with mock.patch.object(FreightReportView, 'paginate_by', 1):
+            response = self.client.get(reverse('freight_report'), {'group': 'driver', 'date_from': '2025-01-01', 'page': 2})
+        self.assertEqual([(row['driver__name'], row['margin_rate']) for row in response.context['rows']],
+                         [('Driver', Decimal('30.77'))])
+        self.assertEqual(response.context['paginator'].count, 2)
+        self.assertEqual(response.context['trips'], 4)
+        self.assertEqual(response.context['freight_margin'], Decimal('140.00'))
+
+        with mock.patch.object(DriverSettlementView, 'paginate_by', 1):
+            response = self.client.get(reverse('driver_settlement'), {'date_from': '2025-01-01', 'page': 2})
+        self.assertEqual([row['driver__name'] for row in response.context['rows']], ['Driver'])
+        self.assertEqual((response.context['trips'], response.context['due']), (4, Decimal('165.00')))
+
+    def test_admin_only(self):
+        self.client.force_login(CustomUser.objects.create_user(username='viewer', password='testpass123', role='user'))
+        self.assertEqual(self.client.get(reverse('freight_report')).status_code, 403)
+        self.assertEqual(self.client.get(reverse('driver_settlement')).status_code, 403)
@@ -0,0 +1,86 @@
+import datetime
+from decimal import Decimal
+from unittest import mock
+
+from django.urls import reverse
+
+from accounts import search
+from accounts.models import Client, CustomUser, Driver, OilType, Sale
+from accounts.models_vehicle import VehicleMovement
+from accounts.pagination import approximate_count
+from accounts.testcases import AccountsTestCase
+from accounts.views import SaleListView
+
+
+class CursorListTests(AccountsTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(username='lists', password='testpass123', role='admin')
+        cls.client_obj = Client.objects.create(name='Client', address='-', phone_number='-')
+        cls.driver = Driver.objects.create(name='Driver', license_number='L1', vehicle_number='V1')
+        cls.oil_type = OilType.objects.create(name='Oil', properties='-')
+        start = datetime.date(2025, 1, 1)
+        # Several rows per day so the pages have to break ties on the primary key
+        Sale.objects.bulk_create(
+            Sale(date=start + datetime.timedelta(days=i // 4), client=cls.client_obj, oil_type=cls.oil_type,
+                 quantity=Decimal('1'), price=Decimal('1'), amount=Decimal('1'))
+            for i in range(90)
+        )
+        VehicleMovement.objects.bulk_create(
+            VehicleMovement(movement_id=f'P-{i:03}', movement_type='external', date=start + datetime.timedelta(days=i // 10),
+                            client=cls.client_obj, oil_type=cls.oil_type, quantity=1, driver=cls.driver,
+                            vehicle_number='V1', loading_location='A', unloading_location='B')
+            for i in range(60)
+        )
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.user)
+
+    def walk(self, url, name, params=None):
+        rows, cursor, pages = [], None, []
+        while True:
+            response = self.client.get(url, dict(params or {}, **({'cursor': cursor} if cursor else {})))
+            page = response.context['page_obj']
+            rows.extend(obj.pk for obj in response.context[name])
+            pages.append(page)
+            if not page.has_next():
+                return rows, pages
+            cursor = page.next_cursor
+
+    def test_sales_walk_every_row_once_in_order(self):
+        rows, pages = self.walk(reverse('sale_list'), 'sales')
+        self.assertEqual(rows, list(Sale.objects.order_by('-date', '-pk').values_list('pk', flat=True)))
+        self.assertEqual(len(pages), 5)
+
+    def test_vehicle_movements_walk_back(self):
+        url = reverse('vehicle_movement_list')
+        rows, pages = self.walk(url, 'movements', {'type': 'external'})
+        self.assertEqual(rows, list(VehicleMovement.objects.order_by('-date', '-created_at', '-pk')
+                                    .values_list('pk', flat=True)))
+        back = self.client.get(url, {'type': 'external', 'cursor': pages[-1].previous_cursor})
+        self.assertEqual(list(back.context['page_obj']), list(pages[-2]))
+        self.assertNotIn('cursor', back.context['page_query'])
+
+    def test_search_falls_back_to_numbered_pages(self):
+        search.rebuild()
+        response = self.client.get(reverse('sale_list'), {'search': 'client', 'page': 2})
+        self.assertFalse(response.context['cursor_pagination'])
+        self.assertEqual(response.context['total_count'], 90)
+        self.assertEqual(response.context['page_obj'].number, 2)
+        self.assertEqual(response.context['paginator'].num_pages, 5)
+
+    def test_approximate_count_stops_at_the_limit(self):
+        self.assertEqual(approximate_count(Sale.objects.all(), 50), (50, True))
+        self.assertEqual(approximate_count(Sale.objects.filter(date__lt='2025-01-03'), 50), (8, False))
+
+    def test_estimated_count_is_marked(self):
+        response = self.client.get(reverse('sale_list'))
+        self.assertEqual((response.context['total_count'], response.context['count_is_estimate']), (90, False))
+        with mock.patch.object(SaleListView, 'approximate_count_limit', 50):
+            response = self.client.get(reverse('sale_list'))
+        self.assertEqual((response.context['total_count'], response.context['count_is_estimate']), (50, True))
+        self.assertContains(response, '50+')
+
+    def test_invalid_cursor(self):
+        self.assertEqual(self.client.get(reverse('sale_list'), {'cursor': 'nonsense'}).status_code, 404)
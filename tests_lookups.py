@@ -0,0 +1,105 @@
+import datetime
+import time
+from decimal import Decimal
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import override_settings
+from django.urls import reverse
+
+from accounts import lookups
+from accounts.models import Client, CustomUser, Driver, OilType, Sale
+from accounts.testcases import AccountsTestCase
+
+
+class LookupTests(AccountsTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(username='lookups', password='testpass123', role='admin')
+        cls.client_obj = Client.objects.create(name='Nile', address='-', phone_number='-')
+        cls.oil_type = OilType.objects.create(name='Diesel', properties='-')
+        cls.driver = Driver.objects.create(name='Hassan', license_number='L1', vehicle_number='V1')
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        for lookup in lookups.LOOKUPS.values():
+            lookup.reset()
+
+    def test_levels(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(lookups.DRIVERS.get(self.driver.pk)['vehicle_number'], 'V1')
+        with self.assertNumQueries(0):
+            lookups.DRIVERS.get(str(self.driver.pk))
+            # Another process shares the cache but not the dict
+            lookups.DRIVERS.reset()
+            lookups.DRIVERS.get(self.driver.pk)
+            lookups.DRIVERS.get(self.driver.pk)
+        self.assertEqual(lookups.DRIVERS.stats(), {'local': 1, 'shared': 1, 'miss': 0})
+
+    def test_missing_rows_are_cached(self):
+        with self.assertNumQueries(1):
+            self.assertIsNone(lookups.CLIENTS.get(999))
+            self.assertIsNone(lookups.CLIENTS.get(999))
+        self.assertIsNone(lookups.CLIENTS.get('abc'))
+        self.assertEqual(lookups.stats()['clients'], {'local': 1, 'shared': 0, 'miss': 2})
+
+    def test_saving_invalidates_every_level(self):
+        lookups.DRIVERS.get(self.driver.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            Driver.objects.filter(pk=self.driver.pk).update(vehicle_number='V2')
+            Driver.objects.get(pk=self.driver.pk).save()
+        with self.assertNumQueries(1):
+            self.assertEqual(lookups.DRIVERS.get(self.driver.pk)['vehicle_number'], 'V2')
+        # Other kinds keep their entries
+        lookups.OIL_TYPES.get(self.oil_type.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client_obj.save()
+        with self.assertNumQueries(0):
+            lookups.OIL_TYPES.get(self.oil_type.pk)
+
+    @override_settings(LOOKUP_CACHE_TIMEOUT=1)
+    def test_changes_without_a_bump_show_after_the_timeout(self):
+        # What another process sees with the per-process cache: the row changes, its version does not
+        lookups.DRIVERS.get(self.driver.pk)
+        Driver.objects.filter(pk=self.driver.pk).update(vehicle_number='V2')
+        self.assertEqual(lookups.DRIVERS.get(self.driver.pk)['vehicle_number'], 'V1')
+        time.sleep(1.1)
+        self.assertEqual(lookups.DRIVERS.get(self.driver.pk)['vehicle_number'], 'V2')
+
+    @override_settings(LOOKUP_VERSION_TTL=1)
+    def test_the_version_is_read_once_per_ttl(self):
+        with mock.patch.object(lookups.caching, 'get_version', wraps=lookups.caching.get_version) as get_version:
+            lookups.DRIVERS.get(self.driver.pk)
+            lookups.DRIVERS.get(self.driver.pk)
+            lookups.DRIVERS.get(self.oil_type.pk)
+            self.assertEqual(get_version.call_count, 1)
+            # A bump from another process shows once the TTL has passed
+            Driver.objects.filter(pk=self.driver.pk).update(vehicle_number='V2')
+            lookups.caching.bump(lookups.DRIVERS.namespace)
+            self.assertEqual(lookups.DRIVERS.get(self.driver.pk)['vehicle_number'], 'V1')
+            time.sleep(1.1)
+            self.assertEqual(lookups.DRIVERS.get(self.driver.pk)['vehicle_number'], 'V2')
+            self.assertEqual(get_version.call_count, 2)
+
+    def test_endpoints_read_master_data_from_the_lookups(self):
+        self.client.force_login(self.user)
+        sale = Sale.objects.create(date=datetime.date(2025, 1, 1), client=self.client_obj, oil_type=self.oil_type,
+                                   driver=self.driver, quantity=Decimal('5'), price=Decimal('2'), amount=Decimal('10'))
+        details = reverse('api_operation_details', args=['sale', sale.pk])
+        self.client.get(details)
+        # session, user, sale
+        with self.assertNumQueries(3):
+            data = self.client.get(details).json()
+        self.assertEqual((data['client_name'], data['oil_type_name'], data['driver_name']), ('Nile', 'Diesel', 'Hassan'))
+
+        # session, user, activity log; the driver was read for the details above
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('get_driver_vehicle', args=[self.driver.pk]))
+        self.assertEqual(response.json(), {'vehicle_number': 'V1'})
+        self.assertEqual(self.client.get(reverse('get_driver_vehicle', args=[999])).status_code, 404)
+
+        response = self.client.get(reverse('calculate_freight'), {'quantity': '3', 'client_id': self.client_obj.pk})
+        self.assertEqual(response.json(), {'freight': 30.0})
+        response = self.client.get(reverse('calculate_freight'), {'quantity': '3', 'client_id': 999})
+        self.assertEqual(response.status_code, 404)
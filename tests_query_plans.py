@@ -0,0 +1,126 @@
+import datetime
+import re
+from decimal import Decimal
+
+from django.db import connection
+from django.test import RequestFactory
+
+from accounts.models import Client, CustomUser, Driver, OilType, Purchase, Sale, Treasury
+from accounts.models_vehicle import VehicleMovement
+from accounts.pagination import KeysetPaginator
+from accounts.statements import ClientStatement
+from accounts.testcases import AccountsTestCase
+from accounts.views import PurchaseListView, SaleListView
+from accounts.views_treasury import TreasuryListView
+from accounts.views_vehicle import VehicleMovementListView
+
+# "SCAN <table>" without an index is a full table scan
+FULL_SCAN = re.compile(r'\bSCAN (\w+)(?!.*\bUSING\b)')
+
+
+class ListQueryPlanTests(AccountsTestCase):
+    """Fails when a hot list query goes back to scanning or sorting a whole table."""
+    rows = 200
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(username='plans', password='testpass123', role='admin')
+        cls.client_obj = Client.objects.create(name='Client', address='-', phone_number='-')
+        other = Client.objects.create(name='Other', address='-', phone_number='-')
+        cls.driver = Driver.objects.create(name='Driver', license_number='L1', vehicle_number='V1')
+        cls.oil_type = OilType.objects.create(name='Oil', properties='-')
+        start = datetime.date(2024, 1, 1)
+        days = [start + datetime.timedelta(days=i % 365) for i in range(cls.rows)]
+        # Two clients so the per-client indexes are selective
+        clients = [cls.client_obj if i % 2 else other for i in range(cls.rows)]
+        Sale.objects.bulk_create(
+            Sale(sale_id=f'SL-{i}', date=day, client=client, oil_type=cls.oil_type, quantity=1, price=1, amount=1)
+            for i, (day, client) in enumerate(zip(days, clients))
+        )
+        Purchase.objects.bulk_create(
+            Purchase(BU_ID=f'BU-{i}', date=day, supplier=client, oil_type=cls.oil_type, quantity=1, price=1, amount=1,
+                     loading_location='A', unloading_location='B')
+            for i, (day, client) in enumerate(zip(days, clients))
+        )
+        Treasury.objects.bulk_create(
+            Treasury(date=day, description='-', transaction_type='income' if i % 2 else 'expense',
+                     payment_method='cash', movement_source='client_account', paid_amount=Decimal('1'),
+                     related_client=client)
+            for i, (day, client) in enumerate(zip(days, clients))
+        )
+        VehicleMovement.objects.bulk_create(
+            VehicleMovement(movement_id=f'VEe-{i}', movement_type='external', date=day, client=client,
+                            oil_type=cls.oil_type, quantity=1, driver=cls.driver, vehicle_number='V1',
+                            loading_location='A', unloading_location='B')
+            for i, (day, client) in enumerate(zip(days, clients))
+        )
+
+    def setUp(self):
+        super().setUp()
+        if connection.vendor != 'sqlite':
+            self.skipTest('Plans are checked with SQLite EXPLAIN QUERY PLAN')
+
+    def page_plan(self, view_class, **params):
+        request = RequestFactory().get('/', params)
+        request.user = self.user
+        view = view_class()
+        view.setup(request)
+        queryset = view.get_queryset()
+        return queryset[:view.paginate_by].explain()
+
+    def cursor_plan(self, view_class, **params):
+        """Plan of the page after the first one, as fetched from its cursor."""
+        request = RequestFactory().get('/', params)
+        request.user = self.user
+        view = view_class()
+        view.setup(request)
+        paginator = KeysetPaginator(view.get_queryset(), view.keyset_ordering, view.paginate_by)
+        _, values = paginator.decode(paginator.page().next_cursor)
+        queryset = paginator.queryset.filter(paginator._after(values, False)).order_by(*paginator.ordering)
+        return queryset[:view.paginate_by + 1].explain()
+
+    def assertIndexed(self, plan, sorted=True):
+        self.assertIsNone(FULL_SCAN.search(plan), plan)
+        if sorted:
+            self.assertNotIn('TEMP B-TREE FOR ORDER BY', plan)
+
+    def test_sale_list(self):
+        self.assertIndexed(self.page_plan(SaleListView))
+
+    def test_purchase_list(self):
+        self.assertIndexed(self.page_plan(PurchaseListView))
+
+    def test_treasury_list(self):
+        self.assertIndexed(self.page_plan(TreasuryListView))
+        self.assertIndexed(self.page_plan(TreasuryListView, date_from='2024-03-01', date_to='2024-03-31'))
+
+    def test_treasury_totals_by_date(self):
+        plan = Treasury.objects.filter(date__gte=datetime.date(2024, 3, 1)).explain()
+        self.assertIndexed(plan, sorted=False)
+        plan = Treasury.objects.filter(transaction_type='income').order_by('-date').explain()
+        self.assertIndexed(plan)
+
+    def test_vehicle_movement_list(self):
+        self.assertIndexed(self.page_plan(VehicleMovementListView))
+        self.assertIndexed(self.page_plan(VehicleMovementListView, type='internal'))
+        self.assertIndexed(self.page_plan(VehicleMovementListView, client=str(self.client_obj.pk)))
+        self.assertIndexed(self.page_plan(VehicleMovementListView, date_from='2024-03-01', date_to='2024-03-31'))
+
+    def test_cursor_pages(self):
+        for view_class in (SaleListView, PurchaseListView, TreasuryListView, VehicleMovementListView):
+            with self.subTest(view_class.__name__):
+                self.assertIndexed(self.cursor_plan(view_class))
+        self.assertIndexed(self.cursor_plan(VehicleMovementListView, type='external'))
+        self.assertIndexed(self.cursor_plan(VehicleMovementListView, client=str(self.client_obj.pk)))
+
+    def test_client_statement(self):
+        for date_from in (None, datetime.date(2024, 6, 15)):
+            statement = ClientStatement(self.client_obj, date_from=date_from)
+            sql, params = statement.rows_sql(limit=100)
+            with connection.cursor() as cursor:
+                cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+                plan = '\n'.join(row[-1] for row in cursor.fetchall())
+            # The window needs one sort of the merged stream; each branch must still use an index
+            for alias in ('s', 'p', 't'):
+                self.assertRegex(plan, rf'SEARCH {alias} USING (COVERING )?INDEX')
+            self.assertIsNone(FULL_SCAN.search(plan.replace('SCAN entries', '')), plan)
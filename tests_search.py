@@ -0,0 +1,133 @@
+import datetime
+from decimal import Decimal
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import override_settings
+from django.urls import reverse
+
+from accounts import search
+from accounts.models import Client, CustomUser, Driver, OilType, Purchase, Sale, Treasury
+from accounts.models_vehicle import VehicleMovement
+from accounts.testcases import AccountsTestCase
+
+
+class NormalizeTests(AccountsTestCase):
+    def test_arabic_variants_fold_together(self):
+        self.assertEqual(search.normalize('أحمد'), search.normalize('احمد'))
+        self.assertEqual(search.normalize('إبراهيم'), search.normalize('ابراهيم'))
+        self.assertEqual(search.normalize('مصطفى'), search.normalize('مصطفي'))
+        self.assertEqual(search.normalize('شركة'), search.normalize('شركه'))
+        self.assertEqual(search.normalize('مُحَمَّد'), 'محمد')
+        self.assertEqual(search.normalize('محـــمد'), 'محمد')
+
+    def test_tokens(self):
+        self.assertEqual(search.tokens('SL-001 زيتٌ'), ['sl', '001', 'زيت'])
+
+
+class SearchIndexTests(AccountsTestCase):
+    def setUp(self):
+        super().setUp()
+        if search.backend() is None:
+            self.skipTest('No full-text backend for this database')
+        self.user = CustomUser.objects.create_user(username='search', password='testpass123', role='admin')
+        self.client.force_login(self.user)
+        self.ahmed = Client.objects.create(name='أحمد للتجارة', address='-', phone_number='-')
+        self.company = Client.objects.create(name='شركة النيل', address='-', phone_number='-')
+        self.driver = Driver.objects.create(name='مصطفى', license_number='L1', vehicle_number='V1')
+        self.oil_type = OilType.objects.create(name='سولار', properties='-')
+
+    def sale(self, client, **kwargs):
+        return Sale.objects.create(date=datetime.date(2025, 1, 10), client=client, oil_type=self.oil_type,
+                                   quantity=Decimal('1'), price=Decimal('1'), **kwargs)
+
+    def test_sale_list_search_ignores_spelling_variants(self):
+        expected = self.sale(self.ahmed)
+        self.sale(self.company)
+        response = self.client.get(reverse('sale_list'), {'search': 'احمد'})
+        self.assertEqual([sale.pk for sale in response.context['sales']], [expected.pk])
+
+        response = self.client.get(reverse('sale_list'), {'search': 'شركه'})
+        self.assertEqual(len(response.context['sales']), 1)
+
+    def test_every_word_must_match_as_a_prefix(self):
+        both = self.sale(self.ahmed, driver=self.driver, vehicle_number='V1')
+        self.sale(self.ahmed)
+        self.assertEqual(search.search_ids('sale', 'احم مصطف'), [str(both.pk)])
+        self.assertEqual(search.search_ids('sale', 'nothing'), [])
+
+    def test_purchase_list_searches_the_supplier(self):
+        purchase = Purchase.objects.create(
+            date=datetime.date(2025, 1, 10), supplier=self.company, oil_type=self.oil_type, quantity=Decimal('1'),
+            price=Decimal('1'), loading_location='A', unloading_location='B',
+        )
+        response = self.client.get(reverse('purchase_list'), {'search': 'النيل'})
+        self.assertEqual([row.pk for row in response.context['purchases']], [purchase.pk])
+
+    def test_vehicle_movements_and_oil_types(self):
+        self.sale(self.ahmed, driver=self.driver, vehicle_number='ABC123')
+        response = self.client.get(reverse('vehicle_movement_list'), {'search': 'abc123'})
+        self.assertEqual(len(response.context['movements']), 1)
+        response = self.client.get(reverse('oiltype_list'), {'search': 'سولار'})
+        self.assertEqual([oil.pk for oil in response.context['oiltypes']], [self.oil_type.pk])
+
+    def test_index_follows_commits(self):
+        sale = self.sale(self.ahmed)
+        search.flush()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.ahmed.name = 'عميل جديد'
+            self.ahmed.save()
+        self.assertEqual(search.search_ids('sale', 'جديد'), [str(sale.pk)])
+        self.assertEqual(search.search_ids('sale', 'احمد'), [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            sale.delete()
+        self.assertEqual(search.search_ids('sale', 'جديد'), [])
+
+    def test_synced_update_is_reindexed(self):
+        sale = self.sale(self.ahmed, driver=self.driver, vehicle_number='V1')
+        movement = VehicleMovement.objects.get(sale=sale)
+        movement.vehicle_number = 'XYZ9'
+        with self.captureOnCommitCallbacks(execute=True):
+            movement.save()
+        self.assertEqual(search.search_ids('sale', 'xyz9'), [str(sale.pk)])
+
+    @override_settings(SEARCH_RESULTS_LIMIT=2)
+    def test_lists_filter_on_every_match_past_the_rank_limit(self):
+        for day in range(1, 6):
+            Treasury.objects.create(date=datetime.date(2025, 1, day), description=f'تحويل {day}', transaction_type='income',
+                                    payment_method='cash', movement_source='direct_deposit', paid_amount=Decimal('10.00'))
+        Treasury.objects.create(date=datetime.date(2025, 1, 9), description='other', transaction_type='income',
+                                payment_method='cash', movement_source='direct_deposit', paid_amount=Decimal('10.00'))
+        self.assertEqual(len(search.search_ids('treasury', 'تحويل')), 2)
+        cache.clear()
+        response = self.client.get(reverse('treasury_list'), {'search': 'تحويل'})
+        self.assertEqual(response.context['total_count'], 5)
+        self.assertEqual(response.context['income_total'], Decimal('50.00'))
+        # The ranked matches first, then the rest by key
+        movements = [movement.pk for movement in response.context['movements']]
+        ranked = [int(pk) for pk in search.search_ids('treasury', 'تحويل')]
+        self.assertEqual(movements[:2], ranked)
+        self.assertEqual(sorted(movements), sorted(Treasury.objects.exclude(description='other').values_list('pk', flat=True)))
+
+    def test_rebuild_command(self):
+        self.sale(self.ahmed)
+        with connection.cursor() as cursor:
+            search.backend().clear(cursor)
+        out = StringIO()
+        call_command('rebuild_search_index', stdout=out)
+        self.assertIn('sale: 1', out.getvalue())
+        self.assertEqual(len(search.search_ids('sale', 'احمد')), 1)
+
+
+class FallbackSearchTests(AccountsTestCase):
+    def test_icontains_on_the_document_fields(self):
+        client = Client.objects.create(name='Nile Co', address='-', phone_number='-')
+        oil_type = OilType.objects.create(name='Diesel', properties='-')
+        sale = Sale.objects.create(date=datetime.date(2025, 1, 10), client=client, oil_type=oil_type,
+                                   quantity=Decimal('1'), price=Decimal('1'))
+        queryset = Sale.objects.filter(search.fallback_filter('sale', 'nile diesel'))
+        self.assertEqual(list(queryset), [sale])
+        self.assertFalse(Sale.objects.filter(search.fallback_filter('sale', 'nile petrol')).exists())
@@ -0,0 +1,40 @@
+from django.db import transaction
+from django.test import override_settings
+
+from accounts.models import Client, Driver, Sequence
+from accounts.sequences import allocator, next_id, peek_id
+from accounts.testcases import AccountsTestCase, AccountsTransactionTestCase
+
+
+class SequenceTests(AccountsTestCase):
+    def test_ids_keep_legacy_format(self):
+        driver = Driver.objects.create(name='Driver', license_number='L1', vehicle_number='V1')
+        client = Client.objects.create(name='Client', address='Cairo', phone_number='0100')
+        self.assertEqual(driver.driver_id, 'DR-001')
+        self.assertEqual(client.client_id, 'CL-001')
+
+    def test_seeds_numerically_past_999(self):
+        Sequence.objects.filter(prefix='CL-').delete()
+        Client.objects.create(client_id='CL-999', name='A', address='-', phone_number='-')
+        Client.objects.create(client_id='CL-1000', name='B', address='-', phone_number='-')
+        self.assertEqual(next_id('CL-'), 'CL-1001')
+
+    def test_rollback_does_not_leak_reserved_numbers(self):
+        try:
+            with transaction.atomic():
+                self.assertEqual(next_id('SL-'), 'SL-001')
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        self.assertEqual(next_id('SL-'), 'SL-001')
+
+
+@override_settings(SEQUENCE_BLOCK_SIZE=5)
+class SequenceBlockTests(AccountsTransactionTestCase):
+    def test_block_is_reserved_once(self):
+        ids = [next_id('BU-') for _ in range(5)]
+        self.assertEqual(ids, ['BU-001', 'BU-002', 'BU-003', 'BU-004', 'BU-005'])
+        self.assertEqual(Sequence.objects.get(prefix='BU-').last_value, 5)
+        self.assertEqual(peek_id('BU-'), 'BU-006')
+        self.assertEqual(next_id('BU-'), 'BU-006')
+        self.assertEqual(Sequence.objects.get(prefix='BU-').last_value, 10)
@@ -0,0 +1,109 @@
+import datetime
+from decimal import Decimal
+
+from django.urls import reverse
+
+from accounts.models import Client, CustomUser, OilType, Purchase, Sale, Treasury
+from accounts.checkpoints import check_checkpoints, rebuild_checkpoints
+from accounts.models_statement import StatementCheckpoint
+from accounts.statements import ClientStatement
+from accounts.testcases import AccountsTestCase
+
+
+class StatementDataMixin:
+    def setUp(self):
+        super().setUp()
+        self.client_obj = Client.objects.create(name='Client', address='-', phone_number='-')
+        self.oil_type = OilType.objects.create(name='Oil', properties='-')
+        start = datetime.date(2025, 1, 1)
+        for day in range(30):
+            date = start + datetime.timedelta(days=day)
+            Sale.objects.create(date=date, client=self.client_obj, oil_type=self.oil_type,
+                                quantity=Decimal('2.500'), price=Decimal('10.00'), sale_id=f'SL-{day:03d}')
+            if day % 3 == 0:
+                Purchase.objects.create(date=date, supplier=self.client_obj, oil_type=self.oil_type,
+                                        quantity=Decimal('1.000'), price=Decimal('7.50'),
+                                        loading_location='A', unloading_location='B')
+            if day % 4 == 0:
+                Treasury.objects.create(date=date, description='payment', transaction_type='expense' if day % 8 else 'income',
+                                        payment_method='cash', movement_source='client_account',
+                                        paid_amount=Decimal('5.00'), related_client=self.client_obj)
+
+    def reference_rows(self, date_from=None):
+        rows = []
+        for sale in Sale.objects.filter(client=self.client_obj).order_by('date', 'id'):
+            rows.append((sale.date, 0, sale.amount))
+        for purchase in Purchase.objects.filter(supplier=self.client_obj).order_by('date', 'id'):
+            rows.append((purchase.date, 1, -purchase.amount))
+        for movement in Treasury.objects.filter(related_client=self.client_obj).order_by('date', 'movement_id'):
+            amount = -movement.paid_amount if movement.transaction_type == 'expense' else movement.paid_amount
+            rows.append((movement.date, 2, amount))
+        rows.sort(key=lambda row: (row[0], row[1]))
+        balance, result = Decimal('0.00'), []
+        for date, kind, amount in rows:
+            balance += amount
+            if date_from is None or date >= date_from:
+                result.append((date, amount, balance))
+        return result
+
+
+class ClientStatementTests(StatementDataMixin, AccountsTestCase):
+    def test_running_balance_matches_reference(self):
+        statement = ClientStatement(self.client_obj)
+        rows = [(row['date'], row['amount'], row['balance']) for row in statement.iter_rows()]
+        self.assertEqual(rows, self.reference_rows())
+        self.assertEqual(statement.count(), len(rows))
+
+    def test_date_range_carries_opening_balance(self):
+        date_from = datetime.date(2025, 1, 10)
+        statement = ClientStatement(self.client_obj, date_from=date_from)
+        expected = self.reference_rows(date_from)
+        self.assertEqual([(row['date'], row['amount'], row['balance']) for row in statement[:]], expected)
+        self.assertEqual(statement.summary()['opening_balance'], expected[0][2] - expected[0][1])
+
+    def test_pages_continue_the_running_balance(self):
+        statement = ClientStatement(self.client_obj)
+        expected = self.reference_rows()
+        self.assertEqual([row['balance'] for row in statement[10:20]], [row[2] for row in expected[10:20]])
+
+    def test_view_uses_constant_queries(self):
+        CustomUser.objects.create_user(username='st', password='testpass123', role='admin')
+        self.client.login(username='st', password='testpass123')
+        url = reverse('client_statement')
+        # session, user, client, summary, page, activity log entry; the client picker loads its options on demand
+        with self.assertNumQueries(6):
+            response = self.client.get(url, {'client_id': self.client_obj.pk, 'date_from': ''})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['total_sales'], Decimal('750.00'))
+
+
+class StatementCheckpointTests(StatementDataMixin, AccountsTestCase):
+    def test_checkpoints_follow_saves_and_deletes(self):
+        self.assertEqual(check_checkpoints(), [])
+        other = Client.objects.create(name='Other', address='-', phone_number='-')
+
+        sale = Sale.objects.filter(client=self.client_obj).order_by('date').first()
+        sale.quantity = Decimal('4.000')
+        sale.save()
+        self.assertEqual(check_checkpoints(), [])
+
+        # Moving a row to another client and month updates both sides
+        sale.client = other
+        sale.date = datetime.date(2025, 3, 15)
+        sale.save()
+        self.assertEqual(check_checkpoints(), [])
+
+        movement = Treasury.objects.filter(related_client=self.client_obj).first()
+        movement.transaction_type = 'expense' if movement.transaction_type == 'income' else 'income'
+        movement.save()
+        Purchase.objects.filter(supplier=self.client_obj).first().delete()
+        self.assertEqual(check_checkpoints(), [])
+
+    def test_rebuild_matches_incremental_state(self):
+        incremental = list(StatementCheckpoint.objects.values_list('client_id', 'period', 'closing_balance'))
+        rebuild_checkpoints()
+        self.assertEqual(list(StatementCheckpoint.objects.values_list('client_id', 'period', 'closing_balance')), incremental)
+
+    def test_checker_reports_drift(self):
+        StatementCheckpoint.objects.filter(client=self.client_obj).update(closing_balance=0)
+        self.assertTrue(check_checkpoints())
@@ -0,0 +1,114 @@
+import datetime
+from decimal import Decimal
+
+from accounts.costing import check_costs
+from accounts.facts import check_facts
+from accounts.models import Client, OilType, Purchase, Sale
+from accounts.models_stock import StockMovement, StockSnapshot
+from accounts.stock import apply_new_rows, check_stock, rebuild_stock, stock_as_of, with_stock_as_of
+from accounts.testcases import AccountsTestCase
+
+
+class StockLedgerTests(AccountsTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client_obj = Client.objects.create(name='Client', address='-', phone_number='-')
+        self.oil_type = OilType.objects.create(name='Oil', properties='-')
+        self.other = OilType.objects.create(name='Other', properties='-')
+        start = datetime.date(2025, 1, 1)
+        for day in range(20):
+            date = start + datetime.timedelta(days=day)
+            if day % 2 == 0:
+                Purchase.objects.create(date=date, supplier=self.client_obj, oil_type=self.oil_type,
+                                        quantity=Decimal('10.000'), price=Decimal('5.00'))
+            Sale.objects.create(date=date, client=self.client_obj, oil_type=self.oil_type,
+                                quantity=Decimal('2.500'), price=Decimal('8.00'))
+
+    def current_quantity(self, oil_type):
+        return OilType.objects.values_list('current_quantity', flat=True).get(pk=oil_type.pk)
+
+    def test_saves_and_deletes_move_the_current_quantity(self):
+        # 10 purchases of 10 and 20 sales of 2.5
+        self.assertEqual(self.current_quantity(self.oil_type), Decimal('50.000'))
+        self.assertEqual(check_stock(), [])
+
+        sale = Sale.objects.order_by('date').first()
+        sale.quantity = Decimal('4.000')
+        sale.save()
+        self.assertEqual(self.current_quantity(self.oil_type), Decimal('48.500'))
+        self.assertEqual(StockMovement.objects.filter(sale=sale).order_by('-id').first().quantity, Decimal('-1.500'))
+
+        # Moving a row to another oil type and day updates both sides
+        sale.oil_type = self.other
+        sale.date = datetime.date(2025, 2, 15)
+        sale.save()
+        self.assertEqual(self.current_quantity(self.oil_type), Decimal('52.500'))
+        self.assertEqual(self.current_quantity(self.other), Decimal('-4.000'))
+        self.assertEqual(check_stock(), [])
+
+        purchase = Purchase.objects.order_by('date').first()
+        reference = purchase.BU_ID
+        purchase.delete()
+        self.assertEqual(self.current_quantity(self.oil_type), Decimal('42.500'))
+        reversal = StockMovement.objects.order_by('-id').first()
+        self.assertEqual((reversal.purchase_id, reversal.reference, reversal.quantity), (None, reference, Decimal('-10.000')))
+        self.assertEqual(check_stock(), [])
+
+    def test_back_dated_rows_carry_to_later_snapshots(self):
+        self.assertEqual(stock_as_of(self.oil_type.pk, datetime.date(2025, 1, 4)), Decimal('10.000'))
+        Purchase.objects.create(date=datetime.date(2025, 1, 2), supplier=self.client_obj, oil_type=self.oil_type,
+                                quantity=Decimal('3.000'), price=Decimal('5.00'))
+        self.assertEqual(stock_as_of(self.oil_type.pk, datetime.date(2025, 1, 1)), Decimal('7.500'))
+        self.assertEqual(stock_as_of(self.oil_type.pk, datetime.date(2025, 1, 4)), Decimal('13.000'))
+        self.assertEqual(stock_as_of(self.oil_type.pk, datetime.date(2030, 1, 1)), Decimal('53.000'))
+        self.assertEqual(stock_as_of(self.oil_type.pk, datetime.date(2024, 12, 31)), Decimal('0'))
+        self.assertEqual(check_stock(), [])
+
+    def test_stock_as_of_reads_one_row(self):
+        with self.assertNumQueries(1):
+            stock_as_of(self.oil_type.pk, datetime.date(2025, 1, 15))
+        with self.assertNumQueries(1):
+            stocks = dict(with_stock_as_of(OilType.objects.all(), datetime.date(2025, 1, 15)).values_list('name', 'stock'))
+        self.assertEqual(stocks, {'Oil': stock_as_of(self.oil_type.pk, datetime.date(2025, 1, 15)), 'Other': Decimal('0')})
+
+    def test_bulk_created_rows_are_applied(self):
+        rows = Sale.objects.bulk_create([
+            Sale(sale_id='BULK-1', date=datetime.date(2025, 1, 5), client=self.client_obj, oil_type=self.oil_type,
+                 quantity=Decimal('1.000'), price=Decimal('8.00'), amount=Decimal('8.00')),
+        ])
+        self.assertTrue(check_stock())
+        apply_new_rows(Sale, [row.current_values() for row in rows])
+        self.assertEqual(check_stock(), [])
+
+    def test_rebuild_matches_incremental_state(self):
+        incremental = list(StockSnapshot.objects.values_list('oil_type_id', 'date', 'closing_quantity'))
+        rebuild_stock()
+        self.assertEqual(list(StockSnapshot.objects.values_list('oil_type_id', 'date', 'closing_quantity')), incremental)
+
+    def test_rebuild_fixes_drift_with_an_adjustment(self):
+        OilType.objects.filter(pk=self.oil_type.pk).update(current_quantity=0)
+        StockMovement.objects.filter(source='sale').first().delete()
+        self.assertEqual(len(check_stock()), 2)
+        rebuild_stock([self.oil_type.pk])
+        self.assertEqual(check_stock(), [])
+        self.assertEqual(StockMovement.objects.get(source='adjustment').quantity, Decimal('-2.500'))
+
+    def test_concurrent_edits_apply_against_the_stored_row(self):
+        purchase = Purchase.objects.create(date=datetime.date(2025, 1, 25), supplier=self.client_obj,
+                                           oil_type=self.oil_type, quantity=Decimal('10.000'), price=Decimal('5.00'))
+        first = Purchase.objects.get(pk=purchase.pk)
+        second = Purchase.objects.get(pk=purchase.pk)
+        first.quantity = Decimal('15.000')
+        first.save()
+        # Loaded with 10 before the first edit was saved
+        second.quantity = Decimal('12.000')
+        second.save()
+        self.assertEqual(self.current_quantity(self.oil_type), Decimal('62.000'))
+        self.assertEqual(check_stock(), [])
+        self.assertEqual(check_costs(), [])
+        self.assertEqual(check_facts(), [])
+
+        Purchase.objects.get(pk=purchase.pk).delete()
+        first.delete()
+        self.assertEqual(self.current_quantity(self.oil_type), Decimal('50.000'))
+        self.assertEqual(check_stock(), [])
@@ -0,0 +1,172 @@
+import datetime
+import importlib
+from decimal import Decimal
+
+from django.apps import apps
+from django.db import connection
+from django.test import Client as HttpClient
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from accounts.models import Client, CustomUser, Driver, OilType, Purchase, Sale
+from accounts.models_vehicle import VehicleMovement
+from accounts.testcases import AccountsTestCase
+
+
+class OperationMovementSyncTests(AccountsTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client_obj = Client.objects.create(name='Client', address='-', phone_number='-')
+        self.driver = Driver.objects.create(name='Driver', license_number='L1', vehicle_number='V1')
+        self.other_driver = Driver.objects.create(name='Other', license_number='L2', vehicle_number='V2')
+        self.oil_type = OilType.objects.create(name='Oil', properties='-')
+
+    def create_sale(self, **kwargs):
+        values = {
+            'date': datetime.date(2025, 1, 10),
+            'client': self.client_obj,
+            'oil_type': self.oil_type,
+            'quantity': Decimal('10'),
+            'price': Decimal('5'),
+            'driver': self.driver,
+            'vehicle_number': 'V1',
+            'loading_location': 'A',
+            'unloading_location': 'B',
+            'driver_freight': Decimal('100'),
+            'client_freight': Decimal('150'),
+        }
+        values.update(kwargs)
+        return Sale.objects.create(**values)
+
+    def movement_for(self, operation_type, pk):
+        return VehicleMovement.objects.get(movement_type='internal', **{f'{operation_type}_id': pk})
+
+    def test_sale_creates_its_internal_movement(self):
+        sale = self.create_sale()
+        movement = self.movement_for('sale', sale.pk)
+        self.assertEqual(movement.driver, self.driver)
+        self.assertEqual(movement.client, self.client_obj)
+        self.assertEqual(movement.quantity, Decimal('10'))
+        self.assertEqual(movement.client_freight, Decimal('150'))
+
+    def test_sale_without_transport_creates_no_movement(self):
+        self.create_sale(driver=None, vehicle_number=None)
+        self.assertFalse(VehicleMovement.objects.exists())
+
+    def test_purchase_uses_supplier_as_movement_client(self):
+        purchase = Purchase.objects.create(
+            date=datetime.date(2025, 1, 10), supplier=self.client_obj, oil_type=self.oil_type,
+            quantity=Decimal('4'), price=Decimal('3'), loading_location='A', unloading_location='B',
+            driver=self.driver, vehicle_number='V1',
+        )
+        self.assertEqual(self.movement_for('purchase', purchase.pk).client, self.client_obj)
+
+    def test_sale_edit_updates_changed_columns_only(self):
+        sale = self.create_sale()
+        sale = Sale.objects.get(pk=sale.pk)
+        sale.vehicle_number = 'V9'
+        with CaptureQueriesContext(connection) as queries:
+            sale.save()
+        updates = [q['sql'] for q in queries.captured_queries if 'UPDATE "accounts_vehiclemovement"' in q['sql']]
+        self.assertEqual(len(updates), 1)
+        self.assertIn('"vehicle_number"', updates[0])
+        self.assertNotIn('"driver_id"', updates[0])
+        self.assertEqual(self.movement_for('sale', sale.pk).vehicle_number, 'V9')
+
+    def test_unchanged_sale_save_does_not_touch_movement(self):
+        sale = Sale.objects.get(pk=self.create_sale().pk)
+        sale.price = Decimal('6')
+        with CaptureQueriesContext(connection) as queries:
+            sale.save()
+        self.assertFalse(any('accounts_vehiclemovement' in q['sql'] for q in queries.captured_queries))
+
+    def test_movement_edit_updates_sale(self):
+        sale = self.create_sale()
+        movement = self.movement_for('sale', sale.pk)
+        movement.driver = self.other_driver
+        movement.unloading_location = 'C'
+        movement.save()
+        sale.refresh_from_db()
+        self.assertEqual(sale.driver, self.other_driver)
+        self.assertEqual(sale.unloading_location, 'C')
+
+    def test_saves_do_not_ping_pong(self):
+        sale = Sale.objects.get(pk=self.create_sale().pk)
+        sale.driver = self.other_driver
+        with CaptureQueriesContext(connection) as sale_queries:
+            sale.save()
+        movement = self.movement_for('sale', sale.pk)
+        movement.client_freight = Decimal('175')
+        with CaptureQueriesContext(connection) as movement_queries:
+            movement.save()
+
+        # One write on each side: neither save bounces back to its own table (the daily facts follow both)
+        def writes(queries):
+            tables = [q['sql'].split()[1] for q in queries.captured_queries if q['sql'].startswith('UPDATE')]
+            return [table for table in tables if table != '"accounts_dailyfact"']
+
+        self.assertEqual(writes(sale_queries), ['"accounts_sale"', '"accounts_vehiclemovement"'])
+        self.assertEqual(writes(movement_queries), ['"accounts_vehiclemovement"', '"accounts_sale"'])
+        sale.refresh_from_db()
+        self.assertEqual(sale.client_freight, Decimal('175'))
+
+    def test_statements_per_save(self):
+        sale = Sale.objects.get(pk=self.create_sale().pk)
+        sale.vehicle_number = 'V9'
+        # savepoint, SELECT sale FOR UPDATE, UPDATE sale, UPDATE movement, release
+        with self.assertNumQueries(5):
+            sale.save()
+
+        movement = self.movement_for('sale', sale.pk)
+        movement.vehicle_number = 'V8'
+        # savepoint, SELECT movement FOR UPDATE, UPDATE movement, UPDATE sale, release
+        with self.assertNumQueries(5):
+            movement.save()
+
+    def test_movement_is_linked_by_foreign_key(self):
+        sale = self.create_sale()
+        movement = self.movement_for('sale', sale.pk)
+        self.assertEqual((movement.operation_type, movement.operation_id), ('sale', str(sale.pk)))
+        self.assertEqual(movement.operation, sale)
+        self.assertIsNone(movement.purchase_id)
+
+    def test_link_to_missing_operation_is_left_empty(self):
+        movement = VehicleMovement.objects.create(
+            movement_type='internal', operation_type='sale', operation_id='999', date=datetime.date(2025, 1, 10),
+            client=self.client_obj, oil_type=self.oil_type, quantity=Decimal('1'), driver=self.driver,
+            vehicle_number='V1', loading_location='A', unloading_location='B',
+        )
+        self.assertIsNone(movement.sale_id)
+        self.assertIsNone(movement.operation)
+
+    def test_detail_view_loads_operation_with_the_movement(self):
+        user = CustomUser.objects.create_user(username='sync', password='testpass123', role='admin')
+        movement = self.movement_for('sale', self.create_sale().pk)
+        http = HttpClient()
+        http.force_login(user)
+        with CaptureQueriesContext(connection) as queries:
+            response = http.get(reverse('vehicle_movement_detail', args=[movement.pk]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['related_operation'].pk, movement.sale_id)
+        self.assertFalse(any(q['sql'].startswith('SELECT') and 'FROM "accounts_sale"' in q['sql']
+                             for q in queries.captured_queries))
+
+    def test_data_migration_links_existing_movements(self):
+        sale = self.create_sale()
+        purchase = Purchase.objects.create(
+            date=datetime.date(2025, 1, 10), supplier=self.client_obj, oil_type=self.oil_type,
+            quantity=Decimal('4'), price=Decimal('3'), loading_location='A', unloading_location='B',
+        )
+        VehicleMovement.objects.update(sale=None, purchase=None)
+        orphan = VehicleMovement.objects.create(
+            movement_type='internal', operation_type='purchase', operation_id=str(purchase.pk),
+            date=datetime.date(2025, 1, 10), client=self.client_obj, oil_type=self.oil_type,
+            quantity=Decimal('4'), driver=self.driver, vehicle_number='V1', loading_location='A', unloading_location='B',
+        )
+        VehicleMovement.objects.filter(pk=orphan.pk).update(purchase=None)
+
+        migration = importlib.import_module('accounts.migrations.0020_vehiclemovement_sale_purchase')
+        migration.link_operations(apps, None)
+
+        self.assertEqual(self.movement_for('sale', sale.pk).operation_type, 'sale')
+        self.assertEqual(VehicleMovement.objects.get(pk=orphan.pk).purchase_id, purchase.pk)
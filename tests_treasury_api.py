@@ -0,0 +1,98 @@
+import datetime
+import json
+from decimal import Decimal
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from accounts.models import Client, CustomUser, Driver, OilType, Purchase, Sale
+from accounts.testcases import AccountsTestCase
+
+
+class TreasuryJSONTests(AccountsTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.manager = CustomUser.objects.create_user(username='cashier', password='testpass123', role='transaction_manager')
+        cls.client_obj = Client.objects.create(name='Nile', address='-', phone_number='-')
+        cls.oil_type = OilType.objects.create(name='Diesel', properties='-')
+        cls.driver = Driver.objects.create(name='Hassan', license_number='L1', vehicle_number='V1')
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.manager)
+
+    def create_sales(self, count, start=0):
+        Sale.objects.bulk_create(
+            Sale(sale_id=f'T-{i:03}', date=datetime.date(2025, 1, 1) + datetime.timedelta(days=i),
+                 client=self.client_obj, oil_type=self.oil_type, driver=self.driver,
+                 quantity=Decimal(i), price=Decimal('2'), amount=Decimal(i * 2))
+            for i in range(start, start + count)
+        )
+
+    def get(self, name, params=None):
+        response = self.client.get(reverse(name), params or {})
+        if response.streaming:
+            return response, json.loads(b''.join(response.streaming_content))
+        return response, response.json()
+
+    def test_sales_rows_carry_related_names(self):
+        self.create_sales(3)
+        response, data = self.get('api_sales')
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertEqual(data['next'], None)
+        self.assertEqual(data['sales'][0], {
+            'id': data['sales'][0]['id'], 'sale_id': 'T-002', 'date': '2025-01-03',
+            'client_id': self.client_obj.pk, 'client_name': 'Nile', 'oil_type': 'Diesel',
+            'quantity': 2.0, 'price': 2.0, 'total': 4.0, 'driver_name': 'Hassan',
+        })
+
+    def test_field_selection(self):
+        Purchase.objects.create(date=datetime.date(2025, 1, 1), supplier=self.client_obj, oil_type=self.oil_type,
+                                quantity=Decimal('5'), price=Decimal('3'), amount=Decimal('15'))
+        _, data = self.get('api_purchases', {'fields': 'purchase_id,supplier_name,total'})
+        self.assertEqual(set(data['purchases'][0]), {'purchase_id', 'supplier_name', 'total'})
+        self.assertEqual(data['purchases'][0]['total'], 15.0)
+
+        response, data = self.get('api_purchases', {'fields': 'status'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(data['error'], 'Unknown fields: status')
+
+    def test_pages_follow_the_next_cursor(self):
+        self.create_sales(25)
+        seen = []
+        params = {'limit': '10', 'fields': 'sale_id'}
+        while True:
+            _, data = self.get('api_sales', params)
+            seen += [row['sale_id'] for row in data['sales']]
+            if data['next'] is None:
+                break
+            params['cursor'] = data['next']
+        self.assertEqual(seen, [f'T-{i:03}' for i in reversed(range(25))])
+
+        response, _ = self.get('api_sales', {'cursor': 'garbage'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_constant_queries_whatever_the_row_count(self):
+        def queries(name):
+            with CaptureQueriesContext(connection) as captured:
+                self.get(name)
+            return len(captured)
+
+        names = ['api_sales', 'api_purchases', 'api_clients', 'api_drivers']
+        # The first requests also write the activity log entries
+        [queries(name) for name in names]
+        self.create_sales(5)
+        before = [queries(name) for name in names]
+        self.create_sales(60, start=5)
+        Client.objects.bulk_create(Client(client_id=f'T-{i:03}', name=f'Client {i}', address='-', phone_number='-')
+                                   for i in range(60))
+        self.assertEqual([queries(name) for name in names], before)
+        # session, user, page
+        self.assertEqual(before, [3, 3, 3, 3])
+
+    def test_requires_a_treasury_role(self):
+        self.client.force_login(CustomUser.objects.create_user(username='viewer', password='testpass123', role='user'))
+        self.assertEqual(self.client.get(reverse('api_clients')).status_code, 403)
+        self.client.logout()
+        self.assertEqual(self.client.get(reverse('api_clients')).status_code, 302)
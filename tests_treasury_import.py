@@ -0,0 +1,126 @@
+import io
+import json
+from decimal import Decimal
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from accounts.checkpoints import check_checkpoints
+from accounts.facts import check_facts
+from accounts.models import BalanceChangeLog, Client, CustomUser, Driver, Treasury
+from accounts.testcases import AccountsTestCase
+from accounts.treasury_import import COLUMNS, import_movements
+
+
+class TreasuryImportTests(AccountsTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = CustomUser.objects.create_user(username='cashier', password='testpass123', role='admin')
+        self.first = Client.objects.create(name='First', address='-', phone_number='-', balance=Decimal('100.00'))
+        self.second = Client.objects.create(name='Second', address='-', phone_number='-')
+        self.driver = Driver.objects.create(name='Driver', license_number='L1', vehicle_number='V1')
+
+    def row(self, **overrides):
+        row = {
+            'date': '2025-02-01',
+            'source': 'client',
+            'record_id': self.first.pk,
+            'transaction_type': 'income',
+            'paid_amount': '10.00',
+            'payment_method': 'cash',
+            'other_payment_method': '',
+            'description': 'end of day',
+        }
+        row.update(overrides)
+        return row
+
+    def rows(self, count):
+        rows = []
+        for index in range(count):
+            rows.append(self.row(source=('client', 'company', 'driver')[index % 3],
+                                 record_id=self.driver.pk if index % 3 == 2 else (self.first, self.second)[index % 2].pk))
+        return rows
+
+    def test_import_applies_net_balance_changes(self):
+        result = import_movements([
+            self.row(),
+            self.row(transaction_type='expense', paid_amount='105.00'),
+            self.row(source='company', record_id=self.second.pk, transaction_type='expense', paid_amount='7.50'),
+            self.row(source='driver', record_id=self.driver.pk, payment_method='other', other_payment_method='wallet'),
+        ], self.user)
+        self.assertTrue(result.ok, result.errors)
+        self.assertEqual(Treasury.objects.count(), 4)
+        self.assertEqual(Client.objects.get(pk=self.first.pk).balance, Decimal('5.00'))
+        self.assertEqual(Client.objects.get(pk=self.second.pk).balance, Decimal('7.50'))
+        self.assertEqual(BalanceChangeLog.objects.count(), 3)
+        self.assertEqual(Treasury.objects.get(related_driver=self.driver).payment_details, 'wallet')
+        self.assertEqual(check_checkpoints(), [])
+        self.assertEqual(check_facts(), [])
+
+    def test_query_count_does_not_grow_with_rows(self):
+        # The first import also creates the month's statement checkpoints
+        import_movements(self.rows(3), self.user)
+        with CaptureQueriesContext(connection) as small:
+            self.assertTrue(import_movements(self.rows(6), self.user).ok)
+        with CaptureQueriesContext(connection) as large:
+            self.assertTrue(import_movements(self.rows(60), self.user).ok)
+        self.assertEqual(len(small), len(large))
+        self.assertEqual(Treasury.objects.count(), 69)
+
+    def test_errors_are_reported_per_row_and_nothing_is_saved(self):
+        result = import_movements([
+            self.row(),
+            self.row(paid_amount='-1'),
+            self.row(record_id=''),
+            self.row(record_id=9999),
+            self.row(payment_method='other'),
+        ], self.user)
+        self.assertEqual(sorted(result.errors), [2, 3, 4, 5])
+        self.assertIn('paid_amount', result.errors[2])
+        self.assertIn('__all__', result.errors[3])
+        self.assertIn('record_id', result.errors[4])
+        self.assertIn('other_payment_method', result.errors[5])
+        self.assertFalse(Treasury.objects.exists())
+
+    def test_overdraft_rejects_the_whole_file(self):
+        result = import_movements([self.row(), self.row(transaction_type='expense', paid_amount='110.01')], self.user)
+        self.assertEqual(list(result.errors), [2])
+        self.assertFalse(Treasury.objects.exists())
+        self.assertEqual(Client.objects.get(pk=self.first.pk).balance, Decimal('100.00'))
+
+    def test_csv_and_xlsx_uploads(self):
+        from openpyxl import Workbook
+
+        self.client.force_login(self.user)
+        self.assertContains(self.client.get(reverse('treasury_import')), 'record_id')
+        text = io.StringIO()
+        text.write(','.join(COLUMNS) + '\n')
+        text.write(','.join(str(self.row()[column]) for column in COLUMNS) + '\n')
+        upload = SimpleUploadedFile('day.csv', text.getvalue().encode('utf-8-sig'), content_type='text/csv')
+        response = self.client.post(reverse('treasury_import'), {'file': upload})
+        self.assertEqual(response.status_code, 302)
+
+        workbook = Workbook()
+        workbook.active.append(COLUMNS)
+        workbook.active.append([self.row()[column] for column in COLUMNS])
+        content = io.BytesIO()
+        workbook.save(content)
+        upload = SimpleUploadedFile('day.xlsx', content.getvalue())
+        response = self.client.post(reverse('treasury_import'), {'file': upload})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Client.objects.get(pk=self.first.pk).balance, Decimal('120.00'))
+
+    def test_json_api(self):
+        self.client.force_login(self.user)
+        url = reverse('api_treasury_import')
+        response = self.client.post(url, json.dumps({'movements': [self.row(), self.row(date='')]}),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['errors'][0]['row'], 2)
+
+        response = self.client.post(url, json.dumps({'movements': [self.row(), self.row()]}),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['created'], 2)
@@ -0,0 +1,52 @@
+import datetime
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.urls import reverse
+
+from accounts.models import CustomUser, Treasury
+from accounts.testcases import AccountsTestCase
+
+
+class TreasuryListTotalsTests(AccountsTestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        user = CustomUser.objects.create_user(username='cashier', password='testpass123', role='admin')
+        self.client.force_login(user)
+        start = datetime.date(2025, 1, 1)
+        for day in range(45):
+            Treasury.objects.create(
+                date=start + datetime.timedelta(days=day), description=f'movement {day}',
+                transaction_type='income' if day % 3 else 'expense', payment_method='cash',
+                movement_source='direct_deposit', paid_amount=Decimal('10.00'),
+            )
+        self.url = reverse('treasury_list')
+
+    def test_totals_and_count_come_from_one_cached_query(self):
+        # session, user, summary, page, activity log entry
+        with self.assertNumQueries(5):
+            response = self.client.get(self.url)
+        self.assertEqual(response.context['total_count'], 45)
+        self.assertEqual(response.context['income_total'], Decimal('300.00'))
+        self.assertEqual(response.context['expense_total'], Decimal('150.00'))
+
+        # Later pages reuse the cached summary
+        with self.assertNumQueries(3):
+            response = self.client.get(self.url, {'cursor': response.context['page_obj'].next_cursor})
+        self.assertEqual(len(response.context['movements']), 20)
+        self.assertEqual(response.context['total_count'], 45)
+
+    def test_filters_have_their_own_totals(self):
+        response = self.client.get(self.url, {'date_from': '2025-02-01', 'search': 'movement'})
+        self.assertEqual(response.context['total_count'], 14)
+        self.assertEqual(response.context['income_total'] + response.context['expense_total'], Decimal('140.00'))
+
+    def test_saving_a_movement_invalidates_the_totals(self):
+        self.client.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            Treasury.objects.filter(transaction_type='expense').first().delete()
+        with self.assertNumQueries(4):
+            response = self.client.get(self.url)
+        self.assertEqual(response.context['total_count'], 44)
+        self.assertEqual(response.context['expense_total'], Decimal('140.00'))
@@ -0,0 +1,62 @@
+import csv
+import datetime
+import io
+from decimal import Decimal
+
+from django.urls import reverse
+
+from accounts.models import Client, CustomUser, Driver, OilType
+from accounts.models_vehicle import VehicleMovement
+from accounts.testcases import AccountsTestCase
+
+
+class VehicleMovementExportTests(AccountsTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = CustomUser.objects.create_user(username='vm', password='testpass123', role='admin')
+        self.client.force_login(self.user)
+        self.first = Client.objects.create(name='First', address='-', phone_number='-')
+        self.second = Client.objects.create(name='Second', address='-', phone_number='-')
+        driver = Driver.objects.create(name='Driver', license_number='L1', vehicle_number='V1')
+        oil_type = OilType.objects.create(name='Oil', properties='-')
+        start = datetime.date(2025, 1, 1)
+        for day in range(10):
+            VehicleMovement.objects.create(
+                movement_type='internal' if day % 2 else 'external', operation_id=f'SL-{day:03d}',
+                date=start + datetime.timedelta(days=day), client=self.first if day < 6 else self.second,
+                oil_type=oil_type, quantity=Decimal('5.000'), driver=driver, vehicle_number='V1',
+                loading_location='A', unloading_location='B',
+            )
+        self.url = reverse('vehicle_movement_export')
+
+    def read_csv(self, response):
+        content = b''.join(response.streaming_content).decode('utf-8-sig')
+        return list(csv.reader(io.StringIO(content)))
+
+    def test_csv_is_streamed_with_list_filters(self):
+        response = self.client.get(self.url, {'format': 'csv', 'client': self.first.pk, 'date_from': '2025-01-03'})
+        self.assertTrue(response.streaming)
+        rows = self.read_csv(response)
+        self.assertEqual(len(rows), 1 + 4)
+        self.assertEqual([row[1] for row in rows[1:]], ['2025-01-06', '2025-01-05', '2025-01-04', '2025-01-03'])
+        self.assertEqual(rows[1][2], 'داخلية')
+        self.assertEqual(rows[2][3], '-')
+
+        rows = self.read_csv(self.client.get(self.url, {'format': 'csv', 'type': 'internal'}))
+        self.assertEqual(len(rows), 1 + 5)
+
+    def test_xlsx_export(self):
+        from openpyxl import load_workbook
+
+        response = self.client.get(self.url, {'format': 'excel', 'date_to': '2025-01-02'})
+        workbook = load_workbook(io.BytesIO(b''.join(response.streaming_content)), read_only=True)
+        rows = list(workbook.active.iter_rows(values_only=True))
+        self.assertEqual(len(rows), 1 + 2)
+        self.assertEqual(rows[1][4], 'First')
+
+    def test_list_view_uses_the_same_filters(self):
+        response = self.client.get(reverse('vehicle_movement_list'), {'client': self.second.pk})
+        self.assertEqual(response.context['total_count'], 4)
+        # The client filter renders the selected client only; the others come from the autocomplete
+        self.assertContains(response, f'<option value="{self.second.pk}" selected>Second</option>', html=True)
+        self.assertNotContains(response, '>First</option>')
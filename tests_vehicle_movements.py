@@ -0,0 +1,75 @@
+import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import connection
+from django.test import Client as HttpClient
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from accounts.models import Client, CustomUser, Driver, OilType
+from accounts.models_vehicle import VehicleMovement
+from accounts.testcases import AccountsTransactionTestCase
+
+
+class VehicleMovementIdLoadTests(AccountsTransactionTestCase):
+    workers = 50
+
+    def setUp(self):
+        super().setUp()
+        self.user = CustomUser.objects.create_user(username='vm', password='testpass123', role='admin')
+        self.client_obj = Client.objects.create(name='Client', address='-', phone_number='-')
+        self.driver = Driver.objects.create(name='Driver', license_number='L1', vehicle_number='V1')
+        self.oil_type = OilType.objects.create(name='Oil', properties='-')
+        self.url = reverse('vehicle_movement_create_external')
+
+    def form_data(self):
+        return {
+            'movement_type': 'external',
+            'date': datetime.date.today().isoformat(),
+            'client': self.client_obj.pk,
+            'oil_type': self.oil_type.pk,
+            'quantity': '10',
+            'driver': self.driver.pk,
+            'vehicle_number': 'V1',
+            'loading_location': 'A',
+            'unloading_location': 'B',
+        }
+
+    def test_opening_the_form_takes_no_write_lock(self):
+        http = HttpClient()
+        http.force_login(self.user)
+        with CaptureQueriesContext(connection) as queries:
+            response = http.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['next_movement_id'], 'VEe-001')
+        for query in queries.captured_queries:
+            sql = query['sql'].upper()
+            if 'ACCOUNTS_VEHICLEMOVEMENT' in sql or 'ACCOUNTS_SEQUENCE' in sql:
+                self.assertTrue(sql.startswith('SELECT'), sql)
+                self.assertNotIn('FOR UPDATE', sql)
+
+    def test_concurrent_form_opens_and_saves(self):
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest('Shared-cache in-memory SQLite fails concurrent writers instead of waiting; keep DATABASES["default"]["TEST"]["NAME"] a file')
+        clients = []
+        for _ in range(self.workers):
+            http = HttpClient()
+            http.force_login(self.user)
+            clients.append(http)
+
+        def open_and_save(http):
+            try:
+                opened = http.get(self.url).status_code
+                saved = http.post(self.url, self.form_data()).status_code
+                return opened, saved
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            results = list(pool.map(open_and_save, clients))
+
+        self.assertEqual(results, [(200, 302)] * self.workers)
+        ids = list(VehicleMovement.objects.values_list('movement_id', flat=True))
+        self.assertEqual(len(ids), self.workers)
+        self.assertEqual(len(set(ids)), self.workers)
+        self.assertTrue(all(movement_id.startswith('VEe-') for movement_id in ids))
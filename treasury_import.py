@@ -0,0 +1,156 @@
+"""Bulk import of treasury movements.
+
+End-of-day reconciliation files (CSV, XLSX or a JSON list) are validated row by
+row with ``TreasuryMovementForm`` and written in one transaction: related
+clients and drivers are fetched with one query per type, the balance changes
+go through the ledger as a single batch and the movements are inserted with
+``bulk_create``. Nothing is written if any row is rejected.
+"""
+import csv
+import datetime
+import io
+
+from django.db import transaction
+
+from . import caching, checkpoints, facts, search
+from .balances import InsufficientBalance, apply_changes, treasury_change
+from .forms import TreasuryMovementForm
+from .models import Client, Driver, Treasury
+
+COLUMNS = [
+    'date', 'source', 'record_id', 'transaction_type', 'paid_amount',
+    'payment_method', 'other_payment_method', 'description',
+]
+RELATED_MODELS = {'client': Client, 'company': Client, 'driver': Driver}
+
+
+class ImportResult:
+    def __init__(self):
+        self.created = []
+        self.errors = {}  # row number -> {field: [messages]}
+
+    @property
+    def ok(self):
+        return not self.errors
+
+    def add_error(self, row, field, message):
+        self.errors.setdefault(row, {}).setdefault(field, []).append(message)
+
+    def as_dict(self):
+        return {
+            'created': len(self.created),
+            'errors': [{'row': row, 'errors': errors} for row, errors in sorted(self.errors.items())],
+        }
+
+
+def _cell(value):
+    if value is None:
+        return ''
+    if isinstance(value, datetime.datetime):
+        return value.date().isoformat()
+    if isinstance(value, datetime.date):
+        return value.isoformat()
+    if isinstance(value, float) and value.is_integer():
+        # Spreadsheets hand integer ids back as floats
+        return str(int(value))
+    return str(value).strip()
+
+
+def read_csv(file):
+    text = file.read()
+    if isinstance(text, bytes):
+        text = text.decode('utf-8-sig')
+    return list(csv.DictReader(io.StringIO(text)))
+
+
+def read_xlsx(file):
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(file, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = [_cell(value) for value in next(rows, ())]
+        return [dict(zip(header, values)) for values in rows if any(value is not None for value in values)]
+    finally:
+        workbook.close()
+
+
+def read_rows(uploaded):
+    """Rows of an uploaded ``.csv`` or ``.xlsx`` file as dicts keyed by column name."""
+    name = (uploaded.name or '').lower()
+    if name.endswith('.csv'):
+        return read_csv(uploaded)
+    if name.endswith('.xlsx'):
+        return read_xlsx(uploaded)
+    raise ValueError('نوع الملف غير مدعوم، استخدم CSV أو XLSX')
+
+
+def import_movements(rows, user=None):
+    """Validate and save ``rows`` (dicts with ``COLUMNS``) as treasury movements.
+
+    Rows are numbered from 1 in the returned ``ImportResult``. The overdraft
+    check applies to each client's net change over the whole file.
+    """
+    result = ImportResult()
+    valid = []
+    for number, row in enumerate(rows, 1):
+        form = TreasuryMovementForm(data={column: _cell(row.get(column)) for column in COLUMNS})
+        if not form.is_valid():
+            for field, messages in form.errors.items():
+                for message in messages:
+                    result.add_error(number, field, message)
+            continue
+        try:
+            record_id = int(form.data['record_id'])
+        except ValueError:
+            result.add_error(number, 'record_id', 'رقم الحساب المرتبط غير صحيح')
+            continue
+        valid.append((number, form, record_id))
+
+    # One query per related model
+    wanted = {}
+    for number, form, record_id in valid:
+        wanted.setdefault(RELATED_MODELS[form.cleaned_data['source']], set()).add(record_id)
+    related = {model: model.objects.in_bulk(ids) for model, ids in wanted.items()}
+
+    username = getattr(user, 'username', '')
+    movements, changes = [], []
+    for number, form, record_id in valid:
+        source = form.cleaned_data['source']
+        record = related[RELATED_MODELS[source]].get(record_id)
+        if record is None:
+            result.add_error(number, 'record_id', 'الحساب المرتبط غير موجود')
+            continue
+        movement = form.save(commit=False)
+        movement.movement_source = source
+        if form.cleaned_data['payment_method'] == 'other':
+            movement.payment_details = form.cleaned_data['other_payment_method']
+        if source == 'driver':
+            movement.related_driver = record
+        else:
+            movement.related_client = record
+        movements.append(movement)
+        changes.append((number, treasury_change(
+            source, form.cleaned_data['transaction_type'], form.cleaned_data['paid_amount'], record_id, username,
+        )))
+
+    if result.errors:
+        return result
+
+    try:
+        with transaction.atomic():
+            apply_changes([change for number, change in changes], user=user)
+            result.created = Treasury.objects.bulk_create(movements)
+            # bulk_create sends no signals
+            rows = [movement.current_values() for movement in result.created]
+            checkpoints.apply_new_rows(Treasury, rows)
+            facts.apply_new_rows(Treasury, rows)
+            search.mark('treasury', [movement.pk for movement in result.created])
+            transaction.on_commit(lambda: caching.bump(caching.TREASURY_TOTALS))
+            transaction.on_commit(lambda: caching.bump(caching.DASHBOARD))
+    except InsufficientBalance as e:
+        result.created = []
+        for number, change in changes:
+            if change and change.client_id in e.client_ids and change.delta < 0:
+                result.add_error(number, 'paid_amount', 'المبلغ يتجاوز الرصيد المتاح')
+    return result
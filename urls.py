@@ -1,17 +1,18 @@
 from django.urls import path, include
 from django.views.generic import TemplateView
-from . import views, views_api, views_treasury, views_vehicle
+from . import views, views_api, views_export, views_treasury, views_vehicle
 from .views import (
     HomeView, UserListView, UserCreateView, UserUpdateView, UserDeleteView,
     ClientListView, ClientCreateView, ClientUpdateView, ClientDeleteView, ClientBalanceLogsView, ClientStatementView,
     DriverListView, DriverCreateView, DriverUpdateView, DriverDeleteView,
     OilTypeListView, OilTypeCreateView, OilTypeUpdateView, OilTypeDeleteView,
     PurchaseListView, PurchaseCreateView, PurchaseUpdateView, PurchaseDeleteView,
-    SaleListView, SaleCreateView, SaleUpdateView, SaleDeleteView
+    SaleListView, SaleCreateView, SaleUpdateView, SaleDeleteView, MarginReportView
 )
 from .views_vehicle import (
     VehicleMovementListView, VehicleMovementCreateView, VehicleMovementUpdateView,
-    VehicleMovementDeleteView, VehicleMovementDetailView, vehicle_movement_export
+    VehicleMovementDeleteView, VehicleMovementDetailView, vehicle_movement_export,
+    FreightReportView, DriverSettlementView,
 )
 
 urlpatterns = [
@@ -57,23 +58,35 @@ urlpatterns = [
     path('sales/create/', SaleCreateView.as_view(), name='sale_create'),
     path('sales/<int:pk>/edit/', SaleUpdateView.as_view(), name='sale_update'),
     path('sales/<int:pk>/delete/', SaleDeleteView.as_view(), name='sale_delete'),
+    path('sales/margins/', MarginReportView.as_view(), name='margin_report'),
     
     # Vehicle Movement URLs
     path('vehicle-movements/', VehicleMovementListView.as_view(), name='vehicle_movement_list'),
     path('vehicle-movements/create/internal/', VehicleMovementCreateView.as_view(), {'movement_type': 'internal'}, name='vehicle_movement_create_internal'),
     path('vehicle-movements/create/external/', VehicleMovementCreateView.as_view(), {'movement_type': 'external'}, name='vehicle_movement_create_external'),
+    # Before <str:pk>/ so 'export' is not taken for a movement id
+    path('vehicle-movements/export/', vehicle_movement_export, name='vehicle_movement_export'),
+    path('vehicle-movements/freight-report/', FreightReportView.as_view(), name='freight_report'),
+    path('vehicle-movements/driver-settlement/', DriverSettlementView.as_view(), name='driver_settlement'),
     path('vehicle-movements/<str:pk>/', VehicleMovementDetailView.as_view(), name='vehicle_movement_detail'),
     path('vehicle-movements/<str:pk>/edit/', VehicleMovementUpdateView.as_view(), name='vehicle_movement_update'),
     path('vehicle-movements/<str:pk>/delete/', VehicleMovementDeleteView.as_view(), name='vehicle_movement_delete'),
-    path('vehicle-movements/export/', vehicle_movement_export, name='vehicle_movement_export'),
     
     # Treasury URLs
     path('treasury/', views_treasury.TreasuryListView.as_view(), name='treasury_list'),
     path('treasury/create/', views_treasury.TreasuryCreateView.as_view(), name='treasury_create'),
     path('treasury/<int:pk>/edit/', views_treasury.TreasuryUpdateView.as_view(), name='treasury_update'),
     path('treasury/<int:pk>/delete/', views_treasury.TreasuryDeleteView.as_view(), name='treasury_delete'),
+    path('treasury/import/', views_treasury.TreasuryImportView.as_view(), name='treasury_import'),
+    
+    # Background exports
+    path('exports/<str:kind>/request/', views_export.export_job_create, name='export_job_create'),
+    path('exports/<int:pk>/', views_export.ExportJobDetailView.as_view(), name='export_job_detail'),
+    path('exports/<int:pk>/download/', views_export.export_job_download, name='export_job_download'),
     
     # API URLs
+    path('api/tables/<str:name>/', views_api.datatable, name='api_datatable'),
+    path('api/autocomplete/<str:source>/', views_api.autocomplete, name='api_autocomplete'),
     path('api/operations/<str:operation_type>/list/', views_api.get_operations_list, name='api_operations_list'),
     path('api/operations/<str:operation_type>/<int:operation_id>/', views_api.get_operation_details, name='api_operation_details'),
     
@@ -84,6 +97,7 @@ urlpatterns = [
     path('api/drivers/', views_treasury.get_drivers_json, name='api_drivers'),
     path('api/sales/<int:sale_id>/', views_treasury.get_sale_by_id, name='api_sale_detail'),
     path('api/purchases/<int:purchase_id>/', views_treasury.get_purchase_by_id, name='api_purchase_detail'),
+    path('api/treasury/import/', views_treasury.treasury_import_api, name='api_treasury_import'),
     
     # Vehicle Movement API URLs - Using views_vehicle for driver and freight endpoints
     path('api/drivers/<int:driver_id>/vehicle/', views_vehicle.get_driver_vehicle, name='get_driver_vehicle'),
@@ -7,10 +7,19 @@ from .mixins import AdminRequiredMixin, ClientManagerRequiredMixin, VehicleManag
 from .models import Client, Driver, CustomUser, BalanceChangeLog, OilType, Sale, Purchase, Treasury
 from django.shortcuts import redirect, get_object_or_404
 from django.core.exceptions import PermissionDenied
-from django.db.models import Q
 from django.contrib import messages
-from .forms import LoginForm, PurchaseForm, DriverForm
-from django.db.models import Sum
+from .forms import LoginForm, PurchaseForm, SaleForm, DriverForm
+from .sequences import next_id
+from django.db.models import Q, Sum
+from django.core.paginator import Paginator
+from django.conf import settings
+from django.utils import timezone
+from datetime import datetime, time, timedelta
+from .filters import parse_date_param
+from .statements import ClientStatement
+from .caching import CLIENT_BALANCE_COUNTS, CLIENT_COUNTS, get_or_compute
+from .pagination import KeysetPaginationMixin
+from . import costing, dashboard, search
 
 def login_view(request):
     if request.method == 'POST':
@@ -46,6 +55,12 @@ class HomeView(TemplateView):
             return redirect('login')
         return super().dispatch(request, *args, **kwargs)
 
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        # Cached figures from the daily facts, never the raw rows
+        context['kpis'] = dashboard.kpis(user=self.request.user)
+        return context
+
 class UserCreateView(LoginRequiredMixin, AdminRequiredMixin, CreateView):
     model = CustomUser
     fields = ['username', 'password', 'role']
@@ -67,10 +82,60 @@ class UserCreateView(LoginRequiredMixin, AdminRequiredMixin, CreateView):
 
 
 # Client Views
-class ClientListView(LoginRequiredMixin, ListView):
+BALANCE_FILTERS = {
+    'positive': Q(balance__gt=0),
+    'negative': Q(balance__lt=0),
+    'zero': Q(balance=0),
+}
+
+
+def start_of_day(day):
+    return timezone.make_aware(datetime.combine(day, time.min)) if settings.USE_TZ else datetime.combine(day, time.min)
+
+
+class ClientListView(LoginRequiredMixin, KeysetPaginationMixin, ListView):
     model = Client
     template_name = 'accounts/client_list.html'
     context_object_name = 'clients'
+    paginate_by = 50
+    keyset_ordering = ['name', 'pk']
+
+    def get_filters(self):
+        balance = self.request.GET.get('balance', '')
+        return {
+            'balance': balance if balance in BALANCE_FILTERS else '',
+            'created_from': parse_date_param(self.request.GET.get('created_from')),
+            'created_to': parse_date_param(self.request.GET.get('created_to')),
+        }
+
+    def get_queryset(self):
+        queryset = Client.objects.all()
+        filters = self.filters = self.get_filters()
+        if filters['balance']:
+            queryset = queryset.filter(BALANCE_FILTERS[filters['balance']])
+        # Day bounds as datetimes so the created_at index is usable
+        if filters['created_from']:
+            queryset = queryset.filter(created_at__gte=start_of_day(filters['created_from']))
+        if filters['created_to']:
+            queryset = queryset.filter(created_at__lt=start_of_day(filters['created_to'] + timedelta(days=1)))
+        return queryset
+
+    def get_total_count(self, queryset):
+        # Only the balance filter changes when a balance does; other counts wait for a new or deleted client
+        filters = self.filters
+        namespace = CLIENT_BALANCE_COUNTS if filters['balance'] else CLIENT_COUNTS
+        count = get_or_compute(
+            namespace,
+            (filters['balance'], filters['created_from'], filters['created_to']),
+            queryset.count,
+            timeout=getattr(settings, 'CLIENT_COUNT_CACHE_TIMEOUT', 300),
+        )
+        return count, False
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context.update(self.filters)
+        return context
 
 class ClientCreateView(LoginRequiredMixin, ClientManagerRequiredMixin, CreateView):
     model = Client
@@ -117,10 +182,15 @@ class ClientDeleteView(LoginRequiredMixin, ClientManagerRequiredMixin, DeleteVie
     success_url = reverse_lazy('client_list')
 
 # Driver Views
-class DriverListView(LoginRequiredMixin, VehicleManagerRequiredMixin, ListView):
-    model = Driver
+class DriverListView(LoginRequiredMixin, VehicleManagerRequiredMixin, TemplateView):
+    # الصفوف تُحمّل صفحة بصفحة من api_datatable
     template_name = 'accounts/driver_list.html'
-    context_object_name = 'drivers'
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['total_count'] = Driver.objects.count()
+        context['license_types'] = Driver._meta.get_field('license_type').choices
+        return context
 
 class DriverCreateView(LoginRequiredMixin, VehicleManagerRequiredMixin, CreateView):
     model = Driver
@@ -162,11 +232,8 @@ class OilTypeListView(LoginRequiredMixin, AdminRequiredMixin, ListView):
         search_query = self.request.GET.get('search', '').strip()
         queryset = OilType.objects.all()
         if search_query:
-            queryset = queryset.filter(
-                Q(id__icontains=search_query) |
-                Q(name__icontains=search_query) |
-                Q(properties__icontains=search_query)
-            )
+            # مرتبة حسب تطابق البحث
+            return search.filter_queryset(queryset, 'oil_type', search_query)
         return queryset.order_by('id')
 
 class OilTypeCreateView(LoginRequiredMixin, AdminRequiredMixin, CreateView):
@@ -191,11 +258,6 @@ class PurchaseCreateView(LoginRequiredMixin, AdminRequiredMixin, CreateView):
     form_class = PurchaseForm
     template_name = 'accounts/purchase_form.html'
     success_url = reverse_lazy('purchase_list')
-    
-    def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
-        context['clients'] = Client.objects.all().order_by('name')
-        return context
 
     def form_valid(self, form):
         return super().form_valid(form)
@@ -205,57 +267,40 @@ class PurchaseUpdateView(LoginRequiredMixin, AdminRequiredMixin, UpdateView):
     form_class = PurchaseForm
     template_name = 'accounts/purchase_form.html'
     success_url = reverse_lazy('purchase_list')
-    
-    def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
-        context['clients'] = Client.objects.all().order_by('name')
-        return context
 
 class PurchaseDeleteView(LoginRequiredMixin, AdminRequiredMixin, DeleteView):
     model = Purchase
     template_name = 'accounts/purchase_confirm_delete.html'
     success_url = reverse_lazy('purchase_list')
 
-class PurchaseListView(LoginRequiredMixin, ListView):
+class PurchaseListView(LoginRequiredMixin, KeysetPaginationMixin, ListView):
     model = Purchase
     template_name = 'accounts/purchase_list.html'
     context_object_name = 'purchases'
     paginate_by = 20
+    keyset_ordering = ['-date', '-pk']
 
     def get_queryset(self):
         queryset = super().get_queryset()
-        search_query = self.request.GET.get('search')
+        search_query = self.request.GET.get('search', '').strip()
         if search_query:
-            queryset = queryset.filter(
-                Q(client__name__icontains=search_query) |
-                Q(oil_type__name__icontains=search_query) |
-                Q(driver__name__icontains=search_query)
-            )
+            queryset = search.filter_queryset(queryset, 'purchase', search_query)
         return queryset
 
 class SaleCreateView(LoginRequiredMixin, AdminRequiredMixin, CreateView):
     model = Sale
-    fields = ['date', 'client', 'oil_type', 'quantity', 'price', 'loading_location', 'unloading_location', 'driver', 'description']
+    form_class = SaleForm
     template_name = 'accounts/sale_form.html'
     success_url = reverse_lazy('sale_list')
 
     def form_valid(self, form):
         if not form.instance.sale_id:
-            last_sale = Sale.objects.select_for_update().order_by('-sale_id').first()
-            if last_sale and last_sale.sale_id:
-                try:
-                    last_number = int(last_sale.sale_id.split('-')[1])
-                    new_number = last_number + 1
-                except (IndexError, ValueError):
-                    new_number = 1
-            else:
-                new_number = 1
-            form.instance.sale_id = f'SL-{new_number:03d}'
+            form.instance.sale_id = next_id('SL-')
         return super().form_valid(form)
 
 class SaleUpdateView(LoginRequiredMixin, AdminRequiredMixin, UpdateView):
     model = Sale
-    fields = ['date', 'client', 'oil_type', 'quantity', 'price', 'loading_location', 'unloading_location', 'driver', 'description']
+    form_class = SaleForm
     template_name = 'accounts/sale_form.html'
     success_url = reverse_lazy('sale_list')
 
@@ -264,21 +309,18 @@ class SaleDeleteView(LoginRequiredMixin, AdminRequiredMixin, DeleteView):
     template_name = 'accounts/sale_confirm_delete.html'
     success_url = reverse_lazy('sale_list')
 
-class SaleListView(LoginRequiredMixin, ListView):
+class SaleListView(LoginRequiredMixin, KeysetPaginationMixin, ListView):
     model = Sale
     template_name = 'accounts/sale_list.html'
     context_object_name = 'sales'
     paginate_by = 20
+    keyset_ordering = ['-date', '-pk']
 
     def get_queryset(self):
         queryset = super().get_queryset()
-        search_query = self.request.GET.get('search')
+        search_query = self.request.GET.get('search', '').strip()
         if search_query:
-            queryset = queryset.filter(
-                Q(client__name__icontains=search_query) |
-                Q(oil_type__name__icontains=search_query) |
-                Q(driver__name__icontains=search_query)
-            )
+            queryset = search.filter_queryset(queryset, 'sale', search_query)
         return queryset
 
 class UserListView(LoginRequiredMixin, AdminRequiredMixin, ListView):
@@ -321,83 +363,69 @@ class ClientBalanceLogsView(LoginRequiredMixin, ClientManagerRequiredMixin, Deta
 # Client Statement View
 class ClientStatementView(LoginRequiredMixin, TemplateView):
     template_name = 'accounts/client_statement.html'
+    paginate_by = 100
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['clients'] = Client.objects.all().order_by('name')
         
         client_id = self.request.GET.get('client_id')
         if client_id:
             client = get_object_or_404(Client, id=client_id)
             context['client'] = client
+            context['date_from'] = parse_date_param(self.request.GET.get('date_from'))
+            context['date_to'] = parse_date_param(self.request.GET.get('date_to'))
+            if 'date_from' not in self.request.GET and 'date_to' not in self.request.GET:
+                # Open period by default; earlier months are carried forward from the checkpoints
+                context['date_from'] = timezone.localdate().replace(day=1)
             
-            # Get all sales for this client
-            sales = Sale.objects.filter(client=client).order_by('date')
-            
-            # Get all purchases for this client (as supplier)
-            purchases = Purchase.objects.filter(supplier=client).order_by('date')
-            
-            # Get all treasury movements for this client
-            treasury_movements = Treasury.objects.filter(related_client=client).order_by('date')
-            
-            # Calculate totals
-            total_sales = sales.aggregate(total=Sum('amount'))['total'] or 0
-            total_purchases = purchases.aggregate(total=Sum('amount'))['total'] or 0
-            total_treasury = treasury_movements.aggregate(total=Sum('paid_amount'))['total'] or 0
-            
-            context['total_sales'] = total_sales
-            context['total_purchases'] = total_purchases
-            context['total_treasury'] = total_treasury
+            # Date-ordered stream with the running balance computed in SQL
+            statement = ClientStatement(client, context['date_from'], context['date_to'])
+            summary = statement.summary()
+            context['total_sales'] = summary['total_sales']
+            context['total_purchases'] = summary['total_purchases']
+            context['total_treasury'] = summary['total_treasury']
+            context['opening_balance'] = summary['opening_balance']
             
-            # Combine all transactions into a single list
-            transactions = []
+            paginator = Paginator(statement, self.paginate_by)
+            page_obj = paginator.get_page(self.request.GET.get('page'))
+            context['page_obj'] = page_obj
+            context['is_paginated'] = page_obj.has_other_pages()
+            context['transactions'] = page_obj.object_list
             
-            # Add sales transactions
-            for sale in sales:
-                transactions.append({
-                    'date': sale.date,
-                    'transaction_id': sale.sale_id,
-                    'type': 'sale',
-                    'details': f'بيع {sale.quantity} {sale.oil_type.name if sale.oil_type else ""}',
-                    'amount': sale.amount,
-                    'balance': 0  # Will calculate running balance later
-                })
-            
-            # Add purchase transactions
-            for purchase in purchases:
-                transactions.append({
-                    'date': purchase.date,
-                    'transaction_id': purchase.BU_ID,
-                    'type': 'purchase',
-                    'details': f'شراء {purchase.quantity} {purchase.oil_type.name if purchase.oil_type else ""}',
-                    'amount': -purchase.amount,  # Negative amount for purchases
-                    'balance': 0  # Will calculate running balance later
-                })
-            
-            # Add treasury transactions
-            for movement in treasury_movements:
-                amount = movement.paid_amount
-                if movement.transaction_type == 'expense':
-                    amount = -amount  # Negative for expenses
-                
-                transactions.append({
-                    'date': movement.date,
-                    'transaction_id': f'TR-{movement.movement_id}',
-                    'type': 'treasury',
-                    'details': movement.description,
-                    'amount': amount,
-                    'balance': 0  # Will calculate running balance later
-                })
-            
-            # Sort transactions by date
-            transactions.sort(key=lambda x: x['date'])
-            
-            # Calculate running balance
-            running_balance = 0
-            for transaction in transactions:
-                running_balance += transaction['amount']
-                transaction['balance'] = running_balance
+            # Balance carried into the first row of this page
+            if page_obj.object_list:
+                first = page_obj.object_list[0]
+                context['page_opening_balance'] = first['balance'] - first['amount']
+            else:
+                context['page_opening_balance'] = summary['opening_balance']
             
-            context['transactions'] = transactions
+            query = self.request.GET.copy()
+            query.pop('page', None)
+            context['page_query'] = query.urlencode()
         
-        return context
\ No newline at end of file
+        return context
+
+
+# Margin Report View
+class MarginReportView(LoginRequiredMixin, AdminRequiredMixin, TemplateView):
+    template_name = 'accounts/margin_report.html'
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+
+        period = self.request.GET.get('period')
+        context['period'] = period if period in costing.PERIODS else 'month'
+        context['date_from'] = parse_date_param(self.request.GET.get('date_from'))
+        context['date_to'] = parse_date_param(self.request.GET.get('date_to'))
+        if 'date_from' not in self.request.GET and 'date_to' not in self.request.GET:
+            # السنة الحالية افتراضياً
+            context['date_from'] = timezone.localdate().replace(month=1, day=1)
+
+        # التكلفة والهامش محسوبان مسبقاً على كل عملية بيع
+        rows = list(costing.margin_report(context['period'], context['date_from'], context['date_to']))
+        context['rows'] = rows
+        context['total_quantity'] = sum(row['quantity'] or 0 for row in rows)
+        context['total_sales'] = sum(row['sales'] or 0 for row in rows)
+        context['total_cost'] = sum(row['cost'] or 0 for row in rows)
+        context['total_margin'] = sum(row['margin'] or 0 for row in rows)
+        return context
@@ -1,15 +1,41 @@
-from django.http import JsonResponse
-from django.views.decorators.http import require_GET
-from django.shortcuts import get_object_or_404
+from django.http import Http404, JsonResponse
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition, require_GET
 from django.contrib.auth.decorators import login_required
 from django.views.decorators.csrf import csrf_exempt
 from django.core.serializers.json import DjangoJSONEncoder
-from .models import Sale, Purchase, Driver, Client, OilType
-from decimal import Decimal
+from .models import Sale, Purchase
+from .datatables import TABLES
+from .autocomplete import SOURCES, etag, suggest
+from . import lookups
 import logging
 
 logger = logging.getLogger(__name__)
 
+@require_GET
+@login_required
+def datatable(request, name):
+    """DataTables server-side processing: one page of ``TABLES[name]``"""
+    table = TABLES.get(name)
+    if table is None:
+        raise Http404('Unknown table')
+    if not table.allowed(request.user):
+        return JsonResponse({'error': 'Permission denied'}, status=403)
+    return JsonResponse(table.response(request.GET))
+
+def autocomplete_etag(request, source):
+    return etag(source, request.GET.get('q', ''))
+
+@require_GET
+@login_required
+@cache_control(private=True, max_age=60)
+@condition(etag_func=autocomplete_etag)
+def autocomplete(request, source):
+    """Select2 options of ``SOURCES[source]`` matching ``?q=``"""
+    if source not in SOURCES:
+        raise Http404('Unknown source')
+    return JsonResponse({'results': suggest(source, request.GET.get('q', ''))})
+
 @login_required
 def get_operations_list(request, operation_type):
     """Returns a list of operations (sales or purchases) for selection in vehicle movement form"""
@@ -81,6 +107,10 @@ def get_operations_list(request, operation_type):
         logger.error(f"Error in get_operations_list: {str(e)}", exc_info=True)
         return JsonResponse({'error': str(e)}, status=500)
 
+# Operation columns read by get_operation_details; client, oil type and driver names come from the lookups
+OPERATION_FIELDS = ['id', 'date', 'oil_type_id', 'quantity', 'loading_location', 'unloading_location',
+                    'driver_id', 'driver_freight', 'client_freight']
+
 @csrf_exempt
 @login_required
 def get_operation_details(request, operation_type, operation_id):
@@ -89,43 +119,33 @@ def get_operation_details(request, operation_type, operation_id):
     
     try:
         if operation_type == 'sale':
-            operation = Sale.objects.select_related('client', 'oil_type', 'driver').get(id=operation_id)
-            data = {
-                'id': operation.id,
-                'date': operation.date.strftime('%Y-%m-%d'),
-                'client': operation.client.id,
-                'client_name': operation.client.name,
-                'oil_type': operation.oil_type.id,
-                'oil_type_name': operation.oil_type.name,
-                'quantity': float(operation.quantity),
-                'loading_location': operation.loading_location or '',
-                'unloading_location': operation.unloading_location or '',
-                'driver': operation.driver.id if operation.driver else None,
-                'driver_name': operation.driver.name if operation.driver else '',
-                'driver_freight': float(operation.driver_freight) if operation.driver_freight else 0,
-                'client_freight': float(operation.client_freight) if operation.client_freight else 0
-            }
-            
+            model, client_field = Sale, 'client_id'
         elif operation_type == 'purchase':
-            operation = Purchase.objects.select_related('supplier', 'oil_type', 'driver').get(id=operation_id)
-            data = {
-                'id': operation.id,
-                'client': operation.supplier.id,
-                'client_name': operation.supplier.name,
-                'oil_type': operation.oil_type.id,
-                'oil_type_name': operation.oil_type.name,
-                'quantity': float(operation.quantity),
-                'loading_location': operation.loading_location or '',
-                'unloading_location': operation.unloading_location or '',
-                'driver': operation.driver.id if operation.driver else None,
-                'driver_name': operation.driver.name if operation.driver else '',
-                'driver_freight': float(operation.driver_freight) if operation.driver_freight else 0,
-                'client_freight': float(operation.client_freight) if operation.client_freight else 0
-            }
+            model, client_field = Purchase, 'supplier_id'
         else:
             logger.error(f"Invalid operation type: {operation_type}")
             return JsonResponse({'error': 'Invalid operation type'}, status=400)
 
+        operation = model.objects.values(client_field, *OPERATION_FIELDS).get(id=operation_id)
+        client = lookups.CLIENTS.get(operation[client_field]) or {}
+        oil_type = lookups.OIL_TYPES.get(operation['oil_type_id']) or {}
+        driver = lookups.DRIVERS.get(operation['driver_id']) or {}
+        data = {
+            'id': operation['id'],
+            'date': operation['date'].strftime('%Y-%m-%d'),
+            'client': operation[client_field],
+            'client_name': client.get('name', ''),
+            'oil_type': operation['oil_type_id'],
+            'oil_type_name': oil_type.get('name', ''),
+            'quantity': float(operation['quantity']),
+            'loading_location': operation['loading_location'] or '',
+            'unloading_location': operation['unloading_location'] or '',
+            'driver': operation['driver_id'],
+            'driver_name': driver.get('name', ''),
+            'driver_freight': float(operation['driver_freight']) if operation['driver_freight'] else 0,
+            'client_freight': float(operation['client_freight']) if operation['client_freight'] else 0
+        }
+
         logger.debug(f"Operation details found: {data}")
         return JsonResponse(data)
         
@@ -135,61 +155,3 @@ def get_operation_details(request, operation_type, operation_id):
     except Exception as e:
         logger.error(f"Error fetching operation details: {str(e)}", exc_info=True)
         return JsonResponse({'error': str(e)}, status=500)
-
-@login_required
-def get_driver_vehicle(request, driver_id):
-    """Returns vehicle number for a driver"""
-    try:
-        driver = get_object_or_404(Driver, id=driver_id)
-        return JsonResponse({
-            'vehicle_number': driver.vehicle_number
-        })
-    except Exception as e:
-        logger.error(f"Error fetching driver vehicle: {str(e)}")
-        return JsonResponse({'error': str(e)}, status=500)
-
-@login_required
-def calculate_freight(request):
-    """Calculate freight based on quantity and client settings"""
-    try:
-        quantity = Decimal(request.GET.get('quantity', '0'))
-        client_id = request.GET.get('client_id')
-        
-        if not quantity or not client_id:
-            return JsonResponse({
-                'error': 'الكمية ورقم العميل مطلوبان'
-            }, status=400)
-        
-        client = get_object_or_404(Client, id=client_id)
-        
-        # حساب النولون حسب معدل العميل
-        # يمكن إضافة منطق حساب أكثر تعقيداً هنا
-        base_rate = Decimal('10.00')  # سعر النولون الأساسي لكل طن
-        quantity_factor = Decimal('1.00')  # معامل الكمية
-        
-        if quantity > 20:
-            quantity_factor = Decimal('0.95')  # خصم 5% للكميات الكبيرة
-        elif quantity > 10:
-            quantity_factor = Decimal('0.97')  # خصم 3% للكميات المتوسطة
-            
-        freight = quantity * base_rate * quantity_factor
-        
-        return JsonResponse({
-            'freight': float(freight.quantize(Decimal('0.01'))),
-            'base_rate': float(base_rate),
-            'quantity_factor': float(quantity_factor)
-        })
-        
-    except ValueError:
-        return JsonResponse({
-            'error': 'قيمة الكمية غير صحيحة'
-        }, status=400)
-    except Client.DoesNotExist:
-        return JsonResponse({
-            'error': 'العميل غير موجود'
-        }, status=404)
-    except Exception as e:
-        logger.error(f"Error calculating freight: {str(e)}")
-        return JsonResponse({
-            'error': 'حدث خطأ أثناء حساب النولون'
-        }, status=500)
\ No newline at end of file
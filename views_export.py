@@ -0,0 +1,71 @@
+from django.contrib import messages
+from django.contrib.auth.decorators import login_required
+from django.contrib.auth.mixins import LoginRequiredMixin
+from django.http import FileResponse, Http404, JsonResponse
+from django.shortcuts import get_object_or_404, redirect
+from django.urls import reverse
+from django.views.decorators.http import require_POST
+from django.views.generic import DetailView
+import os
+
+from .export_jobs import request_export, visible_jobs
+from .models_export import ExportJob
+
+# Filters accepted for each export kind
+EXPORT_PARAMS = {
+    'vehicle_movements': ['search', 'type', 'client', 'date_from', 'date_to'],
+    'client_statement': ['client_id', 'date_from', 'date_to'],
+}
+
+
+@login_required
+@require_POST
+def export_job_create(request, kind):
+    """طلب تصدير في الخلفية، أو إعادة استخدام ملف حديث بنفس الفلاتر"""
+    if kind not in EXPORT_PARAMS:
+        raise Http404('Unknown export')
+    export_format = request.POST.get('export_format', 'xlsx')
+    if export_format not in dict(ExportJob.FORMATS):
+        export_format = 'xlsx'
+    params = {name: request.POST.get(name, '') for name in EXPORT_PARAMS[kind]}
+    if kind == 'client_statement' and not params['client_id']:
+        messages.error(request, 'يجب اختيار العميل')
+        return redirect('client_statement')
+
+    job = request_export(kind, export_format, params, request.user)
+    if request.headers.get('x-requested-with') == 'XMLHttpRequest':
+        return JsonResponse(job_status(job), status=202)
+    return redirect('export_job_detail', pk=job.pk)
+
+
+def job_status(job):
+    return {
+        'id': job.pk,
+        'status': job.status,
+        'progress': job.progress,
+        'rows_written': job.rows_written,
+        'total_rows': job.total_rows,
+        'error': job.error,
+        'download_url': reverse('export_job_download', args=[job.pk]) if job.status == 'done' else None,
+    }
+
+
+class ExportJobDetailView(LoginRequiredMixin, DetailView):
+    template_name = 'accounts/export_job_detail.html'
+    context_object_name = 'job'
+
+    def get_queryset(self):
+        return visible_jobs(self.request.user)
+
+    def render_to_response(self, context, **response_kwargs):
+        if self.request.headers.get('x-requested-with') == 'XMLHttpRequest':
+            return JsonResponse(job_status(self.object))
+        return super().render_to_response(context, **response_kwargs)
+
+
+@login_required
+def export_job_download(request, pk):
+    job = get_object_or_404(visible_jobs(request.user), pk=pk, status='done')
+    if not job.file_path or not os.path.exists(job.file_path):
+        raise Http404('Export file has expired')
+    return FileResponse(open(job.file_path, 'rb'), as_attachment=True, filename=job.filename)
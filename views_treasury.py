@@ -1,100 +1,75 @@
-from django.views.generic import CreateView, ListView, UpdateView, DeleteView, DetailView
+from django.views.generic import CreateView, ListView, UpdateView, DeleteView, DetailView, FormView
+from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin
+from django.views.decorators.http import require_GET, require_POST
 from django.urls import reverse_lazy
 from django.shortcuts import render, redirect, get_object_or_404
 from django.http import JsonResponse
-from django.db.models import Q, Sum
+from django.db import transaction
+from django.db.models import Count, Q, Sum
 from django.contrib import messages
+from django.conf import settings
 from .models import Treasury, Sale, Purchase, Driver, OilType, Client, CompanyAccount
 from .mixins import TransactionManagerRequiredMixin
-from django import forms
+from .filters import parse_date_param
+from .forms import TreasuryImportForm, TreasuryMovementForm
+from .caching import TREASURY_TOTALS, get_or_compute
+from .pagination import KeysetPaginationMixin
+from . import projections, search
 import datetime
-from .models import BalanceChangeLog  # Add import for logging
+import json
+from .balances import InsufficientBalance, apply_changes, reverse_change, treasury_change as balance_change
+from .treasury_import import COLUMNS as IMPORT_COLUMNS, import_movements, read_rows
 
-class TreasuryMovementForm(forms.ModelForm):
-    TRANSACTION_TYPE_CHOICES = [
-        ('income', 'وارد'),
-        ('expense', 'منصرف')
-    ]
-    
-    SOURCE_CHOICES = [
-        ('client', 'العميل'),
-        ('company', 'الشركة'),
-        ('driver', 'السائق')
-    ]
-    
-    transaction_type = forms.ChoiceField(choices=TRANSACTION_TYPE_CHOICES)
-    source = forms.ChoiceField(choices=SOURCE_CHOICES, label='نوع الحساب')
-    description = forms.CharField(widget=forms.Textarea)
-    other_payment_method = forms.CharField(required=False)
-
-    def clean(self):
-        cleaned_data = super().clean()
-        payment_method = cleaned_data.get('payment_method')
-        other_payment = cleaned_data.get('other_payment_method')
-        source = cleaned_data.get('source')
-        record_id = self.data.get('record_id')
-
-        # Validate payment method
-        if payment_method == 'other' and not other_payment:
-            self.add_error('other_payment_method', 'يجب إدخال طريقة الدفع عند اختيار "أخرى"')
-
-        # Validate amount
-        paid_amount = cleaned_data.get('paid_amount')
-        if paid_amount and paid_amount <= 0:
-            self.add_error('paid_amount', 'يجب أن يكون المبلغ المدفوع أكبر من الصفر')
-
-        # Validate record selection
-        if not record_id:
-            self.add_error(None, 'يجب اختيار حساب مرتبط')
-
-        return cleaned_data
-    
-    class Meta:
-        model = Treasury
-        fields = ['movement_id', 'date', 'description', 'transaction_type', 'paid_amount', 'payment_method']
-        widgets = {
-            'description': forms.Textarea(attrs={'rows': 3}),
-            'date': forms.DateInput(attrs={'class': 'datepicker'}),
-        }
-    
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        self.fields['paid_amount'].label = 'المبلغ المدفوع'
-        self.fields['payment_method'].label = 'طريقة الدفع'
-        self.fields['description'].label = 'ملاحظات'
-        self.fields['date'].label = 'التاريخ'
-    
-
-
-class TreasuryListView(LoginRequiredMixin, TransactionManagerRequiredMixin, ListView):
+class TreasuryListView(LoginRequiredMixin, TransactionManagerRequiredMixin, KeysetPaginationMixin, ListView):
     model = Treasury
     template_name = 'accounts/treasury_list.html'
     context_object_name = 'movements'
     paginate_by = 20
+    keyset_ordering = ['-date', '-movement_id']
     
+    def get_filters(self):
+        return {
+            'search': self.request.GET.get('search', '').strip(),
+            'date_from': parse_date_param(self.request.GET.get('date_from')),
+            'date_to': parse_date_param(self.request.GET.get('date_to')),
+        }
+
     def get_queryset(self):
         queryset = super().get_queryset()
-        search_query = self.request.GET.get('search')
+        filters = self.filters = self.get_filters()
+        search_query = filters['search']
         if search_query:
-            queryset = queryset.filter(
-                Q(movement_id__icontains=search_query) |
-                Q(description__icontains=search_query) |
-                Q(related_sale__sale_id__icontains=search_query) |
-                Q(related_purchase__BU_ID__icontains=search_query) |
-                Q(related_driver__name__icontains=search_query)
-            )
-        
-        # Calculate totals for context
-        self.income_total = queryset.filter(transaction_type='income').aggregate(total=Sum('paid_amount'))['total'] or 0
-        self.expense_total = queryset.filter(transaction_type='expense').aggregate(total=Sum('paid_amount'))['total'] or 0
+            queryset = search.filter_queryset(queryset, 'treasury', search_query)
+        if filters['date_from']:
+            queryset = queryset.filter(date__gte=filters['date_from'])
+        if filters['date_to']:
+            queryset = queryset.filter(date__lte=filters['date_to'])
         
-        return queryset.order_by('-date')
+        # Count and totals in one query, cached until a movement changes (see caching for other processes)
+        self.summary = get_or_compute(
+            TREASURY_TOTALS,
+            (filters['search'], filters['date_from'], filters['date_to']),
+            lambda: queryset.aggregate(
+                count=Count('pk'),
+                income_total=Sum('paid_amount', filter=Q(transaction_type='income')),
+                expense_total=Sum('paid_amount', filter=Q(transaction_type='expense')),
+            ),
+            timeout=getattr(settings, 'TREASURY_TOTALS_CACHE_TIMEOUT', 300),
+        )
+        # Search results keep their rank order, otherwise ListView orders by keyset_ordering
+        return queryset
+
+    def get_total_count(self, queryset):
+        return self.summary['count'], False
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['income_total'] = self.income_total
-        context['expense_total'] = self.expense_total
+        context['income_total'] = self.summary['income_total'] or 0
+        context['expense_total'] = self.summary['expense_total'] or 0
+        context['search'] = self.filters['search']
+        context['date_from'] = self.filters['date_from']
+        context['date_to'] = self.filters['date_to']
         return context
 
 def get_clients(request):
@@ -111,13 +86,6 @@ class TreasuryCreateView(LoginRequiredMixin, TransactionManagerRequiredMixin, Cr
     template_name = 'accounts/treasury_form.html'
     success_url = reverse_lazy('treasury_list')
     
-    def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
-        context['sales'] = Sale.objects.all().order_by('-date')
-        context['purchases'] = Purchase.objects.all().order_by('-date')
-        context['drivers'] = Driver.objects.all().order_by('name')
-        return context
-    
     def form_valid(self, form):
         try:
             if not form.is_valid():
@@ -135,57 +103,8 @@ class TreasuryCreateView(LoginRequiredMixin, TransactionManagerRequiredMixin, Cr
             paid_amount = form.cleaned_data['paid_amount']
             transaction_type = form.cleaned_data['transaction_type']
 
-            # Handle balance updates based on account type and transaction type
-            if record_id:
-                try:
-                    if source == 'client':
-                        client = Client.objects.get(id=record_id)
-                        previous_balance = client.balance
-                        
-                        # Update balance based on transaction type
-                        if transaction_type == 'income':
-                            client.balance += paid_amount
-                        else:  # expense
-                            if paid_amount > client.balance:
-                                form.add_error('paid_amount', 'المبلغ يتجاوز الرصيد المتاح')
-                                return self.form_invalid(form)
-                            client.balance -= paid_amount
-                            
-                        client.save()
-                        BalanceChangeLog.objects.create(
-                            client=client,
-                            user=self.request.user,
-                            previous_balance=previous_balance,
-                            new_balance=client.balance,
-                            change_amount=paid_amount if transaction_type == 'income' else -paid_amount,
-                            notes=f"{'إيداع' if transaction_type == 'income' else 'سحب'} خزينة بواسطة {self.request.user.username}"
-                        )
-                    elif source == 'company':
-                        client = Client.objects.get(id=record_id)
-                        previous_balance = client.balance
-                        
-                        # Update balance based on transaction type
-                        if transaction_type == 'income':
-                            client.balance -= paid_amount  # Deduct from client's balance (company's debt)
-                        else:  # expense
-                            client.balance += paid_amount  # Add to client's balance
-                            
-                        client.save()
-                        BalanceChangeLog.objects.create(
-                            client=client,
-                            user=self.request.user,
-                            previous_balance=previous_balance,
-                            new_balance=client.balance,
-                            change_amount=-paid_amount if transaction_type == 'income' else paid_amount,
-                            notes=f"{'سحب' if transaction_type == 'income' else 'إيداع'} خزينة بواسطة {self.request.user.username}"
-                        )
-                    elif source == 'driver':
-                        driver = Driver.objects.get(id=record_id)
-                        # No balance operations for driver
-                        pass
-                except Exception as e:
-                    form.add_error(None, f'حدث خطأ أثناء الحفظ: {str(e)}')
-                    return self.form_invalid(form)
+            # Balance change for client and company accounts; drivers carry no balance
+            change = balance_change(source, transaction_type, paid_amount, record_id, self.request.user.username)
 
             # Create and save movement
             movement = form.save(commit=False)
@@ -207,8 +126,17 @@ class TreasuryCreateView(LoginRequiredMixin, TransactionManagerRequiredMixin, Cr
                 movement.related_client = client
                 movement.description = f"دفعة {'إلى' if transaction_type == 'income' else 'من'} حساب الشركة للعميل {client.name}"
             
-            # Save the movement record
-            movement.save()
+            # Save the movement record and apply the balance change together
+            try:
+                with transaction.atomic():
+                    movement.save()
+                    apply_changes([change], user=self.request.user)
+            except InsufficientBalance:
+                form.add_error('paid_amount', 'المبلغ يتجاوز الرصيد المتاح')
+                return self.form_invalid(form)
+            except Client.DoesNotExist as e:
+                form.add_error(None, f'حدث خطأ أثناء الحفظ: {str(e)}')
+                return self.form_invalid(form)
             messages.success(self.request, 'تم حفظ حركة الخزينة بنجاح')
             return super().form_valid(form)
             
@@ -240,53 +168,18 @@ class TreasuryUpdateView(LoginRequiredMixin, TransactionManagerRequiredMixin, Up
                 form.add_error(None, 'يجب اختيار حساب مرتبط')
                 return self.form_invalid(form)
 
-            # Handle balance updates based on account type and transaction type
+            # Undo the movement's previous balance change and apply the new one in one batch
             try:
-                if source == 'client':
-                    client = Client.objects.get(id=record_id)
-                    previous_balance = client.balance
-                    
-                    # Update balance based on transaction type
-                    if transaction_type == 'income':
-                        client.balance += paid_amount
-                    else:  # expense
-                        if paid_amount > client.balance:
-                            form.add_error('paid_amount', 'المبلغ يتجاوز الرصيد المتاح')
-                            return self.form_invalid(form)
-                        client.balance -= paid_amount
-                        
-                    client.save()
-                    BalanceChangeLog.objects.create(
-                        client=client,
-                        user=self.request.user,
-                        previous_balance=previous_balance,
-                        new_balance=client.balance,
-                        change_amount=paid_amount if transaction_type == 'income' else -paid_amount,
-                        notes=f"{'إيداع' if transaction_type == 'income' else 'سحب'} خزينة بواسطة {self.request.user.username}"
-                    )
-                elif source == 'company':
-                    client = Client.objects.get(id=record_id)
-                    previous_balance = client.balance
-                    
-                    # Update balance based on transaction type
-                    if transaction_type == 'income':
-                        client.balance -= paid_amount  # Deduct from client's balance (company's debt)
-                    else:  # expense
-                        client.balance += paid_amount  # Add to client's balance
-                        
-                    client.save()
-                    BalanceChangeLog.objects.create(
-                        client=client,
-                        user=self.request.user,
-                        previous_balance=previous_balance,
-                        new_balance=client.balance,
-                        change_amount=-paid_amount if transaction_type == 'income' else paid_amount,
-                        notes=f"{'سحب' if transaction_type == 'income' else 'إيداع'} خزينة بواسطة {self.request.user.username}"
-                    )
-                elif source == 'driver':
-                    driver = Driver.objects.get(id=record_id)
-                    # No balance operations for driver
-                    pass
+                loaded = instance._loaded_values or {}
+                username = self.request.user.username
+                changes = []
+                previous = balance_change(
+                    loaded.get('movement_source'), loaded.get('transaction_type'),
+                    loaded.get('paid_amount'), loaded.get('related_client_id'), username,
+                )
+                if previous:
+                    changes.append(reverse_change(previous, f'إلغاء حركة خزينة سابقة بواسطة {username}'))
+                changes.append(balance_change(source, transaction_type, paid_amount, record_id, username))
 
                 # Update movement details
                 instance.user = self.request.user
@@ -307,7 +200,13 @@ class TreasuryUpdateView(LoginRequiredMixin, TransactionManagerRequiredMixin, Up
                     instance.related_client = client
                     instance.description = f"دفعة {'إلى' if transaction_type == 'income' else 'من'} حساب الشركة للعميل {client.name}"
                 
-                instance.save()
+                try:
+                    with transaction.atomic():
+                        instance.save()
+                        apply_changes(changes, user=self.request.user)
+                except InsufficientBalance:
+                    form.add_error('paid_amount', 'المبلغ يتجاوز الرصيد المتاح')
+                    return self.form_invalid(form)
                 messages.success(self.request, 'تم تحديث حركة الخزينة بنجاح')
                 return redirect(self.success_url)
 
@@ -335,49 +234,72 @@ class TreasuryDeleteView(LoginRequiredMixin, TransactionManagerRequiredMixin, De
     template_name = 'accounts/treasury_confirm_delete.html'
     success_url = reverse_lazy('treasury_list')
 
-# AJAX views for fetching records
+class TreasuryImportView(LoginRequiredMixin, TransactionManagerRequiredMixin, FormView):
+    """Upload a day's treasury movements as one CSV/XLSX file"""
+    form_class = TreasuryImportForm
+    template_name = 'accounts/treasury_import.html'
+    success_url = reverse_lazy('treasury_list')
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['columns'] = IMPORT_COLUMNS
+        return context
+
+    def form_valid(self, form):
+        try:
+            rows = read_rows(form.cleaned_data['file'])
+        except (ValueError, ImportError) as e:
+            form.add_error('file', str(e))
+            return self.form_invalid(form)
+
+        result = import_movements(rows, self.request.user)
+        if not result.ok:
+            return self.render_to_response(self.get_context_data(form=form, import_errors=result.as_dict()['errors']))
+        messages.success(self.request, f'تم استيراد {len(result.created)} حركة خزينة بنجاح')
+        return super().form_valid(form)
+
+@login_required
+@require_POST
+def treasury_import_api(request):
+    """Import a JSON list of treasury movements: {"movements": [{column: value, ...}, ...]}"""
+    if request.user.role not in TransactionManagerRequiredMixin.required_roles:
+        return JsonResponse({'error': 'Permission denied'}, status=403)
+    try:
+        payload = json.loads(request.body)
+        rows = payload['movements'] if isinstance(payload, dict) else payload
+    except (ValueError, KeyError):
+        return JsonResponse({'error': 'Invalid JSON body'}, status=400)
+    if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+        return JsonResponse({'error': 'movements must be a list of objects'}, status=400)
+
+    result = import_movements(rows, request.user)
+    return JsonResponse({'status': 'ok' if result.ok else 'error', **result.as_dict()}, status=201 if result.ok else 400)
+
+# AJAX views for fetching records; one page per request, see projections.py
+def projection_response(request, projection, key):
+    if request.user.role not in TransactionManagerRequiredMixin.required_roles:
+        return JsonResponse({'error': 'Permission denied'}, status=403)
+    return projection.response(request.GET, key)
+
+@login_required
+@require_GET
 def get_sales_json(request):
-    sales = Sale.objects.all().order_by('-date')
-    data = [{
-        'id': sale.id,
-        'sale_id': sale.sale_id,
-        'client': sale.client.name,
-        'date': sale.date.strftime('%Y-%m-%d'),
-        'amount': float(sale.total_amount),
-        'status': sale.status
-    } for sale in sales]
-    return JsonResponse({'sales': data})
+    return projection_response(request, projections.SALES, 'sales')
 
+@login_required
+@require_GET
 def get_purchases_json(request):
-    purchases = Purchase.objects.all().order_by('-date')
-    data = [{
-        'id': purchase.id,
-        'purchase_id': purchase.BU_ID,
-        'supplier': purchase.supplier_name,
-        'date': purchase.date.strftime('%Y-%m-%d'),
-        'amount': float(purchase.total_amount),
-        'status': purchase.status
-    } for purchase in purchases]
-    return JsonResponse({'purchases': data})
+    return projection_response(request, projections.PURCHASES, 'purchases')
 
+@login_required
+@require_GET
 def get_drivers_json(request):
-    drivers = Driver.objects.all().order_by('name')
-    data = [{
-        'id': driver.id,
-        'driver_id': driver.driver_id,
-        'name': driver.name,
-        'vehicle_number': driver.vehicle_number
-    } for driver in drivers]
-    return JsonResponse({'drivers': data})
+    return projection_response(request, projections.DRIVERS, 'drivers')
 
+@login_required
+@require_GET
 def get_clients_json(request):
-    clients = Client.objects.all().order_by('name')
-    data = [{
-        'id': client.id,
-        'name': client.name,
-        'balance': float(client.balance)
-    } for client in clients]
-    return JsonResponse({'clients': data})
+    return projection_response(request, projections.CLIENTS, 'clients')
 
 def get_sale_by_id(request, sale_id):
     try:
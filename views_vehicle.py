@@ -2,52 +2,50 @@ from django.contrib.auth.mixins import LoginRequiredMixin
 from django.views.generic import ListView, CreateView, UpdateView, DeleteView, DetailView
 from django.urls import reverse_lazy
 from django.db.models import Q
-from django.http import JsonResponse
-from django.shortcuts import get_object_or_404
+from django.http import Http404, JsonResponse
 from django.contrib import messages
+from django.contrib.auth.decorators import login_required
 from django.core.exceptions import ValidationError
+from django.utils import timezone
 from datetime import datetime
 import logging
 
 from .models_vehicle import VehicleMovement
-from .models import Sale, Purchase, Driver
+from .models import Sale, Purchase, Driver, Client
+from .filters import parse_date_param
 from .forms import VehicleMovementForm
 from .mixins import AdminRequiredMixin
+from .pagination import KeysetPaginationMixin
+from . import freight_reports, lookups
+from .vehicle_exports import export_rows, filter_movements, stream_csv, xlsx_file
 
 logger = logging.getLogger(__name__)
 
-class VehicleMovementListView(LoginRequiredMixin, ListView):
+class VehicleMovementListView(LoginRequiredMixin, KeysetPaginationMixin, ListView):
     model = VehicleMovement
     template_name = 'accounts/vehicle_movement_list.html'
     context_object_name = 'movements'
     paginate_by = 25
+    keyset_ordering = ['-date', '-created_at', '-movement_id']
     
     def get_queryset(self):
         queryset = VehicleMovement.objects.select_related(
             'client', 
             'driver',
             'oil_type'
-        ).order_by('-date', '-created_at')
+        ).order_by(*self.keyset_ordering)
         
-        search_query = self.request.GET.get('search', '')
-        if search_query:
-            queryset = queryset.filter(
-                Q(movement_id__icontains=search_query) |
-                Q(client__name__icontains=search_query) |
-                Q(driver__name__icontains=search_query) |
-                Q(vehicle_number__icontains=search_query)
-            )
-            
-        movement_type = self.request.GET.get('type')
-        if movement_type in ['internal', 'external']:
-            queryset = queryset.filter(movement_type=movement_type)
-            
-        return queryset
+        return filter_movements(queryset, self.request.GET)
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['movement_type_filter'] = self.request.GET.get('type', '')
         context['search_query'] = self.request.GET.get('search', '')
+        context['client_filter'] = self.request.GET.get('client', '')
+        context['date_from'] = self.request.GET.get('date_from', '')
+        context['date_to'] = self.request.GET.get('date_to', '')
+        # القائمة تُحمّل من الإكمال التلقائي، ويُعرض العميل المختار فقط
+        context['selected_client'] = lookups.CLIENTS.get(context['client_filter'])
         return context
 
 class VehicleMovementCreateView(LoginRequiredMixin, CreateView):
@@ -67,6 +65,7 @@ class VehicleMovementCreateView(LoginRequiredMixin, CreateView):
         context['is_create'] = True
         context['movement_type'] = self.kwargs.get('movement_type', 'external')
         context['movement_type_display'] = 'داخلية' if context['movement_type'] == 'internal' else 'خارجية'
+        context['next_movement_id'] = getattr(self.request, 'next_movement_id', None)
         return context
 
     def form_valid(self, form):
@@ -80,22 +79,7 @@ class VehicleMovementCreateView(LoginRequiredMixin, CreateView):
                     form.add_error('client_freight', 'نولون العميل يجب أن يكون أكبر من أو يساوي نولون السائق')
                     return self.form_invalid(form)
             
-            # إنشاء رقم الحركة
-            prefix = 'VEi-' if form.instance.movement_type == 'internal' else 'VEe-'
-            last_movement = VehicleMovement.objects.filter(
-                movement_id__startswith=prefix
-            ).order_by('-movement_id').first()
-            
-            if last_movement:
-                try:
-                    last_number = int(last_movement.movement_id.split('-')[1])
-                    next_number = last_number + 1
-                except (IndexError, ValueError):
-                    next_number = 1
-            else:
-                next_number = 1
-                
-            form.instance.movement_id = f'{prefix}{next_number:03d}'
+            # رقم الحركة يُحجز مرة واحدة عند الحفظ
             response = super().form_valid(form)
             messages.success(self.request, "تم إنشاء الحركة بنجاح")
             return response
@@ -151,23 +135,16 @@ class VehicleMovementDetailView(LoginRequiredMixin, DetailView):
     context_object_name = 'movement'
     pk_url_kwarg = 'pk'
 
+    def get_queryset(self):
+        return super().get_queryset().select_related(
+            'client', 'oil_type', 'driver', 'sale__client', 'purchase__supplier',
+        )
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        movement = self.get_object()
-        
         # إضافة تفاصيل العملية المرتبطة إذا كانت حركة داخلية
-        if movement.movement_type == 'internal' and movement.operation_type:
-            if movement.operation_type == 'sale':
-                try:
-                    context['related_operation'] = Sale.objects.get(id=movement.operation_id)
-                except Sale.DoesNotExist:
-                    pass
-            elif movement.operation_type == 'purchase':
-                try:
-                    context['related_operation'] = Purchase.objects.get(id=movement.operation_id)
-                except Purchase.DoesNotExist:
-                    pass
-                    
+        if self.object.operation is not None:
+            context['related_operation'] = self.object.operation
         return context
 
 class VehicleMovementDeleteView(LoginRequiredMixin, DeleteView):
@@ -187,13 +164,17 @@ class VehicleMovementDeleteView(LoginRequiredMixin, DeleteView):
             return self.get(request, *args, **kwargs)
 
 # API Views
+@login_required
 def get_driver_vehicle(request, driver_id):
-    """إرجاع رقم سيارة السائق"""
-    driver = get_object_or_404(Driver, id=driver_id)
+    """إرجاع رقم سيارة السائق من بيانات السائقين المخزنة"""
+    driver = lookups.DRIVERS.get(driver_id)
+    if driver is None:
+        raise Http404('Driver not found')
     return JsonResponse({
-        'vehicle_number': driver.vehicle_number
+        'vehicle_number': driver['vehicle_number']
     })
 
+@login_required
 def calculate_freight(request):
     """حساب النولون بناءً على الكمية"""
     try:
@@ -204,6 +185,11 @@ def calculate_freight(request):
             return JsonResponse({
                 'error': 'الكمية ورقم العميل مطلوبان'
             }, status=400)
+
+        if lookups.CLIENTS.get(client_id) is None:
+            return JsonResponse({
+                'error': 'العميل غير موجود'
+            }, status=404)
             
         # هنا يمكن إضافة منطق حساب النولون حسب متطلبات العمل
         # مثال بسيط: النولون = الكمية × 10
@@ -223,105 +209,103 @@ def calculate_freight(request):
         }, status=500)
 
 
-from django.http import HttpResponse
-import csv
-import xlwt
-from django.contrib.auth.decorators import login_required
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
 
 @login_required
 def vehicle_movement_export(request):
-    """تصدير حركات السيارات إلى ملف Excel أو PDF"""
+    """تصدير حركات السيارات (بنفس فلاتر القائمة) إلى ملف Excel أو CSV دون تحميلها كلها في الذاكرة"""
     format_type = request.GET.get('format', 'excel')
-    
-    # الحصول على جميع حركات السيارات
-    movements = VehicleMovement.objects.select_related(
-        'client', 'driver', 'oil_type'
-    ).order_by('-date', '-created_at')
+    rows = export_rows(request.GET)
     
     # تصدير إلى Excel
     if format_type == 'excel':
-        response = HttpResponse(content_type='application/ms-excel')
-        response['Content-Disposition'] = 'attachment; filename="vehicle_movements.xls"'
-        
-        wb = xlwt.Workbook(encoding='utf-8')
-        ws = wb.add_sheet('حركات السيارات')
-        
-        # تنسيق العناوين
-        font_style = xlwt.XFStyle()
-        font_style.font.bold = True
-        
-        # كتابة العناوين
-        columns = [
-            'رقم الحركة', 'التاريخ', 'نوع الحركة', 'رقم العملية', 'العميل', 'السائق',
-            'رقم السيارة', 'نوع الزيت', 'الكمية', 'مكان التحميل', 'مكان التفريغ',
-            'النولون للسائق', 'النولون للعميل'
-        ]
-        
-        for col_num, column_title in enumerate(columns):
-            ws.write(0, col_num, column_title, font_style)
-        
-        # كتابة البيانات
-        for row_num, movement in enumerate(movements, 1):
-            movement_type = 'داخلية' if movement.movement_type == 'internal' else 'خارجية'
-            operation_id = movement.operation_id if movement.movement_type == 'internal' else '-'
-            
-            row = [
-                movement.movement_id,
-                movement.date.strftime('%Y-%m-%d'),
-                movement_type,
-                operation_id,
-                movement.client.name,
-                movement.driver.name,
-                movement.vehicle_number,
-                movement.oil_type.name,
-                movement.quantity,
-                movement.loading_location,
-                movement.unloading_location,
-                movement.driver_freight,
-                movement.client_freight
-            ]
-            
-            for col_num, cell_value in enumerate(row):
-                ws.write(row_num, col_num, cell_value)
-        
-        wb.save(response)
-        return response
-        
-    # تصدير إلى PDF
-    elif format_type == 'pdf':
-        # يمكن استخدام مكتبة مثل ReportLab أو WeasyPrint لإنشاء ملفات PDF
-        # هذا مثال بسيط يعيد استجابة نصية
-        response = HttpResponse(content_type='text/plain')
-        response['Content-Disposition'] = 'attachment; filename="vehicle_movements.txt"'
-        
-        writer = csv.writer(response)
-        writer.writerow([
-            'رقم الحركة', 'التاريخ', 'نوع الحركة', 'رقم العملية', 'العميل', 'السائق',
-            'رقم السيارة', 'نوع الزيت', 'الكمية', 'مكان التحميل', 'مكان التفريغ',
-            'النولون للسائق', 'النولون للعميل'
-        ])
-        
-        for movement in movements:
-            movement_type = 'داخلية' if movement.movement_type == 'internal' else 'خارجية'
-            operation_id = movement.operation_id if movement.movement_type == 'internal' else '-'
-            
-            writer.writerow([
-                movement.movement_id,
-                movement.date.strftime('%Y-%m-%d'),
-                movement_type,
-                operation_id,
-                movement.client.name,
-                movement.driver.name,
-                movement.vehicle_number,
-                movement.oil_type.name,
-                movement.quantity,
-                movement.loading_location,
-                movement.unloading_location,
-                movement.driver_freight,
-                movement.client_freight
-            ])
+        return FileResponse(
+            xlsx_file(rows),
+            as_attachment=True,
+            filename='vehicle_movements.xlsx',
+            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+        )
         
+    # تصدير إلى CSV (صيغة pdf القديمة كانت تُخرج CSV أيضاً)
+    elif format_type in ('csv', 'pdf'):
+        response = StreamingHttpResponse(stream_csv(rows), content_type='text/csv; charset=utf-8')
+        response['Content-Disposition'] = 'attachment; filename="vehicle_movements.csv"'
         return response
     
     # إذا لم يتم تحديد نوع صالح
-    return HttpResponse("نوع التصدير غير صالح", status=400)
\ No newline at end of file
+    return HttpResponse("نوع التصدير غير صالح", status=400)
+
+
+def report_params(request):
+    """فلاتر التقرير من الرابط، وافتراضياً السنة الحالية"""
+    params = request.GET.copy()
+    params.pop('page', None)
+    if 'date_from' not in params and 'date_to' not in params:
+        params['date_from'] = timezone.localdate().replace(month=1, day=1).isoformat()
+    return params
+
+
+def csv_response(rows, headers, filename):
+    response = StreamingHttpResponse(stream_csv(rows, headers), content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+class FreightReportView(LoginRequiredMixin, AdminRequiredMixin, ListView):
+    """هامش النولون (نولون العميل - نولون السائق) لكل سائق أو سيارة أو خط سير أو عميل"""
+    template_name = 'accounts/freight_report.html'
+    context_object_name = 'rows'
+    paginate_by = 50
+
+    def get(self, request, *args, **kwargs):
+        self.params = report_params(request)
+        group = request.GET.get('group')
+        self.group = group if group in freight_reports.GROUPS else 'driver'
+        if request.GET.get('format') == 'csv':
+            rows = freight_reports.margin_csv_rows(freight_reports.freight_margins(self.params, self.group), self.group)
+            headers = freight_reports.MARGIN_HEADERS[self.group] + freight_reports.MARGIN_COLUMNS
+            return csv_response(rows, headers, f'freight_{self.group}.csv')
+        return super().get(request, *args, **kwargs)
+
+    def get_queryset(self):
+        # التجميع يُقسم إلى صفحات في قاعدة البيانات؛ الإجماليات باستعلام تجميع منفصل
+        return freight_reports.margin_rows(self.params, self.group)
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['rows'] = list(freight_reports.with_margin_rates(context['rows']))
+        context.update(freight_reports.margin_totals(self.params))
+        context['group'] = self.group
+        context['group_headers'] = freight_reports.MARGIN_HEADERS[self.group]
+        context['movement_type_filter'] = self.params.get('type', '')
+        context['date_from'] = parse_date_param(self.params.get('date_from'))
+        context['date_to'] = parse_date_param(self.params.get('date_to'))
+        context['page_query'] = self.params.urlencode()
+        return context
+
+
+class DriverSettlementView(LoginRequiredMixin, AdminRequiredMixin, ListView):
+    """تسوية السائقين: النولون المستحق مقابل حركات الخزينة الخاصة بكل سائق"""
+    template_name = 'accounts/driver_settlement.html'
+    context_object_name = 'rows'
+    paginate_by = 50
+
+    def get(self, request, *args, **kwargs):
+        self.params = report_params(request)
+        self.date_from = parse_date_param(self.params.get('date_from'))
+        self.date_to = parse_date_param(self.params.get('date_to'))
+        if request.GET.get('format') == 'csv':
+            rows = freight_reports.settlement_csv_rows(freight_reports.driver_settlements(self.date_from, self.date_to).iterator())
+            return csv_response(rows, freight_reports.SETTLEMENT_HEADERS, 'driver_settlement.csv')
+        return super().get(request, *args, **kwargs)
+
+    def get_queryset(self):
+        return freight_reports.driver_settlements(self.date_from, self.date_to)
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context.update(freight_reports.settlement_totals(self.date_from, self.date_to))
+        context['date_from'] = self.date_from
+        context['date_to'] = self.date_to
+        context['page_query'] = self.params.urlencode()
+        return context
@@ -0,0 +1,43 @@
+from django import forms
+from django.core.exceptions import ValidationError
+from django.forms.models import ModelChoiceIterator
+from django.urls import reverse
+
+
+class AutocompleteSelect(forms.Select):
+    """Select of a model choice field that renders only the selected option.
+
+    The other options are loaded from ``/api/autocomplete/<source>/`` by the
+    Select2 set up in ``utils.initializeAutocomplete`` (js/operations.js), so
+    rendering the form does not read the whole table.
+    """
+
+    def __init__(self, source, attrs=None):
+        self.source = source
+        super().__init__(attrs)
+
+    def get_context(self, name, value, attrs):
+        context = super().get_context(name, value, attrs)
+        context['widget']['attrs']['data-autocomplete-url'] = reverse('api_autocomplete', args=[self.source])
+        return context
+
+    def selected_choices(self, value):
+        choices = self.choices
+        if not isinstance(choices, ModelChoiceIterator):
+            return list(choices)
+        options = [('', choices.field.empty_label)] if choices.field.empty_label is not None else []
+        selected = [item for item in value if item not in (None, '')]
+        if selected:
+            try:
+                options += [choices.choice(obj) for obj in choices.queryset.filter(pk__in=selected)]
+            except (TypeError, ValueError, ValidationError):
+                pass
+        return options
+
+    def optgroups(self, name, value, attrs=None):
+        choices = self.choices
+        self.choices = self.selected_choices(value)
+        try:
+            return super().optgroups(name, value, attrs)
+        finally:
+            self.choices = choices